@@ -27,6 +27,7 @@ from modulos.modulo_pagos.views import (
     BecaViewSet,
     DescuentoViewSet,
     PlanPagoViewSet,
+    ConciliacionBancariaViewSet,
 )
 
 # Router configuration
@@ -41,6 +42,7 @@ router.register(r'estados-pago', EstadoPagosEventoViewSet, basename='estados-pag
 router.register(r'matriculas', MatriculaViewSet, basename='matriculas')
 router.register(r'becas', BecaViewSet, basename='becas')
 router.register(r'descuentos', DescuentoViewSet, basename='descuentos')
+router.register(r'conciliaciones-bancarias', ConciliacionBancariaViewSet, basename='conciliaciones-bancarias')
 
 urlpatterns = [
     # Special endpoints (ANTES del router para evitar conflictos)
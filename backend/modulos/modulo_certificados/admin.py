@@ -1,11 +1,43 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Evento, Certificado
+from modulos.modulo_pagos.services.cronogramas_service import CronogramasService
 
 @admin.register(Evento)
 class EventoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'tipo', 'fecha_inicio', 'fecha_fin', 'lugar')
     list_filter = ('tipo',)
     search_fields = ('nombre',)
+    actions = ['simular_recalculo_cronogramas', 'recalcular_cronogramas']
+
+    def _recalcular_cronogramas(self, request, queryset, simular):
+        for evento in queryset:
+            reporte = CronogramasService.recalcular_evento(evento, simular=simular)
+            self.message_user(
+                request,
+                f"{evento.nombre}: {reporte['planes_modificados']} de {reporte['planes_revisados']} planes "
+                f"{'por modificar' if simular else 'modificados'} ({reporte['cuotas_actualizadas']} cuotas "
+                f"actualizadas, {reporte['cuotas_creadas']} creadas, {reporte['cuotas_eliminadas']} eliminadas)",
+                level=messages.INFO if simular else messages.SUCCESS,
+            )
+            if reporte['omitidos']:
+                self.message_user(
+                    request,
+                    f"{evento.nombre}: {len(reporte['omitidos'])} planes omitidos por abonos parciales "
+                    f"(planes {', '.join(str(o['plan_pago_id']) for o in reporte['omitidos'])})",
+                    level=messages.WARNING,
+                )
+
+    def simular_recalculo_cronogramas(self, request, queryset):
+        """Muestra cuántas cuotas cambiarían sin guardar nada"""
+        self._recalcular_cronogramas(request, queryset, simular=True)
+
+    simular_recalculo_cronogramas.short_description = "Simular recálculo de cronogramas de pago"
+
+    def recalcular_cronogramas(self, request, queryset):
+        """Recalcula las cuotas pendientes tras cambiar costo o fecha de inicio"""
+        self._recalcular_cronogramas(request, queryset, simular=False)
+
+    recalcular_cronogramas.short_description = "Recalcular cronogramas de pago (costo y fecha de inicio actuales)"
 
 @admin.register(Certificado)
 class CertificadoAdmin(admin.ModelAdmin):
@@ -0,0 +1,193 @@
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import repeat
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from pypdf import PdfReader, PdfWriter
+
+# Comprobantes renderizados por tarea del grupo de procesos
+TAMANO_BLOQUE = 200
+
+# Procesos usados por defecto en la generación en lote
+MAXIMO_TRABAJADORES = 4
+
+# Filas del cuerpo del comprobante: (etiqueta, clave en los datos)
+FILAS = (
+    ('Fecha', 'fecha'),
+    ('Estudiante', 'estudiante'),
+    ('Cédula', 'cedula'),
+    ('Evento', 'evento'),
+    ('Concepto', 'concepto'),
+    ('Método de pago', 'metodo_pago'),
+    ('Institución financiera', 'institucion_financiera'),
+    ('Referencia', 'referencia'),
+)
+
+# Generador por plantilla de cada proceso: se reutiliza entre bloques
+_generadores = {}
+
+
+def _latin1(texto):
+    """Las fuentes estándar de PDF solo cubren latin-1 (suficiente para español)."""
+    return str(texto).encode('latin-1', 'replace').decode('latin-1')
+
+
+class ComprobantePDF(FPDF):
+    def __init__(self):
+        super().__init__(orientation='L', unit='mm', format='A5')
+        self.WIDTH = 210
+        self.HEIGHT = 148
+        self.set_auto_page_break(auto=False)
+        self.set_margins(12, 10, 12)
+
+
+class GeneradorComprobantes:
+    """
+    Renderiza comprobantes de pago con fuentes estándar de PDF (sin archivos
+    de fuentes que cargar) y la plantilla de fondo leída una sola vez, de modo
+    que el mismo generador sirve para miles de documentos.
+    """
+
+    def __init__(self, plantilla_path=None):
+        self.plantilla = None
+        if plantilla_path and os.path.exists(plantilla_path):
+            with open(plantilla_path, 'rb') as f:
+                self.plantilla = f.read()
+
+    def _pagina(self, pdf, datos):
+        pdf.add_page()
+        if self.plantilla:
+            pdf.image(BytesIO(self.plantilla), x=0, y=0, w=pdf.WIDTH, h=pdf.HEIGHT)
+
+        pdf.set_font('Helvetica', 'B', 12)
+        pdf.cell(0, 6, 'UNIVERSIDAD TÉCNICA ESTATAL DE QUEVEDO', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font('Helvetica', '', 8)
+        pdf.cell(
+            0, 4, 'Centro de Capacitación, Desarrollo y Transferencia de Ciencia, Educación y Tecnología "SCIEDTEC"',
+            align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT
+        )
+        pdf.line(pdf.l_margin, 22, pdf.WIDTH - pdf.r_margin, 22)
+
+        pdf.set_xy(pdf.l_margin, 25)
+        pdf.set_font('Helvetica', 'B', 14)
+        pdf.cell(120, 8, 'COMPROBANTE DE PAGO')
+        pdf.set_font('Helvetica', 'B', 11)
+        pdf.cell(0, 8, _latin1(f"N.º {datos['numero']}"), align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.ln(3)
+
+        for etiqueta, clave in FILAS:
+            valor = datos.get(clave)
+            if not valor:
+                continue
+            pdf.set_font('Helvetica', 'B', 10)
+            pdf.cell(45, 7, f'{etiqueta}:')
+            pdf.set_font('Helvetica', '', 10)
+            pdf.cell(0, 7, _latin1(valor), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        if datos.get('observaciones'):
+            pdf.set_font('Helvetica', 'I', 9)
+            pdf.multi_cell(0, 5, txt=_latin1(datos['observaciones'])[:300], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        pdf.set_xy(pdf.WIDTH - pdf.r_margin - 80, 112)
+        pdf.set_font('Helvetica', 'B', 13)
+        pdf.cell(80, 11, f"TOTAL PAGADO: $ {datos['monto']}", border=1, align='C')
+
+        pdf.set_xy(pdf.l_margin, 134)
+        pdf.set_font('Helvetica', 'I', 8)
+        pdf.cell(
+            0, 4, _latin1(f"Emitido el {datos['emitido']}. Documento generado por el sistema; no requiere firma."),
+            align='C'
+        )
+
+    @staticmethod
+    def _salida(pdf):
+        data = pdf.output()
+        return bytes(data) if isinstance(data, (bytes, bytearray)) else str(data).encode('latin-1')
+
+    def renderizar(self, comprobantes):
+        """Un solo PDF con una página por comprobante."""
+        pdf = ComprobantePDF()
+        for datos in comprobantes:
+            self._pagina(pdf, datos)
+        return self._salida(pdf)
+
+    def renderizar_individuales(self, comprobantes):
+        """Un PDF por comprobante: lista de (nombre de archivo, bytes)."""
+        archivos = []
+        for datos in comprobantes:
+            pdf = ComprobantePDF()
+            self._pagina(pdf, datos)
+            archivos.append((f"comprobante_{datos['numero']}.pdf", self._salida(pdf)))
+        return archivos
+
+
+def _generador(plantilla_path):
+    generador = _generadores.get(plantilla_path)
+    if generador is None:
+        generador = _generadores[plantilla_path] = GeneradorComprobantes(plantilla_path)
+    return generador
+
+
+def _renderizar_bloque(bloque, individuales, plantilla_path):
+    # Se ejecuta en los procesos del grupo: no debe acceder a la base de datos
+    generador = _generador(plantilla_path)
+    if individuales:
+        return generador.renderizar_individuales(bloque)
+    return generador.renderizar(bloque)
+
+
+def generar_comprobante_bytes(datos, plantilla_path=None) -> bytes:
+    """Genera el PDF de un comprobante a partir de sus datos ya formateados."""
+    return _generador(plantilla_path).renderizar([datos])
+
+
+def generar_comprobantes_lote(comprobantes, formato='pdf', trabajadores=None,
+                              tamano_bloque=TAMANO_BLOQUE, plantilla_path=None) -> bytes:
+    """
+    Genera muchos comprobantes repartiendo bloques entre procesos.
+
+    Args:
+        comprobantes: Lista de datos de comprobantes ya formateados
+        formato: 'pdf' (un documento de varias páginas) o 'zip' (un PDF por comprobante)
+        trabajadores: Procesos del grupo (por defecto hasta MAXIMO_TRABAJADORES)
+        tamano_bloque: Comprobantes por tarea
+        plantilla_path: Imagen de fondo opcional
+
+    Returns:
+        bytes: PDF o ZIP con todos los comprobantes
+    """
+    if formato not in ('pdf', 'zip'):
+        raise ValueError(f"Formato no válido: {formato}")
+    comprobantes = list(comprobantes)
+    bloques = [comprobantes[i:i + tamano_bloque] for i in range(0, len(comprobantes), tamano_bloque)]
+    if trabajadores is None:
+        trabajadores = min(os.cpu_count() or 1, MAXIMO_TRABAJADORES)
+    trabajadores = min(trabajadores, len(bloques))
+    argumentos = (bloques, repeat(formato == 'zip'), repeat(plantilla_path))
+
+    if formato == 'pdf' and len(bloques) == 1:
+        return _renderizar_bloque(bloques[0], False, plantilla_path)
+    if trabajadores <= 1:
+        return _ensamblar(map(_renderizar_bloque, *argumentos), formato)
+    with ProcessPoolExecutor(max_workers=trabajadores) as grupo:
+        return _ensamblar(grupo.map(_renderizar_bloque, *argumentos), formato)
+
+
+def _ensamblar(resultados, formato):
+    """Une los bloques en orden a medida que terminan."""
+    salida = BytesIO()
+    if formato == 'zip':
+        # Los PDF ya van comprimidos: almacenarlos sin volver a comprimir
+        with zipfile.ZipFile(salida, 'w', zipfile.ZIP_STORED) as zf:
+            for archivos in resultados:
+                for nombre, contenido in archivos:
+                    zf.writestr(nombre, contenido)
+    else:
+        writer = PdfWriter()
+        for contenido in resultados:
+            writer.append(PdfReader(BytesIO(contenido)))
+        writer.write(salida)
+    return salida.getvalue()
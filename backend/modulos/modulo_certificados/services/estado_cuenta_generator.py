@@ -0,0 +1,189 @@
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+from .comprobante_generator import _latin1
+
+FORMATOS = ('pdf', 'csv')
+
+# Bloques renderizándose a la vez por proceso: acota la memoria en uso
+BLOQUES_EN_CURSO_POR_TRABAJADOR = 2
+
+MAXIMO_TRABAJADORES = 4
+
+# Columnas de las tablas del PDF: (encabezado, clave, ancho en mm, alineación)
+COLUMNAS_CUOTAS = (
+    ('Cuota', 'numero_cuota', 18, 'C'),
+    ('Vencimiento', 'fecha_vencimiento', 32, 'C'),
+    ('Monto', 'monto', 32, 'R'),
+    ('Pagado', 'monto_pagado', 32, 'R'),
+    ('Saldo', 'saldo', 32, 'R'),
+    ('Estado', 'estado', 40, 'C'),
+)
+COLUMNAS_PAGOS = (
+    ('Fecha', 'fecha', 26, 'C'),
+    ('Concepto', 'concepto', 62, 'L'),
+    ('Método', 'metodo_pago', 32, 'L'),
+    ('Referencia', 'referencia', 34, 'L'),
+    ('Monto', 'monto', 32, 'R'),
+)
+COLUMNAS_DESCUENTOS = (
+    ('Aplica a', 'tipo_pago', 40, 'L'),
+    ('Beneficio', 'nombre', 114, 'L'),
+    ('Descuento', 'descuento', 32, 'R'),
+)
+
+
+def _fecha(valor):
+    return valor.strftime('%d/%m/%Y') if valor else ''
+
+
+def nombre_archivo(datos, formato):
+    return f"estado_cuenta_{datos['evento']['codigo_evento']}_{datos['estudiante']['cedula']}.{formato}"
+
+
+class EstadoCuentaPDF(FPDF):
+    def __init__(self):
+        super().__init__(orientation='P', unit='mm', format='A4')
+        self.WIDTH = 210
+        self.HEIGHT = 297
+        self.set_auto_page_break(auto=True, margin=15)
+        self.set_margins(12, 12, 12)
+
+    def tabla(self, titulo, columnas, filas):
+        self.set_font('Helvetica', 'B', 11)
+        self.cell(0, 8, titulo, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        if not filas:
+            self.set_font('Helvetica', 'I', 9)
+            self.cell(0, 6, 'Sin registros', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            self.ln(2)
+            return
+        self.set_font('Helvetica', 'B', 9)
+        self.set_fill_color(230, 230, 230)
+        for encabezado, _, ancho, _ in columnas:
+            self.cell(ancho, 6, encabezado, border=1, align='C', fill=True)
+        self.ln()
+        self.set_font('Helvetica', '', 9)
+        for fila in filas:
+            for _, clave, ancho, alineacion in columnas:
+                valor = fila[clave]
+                texto = _fecha(valor) if hasattr(valor, 'strftime') else _latin1('' if valor is None else valor)
+                self.cell(ancho, 6, texto[:45], border=1, align=alineacion)
+            self.ln()
+        self.ln(3)
+
+
+def generar_estado_cuenta_pdf(datos) -> bytes:
+    """Genera el estado de cuenta de un estudiante en PDF."""
+    pdf = EstadoCuentaPDF()
+    pdf.add_page()
+
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.cell(0, 6, 'UNIVERSIDAD TÉCNICA ESTATAL DE QUEVEDO', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font('Helvetica', '', 8)
+    pdf.cell(
+        0, 4, 'Centro de Capacitación, Desarrollo y Transferencia de Ciencia, Educación y Tecnología "SCIEDTEC"',
+        align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT
+    )
+    pdf.ln(4)
+    pdf.set_font('Helvetica', 'B', 14)
+    pdf.cell(0, 8, 'ESTADO DE CUENTA', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(2)
+
+    estudiante, evento, plan, totales = datos['estudiante'], datos['evento'], datos['plan'], datos['totales']
+    for etiqueta, valor in (
+        ('Estudiante', estudiante['nombre']),
+        ('Cédula', estudiante['cedula']),
+        ('Evento', f"{evento['nombre']} ({evento['codigo_evento']})"),
+        ('Fecha de corte', _fecha(datos['fecha_corte'])),
+        ('Colegiatura', f"$ {plan['monto_colegiatura']} en {plan['numero_cuotas']} cuotas"),
+        ('Estado', plan['estado_general']),
+        ('Convenio', plan['convenio']),
+    ):
+        if not valor:
+            continue
+        pdf.set_font('Helvetica', 'B', 10)
+        pdf.cell(40, 6, f'{etiqueta}:')
+        pdf.set_font('Helvetica', '', 10)
+        pdf.multi_cell(0, 6, txt=_latin1(valor), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(3)
+
+    pdf.tabla('Cuotas', COLUMNAS_CUOTAS, datos['cuotas'])
+    pdf.tabla('Pagos registrados', COLUMNAS_PAGOS, datos['pagos'])
+    pdf.tabla('Becas y descuentos', COLUMNAS_DESCUENTOS, datos['descuentos'])
+
+    pdf.set_font('Helvetica', 'B', 10)
+    for etiqueta, clave in (
+        ('Total cargos', 'cargos'), ('Total abonos', 'abonos'),
+        ('Descuentos vigentes', 'descuentos'), ('SALDO PENDIENTE', 'saldo'),
+    ):
+        pdf.cell(154, 6, etiqueta, border=1, align='R')
+        pdf.cell(32, 6, f'$ {totales[clave]}', border=1, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    data = pdf.output()
+    return bytes(data) if isinstance(data, (bytes, bytearray)) else str(data).encode('latin-1')
+
+
+def generar_estado_cuenta_csv(datos) -> bytes:
+    """Genera el estado de cuenta de un estudiante en CSV (una fila por movimiento)."""
+    salida = io.StringIO()
+    writer = csv.writer(salida)
+    writer.writerow(['seccion', 'fecha', 'descripcion', 'monto', 'pagado', 'saldo', 'estado'])
+    for cuota in datos['cuotas']:
+        writer.writerow([
+            'cuota', cuota['fecha_vencimiento'], f"Cuota {cuota['numero_cuota']}",
+            cuota['monto'], cuota['monto_pagado'], cuota['saldo'], cuota['estado'],
+        ])
+    for pago in datos['pagos']:
+        writer.writerow([
+            'pago', pago['fecha'], f"{pago['concepto']} - {pago['metodo_pago']} {pago['referencia'] or ''}".strip(),
+            pago['monto'], '', '', '',
+        ])
+    for descuento in datos['descuentos']:
+        writer.writerow(['descuento', '', f"{descuento['nombre']} ({descuento['tipo_pago']})", descuento['descuento'], '', '', ''])
+    totales = datos['totales']
+    writer.writerow(['total', datos['fecha_corte'], 'Saldo pendiente', totales['cargos'], totales['abonos'], totales['saldo'], ''])
+    return salida.getvalue().encode('utf-8')
+
+
+GENERADORES = {'pdf': generar_estado_cuenta_pdf, 'csv': generar_estado_cuenta_csv}
+
+
+def renderizar_bloque(bloque, formatos):
+    """Archivos de un bloque de estados de cuenta: lista de (nombre, bytes). Sin acceso a la base de datos."""
+    return [
+        (nombre_archivo(datos, formato), GENERADORES[formato](datos))
+        for datos in bloque
+        for formato in formatos
+    ]
+
+
+def renderizar_en_paralelo(bloques, formatos=FORMATOS, trabajadores=None):
+    """
+    Renderiza los bloques en un grupo de procesos y devuelve sus archivos en
+    orden. Solo se piden bloques nuevos a medida que se entregan los
+    anteriores, de modo que la memoria no crece con el número de estudiantes.
+    """
+    for formato in formatos:
+        if formato not in GENERADORES:
+            raise ValueError(f"Formato no válido: {formato}")
+    if trabajadores is None:
+        trabajadores = min(os.cpu_count() or 1, MAXIMO_TRABAJADORES)
+    if trabajadores <= 1:
+        for bloque in bloques:
+            yield from renderizar_bloque(bloque, formatos)
+        return
+
+    with ProcessPoolExecutor(max_workers=trabajadores) as grupo:
+        en_curso = deque()
+        for bloque in bloques:
+            en_curso.append(grupo.submit(renderizar_bloque, bloque, formatos))
+            if len(en_curso) >= trabajadores * BLOQUES_EN_CURSO_POR_TRABAJADOR:
+                yield from en_curso.popleft().result()
+        while en_curso:
+            yield from en_curso.popleft().result()
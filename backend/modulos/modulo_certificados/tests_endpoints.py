@@ -15,6 +15,7 @@ from modulos.modulo_pagos.models import (
     Matricula,
     Cuota,
     EstadoPagosEvento,
+    Beca,
 )
 
 
@@ -199,3 +200,40 @@ class TestAPICertificadosEndpoints(TestCase):
         self.assertEqual(resumen["tipo"], "final")
         self.assertTrue(resumen["incluidos"])
 
+
+    def test_estadisticas_evento_paginadas(self):
+        plan, cuota = self._preparar_plan_pagado_completo()
+        Cuota.objects.filter(pk=cuota.pk).update(
+            estado="atrasado",
+            monto_pagado=Decimal("0.00"),
+            fecha_vencimiento=date.today() - timedelta(days=10),
+        )
+
+        resp = self.client.get(f"/api/v1/eventos/{self.evento.id}/estadisticas/?limite=1")
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data["estudiantes_atrasados_total"], 1)
+        self.assertEqual(data["estudiantes_atrasados"][0]["dias_atraso"], 10)
+        self.assertEqual(data["estudiantes_atrasados"][0]["monto_atrasado"], "100.00")
+
+        resp = self.client.get(f"/api/v1/eventos/{self.evento.id}/estadisticas/?offset=1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["estudiantes_atrasados"], [])
+
+    def test_reportes_evento_con_descuentos(self):
+        self._preparar_plan_pagado_completo()
+        Beca.objects.create(
+            estudiante=self.estudiante, evento=self.evento, nombre_beca="Excelencia",
+            tipo_beca="porcentual", porcentaje_descuento=Decimal("20.00"), estado="activa",
+            motivo="Alto rendimiento", fecha_inicio=date.today(), fecha_fin=date.today() + timedelta(days=10),
+        )
+
+        resp = self.client.get(f"/api/v1/eventos/{self.evento.id}/estudiantes-pagos/")
+        self.assertEqual(resp.status_code, 200)
+        descuentos = resp.json()["estudiantes"][0]["descuentos"]
+        self.assertEqual(descuentos["colegiatura"], {"descuento_total": "20.00", "monto_final": "80.00"})
+        self.assertEqual(descuentos["certificado"], {"descuento_total": "0.00", "monto_final": "25.00"})
+
+        resp = self.client.get(f"/api/v1/eventos/{self.evento.id}/estadisticas/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["descuentos"]["matricula"], {"estudiantes": 1, "total": "10.00"})
@@ -21,6 +21,7 @@ from .models import Evento
 from modulos.modulo_estudiantes.models import Estudiante
 from modulos.modulo_pagos.models import EstadoPagosEvento, Matricula
 from modulos.modulo_pagos.services.sistema_pagos_service import SistemaPagosService
+from modulos.modulo_pagos.services.descuentos_service import DescuentosService, TIPOS_PAGO
 from django.db.models import Q
 from .serializers import EventoSerializer, CertificadoSerializer
 from rest_framework.views import APIView
@@ -35,6 +36,7 @@ from io import BytesIO
 import qrcode
 import json
 import datetime as dt
+from decimal import Decimal
 
 
 def _ensure_qr_bytes_and_persist(certificado, request) -> bytes:
@@ -126,10 +128,21 @@ class EventoViewSet(viewsets.ModelViewSet):
 
         filtro_estado = (request.query_params.get('estado') or '').strip()
 
+        estudiantes = list(estudiantes_qs)
+        estudiante_ids = [est.id for est in estudiantes]
+        # Resúmenes y estados en lote (número fijo de consultas)
+        resumenes = SistemaPagosService.obtener_resumenes_evento(evento, estudiante_ids=estudiante_ids)
+        estados_pagos = {
+            ep.estudiante_id: ep
+            for ep in EstadoPagosEvento.objects.filter(evento=evento, estudiante_id__in=estudiante_ids)
+        }
+        # Becas y descuentos vigentes de todos los estudiantes en dos consultas
+        descuentos = DescuentosService.calcular_descuentos_evento(evento, estudiante_ids=estudiante_ids)
+
         resultados = []
-        for est in estudiantes_qs:
-            resumen = SistemaPagosService.obtener_resumen_estudiante(est, evento)
-            estado_pagos = EstadoPagosEvento.objects.filter(estudiante=est, evento=evento).first()
+        for est in estudiantes:
+            resumen = resumenes.get(est.id)
+            estado_pagos = estados_pagos.get(est.id)
 
             item_estado = {
                 'matricula_pagada': bool(estado_pagos.matricula_pagada) if estado_pagos else False,
@@ -169,23 +182,57 @@ class EventoViewSet(viewsets.ModelViewSet):
                 },
                 'estado_pagos': item_estado,
                 'colegiatura': payload_colegiatura,
+                'descuentos': {
+                    tipo_pago: {
+                        'descuento_total': str(detalle['descuento_total']),
+                        'monto_final': str(detalle['monto_final']),
+                    }
+                    for tipo_pago, detalle in descuentos[est.id].items()
+                },
             })
 
         return Response({'evento': {'id': evento.id, 'nombre': evento.nombre}, 'estudiantes': resultados})
 
     @swagger_auto_schema(
         operation_description="Estadísticas agregadas de pagos y cuotas del evento",
+        manual_parameters=[
+            openapi.Parameter('limite', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False, description='Máximo de estudiantes atrasados a devolver (por defecto 100)'),
+            openapi.Parameter('offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False, description='Estudiantes atrasados a omitir (paginación)')
+        ],
         responses={200: 'OK'},
         tags=["Eventos"]
     )
     @action(detail=True, methods=['get'], url_path='estadisticas')
     def estadisticas(self, request, pk=None):
         evento = self.get_object()
-        stats = SistemaPagosService.obtener_estadisticas_evento(evento)
+        try:
+            limite = int(request.query_params.get('limite', 100))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'error': 'limite y offset deben ser enteros'}, status=400)
+        if limite < 0 or offset < 0:
+            return Response({'error': 'limite y offset deben ser enteros'}, status=400)
+
+        stats = SistemaPagosService.obtener_estadisticas_evento(
+            evento, limite_atrasados=limite, desplazamiento_atrasados=offset
+        )
 
         if not stats:
             return Response({'error': 'No hay estadísticas disponibles para este evento'}, status=404)
 
+        # Becas y descuentos vigentes del evento sobre sus costos
+        descuentos = DescuentosService.calcular_descuentos_evento(evento)
+        totales_descuentos = {}
+        for tipo_pago in TIPOS_PAGO:
+            aplicados = [
+                por_tipo[tipo_pago]['descuento_total'] for por_tipo in descuentos.values()
+                if por_tipo[tipo_pago]['descuento_total'] > 0
+            ]
+            totales_descuentos[tipo_pago] = {
+                'estudiantes': len(aplicados),
+                'total': str(sum(aplicados, Decimal('0.00'))),
+            }
+
         # Normalizar montos (Decimal) a string para JSON
         montos = stats.get('montos', {})
         montos_serializados = {k: (str(v) if v is not None else None) for k, v in montos.items()}
@@ -199,7 +246,17 @@ class EventoViewSet(viewsets.ModelViewSet):
             'estudiantes': stats.get('estudiantes', {}),
             'cuotas': stats.get('cuotas', {}),
             'montos': montos_serializados,
-            'estudiantes_atrasados': stats.get('estudiantes_atrasados', []),
+            'descuentos': totales_descuentos,
+            'estudiantes_atrasados': [
+                {
+                    **item,
+                    'monto_atrasado': str(item['monto_atrasado']),
+                }
+                for item in stats.get('estudiantes_atrasados', [])
+            ],
+            'estudiantes_atrasados_total': SistemaPagosService.consulta_estudiantes_atrasados(evento).count(),
+            'limite': limite,
+            'offset': offset,
         }
 
         return Response(payload)
@@ -690,10 +747,25 @@ class ExportarCertificadosZipAPIView(APIView):
 
         omitir_no_elegibles = bool(data.get('omitir_no_elegibles', True))
 
+        # Datos de elegibilidad precargados en lote para todos los estudiantes
+        estudiantes = list(estudiantes)
+        estudiante_ids = [est.id for est in estudiantes]
+        estados_pagos = {
+            ep.estudiante_id: ep
+            for ep in EstadoPagosEvento.objects.filter(evento=evento, estudiante_id__in=estudiante_ids)
+        }
+        if tipo == 'final':
+            resumenes = SistemaPagosService.obtener_resumenes_evento(evento, estudiante_ids=estudiante_ids)
+        else:
+            con_matricula = set(
+                Matricula.objects.filter(evento=evento, estudiante_id__in=estudiante_ids)
+                .values_list('estudiante_id', flat=True)
+            )
+
         # Helpers de elegibilidad
         def elegible_final(est, ev):
-            resumen = SistemaPagosService.obtener_resumen_estudiante(est, ev)
-            estado_pagos = EstadoPagosEvento.objects.filter(estudiante=est, evento=ev).first()
+            resumen = resumenes.get(est.id)
+            estado_pagos = estados_pagos.get(est.id)
             if not (resumen and resumen.get('estado_general') == 'completado'):
                 return False, 'colegiatura_incompleta'
             if float(ev.costo_certificado or 0) > 0 and not (estado_pagos and estado_pagos.certificado_pagado):
@@ -703,11 +775,10 @@ class ExportarCertificadosZipAPIView(APIView):
             return True, None
 
         def elegible_matricula(est, ev):
-            m = Matricula.objects.filter(estudiante=est, evento=ev).first()
-            if not m:
+            if est.id not in con_matricula:
                 return False, 'sin_matricula'
             if ev.requiere_matricula:
-                ep = EstadoPagosEvento.objects.filter(estudiante=est, evento=ev).first()
+                ep = estados_pagos.get(est.id)
                 if not (ep and ep.matricula_pagada):
                     return False, 'matricula_no_pagada'
             return True, None
@@ -725,7 +796,7 @@ class ExportarCertificadosZipAPIView(APIView):
             'generado_en': dt.datetime.utcnow().isoformat() + 'Z',
             'incluidos': [],
             'omitidos': [],
-            'total_solicitados': estudiantes.count(),
+            'total_solicitados': len(estudiantes),
         }
 
         with zipfile.ZipFile(tmp_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
@@ -8,6 +8,12 @@ from .models import (
     Pago, 
     PagoCuota,
     PagoCuotaAplicada,
+    PagoConvenio,
+    MovimientoPlanPago,
+    CorteSaldoPlanPago,
+    CierreCajaDiario,
+    ConciliacionBancaria,
+    LineaExtractoBancario,
     InstitucionFinanciera,
     EstadoPagosEvento, 
     Matricula,
@@ -75,7 +81,7 @@ class BecaAdmin(admin.ModelAdmin):
 class DescuentoAdmin(admin.ModelAdmin):
     list_display = [
         'nombre_descuento', 'estudiante', 'evento', 'tipo_descuento',
-        'estado', 'fecha_inicio', 'fecha_fin', 'esta_activo', 'codigo_promocional'
+        'estado', 'fecha_inicio', 'fecha_fin', 'esta_activo', 'codigo_promocional', 'usos', 'max_usos'
     ]
     list_filter = [
         'tipo_descuento', 'estado', 'aplica_matricula',
@@ -86,7 +92,7 @@ class DescuentoAdmin(admin.ModelAdmin):
         'nombre_descuento', 'estudiante__nombres', 'estudiante__apellidos',
         'estudiante__cedula', 'evento__nombre', 'motivo', 'codigo_promocional'
     ]
-    readonly_fields = ['fecha_creacion', 'fecha_modificacion']
+    readonly_fields = ['usos', 'fecha_creacion', 'fecha_modificacion']
     fieldsets = (
         ('Información Básica', {
             'fields': ('estudiante', 'evento', 'nombre_descuento', 'tipo_descuento')
@@ -101,7 +107,7 @@ class DescuentoAdmin(admin.ModelAdmin):
             'fields': ('fecha_inicio', 'fecha_fin', 'estado')
         }),
         ('Información Adicional', {
-            'fields': ('motivo', 'codigo_promocional')
+            'fields': ('motivo', 'codigo_promocional', 'max_usos', 'usos')
         }),
         ('Auditoría', {
             'fields': ('fecha_creacion', 'fecha_modificacion'),
@@ -118,9 +124,11 @@ class DescuentoAdmin(admin.ModelAdmin):
 
 @admin.register(PlanPago)
 class PlanPagoAdmin(admin.ModelAdmin):
-    list_display = ['estudiante', 'evento', 'monto_colegiatura', 'numero_cuotas', 'activo', 'fecha_creacion']
-    list_filter = ['activo', 'evento']
+    list_display = ['estudiante', 'evento', 'monto_colegiatura', 'numero_cuotas', 'monto_pendiente_total', 'estado_general', 'activo', 'fecha_creacion']
+    list_filter = ['activo', 'evento', 'estado_general']
     search_fields = ['estudiante__nombres', 'estudiante__apellidos', 'estudiante__cedula', 'evento__nombre']
+    # Saldos mantenidos desde las cuotas: no editables manualmente
+    readonly_fields = PlanPago.CAMPOS_SALDO
 
     # Ocultar del índice del admin (se usa solo para autocompletar)
     def get_model_perms(self, request):
@@ -604,6 +612,110 @@ class CuotaAdmin(admin.ModelAdmin):
         return obj.plan_pago
     plan_pago.short_description = 'Plan de Pago'
 
+@admin.register(PagoConvenio)
+class PagoConvenioAdmin(admin.ModelAdmin):
+    list_display = ['entidad', 'evento', 'monto_total', 'monto_aplicado', 'regla', 'numero_transaccion', 'fecha_registro']
+    list_filter = ['regla', 'evento', 'institucion_financiera']
+    search_fields = ['entidad', 'numero_transaccion', 'codigo_comprobante', 'evento__nombre']
+    # El reparto se registra desde la API: el admin solo consulta
+    readonly_fields = [
+        'entidad', 'evento', 'monto_total', 'monto_aplicado', 'regla', 'metodo_pago',
+        'institucion_financiera', 'numero_transaccion', 'codigo_comprobante', 'fecha_registro'
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(MovimientoPlanPago)
+class MovimientoPlanPagoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'plan_pago', 'tipo', 'concepto', 'monto', 'pago', 'fecha']
+    list_filter = ['tipo', 'concepto', 'plan_pago__evento']
+    search_fields = ['plan_pago__estudiante__nombres', 'plan_pago__estudiante__apellidos']
+    raw_id_fields = ['plan_pago', 'pago']
+
+    # Diario de solo inserción: se alimenta desde los pagos
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CorteSaldoPlanPago)
+class CorteSaldoPlanPagoAdmin(admin.ModelAdmin):
+    list_display = ['plan_pago', 'ultimo_movimiento_id', 'fecha_corte', 'total_cargos', 'total_abonos', 'movimientos_compactados']
+    list_filter = ['plan_pago__evento']
+    raw_id_fields = ['plan_pago']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CierreCajaDiario)
+class CierreCajaDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'origen', 'tipo_pago', 'metodo_pago', 'institucion_financiera', 'evento', 'numero_pagos', 'monto_total']
+    list_filter = ['origen', 'tipo_pago', 'metodo_pago', 'institucion_financiera']
+    date_hierarchy = 'fecha'
+    raw_id_fields = ['evento']
+
+    # Los cierres se mantienen con las señales de pagos y el comando reconstruir_cierres_caja
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class LineaExtractoBancarioInline(admin.TabularInline):
+    model = LineaExtractoBancario
+    fields = ['numero_linea', 'fecha', 'referencia', 'monto', 'estado', 'pago', 'pago_cuota', 'cuota']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def get_queryset(self, request):
+        # Solo las líneas que requieren revisión manual
+        return super().get_queryset(request).exclude(estado='conciliada')
+
+
+@admin.register(ConciliacionBancaria)
+class ConciliacionBancariaAdmin(admin.ModelAdmin):
+    list_display = [
+        'institucion_financiera', 'fecha_desde', 'fecha_hasta', 'total_lineas',
+        'conciliadas', 'sin_coincidencia', 'ambiguas', 'diferencia_monto', 'fecha_creacion'
+    ]
+    list_filter = ['institucion_financiera']
+    readonly_fields = [
+        'institucion_financiera', 'archivo_nombre', 'fecha_desde', 'fecha_hasta', 'total_lineas',
+        'conciliadas', 'sin_coincidencia', 'ambiguas', 'diferencia_monto', 'duplicadas', 'fecha_creacion'
+    ]
+    inlines = [LineaExtractoBancarioInline]
+
+    # Las conciliaciones se importan desde la API o el comando conciliar_extracto_bancario
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(LineaExtractoBancario)
+class LineaExtractoBancarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'referencia', 'monto', 'estado', 'institucion_financiera', 'conciliacion']
+    list_filter = ['estado', 'institucion_financiera']
+    search_fields = ['referencia', 'descripcion']
+    raw_id_fields = ['conciliacion', 'pago', 'pago_cuota', 'cuota']
+    readonly_fields = ['conciliacion', 'institucion_financiera', 'numero_linea', 'fecha', 'referencia', 'monto', 'descripcion', 'huella']
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(PagoCuotaAplicada)
 class PagoCuotaAplicadaAdmin(admin.ModelAdmin):
     list_display = ['pago', 'cuota', 'estudiante', 'evento', 'monto_aplicado', 'fecha_aplicacion']
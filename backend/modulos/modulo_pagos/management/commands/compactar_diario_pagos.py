@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_certificados.models import Evento
+from modulos.modulo_pagos.services.diario_pagos_service import DiarioPagosService
+
+
+class Command(BaseCommand):
+    help = 'Crea cortes de saldo de los planes de pago a partir de los movimientos recientes del diario'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evento_id',
+            type=int,
+            help='ID del evento específico (opcional)',
+            required=False
+        )
+        parser.add_argument(
+            '--tamano_lote',
+            type=int,
+            default=500,
+            help='Número de planes procesados por lote (por defecto 500)'
+        )
+        parser.add_argument(
+            '--minimo_movimientos',
+            type=int,
+            default=1,
+            help='Movimientos pendientes mínimos para crear un corte (por defecto 1)'
+        )
+
+    def handle(self, *args, **options):
+        evento = None
+        if options.get('evento_id'):
+            try:
+                evento = Evento.objects.get(id=options['evento_id'])
+            except Evento.DoesNotExist:
+                raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
+        if options['tamano_lote'] < 1 or options['minimo_movimientos'] < 1:
+            raise CommandError('El tamaño de lote y el mínimo de movimientos deben ser mayores a cero')
+
+        self.stdout.write(
+            self.style.SUCCESS('🔄 Compactando diario de pagos...')
+        )
+
+        resultado = DiarioPagosService.compactar(
+            evento=evento,
+            tamano_lote=options['tamano_lote'],
+            minimo_movimientos=options['minimo_movimientos'],
+        )
+
+        self.stdout.write(f"""
+📊 RESUMEN DE COMPACTACIÓN:
+===========================
+📋 Planes revisados: {resultado['revisados']}
+🧾 Cortes creados: {resultado['planes']}
+📚 Movimientos compactados: {resultado['movimientos']}
+        """)
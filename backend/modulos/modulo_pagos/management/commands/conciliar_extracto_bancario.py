@@ -0,0 +1,121 @@
+import csv
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_pagos.models import InstitucionFinanciera
+from modulos.modulo_pagos.services.conciliacion_bancaria_service import (
+    ConciliacionBancariaService,
+    ESTADOS_REPORTE,
+)
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = 'Concilia un extracto bancario CSV contra los comprobantes y transacciones registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archivo',
+            type=str,
+            required=True,
+            help='Ruta del extracto CSV (columnas fecha, referencia, monto y opcional descripcion)'
+        )
+        parser.add_argument(
+            '--institucion',
+            type=str,
+            required=True,
+            help='Código de la institución financiera que emite el extracto'
+        )
+        parser.add_argument(
+            '--desde',
+            type=_fecha,
+            help='Fecha inicial de la ventana (YYYY-MM-DD, opcional)'
+        )
+        parser.add_argument(
+            '--hasta',
+            type=_fecha,
+            help='Fecha final de la ventana (YYYY-MM-DD, opcional)'
+        )
+        parser.add_argument(
+            '--tolerancia_dias',
+            type=int,
+            default=3,
+            help='Días de holgura entre la fecha del banco y la del registro (por defecto 3)'
+        )
+        parser.add_argument(
+            '--reporte',
+            type=str,
+            help='Ruta de un CSV donde escribir el estado de cada línea (opcional)'
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Solo muestra el resultado, sin guardar la conciliación'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            institucion = InstitucionFinanciera.objects.get(codigo=options['institucion'])
+        except InstitucionFinanciera.DoesNotExist:
+            raise CommandError(f'No existe una institución financiera con código {options["institucion"]}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🏦 Conciliando extracto de {institucion.nombre}...')
+        )
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                reporte = ConciliacionBancariaService.conciliar_extracto(
+                    institucion,
+                    archivo,
+                    nombre_archivo=options['archivo'],
+                    fecha_desde=options.get('desde'),
+                    fecha_hasta=options.get('hasta'),
+                    tolerancia_dias=options['tolerancia_dias'],
+                    simular=options['dry_run'],
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        resumen = reporte['resumen']
+        self.stdout.write(f"""
+📊 RESUMEN DE CONCILIACIÓN:
+===========================
+📅 Ventana: {reporte['fecha_desde']} a {reporte['fecha_hasta']}
+📋 Líneas leídas: {resumen['total_lineas']}
+✅ Conciliadas: {resumen['conciliada']}
+❓ Sin coincidencia: {resumen['sin_coincidencia']}
+⚠️  Ambiguas: {resumen['ambigua']}
+💲 Diferencia de monto: {resumen['diferencia_monto']}
+🔁 Ya importadas: {resumen['duplicadas']}
+⏭️  Omitidas (débitos o fuera de ventana): {resumen['omitidas']}
+❌ Con errores: {resumen['errores']}
+        """)
+
+        for error in reporte['errores'][:20]:
+            self.stdout.write(self.style.ERROR(f"• Línea {error['numero_linea']}: {error['motivo']}"))
+
+        if options.get('reporte'):
+            with open(options['reporte'], 'w', newline='', encoding='utf-8') as salida:
+                writer = csv.writer(salida)
+                writer.writerow(['numero_linea', 'fecha', 'referencia', 'monto', 'estado', 'tipo', 'registro_id'])
+                filas = [
+                    (detalle, estado) for estado in ESTADOS_REPORTE for detalle in reporte[estado]
+                ]
+                for detalle, estado in sorted(filas, key=lambda fila: fila[0]['numero_linea']):
+                    writer.writerow([
+                        detalle['numero_linea'], detalle['fecha'], detalle['referencia'], detalle['monto'],
+                        estado, detalle.get('tipo', ''), detalle.get('registro_id', ''),
+                    ])
+            self.stdout.write(f"📝 Reporte escrito en {options['reporte']}")
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING('Ejecución en modo --dry_run: no se guardó la conciliación')
+            )
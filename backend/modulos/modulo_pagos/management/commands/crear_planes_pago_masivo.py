@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_estudiantes.models import Estudiante
+from modulos.modulo_certificados.models import Evento
+from modulos.modulo_pagos.services.sistema_pagos_service import SistemaPagosService
+
+
+class Command(BaseCommand):
+    help = 'Crea planes de pago para todos los estudiantes de un evento en una sola transacción'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evento_id',
+            type=int,
+            help='ID del evento',
+            required=True
+        )
+        parser.add_argument(
+            '--estudiante_ids',
+            type=int,
+            nargs='+',
+            help='IDs de estudiantes (opcional, por defecto todos los matriculados en el evento)',
+            required=False
+        )
+        parser.add_argument(
+            '--numero_cuotas',
+            type=int,
+            help='Número de cuotas para todos los planes (opcional)',
+            required=False
+        )
+        parser.add_argument(
+            '--monto_colegiatura',
+            type=str,
+            help='Monto total de colegiatura (opcional, por defecto el costo del evento)',
+            required=False
+        )
+        parser.add_argument(
+            '--aplicar_descuentos',
+            action='store_true',
+            help='Descontar de cada plan las becas y descuentos vigentes del estudiante en el evento'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            evento = Evento.objects.get(id=options['evento_id'])
+        except Evento.DoesNotExist:
+            raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
+        if options.get('estudiante_ids'):
+            estudiantes = options['estudiante_ids']
+        else:
+            estudiantes = Estudiante.objects.filter(
+                eventos_matriculados=evento
+            ).values_list('id', flat=True)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'📚 Creando planes de pago masivos para {evento}')
+        )
+
+        try:
+            resultado = SistemaPagosService.crear_planes_pago_masivo(
+                evento=evento,
+                estudiantes=estudiantes,
+                numero_cuotas=options.get('numero_cuotas'),
+                monto_colegiatura=options.get('monto_colegiatura'),
+                aplicar_descuentos=options.get('aplicar_descuentos', False),
+            )
+        except Exception as e:
+            raise CommandError(f'Error al crear planes de pago: {str(e)}')
+
+        self.stdout.write(f"""
+📊 RESUMEN DE CREACIÓN MASIVA:
+==============================
+✅ Planes creados: {len(resultado['creados'])}
+⏭️  Omitidos (ya tenían plan): {len(resultado['omitidos'])}
+📅 Cuotas generadas: {resultado['total_cuotas']}
+🎓 Planes con becas/descuentos: {sum(1 for item in resultado['creados'] if item['descuento_aplicado'] > 0)}
+        """)
+
+        if options.get('verbosity', 1) > 1:
+            for item in resultado['creados']:
+                self.stdout.write(
+                    f"• Estudiante {item['estudiante_id']} → Plan {item['plan_pago_id']} (${item['monto_colegiatura']})"
+                )
+            for item in resultado['omitidos']:
+                self.stdout.write(
+                    f"• Estudiante {item['estudiante_id']} omitido: {item['motivo']}"
+                )
@@ -18,6 +18,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Mostrar lista detallada de estudiantes atrasados',
         )
+        parser.add_argument(
+            '--limite_atrasados',
+            type=int,
+            help='Máximo de estudiantes atrasados a listar (opcional, los más atrasados primero)',
+            required=False
+        )
 
     def handle(self, *args, **options):
         try:
@@ -29,7 +35,9 @@ class Command(BaseCommand):
             )
             
             # Obtener las estadísticas usando el servicio
-            estadisticas = SistemaPagosService.obtener_estadisticas_evento(evento)
+            estadisticas = SistemaPagosService.obtener_estadisticas_evento(
+                evento, limite_atrasados=options.get('limite_atrasados')
+            )
             
             if not estadisticas:
                 self.stdout.write(
@@ -78,6 +86,7 @@ class Command(BaseCommand):
 👤 {estudiante['estudiante_nombre']}
 📚 {estudiante['evento_nombre']}
 ⚠️  Cuotas Atrasadas: {estudiante['cuotas_atrasadas']}
+💰 Monto Atrasado: ${estudiante['monto_atrasado']}
 ⏰ Días de Atraso: {estudiante['dias_atraso']}
                     """)
                 
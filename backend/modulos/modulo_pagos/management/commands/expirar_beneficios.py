@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from modulos.modulo_pagos.services.descuentos_service import DescuentosService
+
+
+class Command(BaseCommand):
+    help = 'Marca como expiradas las becas y descuentos cuya fecha de fin ya pasó'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Solo contar los beneficios a expirar, sin modificarlos',
+        )
+
+    def handle(self, *args, **options):
+        simular = options.get('dry_run', False)
+        self.stdout.write(
+            self.style.SUCCESS('🔍 Buscando becas y descuentos vencidos...')
+        )
+
+        resultado = DescuentosService.expirar_beneficios(simular=simular)
+
+        if not resultado['becas'] and not resultado['descuentos']:
+            self.stdout.write(self.style.SUCCESS('✅ No hay beneficios vencidos'))
+            return
+
+        becas, descuentos = ('por expirar', 'por expirar') if simular else ('expiradas', 'expirados')
+        self.stdout.write(
+            self.style.WARNING(
+                f"⚠️  Becas {becas}: {resultado['becas']} | Descuentos {descuentos}: {resultado['descuentos']}"
+            )
+        )
+        if simular:
+            self.stdout.write('💡 Ejecute sin --dry_run para aplicar los cambios')
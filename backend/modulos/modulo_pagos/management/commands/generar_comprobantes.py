@@ -0,0 +1,103 @@
+import time
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_certificados.models import Evento
+from modulos.modulo_pagos.services.comprobantes_service import ComprobantesService
+
+
+class Command(BaseCommand):
+    help = 'Genera en lote los comprobantes de pago de un rango de fechas y/o un evento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Fecha inicial en formato YYYY-MM-DD (opcional)',
+            required=False
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            help='Fecha final en formato YYYY-MM-DD (opcional)',
+            required=False
+        )
+        parser.add_argument(
+            '--evento_id',
+            type=int,
+            help='ID del evento específico (opcional)',
+            required=False
+        )
+        parser.add_argument(
+            '--origen',
+            type=str,
+            choices=['todos', 'pago', 'pago_cuota'],
+            default='todos',
+            help='Pagos a incluir (por defecto todos)'
+        )
+        parser.add_argument(
+            '--formato',
+            type=str,
+            choices=['pdf', 'zip'],
+            default='pdf',
+            help='Un PDF de varias páginas o un ZIP con un PDF por pago (por defecto pdf)'
+        )
+        parser.add_argument(
+            '--trabajadores',
+            type=int,
+            help='Procesos usados para renderizar (por defecto según los núcleos disponibles)',
+            required=False
+        )
+        parser.add_argument(
+            '--salida',
+            type=str,
+            help='Ruta del archivo generado (por defecto el nombre sugerido en el directorio actual)',
+            required=False
+        )
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options.get('desde') else None
+            hasta = date.fromisoformat(options['hasta']) if options.get('hasta') else None
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato YYYY-MM-DD')
+
+        evento = None
+        if options.get('evento_id'):
+            try:
+                evento = Evento.objects.get(id=options['evento_id'])
+            except Evento.DoesNotExist:
+                raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
+        if options.get('trabajadores') is not None and options['trabajadores'] < 1:
+            raise CommandError('El número de trabajadores debe ser mayor a cero')
+
+        self.stdout.write(
+            self.style.SUCCESS('🧾 Generando comprobantes de pago...')
+        )
+
+        inicio = time.monotonic()
+        try:
+            lote = ComprobantesService.generar_lote(
+                desde=desde,
+                hasta=hasta,
+                evento=evento,
+                origen=options['origen'],
+                formato=options['formato'],
+                trabajadores=options.get('trabajadores'),
+            )
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        ruta = options.get('salida') or lote['nombre_archivo']
+        with open(ruta, 'wb') as archivo:
+            archivo.write(lote['contenido'])
+
+        self.stdout.write(f"""
+📊 RESUMEN DE COMPROBANTES:
+===========================
+🧾 Comprobantes: {lote['total']}
+📁 Archivo: {ruta}
+⏱️  Tiempo: {time.monotonic() - inicio:.1f} s
+        """)
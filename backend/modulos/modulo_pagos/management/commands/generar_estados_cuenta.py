@@ -0,0 +1,82 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from modulos.modulo_certificados.models import Evento
+from modulos.modulo_pagos.services.estado_cuenta_service import EstadoCuentaService
+
+
+class Command(BaseCommand):
+    help = 'Genera en un ZIP los estados de cuenta de todos los estudiantes de un evento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evento_id',
+            type=int,
+            help='ID del evento',
+            required=True
+        )
+        parser.add_argument(
+            '--formato',
+            type=str,
+            choices=['pdf', 'csv', 'ambos'],
+            default='ambos',
+            help='Formato de los estados de cuenta (por defecto ambos)'
+        )
+        parser.add_argument(
+            '--trabajadores',
+            type=int,
+            help='Procesos usados para renderizar (por defecto según los núcleos disponibles)',
+            required=False
+        )
+        parser.add_argument(
+            '--tamano_bloque',
+            type=int,
+            default=200,
+            help='Estudiantes leídos y renderizados por bloque (por defecto 200)'
+        )
+        parser.add_argument(
+            '--salida',
+            type=str,
+            help='Ruta del ZIP generado (por defecto en el directorio actual)',
+            required=False
+        )
+
+    def handle(self, *args, **options):
+        try:
+            evento = Evento.objects.get(id=options['evento_id'])
+        except Evento.DoesNotExist:
+            raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
+        if options['tamano_bloque'] < 1:
+            raise CommandError('El tamaño de bloque debe ser mayor a cero')
+        if options.get('trabajadores') is not None and options['trabajadores'] < 1:
+            raise CommandError('El número de trabajadores debe ser mayor a cero')
+
+        formato = options['formato']
+        ruta = options.get('salida') or f'estados_cuenta_{evento.codigo_evento}_{timezone.localdate()}.zip'
+
+        self.stdout.write(
+            self.style.SUCCESS(f'📄 Generando estados de cuenta del evento: {evento.nombre}')
+        )
+
+        inicio = time.monotonic()
+        try:
+            archivos = EstadoCuentaService.escribir_zip(
+                ruta,
+                evento,
+                formatos=('pdf', 'csv') if formato == 'ambos' else (formato,),
+                trabajadores=options.get('trabajadores'),
+                tamano_bloque=options['tamano_bloque'],
+            )
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        self.stdout.write(f"""
+📊 RESUMEN DE ESTADOS DE CUENTA:
+================================
+📁 Archivos en el ZIP: {archivos}
+💾 Ruta: {ruta}
+⏱️  Tiempo: {time.monotonic() - inicio:.1f} s
+        """)
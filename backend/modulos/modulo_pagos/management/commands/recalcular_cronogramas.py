@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_certificados.models import Evento
+from modulos.modulo_pagos.services.cronogramas_service import CronogramasService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las cuotas pendientes de todos los planes de un evento tras cambiar su costo o fecha de inicio'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evento_id',
+            type=int,
+            help='ID del evento',
+            required=True
+        )
+        parser.add_argument(
+            '--conservar_montos',
+            action='store_true',
+            help='No actualizar el monto de colegiatura de los planes al costo actual del evento'
+        )
+        parser.add_argument(
+            '--tamano_lote',
+            type=int,
+            default=200,
+            help='Número de planes por transacción (por defecto 200)'
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Mostrar las diferencias sin guardar cambios'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            evento = Evento.objects.get(id=options['evento_id'])
+        except Evento.DoesNotExist:
+            raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
+        if options['tamano_lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor a cero')
+
+        simular = options['dry_run']
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'🔄 {"Simulando recálculo" if simular else "Recalculando"} de cronogramas del evento {evento.nombre}...'
+            )
+        )
+
+        reporte = CronogramasService.recalcular_evento(
+            evento,
+            actualizar_monto=not options['conservar_montos'],
+            simular=simular,
+            tamano_lote=options['tamano_lote'],
+        )
+
+        if simular:
+            for plan in reporte['planes']:
+                self.stdout.write(
+                    f"📋 Plan {plan['plan_pago_id']}: colegiatura ${plan['monto_colegiatura_anterior']} → "
+                    f"${plan['monto_colegiatura']}"
+                )
+                for cambio in plan['cuotas']:
+                    anterior = ''
+                    if cambio['accion'] == 'actualizar':
+                        anterior = f" (antes ${cambio['monto_anterior']} al {cambio['fecha_anterior']})"
+                    self.stdout.write(
+                        f"   • {cambio['accion']} cuota {cambio['numero_cuota']}: "
+                        f"${cambio['monto']} al {cambio['fecha_vencimiento']}{anterior}"
+                    )
+
+        for omitido in reporte['omitidos']:
+            self.stdout.write(
+                self.style.WARNING(f"⚠️ Plan {omitido['plan_pago_id']} omitido: {omitido['motivo']}")
+            )
+
+        self.stdout.write(f"""
+📊 RESUMEN DE RECÁLCULO{' (SIMULACIÓN)' if simular else ''}:
+==========================================
+📋 Planes revisados: {reporte['planes_revisados']}
+✏️ Planes modificados: {reporte['planes_modificados']}
+🔁 Cuotas actualizadas: {reporte['cuotas_actualizadas']}
+➕ Cuotas creadas: {reporte['cuotas_creadas']}
+🗑️ Cuotas eliminadas: {reporte['cuotas_eliminadas']}
+⚠️ Planes omitidos: {len(reporte['omitidos'])}
+        """)
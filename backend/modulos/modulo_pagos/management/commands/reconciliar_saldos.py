@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_certificados.models import Evento
+from modulos.modulo_pagos.services.sistema_pagos_service import SistemaPagosService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las cuotas los saldos agregados de los planes de pago y corrige desvíos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evento_id',
+            type=int,
+            help='ID del evento específico (opcional)',
+            required=False
+        )
+        parser.add_argument(
+            '--tamano_lote',
+            type=int,
+            default=500,
+            help='Número de planes revisados por consulta (por defecto 500)'
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Solo reporta los planes con diferencias, sin corregirlos'
+        )
+
+    def handle(self, *args, **options):
+        evento = None
+        if options.get('evento_id'):
+            try:
+                evento = Evento.objects.get(id=options['evento_id'])
+            except Evento.DoesNotExist:
+                raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
+        if options['tamano_lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor a cero')
+
+        self.stdout.write(
+            self.style.SUCCESS('🔄 Reconciliando saldos de planes de pago...')
+        )
+
+        resultado = SistemaPagosService.recalcular_saldos(
+            evento=evento,
+            tamano_lote=options['tamano_lote'],
+            corregir=not options['dry_run'],
+        )
+
+        self.stdout.write(f"""
+📊 RESUMEN DE RECONCILIACIÓN:
+=============================
+📋 Planes revisados: {resultado['revisados']}
+⚠️  Planes con diferencias: {len(resultado['con_diferencias'])}
+✅ Planes corregidos: {resultado['corregidos']}
+        """)
+
+        if resultado['con_diferencias'] and options.get('verbosity', 1) > 1:
+            for plan_id in resultado['con_diferencias']:
+                self.stdout.write(f"• Plan {plan_id}")
+
+        if options['dry_run'] and resultado['con_diferencias']:
+            self.stdout.write(
+                self.style.WARNING('Ejecución en modo --dry_run: no se aplicaron cambios')
+            )
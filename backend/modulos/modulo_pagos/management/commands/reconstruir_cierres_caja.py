@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from modulos.modulo_pagos.services.cierre_caja_service import CierreCajaService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de cierres de caja diarios a partir de los pagos registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Fecha inicial en formato YYYY-MM-DD (por defecto hoy)',
+            required=False
+        )
+        parser.add_argument(
+            '--hasta',
+            type=str,
+            help='Fecha final en formato YYYY-MM-DD (por defecto la fecha inicial)',
+            required=False
+        )
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options.get('desde') else timezone.localdate()
+            hasta = date.fromisoformat(options['hasta']) if options.get('hasta') else desde
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato YYYY-MM-DD')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🔄 Reconstruyendo cierres de caja del {desde} al {hasta}...')
+        )
+
+        try:
+            resultado = CierreCajaService.reconstruir(desde, hasta)
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        self.stdout.write(f"""
+📊 RESUMEN DE RECONSTRUCCIÓN:
+=============================
+📅 Días: {resultado['dias']}
+🧾 Filas de cierre: {resultado['filas']}
+💳 Pagos: {resultado['numero_pagos']}
+💰 Monto total: ${resultado['monto_total']}
+        """)
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
+from decimal import Decimal
 from django.db import transaction
 from modulos.modulo_pagos.models import Cuota, InstitucionFinanciera
 from modulos.modulo_pagos.services.sistema_pagos_service import SistemaPagosService
@@ -16,7 +17,7 @@ class Command(BaseCommand):
         )
         parser.add_argument(
             '--monto_pagado',
-            type=float,
+            type=Decimal,
             help='Monto pagado',
             required=True
         )
@@ -0,0 +1,86 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_pagos.services.pagos_lote_service import FORMATOS, TAMANO_LOTE, PagosLoteService
+
+
+class Command(BaseCommand):
+    help = 'Registra en lote pagos de cuotas desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archivo',
+            type=str,
+            help='Ruta del archivo de pagos (CSV con encabezado o JSONL)',
+            required=True
+        )
+        parser.add_argument(
+            '--formato',
+            type=str,
+            choices=FORMATOS,
+            help='Formato del archivo (por defecto según la extensión)',
+            required=False
+        )
+        parser.add_argument(
+            '--tamano_lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Filas aplicadas por transacción (por defecto {TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--resultado',
+            type=str,
+            help='Ruta del CSV de resultados (por defecto junto al archivo de pagos)',
+            required=False
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Solo valida las filas, sin registrar pagos'
+        )
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        formato = options.get('formato') or PagosLoteService.detectar_formato(ruta)
+        if options['tamano_lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor a cero')
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING('🔍 MODO SIMULACIÓN - No se registrarán pagos')
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'💳 Registrando pagos desde: {ruta}')
+        )
+
+        inicio = time.monotonic()
+        try:
+            with open(ruta, 'rb') as archivo:
+                reporte = PagosLoteService.registrar(
+                    PagosLoteService.leer_archivo(archivo, formato),
+                    simular=options['dry_run'],
+                    tamano_lote=options['tamano_lote'],
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        ruta_resultado = options.get('resultado') or f'{ruta}.resultado.csv'
+        with open(ruta_resultado, 'w', encoding='utf-8', newline='') as archivo:
+            archivo.write(PagosLoteService.resultados_csv(reporte))
+
+        self.stdout.write(f"""
+📊 RESUMEN DE PAGOS EN LOTE:
+============================
+📄 Filas: {reporte['filas']}
+✅ {'Válidas' if options['dry_run'] else 'Registradas'}: {reporte['aceptadas']}
+❌ Rechazadas: {reporte['rechazadas']}
+💰 Monto: ${reporte['monto_aceptado']}
+📁 Resultados: {ruta_resultado}
+⏱️  Tiempo: {time.monotonic() - inicio:.1f} s
+        """)
+
+        for motivo, cantidad in sorted(reporte['motivos_rechazo'].items(), key=lambda item: -item[1]):
+            self.stdout.write(self.style.WARNING(f'   ⚠️  {cantidad} × {motivo}'))
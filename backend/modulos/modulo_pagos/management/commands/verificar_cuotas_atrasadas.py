@@ -1,4 +1,5 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from modulos.modulo_certificados.models import Evento
 from modulos.modulo_pagos.services.sistema_pagos_service import SistemaPagosService
 
 
@@ -17,33 +18,39 @@ class Command(BaseCommand):
             action='store_true',
             help='Mostrar lista de estudiantes atrasados',
         )
+        parser.add_argument(
+            '--tamano_lote',
+            type=int,
+            default=1000,
+            help='Cuotas procesadas por transacción (por defecto 1000)',
+        )
 
     def handle(self, *args, **options):
+        evento = None
+        if options.get('evento_id'):
+            try:
+                evento = Evento.objects.get(id=options['evento_id'])
+            except Evento.DoesNotExist:
+                raise CommandError(f'No existe un evento con ID {options["evento_id"]}')
+
         try:
             self.stdout.write(
                 self.style.SUCCESS('🔍 Verificando cuotas atrasadas...')
             )
             
-            # Verificar cuotas atrasadas
-            cuotas_atrasadas = SistemaPagosService.verificar_cuotas_atrasadas()
+            # Verificar cuotas atrasadas (UPDATE por lotes)
+            resultado = SistemaPagosService.verificar_cuotas_atrasadas(
+                evento=evento,
+                tamano_lote=options['tamano_lote'],
+            )
             
-            if cuotas_atrasadas:
+            if resultado['cuotas_marcadas']:
                 self.stdout.write(
-                    self.style.WARNING(f'⚠️  Se encontraron {len(cuotas_atrasadas)} cuotas atrasadas')
+                    self.style.WARNING(
+                        f"⚠️  Se marcaron {resultado['cuotas_marcadas']} cuotas como atrasadas "
+                        f"({resultado['pares_actualizados']} estudiantes/evento, {resultado['lotes']} lotes)"
+                    )
                 )
-                
-                # Mostrar detalles de las cuotas atrasadas
-                for cuota in cuotas_atrasadas:
-                    self.stdout.write(f"""
-📅 CUOTA ATRASADA:
-==================
-👤 Estudiante: {cuota.estudiante}
-📚 Evento: {cuota.evento}
-🔢 Cuota: {cuota.numero_cuota}
-💰 Monto: ${cuota.monto}
-📅 Vencimiento: {cuota.fecha_vencimiento}
-⏰ Días de Atraso: {(cuota.fecha_vencimiento - cuota.fecha_vencimiento).days}
-                    """)
             else:
                 self.stdout.write(
                     self.style.SUCCESS('✅ No se encontraron cuotas atrasadas')
@@ -54,7 +61,7 @@ class Command(BaseCommand):
                 self.stdout.write('\n📊 ESTUDIANTES ATRASADOS:')
                 self.stdout.write('=' * 50)
                 
-                estudiantes_atrasados = SistemaPagosService.obtener_estudiantes_atrasados()
+                estudiantes_atrasados = SistemaPagosService.obtener_estudiantes_atrasados(evento)
                 
                 if estudiantes_atrasados:
                     for estudiante in estudiantes_atrasados:
@@ -62,6 +69,7 @@ class Command(BaseCommand):
 👤 {estudiante['estudiante_nombre']}
 📚 {estudiante['evento_nombre']}
 ⚠️  Cuotas Atrasadas: {estudiante['cuotas_atrasadas']}
+💰 Monto Atrasado: ${estudiante['monto_atrasado']}
 ⏰ Días de Atraso: {estudiante['dias_atraso']}
                         """)
                 else:
@@ -70,7 +78,7 @@ class Command(BaseCommand):
             # Mostrar resumen general
             self.stdout.write('\n📈 RESUMEN GENERAL:')
             self.stdout.write('=' * 30)
-            self.stdout.write(f'🔍 Cuotas Verificadas: {len(cuotas_atrasadas)} atrasadas')
+            self.stdout.write(f"🔍 Cuotas Verificadas: {resultado['cuotas_marcadas']} atrasadas")
             
         except Exception as e:
             self.stdout.write(
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:48
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q, Sum
+
+
+def poblar_saldos_forward(apps, schema_editor):
+    PlanPago = apps.get_model('modulo_pagos', 'PlanPago')
+    Cuota = apps.get_model('modulo_pagos', 'Cuota')
+
+    agregados = {
+        fila['plan_pago_id']: fila
+        for fila in Cuota.objects.values('plan_pago_id').annotate(
+            registradas=Count('id'),
+            pagadas=Count('id', filter=Q(estado='pagado')),
+            pendientes=Count('id', filter=Q(estado='pendiente')),
+            atrasadas=Count('id', filter=Q(estado='atrasado')),
+            monto_pagado=Sum('monto_pagado'),
+            proxima=Min('fecha_vencimiento', filter=Q(estado__in=['pendiente', 'atrasado'])),
+        )
+    }
+
+    planes = []
+    for plan in PlanPago.objects.all().iterator():
+        fila = agregados.get(plan.pk, {})
+        plan.monto_pagado_total = Decimal(fila.get('monto_pagado') or 0).quantize(Decimal('0.01'))
+        plan.monto_pendiente_total = plan.monto_colegiatura - plan.monto_pagado_total
+        plan.cuotas_registradas = fila.get('registradas', 0)
+        plan.cuotas_pagadas = fila.get('pagadas', 0)
+        plan.cuotas_pendientes = fila.get('pendientes', 0)
+        plan.cuotas_atrasadas = fila.get('atrasadas', 0)
+        plan.proxima_fecha_vencimiento = fila.get('proxima')
+        if plan.cuotas_pagadas == plan.cuotas_registradas:
+            plan.estado_general = 'completado'
+        elif plan.cuotas_atrasadas > 0:
+            plan.estado_general = 'atrasado'
+        elif plan.cuotas_pagadas > 0:
+            plan.estado_general = 'al_dia'
+        else:
+            plan.estado_general = 'pendiente'
+        planes.append(plan)
+
+    PlanPago.objects.bulk_update(planes, [
+        'monto_pagado_total', 'monto_pendiente_total', 'cuotas_registradas',
+        'cuotas_pagadas', 'cuotas_pendientes', 'cuotas_atrasadas',
+        'proxima_fecha_vencimiento', 'estado_general',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_pagos', '0013_matricula_comprobante_matricula_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planpago',
+            name='cuotas_atrasadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='cuotas_pagadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='cuotas_pendientes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='cuotas_registradas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='estado_general',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('al_dia', 'Al día'), ('atrasado', 'Atrasado'), ('completado', 'Completado')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='monto_pagado_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='monto_pendiente_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='planpago',
+            name='proxima_fecha_vencimiento',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(poblar_saldos_forward, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:57
+
+import logging
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def vaciar_comprobantes_en_blanco(apps, schema_editor):
+    # Los valores vacíos chocarían entre sí en las restricciones de unicidad
+    Pago = apps.get_model('modulo_pagos', 'Pago')
+    PagoCuota = apps.get_model('modulo_pagos', 'PagoCuota')
+    for modelo in (Pago, PagoCuota):
+        for campo in ('codigo_comprobante', 'numero_transaccion'):
+            modelo.objects.filter(**{campo: ''}).update(**{campo: None})
+
+
+def resolver_referencias_duplicadas(apps, schema_editor):
+    """
+    Deja una sola vez cada comprobante o transacción por institución antes de
+    crear las restricciones de unicidad: el pago más antiguo conserva la
+    referencia y en los demás se vacía y se anota en sus observaciones.
+    """
+    from django.db.models import Case, Count, F, Min, Value, When
+    from django.db.models.functions import Concat
+
+    Pago = apps.get_model('modulo_pagos', 'Pago')
+    PagoCuota = apps.get_model('modulo_pagos', 'PagoCuota')
+    for modelo in (Pago, PagoCuota):
+        for campo in ('codigo_comprobante', 'numero_transaccion'):
+            grupos = modelo.objects.filter(
+                institucion_financiera__isnull=False, **{f'{campo}__isnull': False}
+            ).values('institucion_financiera_id', campo).annotate(
+                total=Count('id'), conservado=Min('id')
+            ).filter(total__gt=1)
+            for grupo in grupos:
+                repetidos = modelo.objects.filter(
+                    institucion_financiera_id=grupo['institucion_financiera_id'], **{campo: grupo[campo]}
+                ).exclude(pk=grupo['conservado'])
+                ids = list(repetidos.order_by('pk').values_list('pk', flat=True))
+                nota = (
+                    f"[{campo} '{grupo[campo]}' duplicado retirado al crear la restricción "
+                    f"de unicidad; se conserva en el registro {grupo['conservado']}]"
+                )
+                repetidos.update(**{
+                    campo: None,
+                    'observaciones': Case(
+                        When(observaciones='', then=Value(nota)),
+                        default=Concat(F('observaciones'), Value(f'\n{nota}')),
+                        output_field=models.TextField(),
+                    ),
+                })
+                logger.warning(
+                    '%s %s duplicado en %s; se conserva en %s y se retira de %s',
+                    campo, grupo[campo], modelo.__name__, grupo['conservado'], ids,
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_certificados', '0003_merge_conflict_fix'),
+        ('modulo_estudiantes', '0001_initial'),
+        ('modulo_pagos', '0014_saldos_agregados_plan_pago'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespuestaIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255, unique=True)),
+                ('ruta', models.CharField(max_length=255)),
+                ('huella', models.CharField(help_text='SHA-256 del cuerpo de la solicitud original', max_length=64)),
+                ('codigo_estado', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('respuesta', models.JSONField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Respuesta Idempotente',
+                'verbose_name_plural': 'Respuestas Idempotentes',
+            },
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='codigo_comprobante',
+            field=models.CharField(blank=True, help_text='Código de comprobante de la institución financiera', max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='institucion_financiera',
+            field=models.ForeignKey(blank=True, help_text='Institución financiera donde se realizó el pago', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pagos', to='modulo_pagos.institucionfinanciera'),
+        ),
+        migrations.RunPython(vaciar_comprobantes_en_blanco, migrations.RunPython.noop),
+        migrations.RunPython(resolver_referencias_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pago',
+            constraint=models.UniqueConstraint(fields=('institucion_financiera', 'codigo_comprobante'), name='pago_comprobante_unico_por_institucion'),
+        ),
+        migrations.AddConstraint(
+            model_name='pago',
+            constraint=models.UniqueConstraint(fields=('institucion_financiera', 'numero_transaccion'), name='pago_transaccion_unica_por_institucion'),
+        ),
+        migrations.AddConstraint(
+            model_name='pagocuota',
+            constraint=models.UniqueConstraint(fields=('institucion_financiera', 'codigo_comprobante'), name='pagocuota_comprobante_unico_por_institucion'),
+        ),
+        migrations.AddConstraint(
+            model_name='pagocuota',
+            constraint=models.UniqueConstraint(fields=('institucion_financiera', 'numero_transaccion'), name='pagocuota_transaccion_unica_por_institucion'),
+        ),
+        migrations.AddField(
+            model_name='respuestaidempotente',
+            name='pago',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='respuestas_idempotentes', to='modulo_pagos.pago'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:01
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_certificados', '0003_merge_conflict_fix'),
+        ('modulo_pagos', '0015_idempotencia_pagos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PagoConvenio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(help_text='Institución que realiza el pago', max_length=150)),
+                ('monto_total', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('monto_aplicado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('regla', models.CharField(choices=[('partes_iguales', 'Partes iguales'), ('vencimiento_mas_antiguo', 'Vencimiento más antiguo primero'), ('tabla', 'Tabla explícita por estudiante')], max_length=30)),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('transferencia', 'Transferencia'), ('tarjeta', 'Tarjeta de Crédito'), ('cheque', 'Cheque')], default='transferencia', max_length=20)),
+                ('numero_transaccion', models.CharField(blank=True, max_length=50, null=True)),
+                ('codigo_comprobante', models.CharField(blank=True, max_length=50, null=True)),
+                ('comprobante', models.FileField(blank=True, null=True, upload_to='comprobantes_convenio/')),
+                ('observaciones', models.TextField(blank=True)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('evento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pagos_convenio', to='modulo_certificados.evento')),
+                ('institucion_financiera', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pagos_convenio', to='modulo_pagos.institucionfinanciera')),
+            ],
+            options={
+                'verbose_name': 'Pago de Convenio',
+                'verbose_name_plural': 'Pagos de Convenio',
+                'ordering': ['-fecha_registro'],
+            },
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='pago_convenio',
+            field=models.ForeignKey(blank=True, help_text='Transferencia institucional de la que forma parte este pago', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='pagos', to='modulo_pagos.pagoconvenio'),
+        ),
+        migrations.AddConstraint(
+            model_name='pagoconvenio',
+            constraint=models.UniqueConstraint(fields=('institucion_financiera', 'numero_transaccion'), name='pagoconvenio_transaccion_unica_por_institucion'),
+        ),
+        migrations.AddConstraint(
+            model_name='pagoconvenio',
+            constraint=models.UniqueConstraint(fields=('institucion_financiera', 'codigo_comprobante'), name='pagoconvenio_comprobante_unico_por_institucion'),
+        ),
+    ]
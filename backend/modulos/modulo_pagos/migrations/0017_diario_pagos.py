@@ -0,0 +1,69 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def abrir_diario_forward(apps, schema_editor):
+    """Asienta la colegiatura y lo ya pagado de cada plan existente."""
+    PlanPago = apps.get_model('modulo_pagos', 'PlanPago')
+    MovimientoPlanPago = apps.get_model('modulo_pagos', 'MovimientoPlanPago')
+
+    movimientos = []
+    for plan in PlanPago.objects.only('id', 'monto_colegiatura', 'monto_pagado_total').iterator():
+        movimientos.append(MovimientoPlanPago(
+            plan_pago_id=plan.pk, tipo='cargo', concepto='colegiatura', monto=plan.monto_colegiatura
+        ))
+        if plan.monto_pagado_total:
+            movimientos.append(MovimientoPlanPago(
+                plan_pago_id=plan.pk, tipo='abono', concepto='apertura', monto=plan.monto_pagado_total
+            ))
+    MovimientoPlanPago.objects.bulk_create(movimientos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_pagos', '0016_pagos_convenio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteSaldoPlanPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_movimiento_id', models.BigIntegerField()),
+                ('fecha_corte', models.DateTimeField(help_text='Fecha del último movimiento incluido')),
+                ('total_cargos', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_abonos', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('movimientos_compactados', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('plan_pago', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes_saldo', to='modulo_pagos.planpago')),
+            ],
+            options={
+                'verbose_name': 'Corte de Saldo',
+                'verbose_name_plural': 'Cortes de Saldo',
+                'constraints': [models.UniqueConstraint(fields=('plan_pago', 'ultimo_movimiento_id'), name='corte_saldo_unico_por_movimiento')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoPlanPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cargo', 'Cargo'), ('abono', 'Abono')], max_length=10)),
+                ('concepto', models.CharField(choices=[('colegiatura', 'Colegiatura'), ('ajuste_colegiatura', 'Ajuste de colegiatura'), ('pago', 'Pago aplicado'), ('reverso_pago', 'Reverso de pago'), ('apertura', 'Saldo de apertura')], max_length=20)),
+                ('monto', models.DecimalField(decimal_places=2, help_text='Negativo para reversos y reducciones', max_digits=12)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='modulo_pagos.pago')),
+                ('plan_pago', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='modulo_pagos.planpago')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Plan de Pago',
+                'verbose_name_plural': 'Movimientos de Planes de Pago',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['plan_pago', 'id'], name='movimiento_plan_id_idx')],
+            },
+        ),
+        migrations.RunPython(abrir_diario_forward, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_pagos', '0017_diario_pagos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConciliacionBancaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo_nombre', models.CharField(blank=True, max_length=255)),
+                ('fecha_desde', models.DateField(blank=True, null=True)),
+                ('fecha_hasta', models.DateField(blank=True, null=True)),
+                ('total_lineas', models.PositiveIntegerField(default=0)),
+                ('conciliadas', models.PositiveIntegerField(default=0)),
+                ('sin_coincidencia', models.PositiveIntegerField(default=0)),
+                ('ambiguas', models.PositiveIntegerField(default=0)),
+                ('diferencia_monto', models.PositiveIntegerField(default=0)),
+                ('duplicadas', models.PositiveIntegerField(default=0, help_text='Líneas ya importadas en un extracto anterior')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('institucion_financiera', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='conciliaciones', to='modulo_pagos.institucionfinanciera')),
+            ],
+            options={
+                'verbose_name': 'Conciliación Bancaria',
+                'verbose_name_plural': 'Conciliaciones Bancarias',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaExtractoBancario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_linea', models.PositiveIntegerField()),
+                ('fecha', models.DateField()),
+                ('referencia', models.CharField(blank=True, max_length=100)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('descripcion', models.CharField(blank=True, max_length=255)),
+                ('huella', models.CharField(help_text='SHA-256 de la línea para detectar reimportaciones', max_length=64)),
+                ('estado', models.CharField(choices=[('conciliada', 'Conciliada'), ('sin_coincidencia', 'Sin coincidencia'), ('ambigua', 'Ambigua'), ('diferencia_monto', 'Diferencia de monto')], max_length=20)),
+                ('conciliacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='modulo_pagos.conciliacionbancaria')),
+                ('cuota', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lineas_extracto', to='modulo_pagos.cuota')),
+                ('institucion_financiera', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lineas_extracto', to='modulo_pagos.institucionfinanciera')),
+                ('pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lineas_extracto', to='modulo_pagos.pago')),
+                ('pago_cuota', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lineas_extracto', to='modulo_pagos.pagocuota')),
+            ],
+            options={
+                'verbose_name': 'Línea de Extracto Bancario',
+                'verbose_name_plural': 'Líneas de Extracto Bancario',
+                'ordering': ['conciliacion', 'numero_linea'],
+                'indexes': [models.Index(fields=['estado'], name='linea_extracto_estado_idx')],
+                'constraints': [models.UniqueConstraint(fields=('institucion_financiera', 'huella'), name='linea_extracto_unica_por_institucion')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_pagos', '0018_conciliacion_bancaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cuota',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='cuota_estado_venc_idx'),
+        ),
+    ]
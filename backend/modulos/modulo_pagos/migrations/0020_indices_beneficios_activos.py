@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_certificados', '0003_merge_conflict_fix'),
+        ('modulo_estudiantes', '0001_initial'),
+        ('modulo_pagos', '0019_indice_cuotas_vencimiento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='beca',
+            index=models.Index(condition=models.Q(('estado', 'activa')), fields=['evento', 'estudiante', 'fecha_fin'], name='beca_activa_evento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beca',
+            index=models.Index(condition=models.Q(('estado', 'activa')), fields=['fecha_fin'], name='beca_activa_fin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='descuento',
+            index=models.Index(condition=models.Q(('estado', 'activo')), fields=['evento', 'estudiante', 'fecha_fin'], name='descuento_activo_evento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='descuento',
+            index=models.Index(condition=models.Q(('estado', 'activo')), fields=['fecha_fin'], name='descuento_activo_fin_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_certificados', '0003_merge_conflict_fix'),
+        ('modulo_estudiantes', '0001_initial'),
+        ('modulo_pagos', '0020_indices_beneficios_activos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='descuento',
+            name='max_usos',
+            field=models.PositiveIntegerField(blank=True, help_text='Máximo de canjes del código promocional (vacío: ilimitado)', null=True),
+        ),
+        migrations.AddField(
+            model_name='descuento',
+            name='usos',
+            field=models.PositiveIntegerField(default=0, help_text='Canjes registrados del código promocional'),
+        ),
+        migrations.AddIndex(
+            model_name='descuento',
+            index=models.Index(condition=models.Q(('estado', 'activo')), fields=['codigo_promocional'], name='descuento_activo_codigo_idx'),
+        ),
+    ]
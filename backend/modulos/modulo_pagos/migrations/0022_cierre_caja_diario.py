@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-17 04:40
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modulo_certificados', '0003_merge_conflict_fix'),
+        ('modulo_pagos', '0021_usos_codigo_promocional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreCajaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=120, unique=True)),
+                ('fecha', models.DateField()),
+                ('origen', models.CharField(choices=[('pago', 'Pago'), ('pago_cuota', 'Pago de Cuota')], max_length=20)),
+                ('tipo_pago', models.CharField(max_length=25)),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('numero_pagos', models.IntegerField(default=0)),
+                ('monto_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('evento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cierres_caja', to='modulo_certificados.evento')),
+                ('institucion_financiera', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cierres_caja', to='modulo_pagos.institucionfinanciera')),
+            ],
+            options={
+                'verbose_name': 'Cierre de Caja Diario',
+                'verbose_name_plural': 'Cierres de Caja Diarios',
+                'ordering': ['-fecha', 'origen', 'metodo_pago'],
+                'indexes': [models.Index(fields=['fecha'], name='cierre_caja_fecha_idx')],
+            },
+        ),
+    ]
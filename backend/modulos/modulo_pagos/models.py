@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from modulos.modulo_estudiantes.models import Estudiante
 from modulos.modulo_certificados.models import Evento, CostoMiscelaneo
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -75,10 +76,38 @@ class PlanPago(models.Model):
         help_text="Motivo del convenio de pago"
     )
     
+    # Saldos agregados del plan, mantenidos incrementalmente a partir de las
+    # cuotas (ver signals.py). El comando `reconciliar_saldos` corrige desvíos.
+    ESTADO_GENERAL_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('al_dia', 'Al día'),
+        ('atrasado', 'Atrasado'),
+        ('completado', 'Completado'),
+    ]
+    monto_pagado_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    monto_pendiente_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    cuotas_registradas = models.PositiveIntegerField(default=0)
+    cuotas_pagadas = models.PositiveIntegerField(default=0)
+    cuotas_pendientes = models.PositiveIntegerField(default=0)
+    cuotas_atrasadas = models.PositiveIntegerField(default=0)
+    proxima_fecha_vencimiento = models.DateField(null=True, blank=True)
+    estado_general = models.CharField(max_length=20, choices=ESTADO_GENERAL_CHOICES, default='pendiente')
+
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
 
+    CAMPOS_SALDO = (
+        'monto_pagado_total',
+        'monto_pendiente_total',
+        'cuotas_registradas',
+        'cuotas_pagadas',
+        'cuotas_pendientes',
+        'cuotas_atrasadas',
+        'proxima_fecha_vencimiento',
+        'estado_general',
+    )
+
     class Meta:
         unique_together = ('estudiante', 'evento')
         verbose_name = 'Plan de Pago'
@@ -87,6 +116,22 @@ class PlanPago(models.Model):
     def __str__(self):
         return f"Plan de pago de {self.estudiante} en {self.evento} ({self.numero_cuotas} cuotas)"
 
+    @staticmethod
+    def prorratear_monto(monto_total, numero_cuotas):
+        """
+        Divide un monto en `numero_cuotas` partes redondeadas a dos decimales,
+        acumulando el residuo del redondeo en la última cuota.
+        """
+        if numero_cuotas <= 0:
+            return []
+        monto_base = (monto_total / numero_cuotas).quantize(Decimal('0.01'))
+        montos = [monto_base for _ in range(numero_cuotas)]
+        diferencia = monto_total - sum(montos)
+        # Ajustar la última cuota con el redondeo pendiente
+        if diferencia != Decimal('0.00'):
+            montos[-1] = (montos[-1] + diferencia).quantize(Decimal('0.01'))
+        return montos
+
     def generar_cuotas(self):
         """Genera todas las cuotas desde cero según configuración actual."""
         from datetime import timedelta
@@ -94,18 +139,10 @@ class PlanPago(models.Model):
         self.cuotas.filter(estado__in=['pendiente', 'atrasado']).delete()
 
         # Calcular monto por cuota (ajustar a dos decimales y residuo en última)
-        monto_total = self.monto_colegiatura
-        cuotas_a_generar = self.numero_cuotas
-        if cuotas_a_generar <= 0:
+        montos = self.prorratear_monto(self.monto_colegiatura, self.numero_cuotas)
+        if not montos:
             return []
 
-        monto_base = (monto_total / cuotas_a_generar).quantize(Decimal('0.01'))
-        montos = [monto_base for _ in range(cuotas_a_generar)]
-        diferencia = monto_total - sum(montos)
-        # Ajustar la última cuota con el redondeo pendiente
-        if diferencia != Decimal('0.00'):
-            montos[-1] = (montos[-1] + diferencia).quantize(Decimal('0.01'))
-
         fecha_inicio = self.evento.fecha_inicio
         cuotas = []
         for idx, monto in enumerate(montos, start=1):
@@ -138,11 +175,7 @@ class PlanPago(models.Model):
         if cuotas_restantes == 0 or monto_restante <= Decimal('0.00'):
             return []
 
-        monto_base = (monto_restante / cuotas_restantes).quantize(Decimal('0.01'))
-        montos = [monto_base for _ in range(cuotas_restantes)]
-        diferencia = monto_restante - sum(montos)
-        if diferencia != Decimal('0.00'):
-            montos[-1] = (montos[-1] + diferencia).quantize(Decimal('0.01'))
+        montos = self.prorratear_monto(monto_restante, cuotas_restantes)
 
         # Continuar numeración y calendario mensual desde hoy
         from django.utils import timezone
@@ -199,9 +232,37 @@ class PlanPago(models.Model):
             prev = PlanPago.objects.filter(pk=self.pk).only('numero_cuotas', 'monto_colegiatura').first()
         else:
             prev = None
+
+        if prev is None:
+            self.monto_pendiente_total = self.monto_colegiatura - (self.monto_pagado_total or Decimal('0.00'))
+        elif kwargs.get('update_fields') is None:
+            # Los saldos se actualizan con F() desde las cuotas: no sobrescribirlos
+            # con valores posiblemente obsoletos de esta instancia.
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_SALDO
+            ]
         super().save(*args, **kwargs)
+
+        if prev is None:
+            MovimientoPlanPago.objects.create(
+                plan_pago=self, tipo='cargo', concepto='colegiatura', monto=self.monto_colegiatura
+            )
+        elif prev.monto_colegiatura != self.monto_colegiatura:
+            MovimientoPlanPago.objects.create(
+                plan_pago=self,
+                tipo='cargo',
+                concepto='ajuste_colegiatura',
+                monto=self.monto_colegiatura - prev.monto_colegiatura,
+            )
+
         if prev and (prev.numero_cuotas != self.numero_cuotas or prev.monto_colegiatura != self.monto_colegiatura):
+            if prev.monto_colegiatura != self.monto_colegiatura:
+                PlanPago.objects.filter(pk=self.pk).update(
+                    monto_pendiente_total=models.Value(self.monto_colegiatura) - models.F('monto_pagado_total')
+                )
             self.regenerar_cuotas_pendientes()
+            self.refresh_from_db(fields=self.CAMPOS_SALDO)
 
 class Cuota(models.Model):
     ESTADO_CHOICES = [
@@ -245,10 +306,19 @@ class Cuota(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     fecha_modificacion = models.DateTimeField(auto_now=True, null=True, blank=True)
 
+    # Campos que afectan los saldos agregados del plan (ver signals.py)
+    CAMPOS_SALDO = ('plan_pago_id', 'estado', 'monto_pagado', 'fecha_vencimiento')
+    # Campos que escribe la aplicación de un pago en bloque
+    CAMPOS_APLICACION_PAGO = ['monto_pagado', 'estado', 'fecha_pago', 'fecha_modificacion']
+
     class Meta:
         unique_together = [
             ('plan_pago', 'numero_cuota'),
         ]
+        indexes = [
+            # Cuotas con saldo por fecha de vencimiento (atrasos y cartera vencida)
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='cuota_estado_venc_idx'),
+        ]
         verbose_name = 'Cuota'
         verbose_name_plural = 'Cuotas'
 
@@ -269,6 +339,40 @@ class Cuota(models.Model):
         ).exclude(id=self.id).exists():
             raise ValidationError("Ya existe una cuota con este número en el plan")
     
+    def valores_saldo(self):
+        """Tupla con los valores actuales de `CAMPOS_SALDO`."""
+        return tuple(getattr(self, campo) for campo in self.CAMPOS_SALDO)
+
+    def registrar_abono(self, monto, fecha_pago):
+        """
+        Suma `monto` a lo pagado y marca la cuota como pagada al completarse.
+        Escribe solo las columnas modificadas; debe llamarse con la fila del
+        plan bloqueada y la cuota recién leída (ver `Cuota.abonar`).
+        """
+        self.monto_pagado = (self.monto_pagado or Decimal('0.00')) + monto
+        campos = ['monto_pagado', 'fecha_modificacion']
+        if self.monto_pagado >= self.monto and self.estado != 'pagado':
+            self.estado = 'pagado'
+            self.fecha_pago = fecha_pago
+            campos += ['estado', 'fecha_pago']
+        self.save(update_fields=campos)
+
+    @classmethod
+    def abonar(cls, cuota_id, monto, fecha_pago):
+        """
+        Aplica un abono a la cuota bajo bloqueo de fila de su plan, de modo que
+        pagos concurrentes sobre el mismo plan no pierdan actualizaciones.
+
+        Returns:
+            Cuota: La cuota actualizada
+        """
+        with transaction.atomic():
+            plan_id = cls.objects.values_list('plan_pago_id', flat=True).get(pk=cuota_id)
+            PlanPago.objects.select_for_update().only('id').get(pk=plan_id)
+            cuota = cls.objects.get(pk=cuota_id)
+            cuota.registrar_abono(monto, fecha_pago)
+            return cuota
+
     @property
     def estudiante(self):
         """Retorna el estudiante asociado a la cuota"""
@@ -323,6 +427,41 @@ class Pago(models.Model):
     comprobante = models.ImageField(upload_to='comprobantes_pago/', blank=True, null=True)
     observaciones = models.TextField(blank=True)
     numero_transaccion = models.CharField(max_length=50, blank=True, null=True)
+    institucion_financiera = models.ForeignKey(
+        InstitucionFinanciera,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='pagos',
+        help_text="Institución financiera donde se realizó el pago"
+    )
+    pago_convenio = models.ForeignKey(
+        'PagoConvenio',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='pagos',
+        help_text="Transferencia institucional de la que forma parte este pago"
+    )
+    codigo_comprobante = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        help_text="Código de comprobante de la institución financiera"
+    )
+
+    class Meta:
+        constraints = [
+            # Un comprobante o transacción bancaria solo puede registrarse una vez
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'codigo_comprobante'],
+                name='pago_comprobante_unico_por_institucion',
+            ),
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'numero_transaccion'],
+                name='pago_transaccion_unica_por_institucion',
+            ),
+        ]
 
     def __str__(self):
         return f"Pago de {self.estudiante} - {self.monto} ({self.get_tipo_pago_display()}) - {self.evento}"
@@ -336,51 +475,71 @@ class Pago(models.Model):
         if not self.es_pago_colegiatura():
             return
         
-        plan = PlanPago.objects.filter(
-            estudiante=self.estudiante, evento=self.evento
-        ).first()
-        
-        if not plan:
-            return
-        
-        monto_disponible = self.monto_aplicado_colegiatura or self.monto
-        
-        if self.tipo_pago == 'cuota_individual' and self.cuota:
-            # Pago de cuota individual
-            self._aplicar_a_cuota_individual(self.cuota, monto_disponible)
-        elif self.tipo_pago in ['colegiatura_parcial', 'colegiatura_total']:
-            # Pago parcial o total
-            if cuotas_ids:
-                cuotas = Cuota.objects.filter(id__in=cuotas_ids, plan_pago=plan)
-            else:
-                # Aplicar automáticamente a cuotas pendientes en orden
-                cuotas = Cuota.objects.filter(
-                    plan_pago=plan, estado='pendiente'
-                ).order_by('numero_cuota')
+        with transaction.atomic():
+            # Bloquear el plan serializa los pagos concurrentes sobre sus cuotas;
+            # las cuotas se leen después del bloqueo para partir de saldos vigentes
+            plan = PlanPago.objects.select_for_update().filter(
+                estudiante_id=self.estudiante_id, evento_id=self.evento_id
+            ).only('id').first()
+            
+            if not plan:
+                return
+            
+            monto_disponible = self.monto_aplicado_colegiatura or self.monto
             
-            self._aplicar_a_multiples_cuotas(cuotas, monto_disponible)
+            if self.tipo_pago == 'cuota_individual' and self.cuota_id:
+                # Pago de cuota individual
+                cuota = Cuota.objects.get(pk=self.cuota_id)
+                self._aplicar_a_cuota_individual(cuota, monto_disponible)
+                self.cuota = cuota
+            elif self.tipo_pago in ['colegiatura_parcial', 'colegiatura_total']:
+                # Pago parcial o total
+                if cuotas_ids:
+                    cuotas = Cuota.objects.filter(id__in=cuotas_ids, plan_pago=plan).order_by('numero_cuota')
+                else:
+                    # Aplicar automáticamente a cuotas pendientes en orden
+                    cuotas = Cuota.objects.filter(
+                        plan_pago=plan, estado='pendiente'
+                    ).order_by('numero_cuota')
+                
+                self._aplicar_a_multiples_cuotas(cuotas, monto_disponible)
     
     def _aplicar_a_cuota_individual(self, cuota, monto):
         """Aplica pago a una cuota individual"""
-        monto_pendiente = cuota.monto - (cuota.monto_pagado or Decimal('0.00'))
-        monto_aplicar = min(monto, monto_pendiente)
-        
-        if monto_aplicar > 0:
-            PagoCuotaAplicada.objects.create(
-                pago=self,
-                cuota=cuota,
-                monto_aplicado=monto_aplicar
-            )
-            
-            cuota.monto_pagado = (cuota.monto_pagado or Decimal('0.00')) + monto_aplicar
-            if cuota.monto_pagado >= cuota.monto:
-                cuota.estado = 'pagada'
-                cuota.fecha_pago = self.fecha_pago.date()
-            cuota.save()
+        self._aplicar_a_multiples_cuotas([cuota], monto)
     
     def _aplicar_a_multiples_cuotas(self, cuotas, monto_total):
-        """Aplica pago a múltiples cuotas en orden"""
+        """
+        Reparte el pago entre las cuotas en orden, en memoria, y lo persiste con
+        un solo bulk_create de aplicaciones y un solo bulk_update de cuotas.
+        """
+        from .services.sistema_pagos_service import SistemaPagosService
+
+        aplicaciones, modificadas, cambios = self.repartir_en_cuotas(cuotas, monto_total)
+        if not modificadas:
+            return
+        
+        PagoCuotaAplicada.objects.bulk_create(aplicaciones)
+        Cuota.objects.bulk_update(modificadas, Cuota.CAMPOS_APLICACION_PAGO)
+        # bulk_update no dispara señales: actualizar saldos del plan en bloque
+        SistemaPagosService.aplicar_cambios_cuotas(cambios, pago=self)
+    
+    def repartir_en_cuotas(self, cuotas, monto_total, fecha_pago=None):
+        """
+        Calcula en memoria la aplicación del pago a las cuotas en orden, sin
+        escribir en la base de datos. Las cuotas quedan modificadas en memoria.
+
+        Returns:
+            tuple: (aplicaciones PagoCuotaAplicada sin guardar, cuotas modificadas,
+            cambios (previo, actual) de `Cuota.valores_saldo()`)
+        """
+        if fecha_pago is None:
+            fecha_pago = self.fecha_pago.date() if self.fecha_pago else timezone.localdate()
+        ahora = timezone.now()
         monto_restante = monto_total
+        aplicaciones = []
+        modificadas = []
+        cambios = []
         
         for cuota in cuotas:
             if monto_restante <= 0:
@@ -388,24 +547,28 @@ class Pago(models.Model):
                 
             monto_pendiente = cuota.monto - (cuota.monto_pagado or Decimal('0.00'))
             monto_aplicar = min(monto_restante, monto_pendiente)
+            if monto_aplicar <= 0:
+                continue
             
-            if monto_aplicar > 0:
-                PagoCuotaAplicada.objects.create(
-                    pago=self,
-                    cuota=cuota,
-                    monto_aplicado=monto_aplicar
-                )
-                
-                cuota.monto_pagado = (cuota.monto_pagado or Decimal('0.00')) + monto_aplicar
-                if cuota.monto_pagado >= cuota.monto:
-                    cuota.estado = 'pagada'
-                    cuota.fecha_pago = self.fecha_pago.date()
-                cuota.save()
-                
-                monto_restante -= monto_aplicar
+            previo = cuota.valores_saldo()
+            aplicaciones.append(PagoCuotaAplicada(pago=self, cuota=cuota, monto_aplicado=monto_aplicar))
+            cuota.monto_pagado = (cuota.monto_pagado or Decimal('0.00')) + monto_aplicar
+            if cuota.monto_pagado >= cuota.monto and cuota.estado != 'pagado':
+                cuota.estado = 'pagado'
+                cuota.fecha_pago = fecha_pago
+            cuota.fecha_modificacion = ahora
+            modificadas.append(cuota)
+            cambios.append((previo, cuota.valores_saldo()))
+            
+            monto_restante -= monto_aplicar
+        
+        return aplicaciones, modificadas, cambios
     
     def save(self, *args, **kwargs):
         """Sobrescribir save para aplicar automáticamente pagos a cuotas"""
+        # Vacíos como NULL para que no choquen en las restricciones de unicidad
+        self.codigo_comprobante = self.codigo_comprobante or None
+        self.numero_transaccion = self.numero_transaccion or None
         is_new = self.pk is None
         super().save(*args, **kwargs)
         
@@ -415,6 +578,179 @@ class Pago(models.Model):
             self.aplicar_a_cuotas(cuotas_ids=cuotas_ids_prefijadas)
 
 
+class PagoConvenio(models.Model):
+    """
+    Transferencia única de una institución aliada (p. ej. PRODEUTEQ o un
+    convenio municipal) que cubre la colegiatura de varios estudiantes.
+    Se reparte en un Pago por estudiante según la regla de distribución.
+    """
+    REGLA_CHOICES = [
+        ('partes_iguales', 'Partes iguales'),
+        ('vencimiento_mas_antiguo', 'Vencimiento más antiguo primero'),
+        ('tabla', 'Tabla explícita por estudiante'),
+    ]
+
+    entidad = models.CharField(max_length=150, help_text="Institución que realiza el pago")
+    evento = models.ForeignKey(Evento, on_delete=models.CASCADE, related_name='pagos_convenio')
+    monto_total = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    monto_aplicado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    regla = models.CharField(max_length=30, choices=REGLA_CHOICES)
+    metodo_pago = models.CharField(max_length=20, choices=Pago.METODO_PAGO_CHOICES, default='transferencia')
+    institucion_financiera = models.ForeignKey(
+        InstitucionFinanciera,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='pagos_convenio'
+    )
+    numero_transaccion = models.CharField(max_length=50, blank=True, null=True)
+    codigo_comprobante = models.CharField(max_length=50, blank=True, null=True)
+    comprobante = models.FileField(upload_to='comprobantes_convenio/', blank=True, null=True)
+    observaciones = models.TextField(blank=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Pago de Convenio'
+        verbose_name_plural = 'Pagos de Convenio'
+        ordering = ['-fecha_registro']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'numero_transaccion'],
+                name='pagoconvenio_transaccion_unica_por_institucion',
+            ),
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'codigo_comprobante'],
+                name='pagoconvenio_comprobante_unico_por_institucion',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Convenio {self.entidad} - {self.evento} (${self.monto_total})"
+
+    @property
+    def monto_no_aplicado(self):
+        return self.monto_total - self.monto_aplicado
+
+    def save(self, *args, **kwargs):
+        self.codigo_comprobante = self.codigo_comprobante or None
+        self.numero_transaccion = self.numero_transaccion or None
+        super().save(*args, **kwargs)
+
+
+class RespuestaIdempotente(models.Model):
+    """
+    Respuesta almacenada de un POST recibido con cabecera `Idempotency-Key`,
+    para contestar los reintentos del cliente sin volver a procesarlos.
+    """
+    clave = models.CharField(max_length=255, unique=True)
+    ruta = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64, help_text="SHA-256 del cuerpo de la solicitud original")
+    codigo_estado = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True)
+    pago = models.ForeignKey(
+        'Pago',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='respuestas_idempotentes'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Respuesta Idempotente'
+        verbose_name_plural = 'Respuestas Idempotentes'
+
+    def __str__(self):
+        return f"{self.clave} → {self.codigo_estado}"
+
+
+class MovimientoPlanPago(models.Model):
+    """
+    Asiento del diario de pagos de un plan: cargos (colegiatura y sus ajustes)
+    y abonos (pagos aplicados a sus cuotas). Es de solo inserción; las
+    correcciones se registran como un nuevo asiento de monto negativo.
+    El saldo del plan es la suma de cargos menos la suma de abonos.
+    """
+    TIPO_CHOICES = [
+        ('cargo', 'Cargo'),
+        ('abono', 'Abono'),
+    ]
+    CONCEPTO_CHOICES = [
+        ('colegiatura', 'Colegiatura'),
+        ('ajuste_colegiatura', 'Ajuste de colegiatura'),
+        ('pago', 'Pago aplicado'),
+        ('reverso_pago', 'Reverso de pago'),
+        ('apertura', 'Saldo de apertura'),
+    ]
+
+    plan_pago = models.ForeignKey(PlanPago, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    concepto = models.CharField(max_length=20, choices=CONCEPTO_CHOICES)
+    monto = models.DecimalField(max_digits=12, decimal_places=2, help_text="Negativo para reversos y reducciones")
+    pago = models.ForeignKey(
+        'Pago',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='movimientos'
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Movimiento de Plan de Pago'
+        verbose_name_plural = 'Movimientos de Planes de Pago'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['plan_pago', 'id'], name='movimiento_plan_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ${self.monto} ({self.get_concepto_display()}) - Plan {self.plan_pago_id}"
+
+    def save(self, *args, **kwargs):
+        from django.core.exceptions import ValidationError
+
+        if self.pk is not None:
+            raise ValidationError("Los movimientos del diario de pagos no se modifican")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        from django.core.exceptions import ValidationError
+
+        raise ValidationError("Los movimientos del diario de pagos no se eliminan")
+
+
+class CorteSaldoPlanPago(models.Model):
+    """
+    Saldo acumulado de un plan hasta un movimiento del diario (inclusive).
+    El saldo vigente es el último corte más los movimientos posteriores.
+    """
+    plan_pago = models.ForeignKey(PlanPago, on_delete=models.CASCADE, related_name='cortes_saldo')
+    ultimo_movimiento_id = models.BigIntegerField()
+    fecha_corte = models.DateTimeField(help_text="Fecha del último movimiento incluido")
+    total_cargos = models.DecimalField(max_digits=14, decimal_places=2)
+    total_abonos = models.DecimalField(max_digits=14, decimal_places=2)
+    movimientos_compactados = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Corte de Saldo'
+        verbose_name_plural = 'Cortes de Saldo'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['plan_pago', 'ultimo_movimiento_id'],
+                name='corte_saldo_unico_por_movimiento',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Corte del plan {self.plan_pago_id} al movimiento {self.ultimo_movimiento_id}: ${self.saldo}"
+
+    @property
+    def saldo(self):
+        return self.total_cargos - self.total_abonos
+
+
 class PagoCuotaAplicada(models.Model):
     """Modelo intermedio para tracking de montos aplicados a cuotas específicas"""
     pago = models.ForeignKey(Pago, on_delete=models.CASCADE, related_name='aplicaciones_cuotas')
@@ -497,6 +833,16 @@ class PagoCuota(models.Model):
         verbose_name = 'Pago de Cuota'
         verbose_name_plural = 'Pagos de Cuotas'
         ordering = ['-fecha_pago', '-fecha_creacion']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'codigo_comprobante'],
+                name='pagocuota_comprobante_unico_por_institucion',
+            ),
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'numero_transaccion'],
+                name='pagocuota_transaccion_unica_por_institucion',
+            ),
+        ]
     
     def __str__(self):
         return f"Pago de cuota {self.cuota.numero_cuota} - {self.cuota.estudiante} - ${self.monto_pagado}"
@@ -516,14 +862,15 @@ class PagoCuota(models.Model):
             raise ValidationError("La fecha de pago no puede ser futura")
     
     def save(self, *args, **kwargs):
-        # Actualizar el estado de la cuota si se paga completamente
-        if self.monto_pagado >= self.cuota.monto:
-            self.cuota.estado = 'pagado'
-            self.cuota.fecha_pago = self.fecha_pago
-            self.cuota.monto_pagado = self.monto_pagado
-            self.cuota.save()
-        
-        super().save(*args, **kwargs)
+        self.codigo_comprobante = self.codigo_comprobante or None
+        self.numero_transaccion = self.numero_transaccion or None
+        if self.pk is not None:
+            super().save(*args, **kwargs)
+            return
+        # Un pago nuevo se suma a lo pagado de la cuota bajo bloqueo del plan
+        with transaction.atomic():
+            self.cuota = Cuota.abonar(self.cuota_id, self.monto_pagado, self.fecha_pago)
+            super().save(*args, **kwargs)
     
     @property
     def estudiante(self):
@@ -535,6 +882,129 @@ class PagoCuota(models.Model):
         """Retorna el evento asociado al pago"""
         return self.cuota.evento
 
+
+# Etiqueta de cada método de pago de cuota, para reportes y validaciones
+METODOS_PAGO = dict(PagoCuota.METODO_PAGO_CHOICES)
+
+
+class CierreCajaDiario(models.Model):
+    """
+    Resumen materializado de los cobros de un día por origen, tipo de pago,
+    método, institución financiera y evento. Se actualiza con cada escritura
+    de Pago y PagoCuota (ver signals.py) y el comando `reconstruir_cierres_caja`
+    lo recalcula para cualquier rango de fechas.
+    """
+    ORIGEN_CHOICES = [
+        ('pago', 'Pago'),
+        ('pago_cuota', 'Pago de Cuota'),
+    ]
+
+    # Identifica la combinación de dimensiones; las claves foráneas pueden ser nulas
+    clave = models.CharField(max_length=120, unique=True)
+    fecha = models.DateField()
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES)
+    tipo_pago = models.CharField(max_length=25)
+    metodo_pago = models.CharField(max_length=20)
+    institucion_financiera = models.ForeignKey(
+        InstitucionFinanciera, on_delete=models.SET_NULL, null=True, blank=True, related_name='cierres_caja'
+    )
+    evento = models.ForeignKey(Evento, on_delete=models.CASCADE, null=True, blank=True, related_name='cierres_caja')
+    numero_pagos = models.IntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Cierre de Caja Diario'
+        verbose_name_plural = 'Cierres de Caja Diarios'
+        ordering = ['-fecha', 'origen', 'metodo_pago']
+        indexes = [
+            models.Index(fields=['fecha'], name='cierre_caja_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.metodo_pago} {self.tipo_pago}: {self.numero_pagos} pagos, ${self.monto_total}"
+
+
+class ConciliacionBancaria(models.Model):
+    """Importación de un extracto bancario y su resultado de conciliación."""
+    institucion_financiera = models.ForeignKey(
+        InstitucionFinanciera,
+        on_delete=models.PROTECT,
+        related_name='conciliaciones'
+    )
+    archivo_nombre = models.CharField(max_length=255, blank=True)
+    fecha_desde = models.DateField(null=True, blank=True)
+    fecha_hasta = models.DateField(null=True, blank=True)
+    total_lineas = models.PositiveIntegerField(default=0)
+    conciliadas = models.PositiveIntegerField(default=0)
+    sin_coincidencia = models.PositiveIntegerField(default=0)
+    ambiguas = models.PositiveIntegerField(default=0)
+    diferencia_monto = models.PositiveIntegerField(default=0)
+    duplicadas = models.PositiveIntegerField(default=0, help_text="Líneas ya importadas en un extracto anterior")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Conciliación Bancaria'
+        verbose_name_plural = 'Conciliaciones Bancarias'
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Conciliación {self.institucion_financiera} {self.fecha_desde} - {self.fecha_hasta}"
+
+
+class LineaExtractoBancario(models.Model):
+    """
+    Línea de un extracto bancario. Las conciliadas enlazan el registro de pago
+    correspondiente; el resto queda marcado para revisión manual.
+    """
+    ESTADO_CHOICES = [
+        ('conciliada', 'Conciliada'),
+        ('sin_coincidencia', 'Sin coincidencia'),
+        ('ambigua', 'Ambigua'),
+        ('diferencia_monto', 'Diferencia de monto'),
+    ]
+
+    conciliacion = models.ForeignKey(ConciliacionBancaria, on_delete=models.CASCADE, related_name='lineas')
+    institucion_financiera = models.ForeignKey(
+        InstitucionFinanciera,
+        on_delete=models.PROTECT,
+        related_name='lineas_extracto'
+    )
+    numero_linea = models.PositiveIntegerField()
+    fecha = models.DateField()
+    referencia = models.CharField(max_length=100, blank=True)
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+    descripcion = models.CharField(max_length=255, blank=True)
+    huella = models.CharField(max_length=64, help_text="SHA-256 de la línea para detectar reimportaciones")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES)
+    pago = models.ForeignKey(
+        Pago, on_delete=models.SET_NULL, null=True, blank=True, related_name='lineas_extracto'
+    )
+    pago_cuota = models.ForeignKey(
+        PagoCuota, on_delete=models.SET_NULL, null=True, blank=True, related_name='lineas_extracto'
+    )
+    cuota = models.ForeignKey(
+        Cuota, on_delete=models.SET_NULL, null=True, blank=True, related_name='lineas_extracto'
+    )
+
+    class Meta:
+        verbose_name = 'Línea de Extracto Bancario'
+        verbose_name_plural = 'Líneas de Extracto Bancario'
+        ordering = ['conciliacion', 'numero_linea']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['institucion_financiera', 'huella'],
+                name='linea_extracto_unica_por_institucion',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['estado'], name='linea_extracto_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.referencia} ${self.monto} ({self.get_estado_display()})"
+
+
 class EstadoPagosEvento(models.Model):
     estudiante = models.ForeignKey(Estudiante, on_delete=models.CASCADE)
     evento = models.ForeignKey(Evento, on_delete=models.CASCADE, null=True, blank=True)
@@ -642,6 +1112,20 @@ class Beca(models.Model):
         unique_together = ('estudiante', 'evento', 'nombre_beca')
         verbose_name = 'Beca'
         verbose_name_plural = 'Becas'
+        # Índices parciales sobre las becas activas: el barrido de expiración
+        # mantiene ese conjunto pequeño aunque crezca el histórico
+        indexes = [
+            models.Index(
+                fields=['evento', 'estudiante', 'fecha_fin'],
+                condition=models.Q(estado='activa'),
+                name='beca_activa_evento_idx',
+            ),
+            models.Index(
+                fields=['fecha_fin'],
+                condition=models.Q(estado='activa'),
+                name='beca_activa_fin_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.nombre_beca} - {self.estudiante} en {self.evento}"
@@ -738,6 +1222,12 @@ class Descuento(models.Model):
     # Información adicional
     motivo = models.TextField(help_text="Motivo del descuento")
     codigo_promocional = models.CharField(max_length=20, blank=True, help_text="Código promocional si aplica")
+    max_usos = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Máximo de canjes del código promocional (vacío: ilimitado)"
+    )
+    usos = models.PositiveIntegerField(default=0, help_text="Canjes registrados del código promocional")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
     
@@ -745,6 +1235,23 @@ class Descuento(models.Model):
         unique_together = ('estudiante', 'evento', 'nombre_descuento')
         verbose_name = 'Descuento'
         verbose_name_plural = 'Descuentos'
+        indexes = [
+            models.Index(
+                fields=['evento', 'estudiante', 'fecha_fin'],
+                condition=models.Q(estado='activo'),
+                name='descuento_activo_evento_idx',
+            ),
+            models.Index(
+                fields=['fecha_fin'],
+                condition=models.Q(estado='activo'),
+                name='descuento_activo_fin_idx',
+            ),
+            models.Index(
+                fields=['codigo_promocional'],
+                condition=models.Q(estado='activo'),
+                name='descuento_activo_codigo_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.nombre_descuento} - {self.estudiante} en {self.evento}"
@@ -1,9 +1,13 @@
+from decimal import Decimal
 from rest_framework import serializers
 from .models import (
     PlanPago,
     Cuota,
     Pago,
     PagoCuota,
+    PagoConvenio,
+    ConciliacionBancaria,
+    LineaExtractoBancario,
     InstitucionFinanciera,
     EstadoPagosEvento,
     Matricula,
@@ -99,7 +103,11 @@ class PagoSerializer(serializers.ModelSerializer):
     )
     class Meta:
         model = Pago
-        fields = ['id', 'estudiante', 'evento', 'tipo_pago', 'cuota', 'monto', 'fecha_pago', 'comprobante', 'metodo_pago', 'observaciones', 'cuotas_ids']
+        fields = [
+            'id', 'estudiante', 'evento', 'tipo_pago', 'cuota', 'monto', 'fecha_pago', 'comprobante',
+            'metodo_pago', 'observaciones', 'numero_transaccion', 'institucion_financiera',
+            'codigo_comprobante', 'cuotas_ids'
+        ]
         read_only_fields = ['id']
 
     def validate(self, data):
@@ -192,11 +200,11 @@ class PagoSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        cuotas_ids = self.initial_data.get('cuotas_ids')
-        pago = super().create(validated_data)
-        if pago.es_pago_colegiatura() and cuotas_ids:
-            setattr(pago, '_cuotas_ids_prefijadas', cuotas_ids)
-            pago.aplicar_a_cuotas(cuotas_ids=cuotas_ids)
+        cuotas_ids = validated_data.pop('cuotas_ids', None) or self.initial_data.get('cuotas_ids')
+        pago = Pago(**validated_data)
+        # Pago.save aplica el pago (una sola vez) a las cuotas prefijadas
+        setattr(pago, '_cuotas_ids_prefijadas', cuotas_ids)
+        pago.save()
         return pago
 
 class EstadoPagosEventoSerializer(serializers.ModelSerializer):
@@ -280,14 +288,156 @@ class DescuentoSerializer(serializers.ModelSerializer):
             'porcentaje_descuento', 'monto_descuento',
             'aplica_matricula', 'aplica_colegiatura', 'aplica_certificado',
             'fecha_inicio', 'fecha_fin', 'estado', 'motivo', 'codigo_promocional',
-            'fecha_creacion', 'fecha_modificacion',
+            'max_usos', 'usos', 'fecha_creacion', 'fecha_modificacion',
             'estudiante_nombre', 'estudiante_apellidos', 'evento_nombre', 'esta_activo'
         ]
-        read_only_fields = ['id', 'fecha_creacion', 'fecha_modificacion']
+        read_only_fields = ['id', 'usos', 'fecha_creacion', 'fecha_modificacion']
     
     def validate(self, data):
         # Validar que al menos un campo de descuento esté lleno
         if not data.get('porcentaje_descuento') and not data.get('monto_descuento'):
             raise serializers.ValidationError("Debe especificar un porcentaje o monto de descuento")
         
-        return data 
\ No newline at end of file
+        return data 
+
+
+class DistribucionConvenioSerializer(serializers.Serializer):
+    estudiante = serializers.IntegerField()
+    monto = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+
+
+class PagoConvenioSolicitudSerializer(serializers.Serializer):
+    """Datos para repartir la transferencia de una institución aliada."""
+    evento = serializers.PrimaryKeyRelatedField(queryset=Evento.objects.all())
+    entidad = serializers.CharField(max_length=150)
+    monto_total = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    regla = serializers.ChoiceField(choices=PagoConvenio.REGLA_CHOICES)
+    metodo_pago = serializers.ChoiceField(choices=Pago.METODO_PAGO_CHOICES, default='transferencia')
+    estudiantes = serializers.ListField(child=serializers.IntegerField(), required=False)
+    distribucion = DistribucionConvenioSerializer(many=True, required=False)
+    institucion_financiera = serializers.PrimaryKeyRelatedField(
+        queryset=InstitucionFinanciera.objects.all(), required=False, allow_null=True
+    )
+    numero_transaccion = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    codigo_comprobante = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    observaciones = serializers.CharField(required=False, allow_blank=True, default='')
+    simular = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data['regla'] == 'tabla' and not data.get('distribucion'):
+            raise serializers.ValidationError("La regla 'tabla' requiere la distribución por estudiante")
+        return data
+
+
+
+class RecalcularCronogramasSolicitudSerializer(serializers.Serializer):
+    """Datos para recalcular los cronogramas de cuotas de un evento."""
+    evento = serializers.PrimaryKeyRelatedField(queryset=Evento.objects.all())
+    actualizar_monto = serializers.BooleanField(default=True)
+    simular = serializers.BooleanField(default=False)
+
+
+class ReestructuracionLoteSolicitudSerializer(serializers.Serializer):
+    """Planes (lista o filtro) y nuevos parámetros para reestructurarlos en bloque."""
+    planes = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    evento = serializers.PrimaryKeyRelatedField(queryset=Evento.objects.all(), required=False)
+    estado_general = serializers.ChoiceField(choices=PlanPago.ESTADO_GENERAL_CHOICES, required=False)
+    nuevo_numero_cuotas = serializers.IntegerField(min_value=1, max_value=60, required=False)
+    nuevo_monto_colegiatura = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False
+    )
+    motivo_reestructuracion = serializers.CharField(required=False, allow_blank=True)
+    simular = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data.get('planes') and not data.get('evento'):
+            raise serializers.ValidationError("Indique la lista de planes o el evento a reestructurar")
+        if not data.get('nuevo_numero_cuotas') and not data.get('nuevo_monto_colegiatura'):
+            raise serializers.ValidationError(
+                "Indique el nuevo número de cuotas o el nuevo monto de colegiatura"
+            )
+        return data
+
+
+class SimulacionPlanesSolicitudSerializer(serializers.Serializer):
+    """Cohorte esperada y opciones de planes de pago a comparar."""
+    evento = serializers.PrimaryKeyRelatedField(queryset=Evento.objects.all(), required=False)
+    monto_colegiatura = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False
+    )
+    numero_estudiantes = serializers.IntegerField(min_value=1)
+    numeros_cuotas = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=60), allow_empty=False
+    )
+    fechas_inicio = serializers.ListField(child=serializers.DateField(), required=False, allow_empty=False)
+    porcentajes_beca = serializers.ListField(
+        child=serializers.DecimalField(
+            max_digits=5, decimal_places=2, min_value=Decimal('0.00'), max_value=Decimal('100.00')
+        ),
+        required=False,
+        allow_empty=False,
+    )
+    estudiantes_becados = serializers.IntegerField(min_value=0, required=False)
+    incluir_cronogramas = serializers.BooleanField(default=True)
+
+    def validate(self, data):
+        evento = data.get('evento')
+        if 'monto_colegiatura' not in data:
+            if evento is None:
+                raise serializers.ValidationError("Indique el evento o el monto de colegiatura")
+            data['monto_colegiatura'] = evento.costo_colegiatura
+        if 'fechas_inicio' not in data:
+            if evento is None:
+                raise serializers.ValidationError("Indique el evento o las fechas de inicio")
+            data['fechas_inicio'] = [evento.fecha_inicio]
+        return data
+
+class LineaExtractoBancarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LineaExtractoBancario
+        fields = [
+            'id', 'numero_linea', 'fecha', 'referencia', 'monto', 'descripcion',
+            'estado', 'pago', 'pago_cuota', 'cuota'
+        ]
+        read_only_fields = fields
+
+
+class ConciliacionBancariaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConciliacionBancaria
+        fields = [
+            'id', 'institucion_financiera', 'archivo_nombre', 'fecha_desde', 'fecha_hasta',
+            'total_lineas', 'conciliadas', 'sin_coincidencia', 'ambiguas',
+            'diferencia_monto', 'duplicadas', 'fecha_creacion'
+        ]
+        read_only_fields = fields
+
+
+class PagosLoteSolicitudSerializer(serializers.Serializer):
+    """Archivo CSV o JSONL con pagos de cuotas a registrar en lote."""
+    archivo = serializers.FileField()
+    formato = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+    simular = serializers.BooleanField(default=False)
+    formato_resultado = serializers.ChoiceField(choices=['json', 'csv'], default='json')
+
+
+class ExtractoBancarioSolicitudSerializer(serializers.Serializer):
+    """Extracto CSV a conciliar."""
+    archivo = serializers.FileField()
+    institucion_financiera = serializers.PrimaryKeyRelatedField(queryset=InstitucionFinanciera.objects.all())
+    fecha_desde = serializers.DateField(required=False, allow_null=True)
+    fecha_hasta = serializers.DateField(required=False, allow_null=True)
+    tolerancia_dias = serializers.IntegerField(min_value=0, max_value=31, default=3)
+    simular = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data.get('fecha_desde') and data.get('fecha_hasta') and data['fecha_desde'] > data['fecha_hasta']:
+            raise serializers.ValidationError("La fecha inicial no puede ser posterior a la final")
+        return data
+
+
+class CodigoPromocionalSolicitudSerializer(serializers.Serializer):
+    """Código promocional a validar o canjear para un estudiante en un evento."""
+    codigo = serializers.CharField(max_length=20)
+    estudiante_id = serializers.IntegerField(min_value=1)
+    evento_id = serializers.IntegerField(min_value=1)
@@ -0,0 +1,161 @@
+import hashlib
+import time
+from datetime import datetime, time as hora, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from ..models import Cuota
+from .sistema_pagos_service import MONTO_FIELD, _monto
+from .utils import PendientesAlConfirmar
+
+# Clave de la versión vigente de los reportes en caché: cambia con cada
+# escritura de pagos y vuelve obsoletas todas las entradas anteriores
+CLAVE_VERSION = 'cartera_vencida:version'
+
+# Invalidación programada para la transacción en curso del hilo
+_invalidacion_pendiente = PendientesAlConfirmar(lambda _: CarteraService.invalidar_cache())
+
+# Campo de agrupación de cada dimensión del reporte: (clave, nombre)
+DIMENSIONES = {
+    'evento': ('plan_pago__evento_id', 'plan_pago__evento__nombre'),
+    'ciudad': ('plan_pago__estudiante__ciudad', 'plan_pago__estudiante__ciudad'),
+    'institucion': ('plan_pago__evento__aval', 'plan_pago__evento__aval'),
+}
+
+TRAMOS = ('por_vencer', '0_30', '31_60', '61_90', '90_mas')
+
+
+class CarteraService:
+    """
+    Servicio de reportes de cartera: antigüedad de los saldos pendientes de
+    las cuotas, calculada en la base de datos y guardada en caché por día.
+    """
+
+    @staticmethod
+    def _version():
+        version = cache.get(CLAVE_VERSION)
+        if version is None:
+            cache.add(CLAVE_VERSION, time.time_ns(), None)
+            version = cache.get(CLAVE_VERSION)
+        return version
+
+    @staticmethod
+    def invalidar_cache():
+        """Vuelve obsoletos los reportes en caché (llamar tras escribir pagos)."""
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+    @classmethod
+    def invalidar_cache_al_confirmar(cls):
+        """
+        Invalida la caché cuando se confirme la transacción en curso, una sola
+        vez por transacción aunque se escriban muchas cuotas.
+        """
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            cls.invalidar_cache()
+            return
+
+        _invalidacion_pendiente.estado()
+
+    @staticmethod
+    def _filtros_tramos(hoy):
+        """Condición sobre `fecha_vencimiento` de cada tramo de días de atraso."""
+        return {
+            'por_vencer': Q(fecha_vencimiento__gt=hoy),
+            '0_30': Q(fecha_vencimiento__range=(hoy - timedelta(days=30), hoy)),
+            '31_60': Q(fecha_vencimiento__range=(hoy - timedelta(days=60), hoy - timedelta(days=31))),
+            '61_90': Q(fecha_vencimiento__range=(hoy - timedelta(days=90), hoy - timedelta(days=61))),
+            '90_mas': Q(fecha_vencimiento__lt=hoy - timedelta(days=90)),
+        }
+
+    @classmethod
+    def calcular_antiguedad(cls, agrupar_por='evento', evento_ids=None, hoy=None):
+        """
+        Calcula la cartera por tramos de antigüedad (por vencer, 0–30, 31–60,
+        61–90 y más de 90 días de atraso) con una sola consulta agregada
+        sobre las cuotas con saldo pendiente.
+
+        Args:
+            agrupar_por: 'evento', 'ciudad' o 'institucion' (aval del evento)
+            evento_ids: IDs de eventos a incluir (opcional, eventos con planes activos)
+            hoy: Fecha de corte (opcional, hoy por defecto)
+
+        Returns:
+            dict: Filas por grupo con el saldo de cada tramo y totales
+        """
+        if agrupar_por not in DIMENSIONES:
+            raise ValidationError(f"Agrupación no válida: {agrupar_por}")
+        hoy = hoy or timezone.localdate()
+        campo_clave, campo_nombre = DIMENSIONES[agrupar_por]
+
+        cuotas = Cuota.objects.filter(
+            estado__in=['pendiente', 'atrasado'],
+            monto_pagado__lt=F('monto'),
+            plan_pago__activo=True,
+        )
+        if evento_ids is not None:
+            cuotas = cuotas.filter(plan_pago__evento_id__in=list(evento_ids))
+
+        saldo = F('monto') - F('monto_pagado')
+        vencidas = Q(fecha_vencimiento__lte=hoy)
+        agregados = {
+            tramo: Sum(saldo, filter=condicion, output_field=MONTO_FIELD)
+            for tramo, condicion in cls._filtros_tramos(hoy).items()
+        }
+        agregados.update({
+            'cuotas_vencidas': Count('id', filter=vencidas),
+            'estudiantes_con_atraso': Count('plan_pago__estudiante_id', filter=vencidas, distinct=True),
+        })
+        campos = [campo_clave] if campo_clave == campo_nombre else [campo_clave, campo_nombre]
+        filas_bd = cuotas.values(*campos).annotate(**agregados).order_by(campo_nombre)
+
+        cero = Decimal('0.00')
+        totales = {tramo: cero for tramo in TRAMOS}
+        totales.update({'total_vencido': cero, 'total': cero, 'cuotas_vencidas': 0})
+        filas = []
+        for fila_bd in filas_bd:
+            fila = {
+                'clave': fila_bd[campo_clave],
+                'nombre': fila_bd[campo_nombre],
+            }
+            for tramo in TRAMOS:
+                fila[tramo] = _monto(fila_bd[tramo])
+            fila['total_vencido'] = sum((fila[tramo] for tramo in TRAMOS[1:]), cero)
+            fila['total'] = fila['total_vencido'] + fila['por_vencer']
+            fila['cuotas_vencidas'] = fila_bd['cuotas_vencidas']
+            fila['estudiantes_con_atraso'] = fila_bd['estudiantes_con_atraso']
+            for campo in totales:
+                totales[campo] += fila[campo]
+            filas.append(fila)
+
+        return {
+            'fecha_corte': hoy,
+            'agrupar_por': agrupar_por,
+            'tramos': list(TRAMOS),
+            'filas': filas,
+            'totales': totales,
+        }
+
+    @classmethod
+    def obtener_antiguedad(cls, agrupar_por='evento', evento_ids=None):
+        """
+        Versión en caché de `calcular_antiguedad` con fecha de corte hoy. La
+        entrada vive hasta fin del día o hasta la siguiente escritura de pagos.
+        """
+        hoy = timezone.localdate()
+        eventos = ','.join(str(e) for e in sorted(set(evento_ids))) if evento_ids is not None else '*'
+        clave = 'cartera_vencida:{}:{}:{}:{}'.format(
+            hoy.isoformat(), cls._version(), agrupar_por, hashlib.sha1(eventos.encode()).hexdigest()
+        )
+        reporte = cache.get(clave)
+        if reporte is None:
+            reporte = cls.calcular_antiguedad(agrupar_por=agrupar_por, evento_ids=evento_ids, hoy=hoy)
+            fin_del_dia = timezone.make_aware(datetime.combine(hoy + timedelta(days=1), hora.min))
+            segundos = max(int((fin_del_dia - timezone.now()).total_seconds()), 1)
+            cache.set(clave, reporte, segundos)
+        return reporte
@@ -0,0 +1,287 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncYear
+from django.utils import timezone
+
+from ..models import CierreCajaDiario, Cuota, Pago, PagoCuota
+from .sistema_pagos_service import MONTO_FIELD, _monto
+
+# Dimensiones del cierre en el orden de la clave de cada fila
+CAMPOS_CLAVE = ('fecha', 'origen', 'tipo_pago', 'metodo_pago', 'institucion_financiera_id', 'evento_id')
+
+# Tipo de pago con que se resume un PagoCuota
+TIPO_PAGO_CUOTA = 'cuota_individual'
+
+# Campo de agrupación de cada dimensión del reporte: (clave, nombre)
+DIMENSIONES = {
+    'origen': ('origen', 'origen'),
+    'tipo_pago': ('tipo_pago', 'tipo_pago'),
+    'metodo_pago': ('metodo_pago', 'metodo_pago'),
+    'institucion_financiera': ('institucion_financiera_id', 'institucion_financiera__nombre'),
+    'evento': ('evento_id', 'evento__nombre'),
+}
+
+PERIODOS = {
+    'dia': F('fecha'),
+    'mes': TruncMonth('fecha'),
+    'anio': TruncYear('fecha'),
+}
+
+
+def _clave(dimensiones):
+    return '|'.join('' if dimensiones[campo] is None else str(dimensiones[campo]) for campo in CAMPOS_CLAVE)
+
+
+class CierreCajaService:
+    """
+    Servicio del cierre de caja: mantiene la tabla diaria `CierreCajaDiario`
+    con cada escritura de pagos y genera los reportes leyendo solo el resumen.
+    """
+
+    @staticmethod
+    def dimensiones_pago(valores):
+        """Dimensiones del cierre de un Pago a partir de sus valores persistidos."""
+        return {
+            'fecha': timezone.localtime(valores['fecha_pago']).date(),
+            'origen': 'pago',
+            'tipo_pago': valores['tipo_pago'],
+            'metodo_pago': valores['metodo_pago'],
+            'institucion_financiera_id': valores['institucion_financiera_id'],
+            'evento_id': valores['evento_id'],
+        }
+
+    @staticmethod
+    def dimensiones_pago_cuota(valores):
+        """Dimensiones del cierre de un PagoCuota (el evento es el del plan de la cuota)."""
+        return {
+            'fecha': valores['fecha_pago'],
+            'origen': 'pago_cuota',
+            'tipo_pago': TIPO_PAGO_CUOTA,
+            'metodo_pago': valores['metodo_pago'],
+            'institucion_financiera_id': valores['institucion_financiera_id'],
+            'evento_id': valores['evento_id'],
+        }
+
+    @staticmethod
+    def valores_pago(pago):
+        return {
+            'fecha_pago': pago.fecha_pago,
+            'tipo_pago': pago.tipo_pago,
+            'metodo_pago': pago.metodo_pago,
+            'institucion_financiera_id': pago.institucion_financiera_id,
+            'evento_id': pago.evento_id,
+            'monto': pago.monto,
+        }
+
+    @staticmethod
+    def valores_pago_cuota(pago_cuota, evento_id=None):
+        if evento_id is None:
+            evento_id = Cuota.objects.filter(pk=pago_cuota.cuota_id).values_list(
+                'plan_pago__evento_id', flat=True
+            ).first()
+        return {
+            'fecha_pago': pago_cuota.fecha_pago,
+            'metodo_pago': pago_cuota.metodo_pago,
+            'institucion_financiera_id': pago_cuota.institucion_financiera_id,
+            'evento_id': evento_id,
+            'monto': pago_cuota.monto_pagado,
+        }
+
+    @classmethod
+    def aplicar_cambio(cls, origen, previo, actual):
+        """
+        Resta la contribución previa de un pago y suma la actual. `previo` es
+        None para pagos nuevos y `actual` es None para pagos eliminados.
+        """
+        dimensiones = cls.dimensiones_pago if origen == 'pago' else cls.dimensiones_pago_cuota
+        contribuciones = []
+        if previo is not None:
+            contribuciones.append((dimensiones(previo), -1, -previo['monto']))
+        if actual is not None:
+            contribuciones.append((dimensiones(actual), 1, actual['monto']))
+        cls.acumular(contribuciones)
+
+    @classmethod
+    def registrar_pagos(cls, pagos):
+        """Suma al cierre Pagos creados con bulk_create, que no disparan señales."""
+        cls.acumular([
+            (cls.dimensiones_pago(cls.valores_pago(pago)), 1, pago.monto) for pago in pagos
+        ])
+
+    @classmethod
+    def registrar_pagos_cuota(cls, pagos_cuota):
+        """
+        Suma al cierre PagoCuotas creados con bulk_create. El evento se toma de
+        `cuota.evento_id` cuando la cuota viene anotada con él.
+        """
+        cls.acumular([
+            (
+                cls.dimensiones_pago_cuota(
+                    cls.valores_pago_cuota(pago_cuota, evento_id=getattr(pago_cuota.cuota, 'evento_id', None))
+                ),
+                1,
+                pago_cuota.monto_pagado,
+            )
+            for pago_cuota in pagos_cuota
+        ])
+
+    @staticmethod
+    def _sumar(clave, numero, monto):
+        return CierreCajaDiario.objects.filter(clave=clave).update(
+            numero_pagos=F('numero_pagos') + numero,
+            monto_total=F('monto_total') + monto,
+            fecha_actualizacion=timezone.now(),
+        )
+
+    @classmethod
+    def acumular(cls, contribuciones):
+        """
+        Suma (dimensiones, número de pagos, monto) a las filas del cierre con
+        un UPDATE por combinación; crea la fila si aún no existe.
+        """
+        totales = defaultdict(lambda: [0, Decimal('0.00')])
+        filas = {}
+        for dimensiones, numero, monto in contribuciones:
+            clave = _clave(dimensiones)
+            filas[clave] = dimensiones
+            totales[clave][0] += numero
+            totales[clave][1] += monto
+
+        for clave, (numero, monto) in totales.items():
+            if not numero and not monto:
+                continue
+            if cls._sumar(clave, numero, monto):
+                continue
+            try:
+                with transaction.atomic():
+                    CierreCajaDiario.objects.create(
+                        clave=clave, numero_pagos=numero, monto_total=monto, **filas[clave]
+                    )
+            except IntegrityError:
+                # Otra transacción creó la fila entre el UPDATE y el INSERT
+                cls._sumar(clave, numero, monto)
+
+    @staticmethod
+    def reconstruir(desde, hasta):
+        """
+        Recalcula el cierre de un rango de fechas desde los pagos, con una
+        consulta agregada por tabla. Conviene ejecutarlo fuera del horario de
+        caja: los pagos registrados durante la reconstrucción pueden requerir
+        volver a ejecutarla.
+
+        Returns:
+            dict: Días, filas generadas y totales del rango
+        """
+        if desde > hasta:
+            raise ValidationError("La fecha inicial no puede ser posterior a la final")
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+
+        pagos = Pago.objects.filter(fecha_pago__gte=inicio, fecha_pago__lt=fin).annotate(
+            fecha=TruncDate('fecha_pago'),
+        ).values('fecha', 'tipo_pago', 'metodo_pago', 'institucion_financiera_id', 'evento_id').annotate(
+            numero=Count('id'), monto_total=Sum('monto'),
+        ).order_by()
+        pagos_cuota = PagoCuota.objects.filter(fecha_pago__range=(desde, hasta)).annotate(
+            evento_id=F('cuota__plan_pago__evento_id'),
+        ).values('fecha_pago', 'metodo_pago', 'institucion_financiera_id', 'evento_id').annotate(
+            numero=Count('id'), monto_total=Sum('monto_pagado'),
+        ).order_by()
+
+        filas = []
+        for fila in pagos:
+            dimensiones = {
+                'fecha': fila['fecha'],
+                'origen': 'pago',
+                'tipo_pago': fila['tipo_pago'],
+                'metodo_pago': fila['metodo_pago'],
+                'institucion_financiera_id': fila['institucion_financiera_id'],
+                'evento_id': fila['evento_id'],
+            }
+            filas.append((dimensiones, fila['numero'], fila['monto_total']))
+        for fila in pagos_cuota:
+            dimensiones = CierreCajaService.dimensiones_pago_cuota(fila)
+            filas.append((dimensiones, fila['numero'], fila['monto_total']))
+
+        with transaction.atomic():
+            CierreCajaDiario.objects.filter(fecha__range=(desde, hasta)).delete()
+            CierreCajaDiario.objects.bulk_create([
+                CierreCajaDiario(clave=_clave(dimensiones), numero_pagos=numero, monto_total=_monto(monto), **dimensiones)
+                for dimensiones, numero, monto in filas
+            ], batch_size=1000)
+
+        return {
+            'desde': desde,
+            'hasta': hasta,
+            'dias': (hasta - desde).days + 1,
+            'filas': len(filas),
+            'numero_pagos': sum(numero for _, numero, _ in filas),
+            'monto_total': _monto(sum((monto for _, _, monto in filas), Decimal('0.00'))),
+        }
+
+    @staticmethod
+    def reporte(desde, hasta, periodo='dia', agrupar_por=('metodo_pago',), evento_ids=None):
+        """
+        Reporte de caja por día, mes o año leído de la tabla de cierres, sin
+        recorrer los pagos.
+
+        Args:
+            desde: Fecha inicial (inclusive)
+            hasta: Fecha final (inclusive)
+            periodo: 'dia', 'mes' o 'anio'
+            agrupar_por: Dimensiones entre 'origen', 'tipo_pago', 'metodo_pago',
+                'institucion_financiera' y 'evento'
+            evento_ids: IDs de eventos a incluir (opcional, todos por defecto)
+
+        Returns:
+            dict: Filas por periodo y dimensiones con número de pagos y monto
+        """
+        if periodo not in PERIODOS:
+            raise ValidationError(f"Periodo no válido: {periodo}")
+        for dimension in agrupar_por:
+            if dimension not in DIMENSIONES:
+                raise ValidationError(f"Agrupación no válida: {dimension}")
+        if desde > hasta:
+            raise ValidationError("La fecha inicial no puede ser posterior a la final")
+
+        cierres = CierreCajaDiario.objects.filter(fecha__range=(desde, hasta))
+        if evento_ids is not None:
+            cierres = cierres.filter(evento_id__in=list(evento_ids))
+
+        campos = []
+        for dimension in agrupar_por:
+            for campo in dict.fromkeys(DIMENSIONES[dimension]):
+                campos.append(campo)
+        filas_bd = cierres.annotate(periodo=PERIODOS[periodo]).values('periodo', *campos).annotate(
+            pagos=Sum('numero_pagos'),
+            monto=Sum('monto_total', output_field=MONTO_FIELD),
+        ).filter(pagos__gt=0).order_by('periodo', *campos)
+
+        filas = []
+        totales = {'numero_pagos': 0, 'monto_total': Decimal('0.00')}
+        for fila_bd in filas_bd:
+            fila = {'periodo': fila_bd['periodo']}
+            for dimension in agrupar_por:
+                campo_clave, campo_nombre = DIMENSIONES[dimension]
+                fila[dimension] = fila_bd[campo_clave]
+                if campo_nombre != campo_clave:
+                    fila[f'{dimension}_nombre'] = fila_bd[campo_nombre]
+            fila['numero_pagos'] = fila_bd['pagos']
+            fila['monto_total'] = _monto(fila_bd['monto'])
+            totales['numero_pagos'] += fila['numero_pagos']
+            totales['monto_total'] += fila['monto_total']
+            filas.append(fila)
+
+        return {
+            'desde': desde,
+            'hasta': hasta,
+            'periodo': periodo,
+            'agrupar_por': list(agrupar_por),
+            'filas': filas,
+            'totales': totales,
+        }
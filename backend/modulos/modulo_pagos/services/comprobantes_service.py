@@ -0,0 +1,176 @@
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from modulos.modulo_certificados.services.comprobante_generator import (
+    generar_comprobante_bytes,
+    generar_comprobantes_lote,
+)
+from ..models import METODOS_PAGO, Pago, PagoCuota
+
+# Comprobantes máximos por lote
+MAXIMO_COMPROBANTES = 20000
+
+ORIGENES = ('todos', 'pago', 'pago_cuota')
+
+CAMPOS_PAGO = (
+    'id', 'fecha_pago', 'monto', 'tipo_pago', 'metodo_pago', 'numero_transaccion', 'codigo_comprobante',
+    'observaciones', 'estudiante__nombres', 'estudiante__apellidos', 'estudiante__cedula',
+    'evento__nombre', 'institucion_financiera__nombre', 'pago_convenio__entidad',
+)
+
+CAMPOS_PAGO_CUOTA = (
+    'id', 'fecha_pago', 'monto_pagado', 'metodo_pago', 'codigo_comprobante', 'observaciones',
+    'cuota__numero_cuota', 'cuota__plan_pago__numero_cuotas',
+    'cuota__plan_pago__estudiante__nombres', 'cuota__plan_pago__estudiante__apellidos',
+    'cuota__plan_pago__estudiante__cedula', 'cuota__plan_pago__evento__nombre',
+    'institucion_financiera__nombre',
+)
+
+TIPOS_PAGO = dict(Pago.TIPO_PAGO_CHOICES)
+
+
+def _plantilla():
+    ruta = os.path.join(settings.MEDIA_ROOT, 'plantillas', 'comprobante.png')
+    return ruta if os.path.exists(ruta) else None
+
+
+class ComprobantesService:
+    """
+    Servicio de comprobantes de pago: lee los datos de Pagos y PagoCuotas con
+    una consulta por tabla y delega el renderizado al generador de PDF, que
+    no accede a la base de datos y puede repartirse entre procesos.
+    """
+
+    @staticmethod
+    def datos_pagos(pagos, emitido):
+        comprobantes = []
+        for fila in pagos.values(*CAMPOS_PAGO).order_by('fecha_pago', 'id'):
+            concepto = TIPOS_PAGO.get(fila['tipo_pago'], fila['tipo_pago'])
+            if fila['pago_convenio__entidad']:
+                concepto = f"{concepto} (convenio {fila['pago_convenio__entidad']})"
+            comprobantes.append({
+                'numero': f"P-{fila['id']:06d}",
+                'fecha': timezone.localtime(fila['fecha_pago']).strftime('%d/%m/%Y %H:%M'),
+                'estudiante': f"{fila['estudiante__nombres']} {fila['estudiante__apellidos']}",
+                'cedula': fila['estudiante__cedula'],
+                'evento': fila['evento__nombre'],
+                'concepto': concepto,
+                'metodo_pago': METODOS_PAGO.get(fila['metodo_pago'], fila['metodo_pago']),
+                'institucion_financiera': fila['institucion_financiera__nombre'],
+                'referencia': fila['numero_transaccion'] or fila['codigo_comprobante'],
+                'observaciones': fila['observaciones'],
+                'monto': fila['monto'],
+                'emitido': emitido,
+            })
+        return comprobantes
+
+    @staticmethod
+    def datos_pagos_cuota(pagos_cuota, emitido):
+        comprobantes = []
+        for fila in pagos_cuota.values(*CAMPOS_PAGO_CUOTA).order_by('fecha_pago', 'id'):
+            comprobantes.append({
+                'numero': f"PC-{fila['id']:06d}",
+                'fecha': fila['fecha_pago'].strftime('%d/%m/%Y'),
+                'estudiante': (
+                    f"{fila['cuota__plan_pago__estudiante__nombres']} "
+                    f"{fila['cuota__plan_pago__estudiante__apellidos']}"
+                ),
+                'cedula': fila['cuota__plan_pago__estudiante__cedula'],
+                'evento': fila['cuota__plan_pago__evento__nombre'],
+                'concepto': (
+                    f"Cuota {fila['cuota__numero_cuota']} de {fila['cuota__plan_pago__numero_cuotas']}"
+                ),
+                'metodo_pago': METODOS_PAGO.get(fila['metodo_pago'], fila['metodo_pago']),
+                'institucion_financiera': fila['institucion_financiera__nombre'],
+                'referencia': fila['codigo_comprobante'],
+                'observaciones': fila['observaciones'],
+                'monto': fila['monto_pagado'],
+                'emitido': emitido,
+            })
+        return comprobantes
+
+    @staticmethod
+    def _emitido():
+        return timezone.localtime().strftime('%d/%m/%Y %H:%M')
+
+    @classmethod
+    def comprobante_pago(cls, pago):
+        """PDF del comprobante de un Pago."""
+        datos = cls.datos_pagos(Pago.objects.filter(pk=pago.pk), cls._emitido())
+        return generar_comprobante_bytes(datos[0], plantilla_path=_plantilla())
+
+    @classmethod
+    def comprobante_pago_cuota(cls, pago_cuota):
+        """PDF del comprobante de un PagoCuota."""
+        datos = cls.datos_pagos_cuota(PagoCuota.objects.filter(pk=pago_cuota.pk), cls._emitido())
+        return generar_comprobante_bytes(datos[0], plantilla_path=_plantilla())
+
+    @classmethod
+    def generar_lote(cls, desde=None, hasta=None, evento=None, origen='todos', formato='pdf', trabajadores=None):
+        """
+        Genera en un solo archivo los comprobantes de un rango de fechas y/o
+        un evento: primero los Pagos y luego los PagoCuotas, cada uno por fecha.
+
+        Args:
+            desde: Fecha inicial (inclusive, opcional)
+            hasta: Fecha final (inclusive, opcional)
+            evento: Evento de los pagos (opcional)
+            origen: 'todos', 'pago' o 'pago_cuota'
+            formato: 'pdf' (un documento de varias páginas) o 'zip' (un PDF por pago)
+            trabajadores: Procesos usados para renderizar (opcional)
+
+        Returns:
+            dict: Contenido del archivo, número de comprobantes y nombre sugerido
+        """
+        if origen not in ORIGENES:
+            raise ValidationError(f"Origen no válido: {origen}")
+        if formato not in ('pdf', 'zip'):
+            raise ValidationError(f"Formato no válido: {formato}")
+        if desde is None and hasta is None and evento is None:
+            raise ValidationError("Indique un rango de fechas o un evento")
+        if desde and hasta and desde > hasta:
+            raise ValidationError("La fecha inicial no puede ser posterior a la final")
+
+        pagos = Pago.objects.all()
+        pagos_cuota = PagoCuota.objects.all()
+        if desde:
+            pagos = pagos.filter(fecha_pago__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+            pagos_cuota = pagos_cuota.filter(fecha_pago__gte=desde)
+        if hasta:
+            pagos = pagos.filter(
+                fecha_pago__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+            )
+            pagos_cuota = pagos_cuota.filter(fecha_pago__lte=hasta)
+        if evento is not None:
+            pagos = pagos.filter(evento=evento)
+            pagos_cuota = pagos_cuota.filter(cuota__plan_pago__evento=evento)
+
+        emitido = cls._emitido()
+        comprobantes = []
+        if origen in ('todos', 'pago'):
+            comprobantes += cls.datos_pagos(pagos, emitido)
+        if origen in ('todos', 'pago_cuota'):
+            comprobantes += cls.datos_pagos_cuota(pagos_cuota, emitido)
+        if not comprobantes:
+            raise ValidationError("No hay pagos para los filtros indicados")
+        if len(comprobantes) > MAXIMO_COMPROBANTES:
+            raise ValidationError(
+                f"Demasiados comprobantes ({len(comprobantes)}). Límite {MAXIMO_COMPROBANTES}; reduzca el rango"
+            )
+
+        contenido = generar_comprobantes_lote(
+            comprobantes, formato=formato, trabajadores=trabajadores, plantilla_path=_plantilla()
+        )
+        partes = ['comprobantes']
+        if evento is not None:
+            partes.append(evento.codigo_evento)
+        partes += [str(fecha) for fecha in (desde, hasta) if fecha]
+        return {
+            'contenido': contenido,
+            'total': len(comprobantes),
+            'nombre_archivo': f"{'_'.join(partes)}.{formato}",
+        }
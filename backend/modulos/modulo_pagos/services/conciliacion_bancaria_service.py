@@ -0,0 +1,279 @@
+import csv
+import hashlib
+import io
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from ..models import ConciliacionBancaria, Cuota, LineaExtractoBancario, Pago, PagoCuota
+from .utils import leer_fecha, leer_monto
+
+# Encabezados aceptados para cada columna del extracto (en minúsculas)
+ALIAS_COLUMNAS = {
+    'fecha': ('fecha', 'fecha_transaccion', 'fecha transaccion', 'fecha valor', 'date'),
+    'referencia': ('referencia', 'comprobante', 'documento', 'numero_transaccion', 'reference'),
+    'monto': ('monto', 'valor', 'importe', 'credito', 'amount'),
+    'descripcion': ('descripcion', 'concepto', 'detalle', 'description'),
+}
+ESTADOS_REPORTE = ('conciliada', 'sin_coincidencia', 'ambigua', 'diferencia_monto')
+
+
+def normalizar_referencia(valor):
+    """Clave de comparación de una referencia bancaria: sin espacios, guiones ni ceros a la izquierda."""
+    return re.sub(r'[\s\-_.]', '', str(valor or '')).upper().lstrip('0')
+
+
+class ConciliacionBancariaService:
+    """
+    Servicio para conciliar extractos bancarios (CSV) contra las referencias
+    registradas en pagos, pagos de cuota y cuotas, con un índice en memoria
+    construido una sola vez para la ventana de fechas del extracto.
+    """
+
+    @staticmethod
+    def leer_extracto(archivo):
+        """
+        Lee un extracto CSV línea por línea sin cargarlo completo en memoria.
+
+        Args:
+            archivo: Archivo binario o de texto (p. ej. `request.FILES['archivo']`)
+
+        Yields:
+            tuple: (numero_linea, datos, error); `datos` es un dict con fecha,
+            referencia, monto y descripcion, o None si la línea no es válida
+        """
+        if isinstance(archivo, io.TextIOBase):
+            yield from ConciliacionBancariaService._leer_texto(archivo)
+            return
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        try:
+            yield from ConciliacionBancariaService._leer_texto(texto)
+        finally:
+            # No cerrar el archivo del llamador al descartar el envoltorio
+            texto.detach()
+
+    @staticmethod
+    def _leer_texto(texto):
+        encabezado = texto.readline()
+        delimitador = max(';,\t', key=encabezado.count)
+        columnas = [c.strip().lower() for c in next(csv.reader([encabezado], delimiter=delimitador), [])]
+
+        indices = {}
+        for campo, alias in ALIAS_COLUMNAS.items():
+            for posicion, nombre in enumerate(columnas):
+                if nombre in alias:
+                    indices[campo] = posicion
+                    break
+        faltantes = [campo for campo in ('fecha', 'referencia', 'monto') if campo not in indices]
+        if faltantes:
+            raise ValidationError(f"El extracto no tiene las columnas: {', '.join(faltantes)}")
+
+        for numero_linea, fila in enumerate(csv.reader(texto, delimiter=delimitador), start=2):
+            if not any(celda.strip() for celda in fila):
+                continue
+            try:
+                valores = {campo: fila[posicion].strip() for campo, posicion in indices.items()}
+                yield numero_linea, {
+                    'fecha': leer_fecha(valores['fecha']),
+                    'referencia': valores['referencia'][:100],
+                    'monto': leer_monto(valores['monto']),
+                    'descripcion': valores.get('descripcion', '')[:255],
+                }, None
+            except (IndexError, ValueError, InvalidOperation) as e:
+                yield numero_linea, None, str(e) or "Línea incompleta"
+
+    @staticmethod
+    def indice_referencias(institucion_financiera, fecha_desde, fecha_hasta):
+        """
+        Construye el índice {referencia normalizada: [candidatos]} de los
+        registros aún no conciliados de la ventana, con una consulta por tabla.
+        Los registros sin institución financiera también son candidatos.
+
+        Returns:
+            dict: Candidatos como tuplas (tipo, id, monto)
+        """
+        de_institucion = Q(institucion_financiera=institucion_financiera) | Q(institucion_financiera__isnull=True)
+        indice = defaultdict(list)
+
+        for pago_id, referencia, monto in Pago.objects.filter(
+            de_institucion,
+            numero_transaccion__isnull=False,
+            fecha_pago__date__range=(fecha_desde, fecha_hasta),
+        ).exclude(lineas_extracto__estado='conciliada').values_list('id', 'numero_transaccion', 'monto'):
+            indice[normalizar_referencia(referencia)].append(('pago', pago_id, monto))
+
+        cuotas_con_pago = defaultdict(set)
+        for pago_id, referencia, monto, cuota_id in PagoCuota.objects.filter(
+            de_institucion,
+            codigo_comprobante__isnull=False,
+            fecha_pago__range=(fecha_desde, fecha_hasta),
+        ).exclude(lineas_extracto__estado='conciliada').values_list(
+            'id', 'codigo_comprobante', 'monto_pagado', 'cuota_id'
+        ):
+            clave = normalizar_referencia(referencia)
+            indice[clave].append(('pago_cuota', pago_id, monto))
+            cuotas_con_pago[clave].add(cuota_id)
+
+        for cuota_id, referencia, monto in Cuota.objects.filter(
+            de_institucion,
+            codigo_comprobante__isnull=False,
+            fecha_pago__range=(fecha_desde, fecha_hasta),
+        ).exclude(lineas_extracto__estado='conciliada').values_list('id', 'codigo_comprobante', 'monto_pagado'):
+            clave = normalizar_referencia(referencia)
+            # El comprobante copiado en la cuota y en su PagoCuota es un mismo pago
+            if cuota_id not in cuotas_con_pago[clave]:
+                indice[clave].append(('cuota', cuota_id, monto))
+
+        indice.pop('', None)
+        return indice
+
+    @classmethod
+    def conciliar_extracto(cls, institucion_financiera, archivo, nombre_archivo='', fecha_desde=None,
+                           fecha_hasta=None, tolerancia_dias=3, simular=False):
+        """
+        Concilia un extracto bancario en una sola pasada: una línea concilia si
+        su referencia coincide con un único registro no conciliado y el monto
+        es igual. Las líneas se guardan en bloque con su estado; las líneas ya
+        importadas antes se omiten.
+
+        Args:
+            institucion_financiera: Institución que emite el extracto
+            archivo: Archivo CSV (ver `leer_extracto`)
+            nombre_archivo: Nombre del archivo para el registro
+            fecha_desde: Inicio de la ventana (opcional, primera fecha del extracto)
+            fecha_hasta: Fin de la ventana (opcional, última fecha del extracto)
+            tolerancia_dias: Días de holgura entre la fecha del banco y la del registro
+            simular: Si es True solo devuelve el reporte
+
+        Returns:
+            dict: Resumen y detalle de conciliadas, sin coincidencia, ambiguas
+            y con diferencia de monto
+        """
+        lineas = []
+        errores = []
+        omitidas = 0
+        for numero_linea, datos, error in cls.leer_extracto(archivo):
+            if error:
+                errores.append({'numero_linea': numero_linea, 'motivo': error})
+            elif datos['monto'] <= 0:
+                # Débitos y líneas informativas no corresponden a pagos recibidos
+                omitidas += 1
+            elif (fecha_desde and datos['fecha'] < fecha_desde) or (fecha_hasta and datos['fecha'] > fecha_hasta):
+                omitidas += 1
+            else:
+                datos['numero_linea'] = numero_linea
+                datos['clave'] = normalizar_referencia(datos['referencia'])
+                lineas.append(datos)
+
+        if not lineas and not simular:
+            raise ValidationError("El extracto no contiene líneas de abono válidas")
+
+        fecha_desde = fecha_desde or min((l['fecha'] for l in lineas), default=None)
+        fecha_hasta = fecha_hasta or max((l['fecha'] for l in lineas), default=None)
+        reporte = {
+            'conciliacion_id': None,
+            'simulacion': simular,
+            'institucion_financiera_id': institucion_financiera.pk,
+            'fecha_desde': fecha_desde,
+            'fecha_hasta': fecha_hasta,
+            'resumen': {},
+            'errores': errores,
+        }
+        reporte.update({estado: [] for estado in ESTADOS_REPORTE})
+
+        # Huella por contenido; las líneas idénticas de un mismo extracto se numeran
+        repeticiones = Counter()
+        for linea in lineas:
+            contenido = f"{linea['fecha']}|{linea['clave']}|{linea['monto']}"
+            repeticiones[contenido] += 1
+            linea['huella'] = hashlib.sha256(
+                f"{contenido}|{repeticiones[contenido]}".encode('utf-8')
+            ).hexdigest()
+
+        indice = {}
+        importadas = set()
+        if lineas:
+            holgura = timedelta(days=tolerancia_dias)
+            indice = cls.indice_referencias(institucion_financiera, fecha_desde - holgura, fecha_hasta + holgura)
+            importadas = set(LineaExtractoBancario.objects.filter(
+                institucion_financiera=institucion_financiera,
+                fecha__range=(fecha_desde, fecha_hasta),
+            ).values_list('huella', flat=True))
+
+        nuevas = [linea for linea in lineas if linea['huella'] not in importadas]
+        lineas_por_clave = Counter(linea['clave'] for linea in nuevas)
+        registros = []
+        for linea in nuevas:
+            candidatos = indice.get(linea['clave'], []) if linea['clave'] else []
+            detalle = {
+                'numero_linea': linea['numero_linea'],
+                'fecha': linea['fecha'],
+                'referencia': linea['referencia'],
+                'monto': linea['monto'],
+            }
+            enlace = {}
+            if not candidatos:
+                estado = 'sin_coincidencia'
+            elif len(candidatos) > 1 or lineas_por_clave[linea['clave']] > 1:
+                estado = 'ambigua'
+                detalle['candidatos'] = [
+                    {'tipo': tipo, 'registro_id': registro_id, 'monto': monto}
+                    for tipo, registro_id, monto in candidatos
+                ]
+            else:
+                tipo, registro_id, monto = candidatos[0]
+                estado = 'conciliada' if monto == linea['monto'] else 'diferencia_monto'
+                detalle.update({'tipo': tipo, 'registro_id': registro_id, 'monto_registrado': monto})
+                enlace = {f'{tipo}_id': registro_id}
+            reporte[estado].append(detalle)
+            registros.append(LineaExtractoBancario(
+                institucion_financiera=institucion_financiera,
+                numero_linea=linea['numero_linea'],
+                fecha=linea['fecha'],
+                referencia=linea['referencia'],
+                monto=linea['monto'],
+                descripcion=linea['descripcion'],
+                huella=linea['huella'],
+                estado=estado,
+                **enlace,
+            ))
+
+        resumen = {estado: len(reporte[estado]) for estado in ESTADOS_REPORTE}
+        resumen.update({
+            'total_lineas': len(lineas),
+            'duplicadas': len(lineas) - len(nuevas),
+            'omitidas': omitidas,
+            'errores': len(errores),
+        })
+        reporte['resumen'] = resumen
+
+        if simular:
+            return reporte
+
+        try:
+            with transaction.atomic():
+                conciliacion = ConciliacionBancaria.objects.create(
+                    institucion_financiera=institucion_financiera,
+                    archivo_nombre=nombre_archivo[:255],
+                    fecha_desde=fecha_desde,
+                    fecha_hasta=fecha_hasta,
+                    total_lineas=resumen['total_lineas'],
+                    conciliadas=resumen['conciliada'],
+                    sin_coincidencia=resumen['sin_coincidencia'],
+                    ambiguas=resumen['ambigua'],
+                    diferencia_monto=resumen['diferencia_monto'],
+                    duplicadas=resumen['duplicadas'],
+                )
+                for registro in registros:
+                    registro.conciliacion = conciliacion
+                LineaExtractoBancario.objects.bulk_create(registros, batch_size=1000)
+        except IntegrityError:
+            raise ValidationError("El extracto se está importando en otro proceso; intente nuevamente")
+
+        reporte['conciliacion_id'] = conciliacion.pk
+        return reporte
@@ -0,0 +1,257 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Cuota, MovimientoPlanPago, Pago, PagoConvenio, PagoCuotaAplicada, PlanPago
+from .cartera_service import CarteraService
+from .cierre_caja_service import CierreCajaService
+from .diario_pagos_service import DiarioPagosService
+from .sistema_pagos_service import SistemaPagosService
+
+
+def _decimal(valor):
+    try:
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError(f"Monto inválido: {valor}")
+
+
+class ConveniosService:
+    """
+    Servicio para repartir la transferencia de una institución aliada entre
+    la colegiatura de varios estudiantes de un evento.
+    """
+
+    @classmethod
+    def registrar_pago_convenio(cls, evento, monto_total, regla, entidad, metodo_pago='transferencia',
+                                estudiante_ids=None, distribucion=None, institucion_financiera=None,
+                                numero_transaccion=None, codigo_comprobante=None, observaciones='',
+                                simular=False):
+        """
+        Reparte un monto único entre los planes de pago de un evento y registra
+        en una sola transacción, con operaciones en bloque, un Pago por
+        estudiante, sus PagoCuotaAplicada y los cambios de las cuotas.
+
+        Args:
+            evento: Instancia de Evento
+            monto_total: Monto de la transferencia
+            regla: 'partes_iguales', 'vencimiento_mas_antiguo' o 'tabla'
+            entidad: Nombre de la institución que paga
+            metodo_pago: Método de pago de los pagos generados
+            estudiante_ids: IDs de estudiantes cubiertos (opcional, todos los del
+                evento por defecto; se ignora con la regla 'tabla')
+            distribucion: {estudiante_id: monto} para la regla 'tabla'
+            institucion_financiera: Institución financiera de la transferencia (opcional)
+            numero_transaccion: Número de transacción (opcional)
+            codigo_comprobante: Código de comprobante (opcional)
+            observaciones: Observaciones adicionales
+            simular: Si es True calcula el reparto sin registrar nada
+
+        Returns:
+            dict: Reporte del reparto por estudiante y cuota
+        """
+        monto_total = _decimal(monto_total)
+        if monto_total <= 0:
+            raise ValidationError("El monto total debe ser mayor a cero")
+        if regla not in dict(PagoConvenio.REGLA_CHOICES):
+            raise ValidationError(f"Regla de distribución no válida: {regla}")
+
+        if regla == 'tabla':
+            if not distribucion:
+                raise ValidationError("La regla 'tabla' requiere la distribución por estudiante")
+            distribucion = {int(eid): _decimal(monto) for eid, monto in distribucion.items()}
+            if any(monto <= 0 for monto in distribucion.values()):
+                raise ValidationError("Los montos de la distribución deben ser mayores a cero")
+            if sum(distribucion.values()) > monto_total:
+                raise ValidationError("La distribución excede el monto total de la transferencia")
+            estudiante_ids = list(distribucion)
+        elif estudiante_ids is not None:
+            estudiante_ids = list(dict.fromkeys(int(eid) for eid in estudiante_ids))
+
+        with transaction.atomic():
+            # Bloquear los planes en orden de pk, igual que la aplicación de pagos
+            planes = PlanPago.objects.select_for_update().filter(evento=evento)
+            if estudiante_ids is not None:
+                planes = planes.filter(estudiante_id__in=estudiante_ids)
+            planes = {
+                plan.estudiante_id: plan
+                for plan in planes.only('id', 'estudiante_id').order_by('pk')
+            }
+
+            cuotas_por_plan = defaultdict(list)
+            cuotas_ordenadas = list(
+                Cuota.objects.filter(
+                    plan_pago__in=list(planes.values()),
+                    estado__in=['pendiente', 'atrasado'],
+                    monto_pagado__lt=F('monto'),
+                ).order_by('fecha_vencimiento', 'plan_pago_id', 'numero_cuota')
+            )
+            for cuota in cuotas_ordenadas:
+                cuotas_por_plan[cuota.plan_pago_id].append(cuota)
+            for cuotas in cuotas_por_plan.values():
+                cuotas.sort(key=lambda cuota: cuota.numero_cuota)
+
+            pendiente = {
+                eid: sum((c.monto - c.monto_pagado for c in cuotas_por_plan[plan.pk]), Decimal('0.00'))
+                for eid, plan in planes.items()
+            }
+            asignacion = cls._calcular_asignacion(
+                regla, monto_total, pendiente, planes, cuotas_ordenadas, distribucion
+            )
+
+            omitidos = [
+                {'estudiante_id': eid, 'motivo': 'sin_plan'}
+                for eid in (estudiante_ids or []) if eid not in planes
+            ]
+            omitidos += [
+                {'estudiante_id': eid, 'motivo': 'sin_saldo_pendiente' if not pendiente[eid] else 'sin_asignacion'}
+                for eid in planes if not asignacion.get(eid)
+            ]
+            asignados = [eid for eid in planes if asignacion.get(eid)]
+            monto_aplicado = sum((asignacion[eid] for eid in asignados), Decimal('0.00'))
+
+            reporte = {
+                'pago_convenio_id': None,
+                'simulacion': simular,
+                'regla': regla,
+                'entidad': entidad,
+                'evento_id': evento.pk,
+                'monto_total': monto_total,
+                'monto_aplicado': monto_aplicado,
+                'monto_no_aplicado': monto_total - monto_aplicado,
+                'estudiantes': [],
+                'omitidos': omitidos,
+            }
+
+            convenio = None
+            if not simular:
+                try:
+                    with transaction.atomic():
+                        convenio = PagoConvenio.objects.create(
+                            entidad=entidad,
+                            evento=evento,
+                            monto_total=monto_total,
+                            monto_aplicado=monto_aplicado,
+                            regla=regla,
+                            metodo_pago=metodo_pago,
+                            institucion_financiera=institucion_financiera,
+                            numero_transaccion=numero_transaccion,
+                            codigo_comprobante=codigo_comprobante,
+                            observaciones=observaciones,
+                        )
+                except IntegrityError:
+                    raise ValidationError("Esta transferencia de convenio ya fue registrada")
+                reporte['pago_convenio_id'] = convenio.pk
+
+            pagos = [
+                Pago(
+                    estudiante_id=eid,
+                    evento=evento,
+                    tipo_pago='colegiatura_total' if asignacion[eid] >= pendiente[eid] else 'colegiatura_parcial',
+                    monto=asignacion[eid],
+                    metodo_pago=metodo_pago,
+                    pago_convenio=convenio,
+                    observaciones=f"Convenio {entidad}",
+                )
+                for eid in asignados
+            ]
+            if convenio is not None and pagos:
+                # bulk_create no dispara Pago.save: la aplicación se hace en bloque abajo
+                pagos = Pago.objects.bulk_create(pagos)
+                # Algunos backends (MySQL) no devuelven PKs en bulk_create
+                if any(pago.pk is None for pago in pagos):
+                    pagos = list(Pago.objects.filter(pago_convenio=convenio))
+                CierreCajaService.registrar_pagos(pagos)
+
+            fecha_pago = timezone.localdate()
+            aplicaciones = []
+            modificadas = []
+            movimientos = []
+            for pago in pagos:
+                plan = planes[pago.estudiante_id]
+                aplicaciones_pago, modificadas_pago, cambios = pago.repartir_en_cuotas(
+                    cuotas_por_plan[plan.pk], pago.monto, fecha_pago=fecha_pago
+                )
+                aplicaciones += aplicaciones_pago
+                modificadas += modificadas_pago
+                movimientos += DiarioPagosService.movimientos_por_cambios(cambios, pago=pago)
+                reporte['estudiantes'].append({
+                    'estudiante_id': pago.estudiante_id,
+                    'plan_pago_id': plan.pk,
+                    'pago_id': pago.pk,
+                    'saldo_pendiente_previo': pendiente[pago.estudiante_id],
+                    'monto_asignado': pago.monto,
+                    'cuotas': [
+                        {
+                            'cuota_id': aplicacion.cuota.pk,
+                            'numero_cuota': aplicacion.cuota.numero_cuota,
+                            'monto_aplicado': aplicacion.monto_aplicado,
+                            'estado': aplicacion.cuota.estado,
+                        }
+                        for aplicacion in aplicaciones_pago
+                    ],
+                })
+
+            if convenio is not None and aplicaciones:
+                PagoCuotaAplicada.objects.bulk_create(aplicaciones, batch_size=1000)
+                Cuota.objects.bulk_update(modificadas, Cuota.CAMPOS_APLICACION_PAGO, batch_size=500)
+                MovimientoPlanPago.objects.bulk_create(movimientos, batch_size=1000)
+                # bulk_update no dispara señales: saldos y estados de pago en bloque
+                plan_ids = [planes[eid].pk for eid in asignados]
+                SistemaPagosService.recalcular_saldos(plan_ids=plan_ids)
+                CarteraService.invalidar_cache_al_confirmar()
+                SistemaPagosService.marcar_estado_pagos_pendiente(planes=plan_ids)
+
+        return reporte
+
+    @classmethod
+    def _calcular_asignacion(cls, regla, monto_total, pendiente, planes, cuotas_ordenadas, distribucion):
+        """
+        Calcula el monto asignado a cada estudiante según la regla, sin superar
+        su saldo pendiente.
+
+        Returns:
+            dict: {estudiante_id: monto}
+        """
+        if regla == 'tabla':
+            for eid, monto in distribucion.items():
+                if eid in planes and monto > pendiente[eid]:
+                    raise ValidationError(
+                        f"El monto para el estudiante {eid} (${monto}) excede su saldo pendiente (${pendiente[eid]})"
+                    )
+            return {eid: monto for eid, monto in distribucion.items() if eid in planes}
+
+        if regla == 'vencimiento_mas_antiguo':
+            estudiante_por_plan = {plan.pk: eid for eid, plan in planes.items()}
+            asignacion = defaultdict(lambda: Decimal('0.00'))
+            restante = monto_total
+            for cuota in cuotas_ordenadas:
+                if restante <= 0:
+                    break
+                monto = min(restante, cuota.monto - cuota.monto_pagado)
+                asignacion[estudiante_por_plan[cuota.plan_pago_id]] += monto
+                restante -= monto
+            return dict(asignacion)
+
+        # Partes iguales: lo que un estudiante no puede absorber se reparte
+        # entre los que aún tienen saldo, con el mismo redondeo de las cuotas
+        asignacion = {eid: Decimal('0.00') for eid in planes}
+        restante = monto_total
+        con_saldo = sorted(eid for eid in planes if pendiente[eid] > 0)
+        while restante > 0 and con_saldo:
+            partes = PlanPago.prorratear_monto(restante, len(con_saldo))
+            siguiente = []
+            for eid, parte in zip(con_saldo, partes):
+                monto = min(parte, pendiente[eid] - asignacion[eid])
+                asignacion[eid] += monto
+                restante -= monto
+                if asignacion[eid] < pendiente[eid]:
+                    siguiente.append(eid)
+            if len(siguiente) == len(con_saldo):
+                break
+            con_saldo = siguiente
+        return asignacion
@@ -0,0 +1,419 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from ..models import Cuota, MovimientoPlanPago, PlanPago
+from .cartera_service import CarteraService
+from .sistema_pagos_service import MONTO_FIELD, SistemaPagosService, _monto
+
+# Desplazamiento temporal de `numero_cuota` al renumerar cuotas de un plan,
+# para no violar la restricción única (plan_pago, numero_cuota) a mitad del UPDATE
+DESPLAZAMIENTO_NUMERACION = 1000
+
+CAMPOS_CRONOGRAMA = ['numero_cuota', 'monto', 'fecha_vencimiento', 'estado', 'fecha_modificacion']
+
+
+class CronogramasService:
+    """
+    Servicio para recalcular en bloque los cronogramas de cuotas de muchos
+    planes: todos los de un evento cuando cambian su costo de colegiatura o
+    su fecha de inicio, o un grupo de planes reestructurados con los mismos
+    parámetros. Las cuotas pagadas no se modifican.
+    """
+
+    @staticmethod
+    def calcular_cronograma(plan, cuotas, monto_colegiatura, numero_cuotas, hoy, fecha_inicio=None):
+        """
+        Calcula en memoria el nuevo cronograma de las cuotas pendientes de un
+        plan: el monto restante se prorratea entre las cuotas que faltan. Con
+        `fecha_inicio` los vencimientos siguen el calendario mensual del evento
+        según el número de cuota; sin ella, el calendario mensual empieza hoy
+        (como `PlanPago.regenerar_cuotas_pendientes`).
+
+        Las cuotas pendientes existentes se reutilizan en orden (conservan sus
+        abonos parciales); las sobrantes se eliminan y las faltantes se crean.
+
+        Args:
+            plan: PlanPago
+            cuotas: Todas las cuotas del plan
+            monto_colegiatura: Monto de colegiatura a aplicar al plan
+            numero_cuotas: Número total de cuotas del plan
+            hoy: Fecha de corte para el estado pendiente/atrasado
+            fecha_inicio: Fecha de inicio del evento (opcional)
+
+        Returns:
+            dict: Cuotas a actualizar, crear y eliminar, el detalle de los
+            cambios y el motivo si el plan no puede recalcularse
+        """
+        pagadas = [c for c in cuotas if c.estado == 'pagado']
+        pendientes = sorted(
+            (c for c in cuotas if c.estado in ('pendiente', 'atrasado')), key=lambda c: c.numero_cuota
+        )
+        ocupados = {c.numero_cuota for c in cuotas if c.estado not in ('pendiente', 'atrasado')}
+
+        restante = monto_colegiatura - sum((c.monto for c in pagadas), Decimal('0.00'))
+        faltantes = max(numero_cuotas - len(pagadas), 0)
+        montos = PlanPago.prorratear_monto(restante, faltantes) if restante > 0 else []
+
+        numeros = []
+        numero = 0
+        while len(numeros) < len(montos):
+            numero += 1
+            if numero not in ocupados:
+                numeros.append(numero)
+
+        resultado = {'actualizar': [], 'crear': [], 'eliminar': [], 'cambios': [], 'motivo': None}
+        for posicion, (numero, monto) in enumerate(zip(numeros, montos)):
+            if fecha_inicio is not None:
+                fecha = fecha_inicio + timedelta(days=30 * (numero - 1))
+            else:
+                fecha = hoy + timedelta(days=30 * posicion)
+            estado = 'atrasado' if fecha < hoy else 'pendiente'
+            if posicion >= len(pendientes):
+                resultado['crear'].append(Cuota(
+                    plan_pago=plan, numero_cuota=numero, monto=monto, fecha_vencimiento=fecha, estado=estado,
+                ))
+                resultado['cambios'].append({
+                    'accion': 'crear', 'numero_cuota': numero, 'monto': monto, 'fecha_vencimiento': fecha,
+                })
+                continue
+
+            cuota = pendientes[posicion]
+            if cuota.monto_pagado > monto:
+                resultado['motivo'] = 'abono_parcial_excede_cuota'
+                return resultado
+            previo = (cuota.numero_cuota, cuota.monto, cuota.fecha_vencimiento, cuota.estado)
+            if previo == (numero, monto, fecha, estado):
+                continue
+            resultado['cambios'].append({
+                'accion': 'actualizar',
+                'cuota_id': cuota.pk,
+                'numero_cuota': numero,
+                'numero_anterior': cuota.numero_cuota,
+                'monto': monto,
+                'monto_anterior': cuota.monto,
+                'fecha_vencimiento': fecha,
+                'fecha_anterior': cuota.fecha_vencimiento,
+            })
+            cuota.numero_cuota, cuota.monto, cuota.fecha_vencimiento, cuota.estado = numero, monto, fecha, estado
+            resultado['actualizar'].append(cuota)
+
+        for cuota in pendientes[len(montos):]:
+            if cuota.monto_pagado:
+                resultado['motivo'] = 'abono_parcial_en_cuota_eliminada'
+                return resultado
+            resultado['eliminar'].append(cuota)
+            resultado['cambios'].append({
+                'accion': 'eliminar',
+                'cuota_id': cuota.pk,
+                'numero_cuota': cuota.numero_cuota,
+                'monto': cuota.monto,
+                'fecha_vencimiento': cuota.fecha_vencimiento,
+            })
+        return resultado
+
+    @classmethod
+    def recalcular_evento(cls, evento, actualizar_monto=True, simular=False, tamano_lote=200):
+        """
+        Recalcula los cronogramas de todos los planes activos de un evento con
+        operaciones en bloque (DELETE, bulk_create y bulk_update), en una
+        transacción por lote de planes.
+
+        Args:
+            evento: Evento cuyo costo o fecha de inicio cambió
+            actualizar_monto: Si es True, los planes sin convenio toman el
+                costo de colegiatura actual del evento; los planes con monto
+                personalizado se omiten
+            simular: Si es True solo devuelve las diferencias
+            tamano_lote: Número de planes por transacción
+
+        Returns:
+            dict: Totales y diferencias por plan
+        """
+        def objetivo(plan):
+            monto = plan.monto_colegiatura
+            if actualizar_monto and not plan.tiene_convenio:
+                monto = evento.costo_colegiatura
+            return {'monto_colegiatura': monto, 'numero_cuotas': plan.numero_cuotas}, evento.fecha_inicio
+
+        planes = PlanPago.objects.filter(evento=evento, activo=True)
+        personalizados = []
+        if actualizar_monto:
+            # Montos fijados a mano (p. ej. desde la matrícula): no se reemplazan por el costo del evento
+            personalizados = list(planes.filter(usa_monto_personalizado=True).values_list('id', flat=True))
+            planes = planes.filter(usa_monto_personalizado=False)
+        plan_ids = planes.values_list('id', flat=True)
+        resultados = cls._aplicar_por_lotes(plan_ids, objetivo, simular, tamano_lote)
+
+        modificados = [r for r in resultados if r['estado'] == 'modificado']
+        return {
+            'evento_id': evento.pk,
+            'simulacion': simular,
+            'fecha_inicio': evento.fecha_inicio,
+            'costo_colegiatura': evento.costo_colegiatura,
+            'planes_revisados': len(resultados) + len(personalizados),
+            'planes_modificados': len(modificados),
+            **cls._totales_cuotas(modificados),
+            'planes': [
+                {
+                    'plan_pago_id': r['plan_pago_id'],
+                    'estudiante_id': r['estudiante_id'],
+                    'monto_colegiatura_anterior': r['monto_colegiatura_anterior'],
+                    'monto_colegiatura': r['monto_colegiatura'],
+                    'cuotas': r['cuotas'],
+                }
+                for r in modificados
+            ],
+            'omitidos': [
+                {'plan_pago_id': plan_id, 'motivo': 'monto_personalizado'} for plan_id in personalizados
+            ] + [
+                {'plan_pago_id': r['plan_pago_id'], 'motivo': r['motivo']}
+                for r in resultados if r['estado'] == 'omitido'
+            ],
+        }
+
+    @classmethod
+    def reestructurar_planes(cls, plan_ids=None, evento=None, estado_general=None, nuevo_numero_cuotas=None,
+                             nuevo_monto_colegiatura=None, motivo_reestructuracion=None, simular=False,
+                             tamano_lote=200):
+        """
+        Versión en bloque de `PlanPago.reestructurar_plan`: aplica el mismo
+        número de cuotas y/o monto de colegiatura a muchos planes. Todos los
+        planes se validan primero con una consulta agrupada; los válidos se
+        reestructuran con escrituras en bloque por lotes y sus cuotas
+        pendientes se regeneran con calendario mensual desde hoy.
+
+        Args:
+            plan_ids: IDs de planes (opcional si se indica `evento`)
+            evento: Evento cuyos planes activos se reestructuran (opcional)
+            estado_general: Filtra los planes del evento por estado general (opcional)
+            nuevo_numero_cuotas: Nuevo número de cuotas (1-60)
+            nuevo_monto_colegiatura: Nuevo monto total de colegiatura
+            motivo_reestructuracion: Motivo agregado al convenio de cada plan
+            simular: Si es True solo valida y devuelve las diferencias
+            tamano_lote: Número de planes por transacción
+
+        Returns:
+            dict: Totales y resultado por plan (reestructurado, sin_cambios o
+            rechazado con su motivo)
+        """
+        if plan_ids is None and evento is None:
+            raise ValidationError("Indique los planes o el evento a reestructurar")
+        if not nuevo_numero_cuotas and not nuevo_monto_colegiatura:
+            raise ValidationError("Indique el nuevo número de cuotas o el nuevo monto de colegiatura")
+        if nuevo_numero_cuotas and not 1 <= nuevo_numero_cuotas <= 60:
+            raise ValidationError("El número de cuotas debe estar entre 1 y 60")
+        if nuevo_monto_colegiatura is not None:
+            nuevo_monto_colegiatura = Decimal(str(nuevo_monto_colegiatura)).quantize(Decimal('0.01'))
+            if nuevo_monto_colegiatura <= 0:
+                raise ValidationError("El monto de colegiatura debe ser mayor a 0")
+
+        planes = PlanPago.objects.all()
+        if plan_ids is not None:
+            plan_ids = list(dict.fromkeys(int(pk) for pk in plan_ids))
+            planes = planes.filter(pk__in=plan_ids)
+        if evento is not None:
+            planes = planes.filter(evento=evento, activo=True)
+        if estado_general:
+            planes = planes.filter(estado_general=estado_general)
+
+        # Validación previa de todos los planes con una sola consulta agrupada
+        filas = planes.annotate(
+            pagadas=Count('cuotas', filter=Q(cuotas__estado='pagado')),
+            monto_pagadas=Sum('cuotas__monto', filter=Q(cuotas__estado='pagado'), output_field=MONTO_FIELD),
+        ).values_list('id', 'activo', 'pagadas', 'monto_pagadas').order_by('id')
+        rechazados = {}
+        validos = []
+        encontrados = set()
+        for plan_id, activo, pagadas, monto_pagadas in filas:
+            encontrados.add(plan_id)
+            if not activo:
+                rechazados[plan_id] = 'plan_inactivo'
+            elif nuevo_numero_cuotas and nuevo_numero_cuotas < pagadas:
+                rechazados[plan_id] = 'numero_cuotas_menor_a_pagadas'
+            elif nuevo_monto_colegiatura and nuevo_monto_colegiatura < _monto(monto_pagadas):
+                rechazados[plan_id] = 'monto_menor_a_pagado'
+            else:
+                validos.append(plan_id)
+        for plan_id in plan_ids or []:
+            if plan_id not in encontrados:
+                rechazados[plan_id] = 'no_encontrado'
+
+        def objetivo(plan):
+            campos = {
+                'monto_colegiatura': nuevo_monto_colegiatura or plan.monto_colegiatura,
+                'numero_cuotas': nuevo_numero_cuotas or plan.numero_cuotas,
+            }
+            if motivo_reestructuracion:
+                nota = f"Reestructuración: {motivo_reestructuracion}"
+                campos['motivo_convenio'] = f"{plan.motivo_convenio}\n\n{nota}" if plan.motivo_convenio else nota
+                campos['tiene_convenio'] = True
+            return campos, None
+
+        resultados = cls._aplicar_por_lotes(validos, objetivo, simular, tamano_lote)
+        for resultado in resultados:
+            if resultado['estado'] == 'omitido':
+                resultado['estado'] = 'rechazado'
+            elif resultado['estado'] == 'modificado':
+                resultado['estado'] = 'reestructurado'
+            cambios = []
+            if resultado['numero_cuotas'] != resultado['numero_cuotas_anterior']:
+                cambios.append(f"Número de cuotas: {resultado['numero_cuotas']}")
+            if resultado['monto_colegiatura'] != resultado['monto_colegiatura_anterior']:
+                cambios.append(f"Monto colegiatura: ${resultado['monto_colegiatura']}")
+            resultado['cambios_realizados'] = cambios
+        resultados += [
+            {'plan_pago_id': plan_id, 'estado': 'rechazado', 'motivo': motivo}
+            for plan_id, motivo in sorted(rechazados.items())
+        ]
+
+        conteo = {'reestructurado': 0, 'sin_cambios': 0, 'rechazado': 0}
+        for resultado in resultados:
+            conteo[resultado['estado']] += 1
+        return {
+            'simulacion': simular,
+            'nuevo_numero_cuotas': nuevo_numero_cuotas,
+            'nuevo_monto_colegiatura': nuevo_monto_colegiatura,
+            'total_planes': len(resultados),
+            'reestructurados': conteo['reestructurado'],
+            'sin_cambios': conteo['sin_cambios'],
+            'rechazados': conteo['rechazado'],
+            **cls._totales_cuotas([r for r in resultados if r['estado'] == 'reestructurado']),
+            'resultados': resultados,
+        }
+
+    @staticmethod
+    def _totales_cuotas(resultados):
+        totales = {'cuotas_actualizadas': 0, 'cuotas_creadas': 0, 'cuotas_eliminadas': 0}
+        claves = {'actualizar': 'cuotas_actualizadas', 'crear': 'cuotas_creadas', 'eliminar': 'cuotas_eliminadas'}
+        for resultado in resultados:
+            for cambio in resultado['cuotas']:
+                totales[claves[cambio['accion']]] += 1
+        return totales
+
+    @classmethod
+    def _aplicar_por_lotes(cls, plan_ids, objetivo, simular, tamano_lote):
+        """
+        Aplica `objetivo` a los planes en lotes de `tamano_lote`, cada lote en
+        su propia transacción (o sin escribir si `simular`).
+
+        Args:
+            plan_ids: IDs de los planes
+            objetivo: Función plan -> (campos del plan a escribir, fecha_inicio
+                del calendario o None para empezar hoy)
+            simular: Si es True solo calcula las diferencias
+            tamano_lote: Número de planes por transacción
+
+        Returns:
+            list: Resultado por plan (ver `_aplicar_lote`)
+        """
+        hoy = timezone.localdate()
+        plan_ids = sorted(set(plan_ids))
+        resultados = []
+        for inicio in range(0, len(plan_ids), tamano_lote):
+            lote = plan_ids[inicio:inicio + tamano_lote]
+            if simular:
+                resultados += cls._aplicar_lote(lote, objetivo, True, hoy)
+            else:
+                with transaction.atomic():
+                    resultados += cls._aplicar_lote(lote, objetivo, False, hoy)
+        return resultados
+
+    @classmethod
+    def _aplicar_lote(cls, plan_ids, objetivo, simular, hoy):
+        planes = PlanPago.objects.filter(pk__in=plan_ids).only(
+            'id', 'estudiante_id', 'numero_cuotas', 'monto_colegiatura', 'tiene_convenio', 'motivo_convenio'
+        ).order_by('pk')
+        if not simular:
+            # Bloquear los planes antes que las cuotas, como la aplicación de pagos
+            planes = planes.select_for_update()
+        planes = list(planes)
+
+        cuotas_por_plan = defaultdict(list)
+        for cuota in Cuota.objects.filter(plan_pago_id__in=plan_ids):
+            cuotas_por_plan[cuota.plan_pago_id].append(cuota)
+
+        resultados = []
+        actualizar, crear, eliminar, renumerar = [], [], [], set()
+        planes_modificados, campos_plan, movimientos = [], set(), []
+        for plan in planes:
+            campos, fecha_inicio = objetivo(plan)
+            resultado = {
+                'plan_pago_id': plan.pk,
+                'estudiante_id': plan.estudiante_id,
+                'estado': 'sin_cambios',
+                'motivo': None,
+                'monto_colegiatura_anterior': plan.monto_colegiatura,
+                'monto_colegiatura': campos['monto_colegiatura'],
+                'numero_cuotas_anterior': plan.numero_cuotas,
+                'numero_cuotas': campos['numero_cuotas'],
+                'cuotas': [],
+            }
+            resultados.append(resultado)
+            calculo = cls.calcular_cronograma(
+                plan, cuotas_por_plan[plan.pk], campos['monto_colegiatura'], campos['numero_cuotas'],
+                hoy, fecha_inicio=fecha_inicio,
+            )
+            if calculo['motivo']:
+                resultado.update({'estado': 'omitido', 'motivo': calculo['motivo']})
+                continue
+            cambiados = {campo for campo, valor in campos.items() if getattr(plan, campo) != valor}
+            if not cambiados and not calculo['cambios']:
+                continue
+
+            resultado.update({'estado': 'modificado', 'cuotas': calculo['cambios']})
+            actualizar += calculo['actualizar']
+            crear += calculo['crear']
+            eliminar += calculo['eliminar']
+            renumerar.update(
+                cambio['cuota_id'] for cambio in calculo['cambios']
+                if cambio['accion'] == 'actualizar' and cambio['numero_anterior'] != cambio['numero_cuota']
+            )
+            if campos['monto_colegiatura'] != plan.monto_colegiatura:
+                movimientos.append(MovimientoPlanPago(
+                    plan_pago=plan,
+                    tipo='cargo',
+                    concepto='ajuste_colegiatura',
+                    monto=campos['monto_colegiatura'] - plan.monto_colegiatura,
+                ))
+            for campo in cambiados:
+                setattr(plan, campo, campos[campo])
+            campos_plan |= cambiados
+            planes_modificados.append(plan)
+
+        if simular or not planes_modificados:
+            return resultados
+
+        ahora = timezone.now()
+        if eliminar:
+            # Las cuotas eliminadas no tienen abonos: sin diario que asentar, y
+            # los saldos se recalculan abajo una sola vez por plan
+            with SistemaPagosService.saldos_en_bloque():
+                Cuota.objects.filter(pk__in=[cuota.pk for cuota in eliminar]).delete()
+        if renumerar:
+            temporales = [
+                Cuota(pk=cuota.pk, numero_cuota=cuota.numero_cuota + DESPLAZAMIENTO_NUMERACION)
+                for cuota in actualizar if cuota.pk in renumerar
+            ]
+            Cuota.objects.bulk_update(temporales, ['numero_cuota'], batch_size=500)
+        for cuota in actualizar:
+            cuota.fecha_modificacion = ahora
+        Cuota.objects.bulk_update(actualizar, CAMPOS_CRONOGRAMA, batch_size=500)
+        Cuota.objects.bulk_create(crear, batch_size=1000)
+        if campos_plan:
+            for plan in planes_modificados:
+                plan.fecha_modificacion = ahora
+            PlanPago.objects.bulk_update(planes_modificados, sorted(campos_plan) + ['fecha_modificacion'])
+        MovimientoPlanPago.objects.bulk_create(movimientos)
+
+        # bulk_update y bulk_create no disparan señales: saldos y estados en bloque
+        modificados = [plan.pk for plan in planes_modificados]
+        SistemaPagosService.recalcular_saldos(plan_ids=modificados)
+        CarteraService.invalidar_cache_al_confirmar()
+        SistemaPagosService.marcar_estado_pagos_pendiente(planes=modificados)
+        return resultados
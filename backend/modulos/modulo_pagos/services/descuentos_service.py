@@ -1,12 +1,101 @@
+import hashlib
+import time
+from collections import defaultdict
 from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
 from django.utils import timezone
+
 from ..models import Beca, Descuento
 
+TIPOS_PAGO = ('matricula', 'colegiatura', 'certificado')
+
+# Campos leídos de becas y descuentos para el cálculo por evento
+CAMPOS_BENEFICIO = (
+    'id', 'estudiante_id', 'porcentaje_descuento', 'monto_descuento',
+    'aplica_matricula', 'aplica_colegiatura', 'aplica_certificado',
+)
+
+# Versión vigente de los códigos promocionales en caché: cambia al guardar
+# un Descuento y vuelve obsoletas todas las entradas anteriores
+CLAVE_VERSION_CODIGOS = 'codigo_promocional:version'
+
+# Segundos en caché de un código con descuentos activos y de uno inexistente
+TTL_CODIGO = 3600
+TTL_CODIGO_INVALIDO = 300
+
+CAMPOS_CODIGO = (
+    'id', 'estudiante_id', 'evento_id', 'nombre_descuento', 'tipo_descuento',
+    'porcentaje_descuento', 'monto_descuento', 'aplica_matricula', 'aplica_colegiatura',
+    'aplica_certificado', 'fecha_inicio', 'fecha_fin', 'max_usos', 'usos',
+)
+
+
+def _calcular_descuento(tipo, porcentaje, monto_fijo, monto_original):
+    """
+    Regla de `Beca.calcular_descuento` y `Descuento.calcular_descuento` para
+    un beneficio ya filtrado por vigencia y tipo de pago.
+    """
+    if tipo == 'porcentual' and porcentaje:
+        descuento = monto_original * (porcentaje / Decimal('100.00'))
+    elif tipo == 'monto_fijo' and monto_fijo:
+        descuento = min(monto_fijo, monto_original)
+    else:
+        descuento = Decimal('0.00')
+    return descuento.quantize(Decimal('0.01'))
+
+
 class DescuentosService:
     """
     Servicio para calcular y aplicar descuentos y becas automáticamente.
     """
     
+    @staticmethod
+    def becas_vigentes(hoy=None):
+        """
+        Becas activas y vigentes a la fecha. El filtro por estado usa los
+        índices parciales de becas activas (ver `expirar_beneficios`).
+        """
+        hoy = hoy or timezone.now().date()
+        return Beca.objects.filter(estado='activa', fecha_inicio__lte=hoy, fecha_fin__gte=hoy)
+
+    @staticmethod
+    def descuentos_vigentes(hoy=None):
+        """Descuentos activos y vigentes a la fecha (ver `becas_vigentes`)."""
+        hoy = hoy or timezone.now().date()
+        return Descuento.objects.filter(estado='activo', fecha_inicio__lte=hoy, fecha_fin__gte=hoy)
+
+    @staticmethod
+    def expirar_beneficios(hoy=None, simular=False):
+        """
+        Marca como expiradas las becas y descuentos activos cuya fecha de fin
+        ya pasó, con un UPDATE por modelo. Así el conjunto activo, cubierto
+        por índices parciales, no crece con el histórico.
+
+        Args:
+            hoy: Fecha de corte (opcional, hoy por defecto)
+            simular: Si es True solo cuenta los beneficios a expirar
+
+        Returns:
+            dict: {'becas': int, 'descuentos': int}
+        """
+        hoy = hoy or timezone.now().date()
+        becas = Beca.objects.filter(estado='activa', fecha_fin__lt=hoy)
+        descuentos = Descuento.objects.filter(estado='activo', fecha_fin__lt=hoy)
+        if simular:
+            return {'becas': becas.count(), 'descuentos': descuentos.count()}
+        ahora = timezone.now()
+        resultado = {
+            'becas': becas.update(estado='expirada', fecha_modificacion=ahora),
+            'descuentos': descuentos.update(estado='expirado', fecha_modificacion=ahora),
+        }
+        if resultado['descuentos']:
+            # El UPDATE no dispara señales
+            DescuentosService.invalidar_cache_codigos()
+        return resultado
+
     @staticmethod
     def calcular_descuento_total(estudiante_id, evento_id, tipo_pago, monto_original):
         """
@@ -24,21 +113,15 @@ class DescuentosService:
         hoy = timezone.now().date()
         
         # Obtener becas activas
-        becas = Beca.objects.filter(
+        becas = DescuentosService.becas_vigentes(hoy).filter(
             estudiante_id=estudiante_id,
-            evento_id=evento_id,
-            estado='activa',
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
+            evento_id=evento_id
         )
         
         # Obtener descuentos activos
-        descuentos = Descuento.objects.filter(
+        descuentos = DescuentosService.descuentos_vigentes(hoy).filter(
             estudiante_id=estudiante_id,
-            evento_id=evento_id,
-            estado='activo',
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
+            evento_id=evento_id
         )
         
         descuento_total = Decimal('0.00')
@@ -105,21 +188,15 @@ class DescuentosService:
         hoy = timezone.now().date()
         
         # Obtener becas activas
-        becas = Beca.objects.filter(
+        becas = DescuentosService.becas_vigentes(hoy).filter(
             estudiante_id=estudiante_id,
-            evento_id=evento_id,
-            estado='activa',
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
+            evento_id=evento_id
         )
         
         # Obtener descuentos activos
-        descuentos = Descuento.objects.filter(
+        descuentos = DescuentosService.descuentos_vigentes(hoy).filter(
             estudiante_id=estudiante_id,
-            evento_id=evento_id,
-            estado='activo',
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
+            evento_id=evento_id
         )
         
         resumen = {
@@ -174,10 +251,48 @@ class DescuentosService:
         
         return resumen
     
+    @staticmethod
+    def _version_codigos():
+        version = cache.get(CLAVE_VERSION_CODIGOS)
+        if version is None:
+            cache.add(CLAVE_VERSION_CODIGOS, time.time_ns(), None)
+            version = cache.get(CLAVE_VERSION_CODIGOS)
+        return version
+
+    @staticmethod
+    def invalidar_cache_codigos():
+        """Vuelve obsoletos los códigos promocionales en caché (al guardar un Descuento)."""
+        cache.set(CLAVE_VERSION_CODIGOS, time.time_ns(), None)
+
+    @staticmethod
+    def _clave_codigo(codigo):
+        return 'codigo_promocional:{}:{}'.format(
+            DescuentosService._version_codigos(), hashlib.sha1(codigo.encode()).hexdigest()
+        )
+
+    @staticmethod
+    def _descuentos_por_codigo(codigo):
+        """
+        Descuentos activos con el código, leídos del índice parcial de
+        códigos activos y guardados en caché. Los códigos sin descuentos
+        también se guardan, por menos tiempo.
+        """
+        clave = DescuentosService._clave_codigo(codigo)
+        descuentos = cache.get(clave)
+        if descuentos is None:
+            descuentos = list(
+                Descuento.objects.filter(codigo_promocional=codigo, estado='activo')
+                .values(*CAMPOS_CODIGO).order_by('pk')
+            )
+            cache.set(clave, descuentos, TTL_CODIGO if descuentos else TTL_CODIGO_INVALIDO)
+        return descuentos
+
     @staticmethod
     def validar_codigo_promocional(codigo, estudiante_id, evento_id):
         """
         Valida si un código promocional es válido para un estudiante y evento específicos.
+        La consulta se resuelve desde la caché en el caso común; la vigencia
+        y el límite de usos se comprueban sobre los datos guardados.
         
         Args:
             codigo: Código promocional
@@ -188,40 +303,163 @@ class DescuentosService:
             dict: Información del descuento si es válido, None si no
         """
         hoy = timezone.now().date()
-        
-        try:
-            descuento = Descuento.objects.get(
-                codigo_promocional=codigo,
-                estado='activo',
-                fecha_inicio__lte=hoy,
-                fecha_fin__gte=hoy
-            )
-            
-            # Verificar si aplica al estudiante y evento
-            if descuento.estudiante_id == estudiante_id and descuento.evento_id == evento_id:
-                return {
-                    'valido': True,
-                    'descuento': {
-                        'id': descuento.id,
-                        'nombre': descuento.nombre_descuento,
-                        'tipo': descuento.tipo_descuento,
-                        'porcentaje': descuento.porcentaje_descuento,
-                        'monto_fijo': descuento.monto_descuento,
-                        'aplica_a': {
-                            'matricula': descuento.aplica_matricula,
-                            'colegiatura': descuento.aplica_colegiatura,
-                            'certificado': descuento.aplica_certificado
-                        }
-                    }
-                }
-            else:
-                return {
-                    'valido': False,
-                    'error': 'El código promocional no aplica para este estudiante o evento'
-                }
-                
-        except Descuento.DoesNotExist:
+        codigo = (codigo or '').strip()
+        vigentes = [
+            descuento for descuento in (DescuentosService._descuentos_por_codigo(codigo) if codigo else [])
+            if descuento['fecha_inicio'] <= hoy <= descuento['fecha_fin']
+        ]
+        if not vigentes:
             return {
                 'valido': False,
                 'error': 'Código promocional no válido o expirado'
             }
+
+        # Verificar si aplica al estudiante y evento
+        descuento = next(
+            (d for d in vigentes if d['estudiante_id'] == estudiante_id and d['evento_id'] == evento_id),
+            None
+        )
+        if descuento is None:
+            return {
+                'valido': False,
+                'error': 'El código promocional no aplica para este estudiante o evento'
+            }
+        if descuento['max_usos'] is not None and descuento['usos'] >= descuento['max_usos']:
+            return {
+                'valido': False,
+                'error': 'El código promocional alcanzó su límite de usos'
+            }
+        return {
+            'valido': True,
+            'descuento': {
+                'id': descuento['id'],
+                'nombre': descuento['nombre_descuento'],
+                'tipo': descuento['tipo_descuento'],
+                'porcentaje': descuento['porcentaje_descuento'],
+                'monto_fijo': descuento['monto_descuento'],
+                'aplica_a': {
+                    'matricula': descuento['aplica_matricula'],
+                    'colegiatura': descuento['aplica_colegiatura'],
+                    'certificado': descuento['aplica_certificado']
+                },
+                'usos_restantes': (
+                    descuento['max_usos'] - descuento['usos'] if descuento['max_usos'] is not None else None
+                )
+            }
+        }
+
+    @staticmethod
+    def canjear_codigo_promocional(codigo, estudiante_id, evento_id):
+        """
+        Valida y canjea un código promocional. El contador de usos se
+        incrementa con un UPDATE condicional sobre el límite, de modo que
+        canjes concurrentes nunca superan `max_usos`.
+
+        Args:
+            codigo: Código promocional
+            estudiante_id: ID del estudiante
+            evento_id: ID del evento
+
+        Returns:
+            dict: Resultado de la validación con 'canjeado' si el canje se registró
+        """
+        validacion = DescuentosService.validar_codigo_promocional(codigo, estudiante_id, evento_id)
+        if not validacion['valido']:
+            return validacion
+
+        descuento = validacion['descuento']
+        canjeado = Descuento.objects.filter(
+            Q(max_usos__isnull=True) | Q(usos__lt=F('max_usos')),
+            pk=descuento['id'],
+            estado='activo',
+        ).update(usos=F('usos') + 1)
+        if descuento['usos_restantes'] is not None or not canjeado:
+            # El contador en caché quedó desactualizado
+            cache.delete(DescuentosService._clave_codigo(codigo.strip()))
+        if not canjeado:
+            return {
+                'valido': False,
+                'error': 'El código promocional alcanzó su límite de usos'
+            }
+        if descuento['usos_restantes'] is not None:
+            descuento['usos_restantes'] -= 1
+        return {**validacion, 'canjeado': True}
+
+    @staticmethod
+    def calcular_descuentos_evento(evento, montos=None, estudiante_ids=None, hoy=None):
+        """
+        Calcula los descuentos de todos los estudiantes de un evento y todos
+        los tipos de pago con dos consultas (becas y descuentos vigentes), con
+        las mismas reglas que `calcular_descuento_total`.
+
+        Args:
+            evento: Instancia de Evento
+            montos: {tipo_pago: monto_original} (opcional, costos del evento por defecto)
+            estudiante_ids: IDs de estudiantes a incluir (opcional, todos los que
+                tienen beneficios vigentes)
+            hoy: Fecha de vigencia (opcional, hoy por defecto)
+
+        Returns:
+            dict: {estudiante_id: {tipo_pago: {'monto_original', 'descuento_total',
+            'monto_final', 'becas_aplicadas', 'descuentos_aplicados'}}}. Con
+            `estudiante_ids` se incluyen también los estudiantes sin beneficios.
+        """
+        hoy = hoy or timezone.now().date()
+        if montos is None:
+            montos = {
+                'matricula': evento.costo_matricula,
+                'colegiatura': evento.costo_colegiatura,
+                'certificado': evento.costo_certificado,
+            }
+        for tipo in montos:
+            if tipo not in TIPOS_PAGO:
+                raise ValidationError(f"Tipo de pago no válido: {tipo}")
+        montos = {tipo: Decimal(str(monto)) for tipo, monto in montos.items()}
+
+        becas = DescuentosService.becas_vigentes(hoy).filter(evento=evento)
+        descuentos = DescuentosService.descuentos_vigentes(hoy).filter(evento=evento)
+        if estudiante_ids is not None:
+            estudiante_ids = list(estudiante_ids)
+            becas = becas.filter(estudiante_id__in=estudiante_ids)
+            descuentos = descuentos.filter(estudiante_id__in=estudiante_ids)
+
+        beneficios = defaultdict(list)
+        for beca in becas.values(*CAMPOS_BENEFICIO, 'tipo_beca', 'nombre_beca').order_by('pk'):
+            beneficios[beca['estudiante_id']].append(
+                ('becas_aplicadas', beca['tipo_beca'], beca['nombre_beca'], beca)
+            )
+        for descuento in descuentos.values(*CAMPOS_BENEFICIO, 'tipo_descuento', 'nombre_descuento').order_by('pk'):
+            beneficios[descuento['estudiante_id']].append(
+                ('descuentos_aplicados', descuento['tipo_descuento'], descuento['nombre_descuento'], descuento)
+            )
+
+        # Las becas de una cohorte suelen repetirse: cada regla se calcula una vez
+        calculados = {}
+        resultado = {}
+        for estudiante_id in (estudiante_ids if estudiante_ids is not None else beneficios):
+            por_tipo = {}
+            for tipo_pago, monto_original in montos.items():
+                detalle = {
+                    'monto_original': monto_original,
+                    'descuento_total': Decimal('0.00'),
+                    'becas_aplicadas': [],
+                    'descuentos_aplicados': [],
+                }
+                for lista, tipo, nombre, fila in beneficios.get(estudiante_id, ()):
+                    if not fila[f'aplica_{tipo_pago}']:
+                        continue
+                    clave = (tipo, fila['porcentaje_descuento'], fila['monto_descuento'], monto_original)
+                    if clave not in calculados:
+                        calculados[clave] = _calcular_descuento(*clave)
+                    if calculados[clave] > 0:
+                        detalle['descuento_total'] += calculados[clave]
+                        detalle[lista].append({
+                            'id': fila['id'],
+                            'nombre': nombre,
+                            'tipo': tipo,
+                            'descuento': calculados[clave],
+                        })
+                detalle['monto_final'] = monto_original - detalle['descuento_total']
+                por_tipo[tipo_pago] = detalle
+            resultado[estudiante_id] = por_tipo
+        return resultado
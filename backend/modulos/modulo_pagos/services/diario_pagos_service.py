@@ -0,0 +1,250 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import CorteSaldoPlanPago, MovimientoPlanPago, PlanPago
+
+# Antigüedad mínima de un movimiento para compactarlo: deja confirmar las
+# transacciones en curso que pudieran insertar ids menores
+MARGEN_COMPACTACION = timedelta(minutes=5)
+
+
+def _total(valor):
+    return Decimal(valor or 0).quantize(Decimal('0.01'))
+
+
+class DiarioPagosService:
+    """
+    Servicio del diario de pagos: asientos de solo inserción por plan y cortes
+    de saldo periódicos. El saldo de un plan en cualquier momento es su último
+    corte anterior más la cola de movimientos posteriores.
+    """
+
+    @staticmethod
+    def movimientos_por_cambios(cambios, pago=None):
+        """
+        Construye, sin guardarlos, los abonos correspondientes a cambios de
+        `monto_pagado` en cuotas: un movimiento por plan.
+
+        Args:
+            cambios: Iterable de tuplas (previo, actual) de `Cuota.valores_saldo()`
+            pago: Pago que originó los cambios (opcional)
+
+        Returns:
+            list: Instancias de MovimientoPlanPago sin guardar
+        """
+        deltas = defaultdict(lambda: Decimal('0.00'))
+        for previo, actual in cambios:
+            for fila, signo in ((previo, -1), (actual, 1)):
+                if fila is not None:
+                    deltas[fila[0]] += (fila[2] or Decimal('0.00')) * signo
+
+        ahora = timezone.now()
+        return [
+            MovimientoPlanPago(
+                plan_pago_id=plan_id,
+                tipo='abono',
+                concepto='pago' if monto > 0 else 'reverso_pago',
+                monto=monto,
+                pago=pago,
+                fecha=ahora,
+            )
+            for plan_id, monto in deltas.items() if monto
+        ]
+
+    @classmethod
+    def registrar_cambios_cuotas(cls, cambios, pago=None):
+        """Registra en el diario los abonos de `movimientos_por_cambios` con un solo INSERT."""
+        movimientos = cls.movimientos_por_cambios(cambios, pago=pago)
+        if movimientos:
+            MovimientoPlanPago.objects.bulk_create(movimientos)
+        return movimientos
+
+    @staticmethod
+    def _cortes_vigentes(plan_ids, hasta=None):
+        """Último corte de cada plan (anterior a `hasta`, si se indica)."""
+        ultimos = CorteSaldoPlanPago.objects.filter(plan_pago=OuterRef('plan_pago'))
+        cortes = CorteSaldoPlanPago.objects.filter(plan_pago_id__in=plan_ids)
+        if hasta is not None:
+            ultimos = ultimos.filter(fecha_corte__lte=hasta)
+            cortes = cortes.filter(fecha_corte__lte=hasta)
+        cortes = cortes.filter(
+            ultimo_movimiento_id=Subquery(
+                ultimos.order_by('-ultimo_movimiento_id').values('ultimo_movimiento_id')[:1]
+            )
+        )
+        return {corte.plan_pago_id: corte for corte in cortes}
+
+    @staticmethod
+    def _cola(plan_ids, cortes):
+        """
+        Movimientos posteriores al corte de cada plan. Usa el índice
+        (plan_pago, id), de modo que el costo depende solo de la cola.
+        """
+        condicion = Q(
+            plan_pago__cortes_saldo__in=[corte.pk for corte in cortes.values()],
+            id__gt=F('plan_pago__cortes_saldo__ultimo_movimiento_id'),
+        )
+        sin_corte = [plan_id for plan_id in plan_ids if plan_id not in cortes]
+        if sin_corte:
+            condicion |= Q(plan_pago_id__in=sin_corte)
+        return MovimientoPlanPago.objects.filter(condicion)
+
+    @classmethod
+    def saldos_planes(cls, plan_ids, hasta=None):
+        """
+        Calcula los saldos de varios planes con dos consultas: sus cortes
+        vigentes y la suma de los movimientos posteriores.
+
+        Args:
+            plan_ids: IDs de los planes
+            hasta: Fecha y hora de consulta (opcional, saldo actual por defecto)
+
+        Returns:
+            dict: {plan_id: {'cargos', 'abonos', 'saldo'}}; los planes sin
+            movimientos tienen saldos en cero
+        """
+        plan_ids = list(plan_ids)
+        if not plan_ids:
+            return {}
+
+        cortes = cls._cortes_vigentes(plan_ids, hasta=hasta)
+        cola = cls._cola(plan_ids, cortes)
+        if hasta is not None:
+            cola = cola.filter(fecha__lte=hasta)
+        sumas = {
+            fila['plan_pago_id']: fila
+            for fila in cola.values('plan_pago_id').annotate(
+                cargos=Sum('monto', filter=Q(tipo='cargo')),
+                abonos=Sum('monto', filter=Q(tipo='abono')),
+            ).order_by()
+        }
+
+        saldos = {}
+        for plan_id in plan_ids:
+            corte = cortes.get(plan_id)
+            fila = sumas.get(plan_id, {})
+            cargos = _total(fila.get('cargos')) + (corte.total_cargos if corte else Decimal('0.00'))
+            abonos = _total(fila.get('abonos')) + (corte.total_abonos if corte else Decimal('0.00'))
+            saldos[plan_id] = {'cargos': cargos, 'abonos': abonos, 'saldo': cargos - abonos}
+        return saldos
+
+    @staticmethod
+    def totales_evento(evento):
+        """
+        Cargos y abonos de todos los planes de un evento con dos agregados:
+        la suma de los cortes vigentes y la de los movimientos posteriores a
+        ellos, sin recorrer los planes.
+
+        Returns:
+            dict: {'cargos', 'abonos', 'saldo'}
+        """
+        ultimo_corte = CorteSaldoPlanPago.objects.filter(
+            plan_pago=OuterRef('plan_pago')
+        ).order_by('-ultimo_movimiento_id').values('ultimo_movimiento_id')[:1]
+
+        cortes = CorteSaldoPlanPago.objects.filter(
+            plan_pago__evento=evento, ultimo_movimiento_id=Subquery(ultimo_corte)
+        ).aggregate(cargos=Sum('total_cargos'), abonos=Sum('total_abonos'))
+        cola = MovimientoPlanPago.objects.filter(plan_pago__evento=evento).annotate(
+            corte=Coalesce(Subquery(ultimo_corte), Value(0))
+        ).filter(id__gt=F('corte')).aggregate(
+            cargos=Sum('monto', filter=Q(tipo='cargo')),
+            abonos=Sum('monto', filter=Q(tipo='abono')),
+        )
+
+        cargos = _total(cortes['cargos']) + _total(cola['cargos'])
+        abonos = _total(cortes['abonos']) + _total(cola['abonos'])
+        return {'cargos': cargos, 'abonos': abonos, 'saldo': cargos - abonos}
+
+    @classmethod
+    def saldo_plan(cls, plan_pago, hasta=None):
+        """Saldo de un plan (ver `saldos_planes`)."""
+        return cls.saldos_planes([plan_pago.pk], hasta=hasta)[plan_pago.pk]
+
+    @classmethod
+    def compactar(cls, plan_ids=None, evento=None, tamano_lote=500, minimo_movimientos=1,
+                  margen=MARGEN_COMPACTACION):
+        """
+        Crea un nuevo corte para cada plan con al menos `minimo_movimientos`
+        movimientos posteriores a su último corte. Los cortes anteriores se
+        conservan para consultar saldos históricos.
+
+        Args:
+            plan_ids: IDs de planes a compactar (opcional, todos por defecto)
+            evento: Evento específico (opcional)
+            tamano_lote: Número de planes por lote
+            minimo_movimientos: Cola mínima para crear un corte
+            margen: Antigüedad mínima de los movimientos a compactar
+
+        Returns:
+            dict: Planes revisados, planes con corte nuevo y movimientos compactados
+        """
+        planes = PlanPago.objects.all()
+        if plan_ids is not None:
+            planes = planes.filter(pk__in=list(plan_ids))
+        if evento:
+            planes = planes.filter(evento=evento)
+        planes = planes.order_by('id').values_list('id', flat=True)
+
+        resultado = {'revisados': 0, 'planes': 0, 'movimientos': 0}
+        ultimo_id = 0
+        while True:
+            lote = list(planes.filter(id__gt=ultimo_id)[:tamano_lote])
+            if not lote:
+                break
+            ultimo_id = lote[-1]
+            resultado['revisados'] += len(lote)
+            parcial = cls._compactar_lote(lote, minimo_movimientos, timezone.now() - margen)
+            resultado['planes'] += parcial['planes']
+            resultado['movimientos'] += parcial['movimientos']
+        return resultado
+
+    @classmethod
+    def _compactar_lote(cls, plan_ids, minimo_movimientos, limite):
+        cortes = cls._cortes_vigentes(plan_ids)
+
+        colas = defaultdict(list)
+        for fila in cls._cola(plan_ids, cortes).values_list(
+            'plan_pago_id', 'id', 'tipo', 'monto', 'fecha'
+        ).order_by('plan_pago_id', 'id'):
+            colas[fila[0]].append(fila)
+
+        nuevos = []
+        compactados = 0
+        for plan_id, filas in colas.items():
+            # El corte llega hasta el último movimiento anterior al límite e
+            # incluye todos los de id menor, para que la cola quede contigua
+            incluidos = [f for f in filas if f[4] <= limite]
+            if not incluidos:
+                continue
+            ultimo_id = incluidos[-1][1]
+            incluidos = [f for f in filas if f[1] <= ultimo_id]
+            if len(incluidos) < minimo_movimientos:
+                continue
+
+            corte = cortes.get(plan_id)
+            cargos = corte.total_cargos if corte else Decimal('0.00')
+            abonos = corte.total_abonos if corte else Decimal('0.00')
+            for _, _, tipo, monto, _ in incluidos:
+                if tipo == 'cargo':
+                    cargos += monto
+                else:
+                    abonos += monto
+            nuevos.append(CorteSaldoPlanPago(
+                plan_pago_id=plan_id,
+                ultimo_movimiento_id=ultimo_id,
+                fecha_corte=max(f[4] for f in incluidos),
+                total_cargos=cargos,
+                total_abonos=abonos,
+                movimientos_compactados=len(incluidos),
+            ))
+            compactados += len(incluidos)
+
+        # Una compactación concurrente del mismo plan produce el mismo corte
+        CorteSaldoPlanPago.objects.bulk_create(nuevos, ignore_conflicts=True)
+        return {'planes': len(nuevos), 'movimientos': compactados}
@@ -0,0 +1,211 @@
+import csv
+import io
+import zipfile
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.utils import timezone
+
+from modulos.modulo_certificados.services.estado_cuenta_generator import FORMATOS, renderizar_en_paralelo
+from ..models import METODOS_PAGO, Cuota, Pago, PagoCuota, PlanPago
+from .descuentos_service import DescuentosService
+from .diario_pagos_service import DiarioPagosService
+
+# Estudiantes leídos y renderizados por bloque
+TAMANO_BLOQUE = 200
+
+TIPOS_PAGO = dict(Pago.TIPO_PAGO_CHOICES)
+ESTADOS_CUOTA = dict(Cuota.ESTADO_CHOICES)
+ESTADOS_PLAN = dict(PlanPago.ESTADO_GENERAL_CHOICES)
+
+COLUMNAS_RESUMEN = ('cedula', 'estudiante', 'cargos', 'abonos', 'descuentos', 'saldo', 'estado')
+
+
+class _BufferFlujo:
+    """Destino de escritura sin `tell`: ZipFile escribe en modo flujo y se vacía por partes."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+class EstadoCuentaService:
+    """
+    Servicio de estados de cuenta por evento: lee los datos de los estudiantes
+    por bloques con un número fijo de consultas agrupadas por bloque y
+    renderiza los PDF y CSV en paralelo, sin mantener todo el evento en memoria.
+    """
+
+    @staticmethod
+    def datos_bloque(evento, plan_ids, hoy=None):
+        """
+        Datos de los estados de cuenta de un bloque de planes con ocho consultas:
+        planes, cuotas, pagos, pagos de cuotas, becas, descuentos y saldos del diario.
+
+        Returns:
+            list: Un dict por plan con estudiante, cuotas, pagos, descuentos y totales
+        """
+        hoy = hoy or timezone.localdate()
+        planes = list(PlanPago.objects.filter(pk__in=plan_ids).values(
+            'id', 'estudiante_id', 'monto_colegiatura', 'numero_cuotas', 'estado_general',
+            'tiene_convenio', 'motivo_convenio', 'estudiante__nombres', 'estudiante__apellidos',
+            'estudiante__cedula', 'estudiante__correo',
+        ).order_by('estudiante__apellidos', 'estudiante__nombres', 'id'))
+        estudiante_ids = [plan['estudiante_id'] for plan in planes]
+
+        cuotas = defaultdict(list)
+        for cuota in Cuota.objects.filter(plan_pago_id__in=plan_ids).values(
+            'plan_pago_id', 'numero_cuota', 'fecha_vencimiento', 'monto', 'monto_pagado', 'estado'
+        ).order_by('plan_pago_id', 'numero_cuota'):
+            cuota['saldo'] = cuota['monto'] - cuota['monto_pagado']
+            cuota['estado'] = ESTADOS_CUOTA.get(cuota['estado'], cuota['estado'])
+            cuotas[cuota.pop('plan_pago_id')].append(cuota)
+
+        pagos = defaultdict(list)
+        for pago in Pago.objects.filter(evento=evento, estudiante_id__in=estudiante_ids).values(
+            'estudiante_id', 'fecha_pago', 'tipo_pago', 'metodo_pago', 'numero_transaccion',
+            'codigo_comprobante', 'monto',
+        ).order_by('fecha_pago', 'id'):
+            pagos[pago['estudiante_id']].append({
+                'fecha': timezone.localtime(pago['fecha_pago']).date(),
+                'concepto': TIPOS_PAGO.get(pago['tipo_pago'], pago['tipo_pago']),
+                'metodo_pago': METODOS_PAGO.get(pago['metodo_pago'], pago['metodo_pago']),
+                'referencia': pago['numero_transaccion'] or pago['codigo_comprobante'],
+                'monto': pago['monto'],
+            })
+        for pago in PagoCuota.objects.filter(cuota__plan_pago_id__in=plan_ids).annotate(
+            estudiante_id=F('cuota__plan_pago__estudiante_id'),
+        ).values(
+            'estudiante_id', 'fecha_pago', 'cuota__numero_cuota', 'metodo_pago', 'codigo_comprobante', 'monto_pagado',
+        ).order_by('fecha_pago', 'id'):
+            pagos[pago['estudiante_id']].append({
+                'fecha': pago['fecha_pago'],
+                'concepto': f"Cuota {pago['cuota__numero_cuota']}",
+                'metodo_pago': METODOS_PAGO.get(pago['metodo_pago'], pago['metodo_pago']),
+                'referencia': pago['codigo_comprobante'],
+                'monto': pago['monto_pagado'],
+            })
+
+        beneficios = DescuentosService.calcular_descuentos_evento(evento, estudiante_ids=estudiante_ids, hoy=hoy)
+        saldos = DiarioPagosService.saldos_planes(plan_ids)
+
+        estados = []
+        for plan in planes:
+            estudiante_id = plan['estudiante_id']
+            descuentos = [
+                {'tipo_pago': tipo_pago, 'nombre': beneficio['nombre'], 'descuento': beneficio['descuento']}
+                for tipo_pago, detalle in beneficios.get(estudiante_id, {}).items()
+                for beneficio in detalle['becas_aplicadas'] + detalle['descuentos_aplicados']
+            ]
+            saldo = saldos[plan['id']]
+            estados.append({
+                'fecha_corte': hoy,
+                'estudiante': {
+                    'id': estudiante_id,
+                    'nombre': f"{plan['estudiante__nombres']} {plan['estudiante__apellidos']}",
+                    'cedula': plan['estudiante__cedula'],
+                    'correo': plan['estudiante__correo'],
+                },
+                'evento': {'nombre': evento.nombre, 'codigo_evento': evento.codigo_evento},
+                'plan': {
+                    'monto_colegiatura': plan['monto_colegiatura'],
+                    'numero_cuotas': plan['numero_cuotas'],
+                    'estado_general': ESTADOS_PLAN.get(plan['estado_general'], plan['estado_general']),
+                    'convenio': plan['motivo_convenio'] if plan['tiene_convenio'] else '',
+                },
+                'cuotas': cuotas.get(plan['id'], []),
+                'pagos': sorted(pagos.get(estudiante_id, []), key=lambda pago: pago['fecha']),
+                'descuentos': descuentos,
+                'totales': {
+                    'cargos': saldo['cargos'],
+                    'abonos': saldo['abonos'],
+                    'descuentos': sum((d['descuento'] for d in descuentos), Decimal('0.00')),
+                    'saldo': saldo['saldo'],
+                },
+            })
+        return estados
+
+    @classmethod
+    def bloques(cls, evento, estudiante_ids=None, tamano_bloque=TAMANO_BLOQUE, hoy=None):
+        """Genera los estados de cuenta del evento de `tamano_bloque` en `tamano_bloque` planes."""
+        planes = PlanPago.objects.filter(evento=evento)
+        if estudiante_ids is not None:
+            planes = planes.filter(estudiante_id__in=list(estudiante_ids))
+        plan_ids = list(planes.order_by('id').values_list('id', flat=True))
+        if not plan_ids:
+            raise ValidationError("El evento no tiene estudiantes con plan de pagos")
+        for inicio in range(0, len(plan_ids), tamano_bloque):
+            yield cls.datos_bloque(evento, plan_ids[inicio:inicio + tamano_bloque], hoy=hoy)
+
+    @classmethod
+    def archivos(cls, evento, formatos=FORMATOS, estudiante_ids=None, trabajadores=None,
+                 tamano_bloque=TAMANO_BLOQUE, hoy=None):
+        """
+        Genera (nombre, bytes) de cada estado de cuenta y, al final, un
+        `resumen.csv` con una fila por estudiante.
+        """
+        for formato in formatos:
+            if formato not in FORMATOS:
+                raise ValidationError(f"Formato no válido: {formato}")
+        resumen = io.StringIO()
+        writer = csv.writer(resumen)
+        writer.writerow(COLUMNAS_RESUMEN)
+
+        def bloques_con_resumen():
+            for bloque in cls.bloques(evento, estudiante_ids, tamano_bloque, hoy):
+                for datos in bloque:
+                    totales = datos['totales']
+                    writer.writerow([
+                        datos['estudiante']['cedula'], datos['estudiante']['nombre'], totales['cargos'],
+                        totales['abonos'], totales['descuentos'], totales['saldo'], datos['plan']['estado_general'],
+                    ])
+                yield bloque
+
+        yield from renderizar_en_paralelo(bloques_con_resumen(), formatos, trabajadores)
+        yield 'resumen.csv', resumen.getvalue().encode('utf-8')
+
+    @classmethod
+    def escribir_zip(cls, destino, evento, **kwargs):
+        """Escribe el ZIP de estados de cuenta en `destino` (ruta o archivo). Retorna el número de archivos."""
+        total = 0
+        # Los PDF ya van comprimidos; los CSV son pequeños
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as zf:
+            for nombre, contenido in cls.archivos(evento, **kwargs):
+                zf.writestr(nombre, contenido)
+                total += 1
+        return total
+
+    @classmethod
+    def zip_en_flujo(cls, evento, **kwargs):
+        """
+        ZIP por partes para `StreamingHttpResponse`, un archivo a la vez. El
+        primer archivo se genera de inmediato para validar los parámetros
+        antes de empezar a responder.
+        """
+        archivos = cls.archivos(evento, **kwargs)
+        primero = next(archivos)
+
+        def partes():
+            buffer = _BufferFlujo()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+                zf.writestr(*primero)
+                yield buffer.vaciar()
+                for nombre, contenido in archivos:
+                    zf.writestr(nombre, contenido)
+                    yield buffer.vaciar()
+            yield buffer.vaciar()
+
+        return partes()
@@ -0,0 +1,109 @@
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from ..models import Pago, RespuestaIdempotente
+
+
+class IdempotenciaService:
+    """
+    Servicio para detectar reintentos de registro de pagos y responderlos
+    con la respuesta original, sin volver a validar ni aplicar el pago.
+    """
+
+    CABECERA = 'Idempotency-Key'
+
+    @staticmethod
+    def huella_solicitud(datos):
+        """
+        Calcula la huella SHA-256 del cuerpo de una solicitud para comprobar
+        que un reintento corresponde a la misma operación.
+
+        Args:
+            datos: `request.data` (dict o QueryDict); los archivos se ignoran
+
+        Returns:
+            str: Huella hexadecimal
+        """
+        if hasattr(datos, 'lists'):
+            normalizado = {clave: valores for clave, valores in datos.lists()}
+        else:
+            normalizado = dict(datos)
+        normalizado = {
+            clave: valor for clave, valor in normalizado.items()
+            if not hasattr(valor, 'read')
+            and not (isinstance(valor, list) and any(hasattr(v, 'read') for v in valor))
+        }
+        contenido = json.dumps(normalizado, sort_keys=True, default=str)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def buscar_respuesta(clave):
+        """Obtiene la respuesta almacenada para una clave (búsqueda por índice único)."""
+        return RespuestaIdempotente.objects.filter(clave=clave).first()
+
+    @staticmethod
+    def reservar_clave(clave, ruta, huella):
+        """
+        Registra la clave antes de procesar la solicitud. Debe llamarse dentro
+        de la transacción del pago: un reintento concurrente con la misma clave
+        espera en el índice único y falla con IntegrityError al confirmarse.
+        """
+        return RespuestaIdempotente.objects.create(clave=clave, ruta=ruta, huella=huella)
+
+    @staticmethod
+    def guardar_respuesta(registro, codigo_estado, respuesta, pago=None):
+        registro.codigo_estado = codigo_estado
+        registro.respuesta = json.loads(json.dumps(respuesta, default=str))
+        registro.pago = pago
+        registro.save(update_fields=['codigo_estado', 'respuesta', 'pago'])
+        return registro
+
+    @staticmethod
+    def buscar_pago_duplicado(datos):
+        """
+        Busca un pago ya registrado con el mismo comprobante o número de
+        transacción de la misma institución financiera.
+
+        Args:
+            datos: `request.data` con institucion_financiera, codigo_comprobante
+                y/o numero_transaccion
+
+        Returns:
+            Pago o None
+        """
+        institucion = datos.get('institucion_financiera')
+        codigo = datos.get('codigo_comprobante')
+        transaccion = datos.get('numero_transaccion')
+        if not institucion or not (codigo or transaccion):
+            return None
+
+        condicion = Q()
+        if codigo:
+            condicion |= Q(codigo_comprobante=codigo)
+        if transaccion:
+            condicion |= Q(numero_transaccion=transaccion)
+        try:
+            return Pago.objects.filter(condicion, institucion_financiera_id=int(institucion)).first()
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def coincide_con_solicitud(pago, datos):
+        """
+        Indica si un pago ya registrado corresponde a la solicitud: mismo
+        estudiante, evento y monto. Si no coincide, la referencia bancaria se
+        está reutilizando para otro pago y no debe tratarse como un reintento.
+        """
+        try:
+            monto = Decimal(str(datos.get('monto'))).quantize(Decimal('0.01'))
+        except (InvalidOperation, TypeError, ValueError):
+            return False
+        evento = datos.get('evento')
+        return (
+            str(pago.estudiante_id) == str(datos.get('estudiante'))
+            and str(pago.evento_id or '') == str(evento or '')
+            and pago.monto == monto
+        )
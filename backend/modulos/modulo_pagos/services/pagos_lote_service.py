@@ -0,0 +1,424 @@
+import csv
+import io
+import json
+import os
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import METODOS_PAGO, Cuota, InstitucionFinanciera, MovimientoPlanPago, PagoCuota, PlanPago
+from .cartera_service import CarteraService
+from .cierre_caja_service import CierreCajaService
+from .diario_pagos_service import DiarioPagosService
+from .sistema_pagos_service import SistemaPagosService
+from .utils import leer_fecha, leer_monto
+
+# Filas aplicadas por transacción
+TAMANO_LOTE = 500
+
+# Filas máximas por archivo
+MAXIMO_FILAS = 20000
+
+FORMATOS = ('csv', 'jsonl')
+
+METODO_PAGO_POR_DEFECTO = 'deposito'
+
+# Columnas del archivo de resultados
+COLUMNAS_RESULTADO = ('linea', 'estado', 'motivo', 'cuota_id', 'pago_cuota_id', 'monto', 'estado_cuota')
+
+
+def _texto(valor, campo, longitud=50):
+    texto = str(valor).strip() if valor is not None else ''
+    if len(texto) > longitud:
+        raise ValueError(f"{campo} excede {longitud} caracteres")
+    return texto or None
+
+
+def _entero(valor, campo):
+    texto = str(valor).strip() if valor is not None else ''
+    if not texto:
+        return None
+    try:
+        return int(texto)
+    except ValueError:
+        raise ValueError(f"{campo} no es un número entero: {texto}")
+
+
+class PagosLoteService:
+    """
+    Servicio para registrar en lote pagos de cuotas leídos de un archivo CSV o
+    JSONL: resuelve las cuotas, instituciones y referencias duplicadas con
+    consultas agrupadas y aplica los pagos por bloques, cada uno en una
+    transacción con escrituras en bloque.
+    """
+
+    @staticmethod
+    def detectar_formato(nombre_archivo):
+        """Formato del archivo según su extensión: 'jsonl' para .jsonl/.ndjson, 'csv' en otro caso."""
+        extension = os.path.splitext(nombre_archivo or '')[1].lower()
+        return 'jsonl' if extension in ('.jsonl', '.ndjson') else 'csv'
+
+    @staticmethod
+    def normalizar_fila(valores):
+        """
+        Valida y convierte los valores de una fila del archivo.
+
+        La cuota se identifica con `cuota_id` o con `cedula`, `codigo_evento` y
+        `numero_cuota`. `fecha_pago` es opcional (hoy por defecto) y
+        `institucion_financiera` acepta el código o el ID de la institución.
+
+        Raises:
+            ValueError: Si la fila no es válida
+        """
+        valores = {str(clave).strip().lower(): valor for clave, valor in valores.items()}
+        datos = {
+            'cuota_id': _entero(valores.get('cuota_id'), 'cuota_id'),
+            'cedula': _texto(valores.get('cedula'), 'cedula', 20),
+            'codigo_evento': _texto(valores.get('codigo_evento'), 'codigo_evento'),
+            'numero_cuota': _entero(valores.get('numero_cuota'), 'numero_cuota'),
+        }
+        if datos['cuota_id'] is None and not (
+            datos['cedula'] and datos['codigo_evento'] and datos['numero_cuota'] is not None
+        ):
+            raise ValueError("Identifique la cuota con cuota_id o con cedula, codigo_evento y numero_cuota")
+
+        monto = valores.get('monto', valores.get('monto_pagado'))
+        try:
+            datos['monto'] = leer_monto(monto)
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"Monto inválido: {monto}")
+        if datos['monto'] <= 0:
+            raise ValueError("El monto debe ser mayor a cero")
+
+        datos['metodo_pago'] = str(valores.get('metodo_pago') or METODO_PAGO_POR_DEFECTO).strip().lower()
+        if datos['metodo_pago'] not in METODOS_PAGO:
+            raise ValueError(f"Método de pago no válido: {datos['metodo_pago']}")
+
+        fecha = valores.get('fecha_pago')
+        datos['fecha_pago'] = leer_fecha(fecha) if str(fecha or '').strip() else None
+        datos['institucion_financiera'] = _texto(valores.get('institucion_financiera'), 'institucion_financiera', 10)
+        datos['codigo_comprobante'] = _texto(valores.get('codigo_comprobante'), 'codigo_comprobante')
+        datos['numero_transaccion'] = _texto(valores.get('numero_transaccion'), 'numero_transaccion')
+        datos['observaciones'] = str(valores.get('observaciones') or '').strip()
+        return datos
+
+    @classmethod
+    def leer_archivo(cls, archivo, formato='csv'):
+        """
+        Lee las filas de un archivo CSV (con encabezado) o JSONL (un objeto por línea).
+
+        Args:
+            archivo: Archivo binario o de texto (p. ej. `request.FILES['archivo']`)
+            formato: 'csv' o 'jsonl'
+
+        Yields:
+            tuple: (numero_linea, datos, error); `datos` es None si la línea no es válida
+        """
+        if formato not in FORMATOS:
+            raise ValidationError(f"Formato no válido: {formato}")
+        texto = archivo
+        if not isinstance(archivo, io.TextIOBase):
+            texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        try:
+            yield from (cls._leer_jsonl(texto) if formato == 'jsonl' else cls._leer_csv(texto))
+        finally:
+            if texto is not archivo:
+                # No cerrar el archivo del llamador al descartar el envoltorio
+                texto.detach()
+
+    @classmethod
+    def _leer_csv(cls, texto):
+        encabezado = texto.readline()
+        delimitador = max(';,\t', key=encabezado.count)
+        columnas = [c.strip().lower() for c in next(csv.reader([encabezado], delimiter=delimitador), [])]
+        if 'monto' not in columnas and 'monto_pagado' not in columnas:
+            raise ValidationError("El archivo no tiene la columna monto")
+
+        for numero_linea, fila in enumerate(csv.reader(texto, delimiter=delimitador), start=2):
+            if not any(celda.strip() for celda in fila):
+                continue
+            try:
+                yield numero_linea, cls.normalizar_fila(dict(zip(columnas, fila))), None
+            except ValueError as e:
+                yield numero_linea, None, str(e)
+
+    @classmethod
+    def _leer_jsonl(cls, texto):
+        for numero_linea, linea in enumerate(texto, start=1):
+            if not linea.strip():
+                continue
+            try:
+                valores = json.loads(linea)
+                if not isinstance(valores, dict):
+                    raise ValueError("La línea no es un objeto JSON")
+                yield numero_linea, cls.normalizar_fila(valores), None
+            except ValueError as e:
+                yield numero_linea, None, str(e)
+
+    @staticmethod
+    def _resolver_instituciones(filas):
+        """{código o ID tal como viene en el archivo: id} con una consulta."""
+        referencias = {
+            datos['institucion_financiera'] for _, datos, _ in filas if datos and datos['institucion_financiera']
+        }
+        if not referencias:
+            return {}
+        ids = [int(ref) for ref in referencias if ref.isdigit()]
+        resueltas = {}
+        for pk, codigo in InstitucionFinanciera.objects.filter(
+            Q(codigo__in=referencias) | Q(pk__in=ids)
+        ).values_list('pk', 'codigo'):
+            resueltas.setdefault(str(pk), pk)
+            # El código tiene prioridad sobre un ID que coincida con él
+            resueltas[codigo] = pk
+        return resueltas
+
+    @staticmethod
+    def _resolver_cuotas(filas):
+        """
+        Cuota de cada fila con a lo sumo dos consultas: una por IDs y otra por
+        (cédula, código de evento, número de cuota).
+
+        Returns:
+            dict: {numero_linea: (cuota_id, plan_pago_id)}
+        """
+        por_id = [datos['cuota_id'] for _, datos in filas if datos['cuota_id'] is not None]
+        por_clave = [datos for _, datos in filas if datos['cuota_id'] is None]
+
+        cuotas_por_id = {}
+        if por_id:
+            cuotas_por_id = {
+                pk: (pk, plan_id)
+                for pk, plan_id in Cuota.objects.filter(pk__in=por_id).values_list('pk', 'plan_pago_id')
+            }
+        cuotas_por_clave = {}
+        if por_clave:
+            for pk, plan_id, cedula, codigo_evento, numero_cuota in Cuota.objects.filter(
+                plan_pago__estudiante__cedula__in={d['cedula'] for d in por_clave},
+                plan_pago__evento__codigo_evento__in={d['codigo_evento'] for d in por_clave},
+                numero_cuota__in={d['numero_cuota'] for d in por_clave},
+            ).values_list(
+                'pk', 'plan_pago_id', 'plan_pago__estudiante__cedula',
+                'plan_pago__evento__codigo_evento', 'numero_cuota',
+            ):
+                cuotas_por_clave[(cedula, codigo_evento, numero_cuota)] = (pk, plan_id)
+
+        resueltas = {}
+        for linea, datos in filas:
+            if datos['cuota_id'] is not None:
+                cuota = cuotas_por_id.get(datos['cuota_id'])
+            else:
+                cuota = cuotas_por_clave.get((datos['cedula'], datos['codigo_evento'], datos['numero_cuota']))
+            if cuota:
+                resueltas[linea] = cuota
+        return resueltas
+
+    @staticmethod
+    def _referencias(datos, institucion_id):
+        """Claves de unicidad de comprobante y transacción de una fila."""
+        referencias = []
+        if datos['codigo_comprobante']:
+            referencias.append(('comprobante', institucion_id, datos['codigo_comprobante']))
+        if datos['numero_transaccion']:
+            referencias.append(('transaccion', institucion_id, datos['numero_transaccion']))
+        return referencias
+
+    @staticmethod
+    def _referencias_registradas(filas):
+        """Comprobantes y transacciones de las filas que ya existen en PagoCuota, con una consulta."""
+        comprobantes = {datos['codigo_comprobante'] for _, datos in filas if datos['codigo_comprobante']}
+        transacciones = {datos['numero_transaccion'] for _, datos in filas if datos['numero_transaccion']}
+        if not comprobantes and not transacciones:
+            return set()
+        registradas = set()
+        for institucion_id, codigo, transaccion in PagoCuota.objects.filter(
+            Q(codigo_comprobante__in=comprobantes) | Q(numero_transaccion__in=transacciones)
+        ).values_list('institucion_financiera_id', 'codigo_comprobante', 'numero_transaccion'):
+            if codigo:
+                registradas.add(('comprobante', institucion_id, codigo))
+            if transaccion:
+                registradas.add(('transaccion', institucion_id, transaccion))
+        return registradas
+
+    @classmethod
+    def registrar(cls, filas, simular=False, tamano_lote=TAMANO_LOTE, hoy=None):
+        """
+        Registra los pagos de cuota de las filas leídas con `leer_archivo`.
+
+        Cada bloque de `tamano_lote` filas se aplica en su propia transacción:
+        bloquea los planes en orden de pk, relee las cuotas y escribe los
+        PagoCuota, las cuotas y el diario con operaciones en bloque. Un
+        comprobante o transacción repetido (en el archivo o ya registrado para
+        la misma institución) se rechaza, de modo que volver a cargar un
+        archivo no duplica pagos.
+
+        Args:
+            filas: Iterable de (numero_linea, datos, error)
+            simular: Si es True valida las filas sin registrar nada
+            tamano_lote: Filas por transacción
+            hoy: Fecha usada por defecto y como límite de las fechas de pago
+
+        Returns:
+            dict: Totales y un resultado por fila (registrado, simulado o rechazado)
+        """
+        if tamano_lote < 1:
+            raise ValidationError("El tamaño de lote debe ser mayor a cero")
+        filas = list(filas)
+        if not filas:
+            raise ValidationError("El archivo no tiene filas")
+        if len(filas) > MAXIMO_FILAS:
+            raise ValidationError(f"Demasiadas filas ({len(filas)}). Límite {MAXIMO_FILAS}; divida el archivo")
+        hoy = hoy or timezone.localdate()
+
+        instituciones = cls._resolver_instituciones(filas)
+        usadas = set()
+        resultados = []
+        for inicio in range(0, len(filas), tamano_lote):
+            resultados += cls._procesar_bloque(
+                filas[inicio:inicio + tamano_lote], simular, hoy, instituciones, usadas
+            )
+
+        aceptadas = [r for r in resultados if r['estado'] != 'rechazado']
+        return {
+            'simulacion': simular,
+            'filas': len(resultados),
+            'aceptadas': len(aceptadas),
+            'rechazadas': len(resultados) - len(aceptadas),
+            'monto_aceptado': sum((r['monto'] for r in aceptadas), Decimal('0.00')),
+            'motivos_rechazo': dict(Counter(r['motivo'] for r in resultados if r['estado'] == 'rechazado')),
+            'resultados': resultados,
+        }
+
+    @classmethod
+    def _procesar_bloque(cls, filas, simular, hoy, instituciones, usadas):
+        resultados = {}
+
+        def rechazar(linea, motivo, datos=None, cuota_id=None):
+            resultados[linea] = {
+                'linea': linea, 'estado': 'rechazado', 'motivo': motivo, 'cuota_id': cuota_id,
+                'pago_cuota_id': None, 'monto': datos['monto'] if datos else None, 'estado_cuota': None,
+            }
+
+        validas = []
+        for linea, datos, error in filas:
+            if error:
+                rechazar(linea, error)
+                continue
+            institucion = datos['institucion_financiera']
+            if institucion and institucion not in instituciones:
+                rechazar(linea, f"Institución financiera no encontrada: {institucion}", datos)
+                continue
+            if datos['fecha_pago'] and datos['fecha_pago'] > hoy:
+                rechazar(linea, "La fecha de pago no puede ser futura", datos)
+                continue
+            validas.append((linea, datos))
+
+        usadas_bloque = set(usadas)
+        try:
+            with transaction.atomic():
+                referencias = cls._resolver_cuotas(validas) if validas else {}
+                plan_ids = sorted({plan_id for _, plan_id in referencias.values()})
+                if plan_ids and not simular:
+                    # Bloquear los planes en orden de pk, igual que la aplicación de pagos
+                    list(
+                        PlanPago.objects.select_for_update().filter(pk__in=plan_ids)
+                        .order_by('pk').values_list('pk', flat=True)
+                    )
+                cuotas = Cuota.objects.annotate(evento_id=F('plan_pago__evento_id')).in_bulk(
+                    [cuota_id for cuota_id, _ in referencias.values()]
+                )
+                registradas = cls._referencias_registradas(validas)
+
+                ahora = timezone.now()
+                previos = {}
+                pagos = []
+                lineas_pago = []
+                for linea, datos in validas:
+                    if linea not in referencias:
+                        rechazar(linea, "Cuota no encontrada", datos)
+                        continue
+                    cuota = cuotas[referencias[linea][0]]
+                    institucion_id = instituciones.get(datos['institucion_financiera'])
+                    claves = cls._referencias(datos, institucion_id)
+                    if any(clave in registradas or clave in usadas_bloque for clave in claves):
+                        rechazar(linea, "Comprobante o transacción ya registrado", datos, cuota.pk)
+                        continue
+                    if cuota.estado == 'cancelado':
+                        rechazar(linea, "La cuota está cancelada", datos, cuota.pk)
+                        continue
+                    saldo = cuota.monto - cuota.monto_pagado
+                    if datos['monto'] > saldo:
+                        rechazar(
+                            linea, f"El monto (${datos['monto']}) excede el saldo de la cuota (${saldo})",
+                            datos, cuota.pk,
+                        )
+                        continue
+
+                    # Misma lógica que Cuota.registrar_abono, en memoria
+                    fecha_pago = datos['fecha_pago'] or hoy
+                    previos.setdefault(cuota.pk, cuota.valores_saldo())
+                    cuota.monto_pagado += datos['monto']
+                    if cuota.monto_pagado >= cuota.monto and cuota.estado != 'pagado':
+                        cuota.estado = 'pagado'
+                        cuota.fecha_pago = fecha_pago
+                    cuota.fecha_modificacion = ahora
+                    usadas_bloque.update(claves)
+                    pagos.append(PagoCuota(
+                        cuota=cuota,
+                        monto_pagado=datos['monto'],
+                        fecha_pago=fecha_pago,
+                        metodo_pago=datos['metodo_pago'],
+                        institucion_financiera_id=institucion_id,
+                        codigo_comprobante=datos['codigo_comprobante'],
+                        numero_transaccion=datos['numero_transaccion'],
+                        observaciones=datos['observaciones'],
+                    ))
+                    lineas_pago.append(linea)
+
+                if pagos and not simular:
+                    # bulk_create no dispara PagoCuota.save ni las señales: cuotas,
+                    # diario, saldos y cierre de caja se actualizan en bloque abajo
+                    pagos = PagoCuota.objects.bulk_create(pagos, batch_size=1000)
+                    modificadas = [cuotas[cuota_id] for cuota_id in previos]
+                    Cuota.objects.bulk_update(modificadas, Cuota.CAMPOS_APLICACION_PAGO, batch_size=500)
+                    cambios = [(previos[cuota.pk], cuota.valores_saldo()) for cuota in modificadas]
+                    MovimientoPlanPago.objects.bulk_create(
+                        DiarioPagosService.movimientos_por_cambios(cambios), batch_size=1000
+                    )
+                    CierreCajaService.registrar_pagos_cuota(pagos)
+                    planes_modificados = sorted({cuota.plan_pago_id for cuota in modificadas})
+                    SistemaPagosService.recalcular_saldos(plan_ids=planes_modificados)
+                    CarteraService.invalidar_cache_al_confirmar()
+                    SistemaPagosService.marcar_estado_pagos_pendiente(planes=planes_modificados)
+        except IntegrityError:
+            # Otra transacción registró una de las referencias durante el bloque
+            for linea, datos in validas:
+                rechazar(linea, "Conflicto al registrar el bloque; vuelva a cargar estas filas", datos)
+            return [resultados[linea] for linea, _, _ in filas]
+
+        usadas |= usadas_bloque
+        for linea, pago in zip(lineas_pago, pagos):
+            resultados[linea] = {
+                'linea': linea,
+                'estado': 'simulado' if simular else 'registrado',
+                'motivo': '',
+                'cuota_id': pago.cuota_id,
+                'pago_cuota_id': pago.pk,
+                'monto': pago.monto_pagado,
+                'estado_cuota': pago.cuota.estado,
+            }
+        return [resultados[linea] for linea, _, _ in filas]
+
+    @staticmethod
+    def resultados_csv(reporte):
+        """Archivo de resultados en CSV: una fila por línea del archivo de entrada."""
+        salida = io.StringIO()
+        writer = csv.writer(salida)
+        writer.writerow(COLUMNAS_RESULTADO)
+        for resultado in reporte['resultados']:
+            writer.writerow(['' if resultado[c] is None else resultado[c] for c in COLUMNAS_RESULTADO])
+        return salida.getvalue()
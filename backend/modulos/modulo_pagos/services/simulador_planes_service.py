@@ -0,0 +1,164 @@
+from decimal import Decimal
+
+import numpy as np
+from django.core.exceptions import ValidationError
+
+# Límite de combinaciones (número de cuotas × fechas × porcentajes) por simulación
+MAXIMO_COMBINACIONES = 5000
+
+
+def _dividir_redondeo_par(numerador, denominador):
+    """
+    División entera con redondeo al par más cercano (ROUND_HALF_EVEN), el
+    redondeo por defecto de `Decimal.quantize` en `PlanPago.prorratear_monto`.
+    """
+    cociente, resto = np.divmod(numerador, denominador)
+    doble = 2 * resto
+    return cociente + ((doble > denominador) | ((doble == denominador) & (cociente % 2 == 1)))
+
+
+def _a_monto(centavos):
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+class SimuladorPlanesService:
+    """
+    Simulador en memoria de opciones de planes de pago para una cohorte: los
+    cronogramas y el flujo mensual de cobros de cada combinación se calculan
+    con arreglos de NumPy en centavos, sin escribir en la base de datos.
+    """
+
+    @staticmethod
+    def prorratear_centavos(totales, numeros_cuotas):
+        """
+        Versión vectorizada de `PlanPago.prorratear_monto` en centavos: todas
+        las cuotas tienen el monto base y la última absorbe el residuo.
+
+        Args:
+            totales: Arreglo de montos totales en centavos
+            numeros_cuotas: Arreglo con el número de cuotas de cada total
+
+        Returns:
+            tuple: (monto base, monto de la última cuota) en centavos
+        """
+        totales = np.asarray(totales, dtype=np.int64)
+        numeros_cuotas = np.asarray(numeros_cuotas, dtype=np.int64)
+        base = _dividir_redondeo_par(totales, numeros_cuotas)
+        return base, totales - base * (numeros_cuotas - 1)
+
+    @classmethod
+    def simular(cls, monto_colegiatura, numero_estudiantes, numeros_cuotas, fechas_inicio,
+                porcentajes_beca=(0,), estudiantes_becados=None, incluir_cronogramas=True):
+        """
+        Simula todas las combinaciones de número de cuotas, fecha de inicio y
+        porcentaje de beca para una cohorte de estudiantes. Los vencimientos
+        son mensuales desde la fecha de inicio, como en `PlanPago.generar_cuotas`,
+        y la beca se calcula como `Beca.calcular_descuento` porcentual.
+
+        Args:
+            monto_colegiatura: Monto de colegiatura sin beca
+            numero_estudiantes: Estudiantes esperados en la cohorte
+            numeros_cuotas: Números de cuotas a comparar (1-60)
+            fechas_inicio: Fechas de inicio a comparar
+            porcentajes_beca: Porcentajes de beca a comparar (0-100)
+            estudiantes_becados: Estudiantes con beca cuando el porcentaje es
+                mayor a cero (opcional, toda la cohorte por defecto)
+            incluir_cronogramas: Si es True incluye las cuotas de cada opción
+
+        Returns:
+            dict: Periodos mensuales y, por opción, cuotas, totales y flujo
+            de cobros de la cohorte por periodo
+        """
+        numeros_cuotas = [int(n) for n in numeros_cuotas]
+        fechas_inicio = list(fechas_inicio)
+        porcentajes_beca = [Decimal(str(p)) for p in porcentajes_beca]
+        if not numeros_cuotas or not fechas_inicio or not porcentajes_beca:
+            raise ValidationError("Indique al menos un número de cuotas, una fecha de inicio y un porcentaje")
+        if any(not 1 <= n <= 60 for n in numeros_cuotas):
+            raise ValidationError("El número de cuotas debe estar entre 1 y 60")
+        if any(not Decimal('0') <= p <= Decimal('100') for p in porcentajes_beca):
+            raise ValidationError("El porcentaje de beca debe estar entre 0 y 100")
+        if numero_estudiantes < 1:
+            raise ValidationError("La cohorte debe tener al menos un estudiante")
+        if estudiantes_becados is None:
+            estudiantes_becados = numero_estudiantes
+        if not 0 <= estudiantes_becados <= numero_estudiantes:
+            raise ValidationError("Los estudiantes becados no pueden superar a la cohorte")
+        combinaciones = len(numeros_cuotas) * len(fechas_inicio) * len(porcentajes_beca)
+        if combinaciones > MAXIMO_COMBINACIONES:
+            raise ValidationError(
+                f"La simulación tiene {combinaciones} combinaciones; el máximo es {MAXIMO_COMBINACIONES}"
+            )
+
+        # Una fila por combinación, en el orden (cuotas, fecha, porcentaje)
+        indices = np.indices((len(numeros_cuotas), len(fechas_inicio), len(porcentajes_beca))).reshape(3, -1)
+        n = np.array(numeros_cuotas, dtype=np.int64)[indices[0]]
+        inicio = np.array(fechas_inicio, dtype='datetime64[D]')[indices[1]]
+        porcentaje = np.array(
+            [int(p * 100) for p in porcentajes_beca], dtype=np.int64
+        )[indices[2]]
+
+        total = int(Decimal(str(monto_colegiatura)).quantize(Decimal('0.01')) * 100)
+        total_becado = total - _dividir_redondeo_par(total * porcentaje, 10000)
+        becados = np.where(porcentaje > 0, estudiantes_becados, 0)
+        regulares = numero_estudiantes - becados
+        base, ultima = cls.prorratear_centavos(np.full(combinaciones, total), n)
+        base_becado, ultima_becado = cls.prorratear_centavos(total_becado, n)
+
+        # Matriz combinación × número de cuota
+        k = np.arange(n.max())
+        validas = k < n[:, None]
+        es_ultima = k == (n - 1)[:, None]
+        cuota = np.where(es_ultima, ultima[:, None], base[:, None])
+        cuota_becado = np.where(es_ultima, ultima_becado[:, None], base_becado[:, None])
+        vencimientos = inicio[:, None] + (30 * k).astype('timedelta64[D]')
+        flujo_cuota = np.where(validas, regulares[:, None] * cuota + becados[:, None] * cuota_becado, 0)
+
+        meses = vencimientos.astype('datetime64[M]')
+        primer_mes = meses[validas].min()
+        periodos = int((meses[validas].max() - primer_mes).astype(np.int64)) + 1
+        posicion = (meses - primer_mes).astype(np.int64) + np.arange(combinaciones)[:, None] * periodos
+        flujo = np.rint(np.bincount(
+            posicion[validas], weights=flujo_cuota[validas], minlength=combinaciones * periodos
+        )).astype(np.int64).reshape(combinaciones, periodos)
+        ingresos = flujo.sum(axis=1)
+        ultimos = vencimientos[np.arange(combinaciones), n - 1]
+
+        opciones = []
+        for i in range(combinaciones):
+            opcion = {
+                'numero_cuotas': int(n[i]),
+                'fecha_inicio': inicio[i].item(),
+                'porcentaje_beca': porcentajes_beca[indices[2][i]],
+                'estudiantes_becados': int(becados[i]),
+                'monto_estudiante': _a_monto(total),
+                'monto_becado': _a_monto(total_becado[i]),
+                'cuota_regular': _a_monto(base[i]),
+                'ultima_cuota': _a_monto(ultima[i]),
+                'cuota_regular_becado': _a_monto(base_becado[i]),
+                'ultima_cuota_becado': _a_monto(ultima_becado[i]),
+                'ultimo_vencimiento': ultimos[i].item(),
+                'ingreso_total': _a_monto(ingresos[i]),
+                'flujo': [_a_monto(valor) for valor in flujo[i].tolist()],
+            }
+            if incluir_cronogramas:
+                opcion['cronograma'] = [
+                    {
+                        'numero_cuota': numero + 1,
+                        'fecha_vencimiento': vencimientos[i, numero].item(),
+                        'monto': _a_monto(cuota[i, numero]),
+                        'monto_becado': _a_monto(cuota_becado[i, numero]),
+                    }
+                    for numero in range(n[i])
+                ]
+            opciones.append(opcion)
+
+        return {
+            'monto_colegiatura': _a_monto(total),
+            'numero_estudiantes': numero_estudiantes,
+            'combinaciones': combinaciones,
+            'periodos': [
+                (primer_mes + mes).astype('datetime64[D]').item() for mes in range(periodos)
+            ],
+            'opciones': opciones,
+        }
@@ -1,15 +1,52 @@
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 from datetime import date, timedelta
 from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+)
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from ..models import (
     PlanPago, Cuota, 
-    PagoCuota, Matricula, EstadoPagosEvento, InstitucionFinanciera
+    PagoCuota, Matricula, EstadoPagosEvento, InstitucionFinanciera,
+    MovimientoPlanPago
 )
+from .descuentos_service import DescuentosService
+from .diario_pagos_service import DiarioPagosService
+from .utils import PendientesAlConfirmar
 from modulos.modulo_certificados.models import Evento, Certificado
 from modulos.modulo_estudiantes.models import Estudiante
 
+# Tipo de salida para agregados monetarios (conserva 2 decimales en todos los backends)
+MONTO_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _monto(valor):
+    """Normaliza el resultado de un agregado monetario a Decimal con 2 decimales."""
+    return Decimal(valor or 0).quantize(Decimal('0.01'))
+
+
+# Pares (estudiante, evento) y planes cuyo EstadoPagosEvento debe recalcularse
+# al confirmar la transacción en curso del hilo
+_estados_pendientes = PendientesAlConfirmar(
+    lambda pendientes: SistemaPagosService._recalcular_estados_pendientes(
+        pendientes['pares'], pendientes['planes']
+    ),
+    nuevo=lambda: {'pares': set(), 'planes': set()},
+)
+
+# Marca de las escrituras en bloque que recalculan los saldos al terminar
+_saldos_en_bloque = threading.local()
+
+# Contador de PlanPago que corresponde a cada estado de cuota
+CONTADOR_POR_ESTADO = {
+    'pagado': 'cuotas_pagadas',
+    'pendiente': 'cuotas_pendientes',
+    'atrasado': 'cuotas_atrasadas',
+}
+
 
 class SistemaPagosService:
     """
@@ -112,7 +149,183 @@ class SistemaPagosService:
             cuotas.append(cuota)
         
         return cuotas
-    
+
+    @classmethod
+    def crear_planes_pago_masivo(cls, evento, estudiantes, numero_cuotas=None, monto_colegiatura=None,
+                                 aplicar_descuentos=False):
+        """
+        Crea planes de pago, cuotas, matrículas y estados de pago para muchos
+        estudiantes de un evento con un número constante de consultas.
+
+        Los estudiantes que ya tienen plan en el evento se omiten. Las cuotas
+        siguen las reglas de redondeo de `PlanPago.prorratear_monto`.
+
+        Args:
+            evento: Instancia de Evento
+            estudiantes: Iterable de instancias de Estudiante o de IDs
+            numero_cuotas: Número de cuotas para todos los planes (opcional, 1 por defecto)
+            monto_colegiatura: Monto total de colegiatura (opcional, costo del evento por defecto)
+            aplicar_descuentos: Si es True descuenta de la colegiatura de cada
+                estudiante sus becas y descuentos vigentes en el evento, que
+                quedan vinculados al plan (dos consultas para todo el lote)
+
+        Returns:
+            dict: {'creados': [...], 'omitidos': [...], 'total_cuotas': int}
+        """
+        if numero_cuotas is None:
+            numero_cuotas = 1
+        if not 1 <= numero_cuotas <= 60:
+            raise ValidationError("El número de cuotas debe estar entre 1 y 60")
+        if monto_colegiatura is None:
+            monto_colegiatura = evento.costo_colegiatura
+        monto_colegiatura = Decimal(str(monto_colegiatura))
+
+        # Normalizar a IDs conservando el orden y sin duplicados
+        estudiante_ids = list(dict.fromkeys(
+            getattr(est, 'pk', est) for est in estudiantes
+        ))
+        if not estudiante_ids:
+            return {'creados': [], 'omitidos': [], 'total_cuotas': 0}
+
+        fechas = [evento.fecha_inicio + timedelta(days=30 * i) for i in range(numero_cuotas)]
+
+        with transaction.atomic():
+            # Un solo pre-fetch por tabla con restricción única (estudiante, evento)
+            con_plan = set(PlanPago.objects.filter(
+                evento=evento, estudiante_id__in=estudiante_ids
+            ).values_list('estudiante_id', flat=True))
+            matriculas_existentes = {
+                m.estudiante_id: m for m in Matricula.objects.filter(
+                    evento=evento, estudiante_id__in=estudiante_ids
+                ).only('id', 'estudiante_id', 'plan_pago_id')
+            }
+
+            nuevos_ids = [eid for eid in estudiante_ids if eid not in con_plan]
+            omitidos = [
+                {'estudiante_id': eid, 'motivo': 'ya_tiene_plan'}
+                for eid in estudiante_ids if eid in con_plan
+            ]
+            if not nuevos_ids:
+                return {'creados': [], 'omitidos': omitidos, 'total_cuotas': 0}
+
+            beneficios = {}
+            if aplicar_descuentos:
+                beneficios = {
+                    eid: por_tipo['colegiatura']
+                    for eid, por_tipo in DescuentosService.calcular_descuentos_evento(
+                        evento, montos={'colegiatura': monto_colegiatura}, estudiante_ids=nuevos_ids
+                    ).items()
+                    if por_tipo['colegiatura']['descuento_total'] > 0
+                }
+            monto_estudiante = {
+                eid: max(beneficios[eid]['monto_final'], Decimal('0.00')) if eid in beneficios else monto_colegiatura
+                for eid in nuevos_ids
+            }
+            # Un prorrateo por monto distinto: sin beneficios todos comparten el mismo
+            cronogramas = {
+                monto: PlanPago.prorratear_monto(monto, numero_cuotas) if monto > 0 else []
+                for monto in set(monto_estudiante.values())
+            }
+
+            planes = PlanPago.objects.bulk_create([
+                PlanPago(
+                    estudiante_id=eid,
+                    evento=evento,
+                    numero_cuotas=numero_cuotas,
+                    monto_colegiatura=monto_estudiante[eid],
+                    # bulk_create no dispara señales: saldos iniciales explícitos
+                    monto_pendiente_total=monto_estudiante[eid],
+                    cuotas_registradas=len(cronogramas[monto_estudiante[eid]]),
+                    cuotas_pendientes=len(cronogramas[monto_estudiante[eid]]),
+                    proxima_fecha_vencimiento=fechas[0] if cronogramas[monto_estudiante[eid]] else None,
+                    estado_general='pendiente' if cronogramas[monto_estudiante[eid]] else 'completado',
+                    # Los montos con beneficios no deben volver al costo del evento
+                    # en los recálculos de cronogramas
+                    usa_monto_personalizado=eid in beneficios,
+                )
+                for eid in nuevos_ids
+            ])
+            # Algunos backends (MySQL) no devuelven PKs en bulk_create
+            if any(plan.pk is None for plan in planes):
+                planes = list(PlanPago.objects.filter(evento=evento, estudiante_id__in=nuevos_ids))
+            plan_por_estudiante = {plan.estudiante_id: plan for plan in planes}
+
+            Cuota.objects.bulk_create([
+                Cuota(
+                    plan_pago=plan,
+                    numero_cuota=idx,
+                    monto=monto,
+                    fecha_vencimiento=fecha,
+                    estado='pendiente',
+                )
+                for plan in planes
+                for idx, (monto, fecha) in enumerate(
+                    zip(cronogramas[monto_estudiante[plan.estudiante_id]], fechas), start=1
+                )
+            ], batch_size=1000)
+
+            if beneficios:
+                PlanPago.becas.through.objects.bulk_create([
+                    PlanPago.becas.through(planpago_id=plan_por_estudiante[eid].pk, beca_id=beca['id'])
+                    for eid, detalle in beneficios.items()
+                    for beca in detalle['becas_aplicadas']
+                ])
+                PlanPago.descuentos.through.objects.bulk_create([
+                    PlanPago.descuentos.through(planpago_id=plan_por_estudiante[eid].pk, descuento_id=descuento['id'])
+                    for eid, detalle in beneficios.items()
+                    for descuento in detalle['descuentos_aplicados']
+                ])
+
+            # Matrículas: crear las faltantes y vincular el plan a las existentes
+            Matricula.objects.bulk_create([
+                Matricula(
+                    estudiante_id=eid,
+                    evento=evento,
+                    plan_pago=plan_por_estudiante[eid],
+                    estado='activa',
+                )
+                for eid in nuevos_ids if eid not in matriculas_existentes
+            ])
+            sin_plan = []
+            for eid in nuevos_ids:
+                matricula = matriculas_existentes.get(eid)
+                if matricula and matricula.plan_pago_id is None:
+                    matricula.plan_pago = plan_por_estudiante[eid]
+                    sin_plan.append(matricula)
+            if sin_plan:
+                Matricula.objects.bulk_update(sin_plan, ['plan_pago'])
+
+            EstadoPagosEvento.objects.bulk_create(
+                [EstadoPagosEvento(estudiante_id=eid, evento=evento) for eid in nuevos_ids],
+                ignore_conflicts=True,
+            )
+            MovimientoPlanPago.objects.bulk_create([
+                MovimientoPlanPago(
+                    plan_pago=plan_por_estudiante[eid],
+                    tipo='cargo',
+                    concepto='colegiatura',
+                    monto=monto_estudiante[eid],
+                )
+                for eid in nuevos_ids
+            ])
+
+        creados = [
+            {
+                'estudiante_id': eid,
+                'plan_pago_id': plan_por_estudiante[eid].pk,
+                'numero_cuotas': numero_cuotas,
+                'monto_colegiatura': monto_estudiante[eid],
+                'descuento_aplicado': beneficios[eid]['descuento_total'] if eid in beneficios else Decimal('0.00'),
+                'matricula_existente': eid in matriculas_existentes,
+            }
+            for eid in nuevos_ids
+        ]
+        return {
+            'creados': creados,
+            'omitidos': omitidos,
+            'total_cuotas': sum(len(cronogramas[monto_estudiante[eid]]) for eid in nuevos_ids),
+        }
+
     @classmethod
     def registrar_pago_cuota(cls, cuota, monto_pagado, metodo_pago, 
                            institucion_financiera=None, codigo_comprobante=None,
@@ -133,7 +346,8 @@ class SistemaPagosService:
         """
         try:
             with transaction.atomic():
-                # Crear el registro de pago
+                # Crear el registro de pago: PagoCuota.save suma el abono a la
+                # cuota bajo bloqueo del plan y la marca como pagada al completarse
                 pago = PagoCuota.objects.create(
                     cuota=cuota,
                     monto_pagado=monto_pagado,
@@ -143,19 +357,14 @@ class SistemaPagosService:
                     codigo_comprobante=codigo_comprobante,
                     observaciones=observaciones
                 )
+                # Reflejar en la instancia recibida los saldos vigentes de la cuota
+                cuota.monto_pagado = pago.cuota.monto_pagado
+                cuota.estado = pago.cuota.estado
+                cuota.fecha_pago = pago.cuota.fecha_pago
                 
-                # Actualizar el estado de la cuota
-                cuota.monto_pagado += monto_pagado
-                
-                # Si se pagó completamente, marcar como pagada
-                if cuota.monto_pagado >= cuota.monto:
-                    cuota.estado = 'pagado'
-                    cuota.fecha_pago = date.today()
-                
-                cuota.save()
-                
-                # Actualizar el estado general de pagos del evento
-                cls.actualizar_estado_pagos_evento(cuota.estudiante, cuota.evento)
+                # El estado general de pagos del evento se recalcula al confirmar
+                # la transacción (la señal de Cuota marca el plan como pendiente)
+                cls.marcar_estado_pagos_pendiente(planes=[cuota.plan_pago_id])
                 
                 return pago
                 
@@ -171,30 +380,43 @@ class SistemaPagosService:
             estudiante: Instancia de Estudiante
             evento: Instancia de Evento
         """
-        try:
-            estado_pagos = EstadoPagosEvento.objects.get(estudiante=estudiante, evento=evento)
-            
-            # Obtener el plan de pago
-            plan_pago = PlanPago.objects.get(estudiante=estudiante, evento=evento)
-            
-            # Verificar estado de matrícula
-            matricula = Matricula.objects.get(estudiante=estudiante, evento=evento)
-            estado_pagos.matricula_pagada = matricula.estado == 'activa'
-            
-            # Verificar estado de colegiatura
-            cuotas_pendientes = Cuota.objects.filter(plan_pago=plan_pago, estado='pendiente').count()
-            
-            estado_pagos.colegiatura_al_dia = cuotas_pendientes == 0
-            
-            # Verificar estado de certificado
-            certificado = evento.certificados.filter(estudiante=estudiante).first()
-            if certificado:
-                estado_pagos.certificado_pagado = certificado.pagado
-            
-            estado_pagos.save()
-            
-        except EstadoPagosEvento.DoesNotExist:
-            pass
+        cls.actualizar_estados_pagos_lote([(estudiante.pk, evento.pk)])
+
+    @classmethod
+    def marcar_estado_pagos_pendiente(cls, pares=(), planes=()):
+        """
+        Registra pares (estudiante_id, evento_id) o IDs de PlanPago cuyo
+        EstadoPagosEvento debe recalcularse. Dentro de una transacción el
+        recálculo se difiere a `transaction.on_commit` y se hace una sola vez
+        por par, sin importar cuántas cuotas se modifiquen; fuera de una
+        transacción se ejecuta de inmediato.
+
+        Args:
+            pares: Iterable de tuplas (estudiante_id, evento_id)
+            planes: Iterable de IDs de PlanPago
+        """
+        pares = set(pares)
+        planes = set(planes)
+        if not pares and not planes:
+            return
+
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            cls._recalcular_estados_pendientes(pares, planes)
+            return
+
+        pendientes = _estados_pendientes.estado()
+        pendientes['pares'] |= pares
+        pendientes['planes'] |= planes
+
+    @classmethod
+    def _recalcular_estados_pendientes(cls, pares, planes):
+        pares = set(pares)
+        if planes:
+            pares |= set(
+                PlanPago.objects.filter(pk__in=planes).values_list('estudiante_id', 'evento_id')
+            )
+        cls.actualizar_estados_pagos_lote(pares)
     
     @classmethod
     def obtener_resumen_estudiante(cls, estudiante, evento):
@@ -208,35 +430,65 @@ class SistemaPagosService:
         Returns:
             dict: Resumen completo del estado de pagos
         """
-        try:
-            plan_pago = PlanPago.objects.get(estudiante=estudiante, evento=evento)
-            cuotas = Cuota.objects.filter(plan_pago=plan_pago).order_by('numero_cuota')
-            
-            # Calcular estadísticas
-            total_cuotas = cuotas.count()
-            cuotas_pagadas = cuotas.filter(estado='pagado').count()
-            cuotas_pendientes = cuotas.filter(estado='pendiente').count()
-            cuotas_atrasadas = cuotas.filter(estado='atrasado').count()
-            
-            # Calcular montos
+        return cls.obtener_resumenes_evento(evento, estudiante_ids=[estudiante.pk]).get(estudiante.pk)
+
+    @classmethod
+    def obtener_resumenes_evento(cls, evento, estudiante_ids=None):
+        """
+        Obtiene los resúmenes de pagos de todos los estudiantes de un evento
+        con un número fijo de consultas. Los montos se leen del diario de pagos
+        (último corte más movimientos recientes) y los contadores de cuotas de
+        las columnas agregadas de PlanPago, sin recorrer las cuotas.
+        
+        Args:
+            evento: Instancia de Evento
+            estudiante_ids: Lista de IDs de estudiantes a incluir (opcional, todos por defecto)
+        
+        Returns:
+            dict: {estudiante_id: resumen} con la misma estructura que
+            `obtener_resumen_estudiante`. Los estudiantes sin plan no aparecen.
+        """
+        planes = PlanPago.objects.filter(evento=evento).select_related('estudiante')
+        matriculas = Matricula.objects.filter(evento=evento)
+        certificados = Certificado.objects.filter(evento=evento)
+        if estudiante_ids is not None:
+            estudiante_ids = list(estudiante_ids)
+            if not estudiante_ids:
+                return {}
+            planes = planes.filter(estudiante_id__in=estudiante_ids)
+            matriculas = matriculas.filter(estudiante_id__in=estudiante_ids)
+            certificados = certificados.filter(estudiante_id__in=estudiante_ids)
+
+        planes = list(planes)
+        if not planes:
+            return {}
+
+        estado_matricula = dict(matriculas.values_list('estudiante_id', 'estado'))
+        # `.first()` por pk: el certificado más antiguo gana
+        certificado_pagado = dict(
+            certificados.order_by('-id').values_list('estudiante_id', 'pagado')
+        )
+
+        saldos = DiarioPagosService.saldos_planes([plan_pago.pk for plan_pago in planes])
+
+        resumenes = {}
+        for plan_pago in planes:
+            # Montos según el diario de pagos del plan
             monto_total = plan_pago.monto_colegiatura
-            monto_pagado = sum(cuota.monto_pagado for cuota in cuotas)
-            monto_pendiente = monto_total - monto_pagado
+            monto_pagado = saldos[plan_pago.pk]['abonos']
+            monto_pendiente = saldos[plan_pago.pk]['saldo']
             
             # Calcular progreso
             progreso_porcentaje = (monto_pagado / monto_total * 100) if monto_total > 0 else 0
             
-            # Obtener estado de matrícula y certificado
-            matricula = Matricula.objects.get(estudiante=estudiante, evento=evento)
-            certificado = Certificado.objects.filter(evento=evento, estudiante=estudiante).first()
-            
-            return {
-                'estudiante': estudiante,
+            estado = estado_matricula.get(plan_pago.estudiante_id)
+            resumenes[plan_pago.estudiante_id] = {
+                'estudiante': plan_pago.estudiante,
                 'evento': evento,
                 'plan_pago': plan_pago,
                 'matricula': {
-                    'estado': matricula.estado,
-                    'pagada': matricula.estado == 'activa'
+                    'estado': estado,
+                    'pagada': estado == 'activa'
                 },
                 'colegiatura': {
                     'monto_total': monto_total,
@@ -244,21 +496,20 @@ class SistemaPagosService:
                     'monto_pendiente': monto_pendiente,
                     'progreso_porcentaje': round(progreso_porcentaje, 2),
                     'cuotas': {
-                        'total': total_cuotas,
-                        'pagadas': cuotas_pagadas,
-                        'pendientes': cuotas_pendientes,
-                        'atrasadas': cuotas_atrasadas
-                    }
+                        'total': plan_pago.cuotas_registradas,
+                        'pagadas': plan_pago.cuotas_pagadas,
+                        'pendientes': plan_pago.cuotas_pendientes,
+                        'atrasadas': plan_pago.cuotas_atrasadas
+                    },
+                    'proxima_fecha_vencimiento': plan_pago.proxima_fecha_vencimiento
                 },
                 'certificado': {
-                    'pagado': certificado.pagado if certificado else False,
+                    'pagado': certificado_pagado.get(plan_pago.estudiante_id, False),
                     'monto': evento.costo_certificado
                 },
-                'estado_general': cls.calcular_estado_general(cuotas_pagadas, cuotas_atrasadas, total_cuotas)
+                'estado_general': plan_pago.estado_general
             }
-            
-        except PlanPago.DoesNotExist:
-            return None
+        return resumenes
     
     @classmethod
     def calcular_estado_general(cls, cuotas_pagadas, cuotas_atrasadas, total_cuotas):
@@ -283,104 +534,422 @@ class SistemaPagosService:
             return 'pendiente'
     
     @classmethod
-    def verificar_cuotas_atrasadas(cls):
+    def verificar_cuotas_atrasadas(cls, evento=None, tamano_lote=1000):
         """
-        Verifica y actualiza el estado de las cuotas atrasadas
-        
+        Marca como 'atrasado' las cuotas pendientes vencidas con UPDATE
+        condicionales por lotes y recalcula EstadoPagosEvento solo para los
+        pares (estudiante, evento) afectados, una vez por par al confirmar.
+
+        Args:
+            evento: Evento específico (opcional)
+            tamano_lote: Número máximo de cuotas por transacción
+
         Returns:
-            list: Lista de cuotas atrasadas
+            dict: Totales del barrido (cuotas marcadas, pares actualizados, lotes)
         """
-        cuotas_atrasadas = []
         fecha_actual = date.today()
-        
-        # Buscar cuotas pendientes que han vencido
-        cuotas_vencidas = Cuota.objects.filter(
+        vencidas = Cuota.objects.filter(
             estado='pendiente',
             fecha_vencimiento__lt=fecha_actual
         )
-        
-        for cuota in cuotas_vencidas:
-            cuota.estado = 'atrasado'
-            cuota.save()
-            cuotas_atrasadas.append(cuota)
-            
-            # Actualizar estado del evento
-            cls.actualizar_estado_pagos_evento(cuota.estudiante, cuota.evento)
-        
-        return cuotas_atrasadas
-    
+        if evento:
+            vencidas = vencidas.filter(plan_pago__evento=evento)
+
+        total_marcadas = 0
+        pares_afectados = set()
+        lotes = 0
+        ultimo_id = 0
+        while True:
+            filas = list(
+                vencidas.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values_list(
+                    'id', 'plan_pago__estudiante_id', 'plan_pago__evento_id', 'plan_pago_id'
+                )[:tamano_lote]
+            )
+            if not filas:
+                break
+            ultimo_id = filas[-1][0]
+            pares_lote = {(est_id, ev_id) for _, est_id, ev_id, _ in filas}
+
+            with transaction.atomic():
+                # Bloquear los planes antes que las cuotas, en el mismo orden que
+                # la aplicación de pagos, para evitar interbloqueos
+                list(
+                    PlanPago.objects.select_for_update()
+                    .filter(pk__in={fila[3] for fila in filas})
+                    .order_by('pk').values_list('pk', flat=True)
+                )
+                # El filtro por estado evita pisar cuotas pagadas entre la lectura y el UPDATE
+                total_marcadas += Cuota.objects.filter(
+                    id__in=[fila[0] for fila in filas],
+                    estado='pendiente',
+                ).update(estado='atrasado', fecha_modificacion=timezone.now())
+                # El UPDATE masivo no dispara señales: recalcular saldos de los planes
+                cls.recalcular_saldos({fila[3] for fila in filas})
+                cls.marcar_estado_pagos_pendiente(pares=pares_lote)
+
+            pares_afectados |= pares_lote
+            lotes += 1
+
+        return {
+            'cuotas_marcadas': total_marcadas,
+            'pares_actualizados': len(pares_afectados),
+            'lotes': lotes,
+            'fecha_corte': fecha_actual,
+        }
+
+    @staticmethod
+    @contextmanager
+    def saldos_en_bloque():
+        """
+        Suspende el mantenimiento incremental de saldos por cuota (señales de
+        Cuota) dentro del bloque. Quien lo usa recalcula al terminar los
+        saldos de los planes tocados con `recalcular_saldos`.
+        """
+        anterior = getattr(_saldos_en_bloque, 'activo', False)
+        _saldos_en_bloque.activo = True
+        try:
+            yield
+        finally:
+            _saldos_en_bloque.activo = anterior
+
+    @staticmethod
+    def saldos_incrementales_activos():
+        """Indica si las señales de Cuota deben mantener los saldos del plan."""
+        return not getattr(_saldos_en_bloque, 'activo', False)
+
     @classmethod
-    def obtener_estudiantes_atrasados(cls, evento=None):
+    def aplicar_cambio_cuota(cls, previo, actual):
         """
-        Obtiene la lista de estudiantes atrasados en sus pagos
-        
+        Actualiza incrementalmente los saldos agregados de PlanPago a partir
+        del cambio de una cuota, con UPDATE sobre expresiones F().
+
+        Args:
+            previo: Tupla `Cuota.valores_saldo()` antes del cambio, o None si
+                la cuota es nueva
+            actual: Misma tupla después del cambio, o None si la cuota se eliminó
+        """
+        cls.aplicar_cambios_cuotas([(previo, actual)])
+
+    @classmethod
+    def aplicar_cambios_cuotas(cls, cambios, pago=None):
+        """
+        Versión por lotes de `aplicar_cambio_cuota`: acumula los cambios de
+        varias cuotas y emite un UPDATE por plan afectado, para rutas que
+        escriben cuotas con `bulk_update` (sin señales). Los cambios de monto
+        pagado se asientan además en el diario de pagos.
+
+        Args:
+            cambios: Iterable de tuplas (previo, actual)
+            pago: Pago que originó los cambios (opcional)
+        """
+        cambios = list(cambios)
+        DiarioPagosService.registrar_cambios_cuotas(cambios, pago=pago)
+
+        deltas = {}
+        planes_cambio_estado = set()
+        for previo, actual in cambios:
+            if previo == actual:
+                continue
+            if previo is not None and actual is not None and previo[:2] != actual[:2]:
+                planes_cambio_estado.update((previo[0], actual[0]))
+            for fila, signo in ((previo, -1), (actual, 1)):
+                if fila is None:
+                    continue
+                plan_id, estado, monto_pagado, _ = fila
+                delta = deltas.setdefault(plan_id, {})
+                delta['cuotas_registradas'] = delta.get('cuotas_registradas', 0) + signo
+                contador = CONTADOR_POR_ESTADO.get(estado)
+                if contador:
+                    delta[contador] = delta.get(contador, 0) + signo
+                monto = (monto_pagado or Decimal('0.00')) * signo
+                delta['monto_pagado_total'] = delta.get('monto_pagado_total', Decimal('0.00')) + monto
+
+        if not deltas:
+            return
+
+        # Los reportes de cartera en caché dejan de ser válidos al confirmar
+        from .cartera_service import CarteraService
+        CarteraService.invalidar_cache_al_confirmar()
+
+        for plan_id, delta in deltas.items():
+            campos = {campo: F(campo) + valor for campo, valor in delta.items() if valor}
+            if 'monto_pagado_total' in campos:
+                campos['monto_pendiente_total'] = F('monto_pendiente_total') - delta['monto_pagado_total']
+            if campos:
+                PlanPago.objects.filter(pk=plan_id).update(**campos)
+
+        # Segundo UPDATE: el estado general depende de los contadores ya actualizados
+        cls.refrescar_estado_planes(deltas.keys())
+
+        # Un cambio de estado puede alterar EstadoPagosEvento: se recalcula una
+        # vez por par al confirmar la transacción
+        if planes_cambio_estado:
+            cls.marcar_estado_pagos_pendiente(planes=planes_cambio_estado)
+
+    @classmethod
+    def refrescar_estado_planes(cls, plan_ids):
+        """
+        Recalcula en SQL `estado_general` y `proxima_fecha_vencimiento` de los
+        planes indicados a partir de sus contadores.
+        """
+        PlanPago.objects.filter(pk__in=list(plan_ids)).update(
+            estado_general=Case(
+                When(cuotas_pagadas=F('cuotas_registradas'), then=Value('completado')),
+                When(cuotas_atrasadas__gt=0, then=Value('atrasado')),
+                When(cuotas_pagadas__gt=0, then=Value('al_dia')),
+                default=Value('pendiente'),
+            ),
+            proxima_fecha_vencimiento=Subquery(
+                Cuota.objects.filter(
+                    plan_pago=OuterRef('pk'),
+                    estado__in=['pendiente', 'atrasado'],
+                ).order_by('fecha_vencimiento').values('fecha_vencimiento')[:1]
+            ),
+        )
+
+    @classmethod
+    def recalcular_saldos(cls, plan_ids=None, evento=None, tamano_lote=500, corregir=True):
+        """
+        Recalcula desde las cuotas los saldos agregados de PlanPago y corrige
+        en bloque los planes cuyo valor almacenado se haya desviado.
+
         Args:
+            plan_ids: IDs de planes a revisar (opcional, todos por defecto)
             evento: Evento específico (opcional)
-        
+            tamano_lote: Número de planes por consulta agrupada
+            corregir: Si es False solo reporta las diferencias
+
         Returns:
-            list: Lista de estudiantes atrasados
+            dict: Planes revisados, IDs con diferencias y número de corregidos
         """
-        filtro = {'estado': 'atrasado'}
+        planes = PlanPago.objects.all()
+        if plan_ids is not None:
+            planes = planes.filter(pk__in=list(plan_ids))
         if evento:
-            filtro['plan_pago__evento'] = evento
-        
-        cuotas_atrasadas = Cuota.objects.filter(**filtro).select_related(
-            'plan_pago__estudiante',
-            'plan_pago__evento'
+            planes = planes.filter(evento=evento)
+        planes = planes.only('id', 'monto_colegiatura', *PlanPago.CAMPOS_SALDO).order_by('id')
+
+        revisados = 0
+        con_diferencias = []
+        corregidos = 0
+        ultimo_id = 0
+        while True:
+            lote = list(planes.filter(id__gt=ultimo_id)[:tamano_lote])
+            if not lote:
+                break
+            ultimo_id = lote[-1].pk
+            revisados += len(lote)
+
+            agregados = {
+                fila['plan_pago_id']: fila
+                for fila in Cuota.objects.filter(plan_pago__in=lote).values('plan_pago_id').annotate(
+                    registradas=Count('id'),
+                    pagadas=Count('id', filter=Q(estado='pagado')),
+                    pendientes=Count('id', filter=Q(estado='pendiente')),
+                    atrasadas=Count('id', filter=Q(estado='atrasado')),
+                    monto_pagado=Sum('monto_pagado', output_field=MONTO_FIELD),
+                    proxima=Min('fecha_vencimiento', filter=Q(estado__in=['pendiente', 'atrasado'])),
+                )
+            }
+
+            desviados = []
+            for plan in lote:
+                fila = agregados.get(plan.pk, {})
+                monto_pagado = _monto(fila.get('monto_pagado'))
+                esperado = {
+                    'monto_pagado_total': monto_pagado,
+                    'monto_pendiente_total': plan.monto_colegiatura - monto_pagado,
+                    'cuotas_registradas': fila.get('registradas', 0),
+                    'cuotas_pagadas': fila.get('pagadas', 0),
+                    'cuotas_pendientes': fila.get('pendientes', 0),
+                    'cuotas_atrasadas': fila.get('atrasadas', 0),
+                    'proxima_fecha_vencimiento': fila.get('proxima'),
+                    'estado_general': cls.calcular_estado_general(
+                        fila.get('pagadas', 0), fila.get('atrasadas', 0), fila.get('registradas', 0)
+                    ),
+                }
+                if any(getattr(plan, campo) != valor for campo, valor in esperado.items()):
+                    for campo, valor in esperado.items():
+                        setattr(plan, campo, valor)
+                    desviados.append(plan)
+
+            con_diferencias.extend(plan.pk for plan in desviados)
+            if corregir and desviados:
+                PlanPago.objects.bulk_update(desviados, PlanPago.CAMPOS_SALDO)
+                corregidos += len(desviados)
+
+        return {
+            'revisados': revisados,
+            'con_diferencias': con_diferencias,
+            'corregidos': corregidos,
+        }
+
+    @classmethod
+    def actualizar_estados_pagos_lote(cls, pares):
+        """
+        Versión por lotes de `actualizar_estado_pagos_evento`: recalcula el
+        estado de pagos de varios pares (estudiante_id, evento_id) con un
+        número fijo de consultas agrupadas.
+
+        Args:
+            pares: Iterable de tuplas (estudiante_id, evento_id)
+
+        Returns:
+            int: Número de registros de EstadoPagosEvento actualizados
+        """
+        pares = set(pares)
+        if not pares:
+            return 0
+        estudiante_ids = {est_id for est_id, _ in pares}
+        evento_ids = {ev_id for _, ev_id in pares}
+
+        estados = [
+            estado for estado in EstadoPagosEvento.objects.filter(
+                estudiante_id__in=estudiante_ids, evento_id__in=evento_ids
+            )
+            if (estado.estudiante_id, estado.evento_id) in pares
+        ]
+        if not estados:
+            return 0
+
+        matriculas = {
+            (est_id, ev_id): estado
+            for est_id, ev_id, estado in Matricula.objects.filter(
+                estudiante_id__in=estudiante_ids, evento_id__in=evento_ids
+            ).values_list('estudiante_id', 'evento_id', 'estado')
+        }
+        pendientes = {
+            (fila['plan_pago__estudiante_id'], fila['plan_pago__evento_id']): fila['total']
+            for fila in Cuota.objects.filter(
+                plan_pago__estudiante_id__in=estudiante_ids,
+                plan_pago__evento_id__in=evento_ids,
+                estado='pendiente',
+            ).values('plan_pago__estudiante_id', 'plan_pago__evento_id').annotate(total=Count('id'))
+        }
+        certificados = {
+            (est_id, ev_id): pagado
+            for est_id, ev_id, pagado in Certificado.objects.filter(
+                estudiante_id__in=estudiante_ids, evento_id__in=evento_ids
+            ).order_by('-id').values_list('estudiante_id', 'evento_id', 'pagado')
+        }
+
+        ahora = timezone.now()
+        for estado in estados:
+            par = (estado.estudiante_id, estado.evento_id)
+            if par in matriculas:
+                estado.matricula_pagada = matriculas[par] == 'activa'
+            estado.colegiatura_al_dia = pendientes.get(par, 0) == 0
+            if par in certificados:
+                estado.certificado_pagado = certificados[par]
+            estado.ultima_actualizacion = ahora
+
+        EstadoPagosEvento.objects.bulk_update(
+            estados,
+            ['matricula_pagada', 'colegiatura_al_dia', 'certificado_pagado', 'ultima_actualizacion'],
+            batch_size=500,
         )
+        return len(estados)
+    
+    @classmethod
+    def consulta_estudiantes_atrasados(cls, evento=None):
+        """
+        QuerySet agrupado por (estudiante, evento) con el número de cuotas
+        atrasadas, el monto adeudado y el vencimiento más antiguo.
+
+        Args:
+            evento: Evento específico (opcional)
+
+        Returns:
+            QuerySet: Filas de `values()` ordenadas por días de atraso (desc)
+        """
+        cuotas = Cuota.objects.filter(estado='atrasado')
+        if evento:
+            cuotas = cuotas.filter(plan_pago__evento=evento)
+
+        return cuotas.values(
+            'plan_pago__estudiante_id',
+            'plan_pago__estudiante__nombres',
+            'plan_pago__estudiante__apellidos',
+            'plan_pago__evento_id',
+            'plan_pago__evento__nombre',
+        ).annotate(
+            total_atrasadas=Count('id'),
+            monto_atrasado=Sum(F('monto') - F('monto_pagado'), output_field=MONTO_FIELD),
+            vencimiento_mas_antiguo=Min('fecha_vencimiento'),
+        ).order_by('vencimiento_mas_antiguo', 'plan_pago__estudiante_id', 'plan_pago__evento_id')
+
+    @classmethod
+    def obtener_estudiantes_atrasados(cls, evento=None, limite=None, desplazamiento=0):
+        """
+        Obtiene la lista de estudiantes atrasados en sus pagos
         
-        estudiantes_atrasados = []
-        for cuota in cuotas_atrasadas:
-            estudiante = cuota.plan_pago.estudiante
-            evento = cuota.plan_pago.evento
-            
-            if not any(e['estudiante_id'] == estudiante.id and e['evento_id'] == evento.id 
-                      for e in estudiantes_atrasados):
-                estudiantes_atrasados.append({
-                    'estudiante_id': estudiante.id,
-                    'estudiante_nombre': f"{estudiante.nombres} {estudiante.apellidos}",
-                    'evento_id': evento.id,
-                    'evento_nombre': evento.nombre,
-                    'cuotas_atrasadas': cuotas_atrasadas.filter(
-                        plan_pago__estudiante=estudiante,
-                        plan_pago__evento=evento,
-                        estado='atrasado'
-                    ).count(),
-                    'dias_atraso': (date.today() - cuota.fecha_vencimiento).days
-                })
+        Args:
+            evento: Evento específico (opcional)
+            limite: Máximo de filas a devolver (opcional)
+            desplazamiento: Filas a omitir para paginación
         
-        return estudiantes_atrasados
+        Returns:
+            list: Lista de estudiantes atrasados, del más atrasado al menos atrasado
+        """
+        filas = cls.consulta_estudiantes_atrasados(evento)
+        if limite is not None:
+            filas = filas[desplazamiento:desplazamiento + limite]
+        elif desplazamiento:
+            filas = filas[desplazamiento:]
+
+        hoy = date.today()
+        return [
+            {
+                'estudiante_id': fila['plan_pago__estudiante_id'],
+                'estudiante_nombre': f"{fila['plan_pago__estudiante__nombres']} {fila['plan_pago__estudiante__apellidos']}",
+                'evento_id': fila['plan_pago__evento_id'],
+                'evento_nombre': fila['plan_pago__evento__nombre'],
+                'cuotas_atrasadas': fila['total_atrasadas'],
+                'monto_atrasado': _monto(fila['monto_atrasado']),
+                'fecha_vencimiento_mas_antigua': fila['vencimiento_mas_antiguo'],
+                'dias_atraso': (hoy - fila['vencimiento_mas_antiguo']).days,
+            }
+            for fila in filas
+        ]
     
     @classmethod
-    def obtener_estadisticas_evento(cls, evento):
+    def obtener_estadisticas_evento(cls, evento, limite_atrasados=None, desplazamiento_atrasados=0):
         """
         Obtiene estadísticas completas de pagos para un evento
         
         Args:
             evento: Instancia de Evento
+            limite_atrasados: Máximo de estudiantes atrasados a incluir (opcional)
+            desplazamiento_atrasados: Estudiantes atrasados a omitir para paginación
         
         Returns:
             dict: Estadísticas del evento
         """
         try:
-            # Obtener todos los planes de pago del evento
-            planes_pago = PlanPago.objects.filter(evento=evento)
-            
-            total_estudiantes = planes_pago.count()
-            total_cuotas = sum(plan.numero_cuotas for plan in planes_pago)
-            
-            # Contar cuotas por estado
-            cuotas_pagadas = Cuota.objects.filter(plan_pago__evento=evento, estado='pagado').count()
-            
-            cuotas_pendientes = Cuota.objects.filter(plan_pago__evento=evento, estado='pendiente').count()
-            
-            cuotas_atrasadas = Cuota.objects.filter(plan_pago__evento=evento, estado='atrasado').count()
-            
-            # Calcular montos
-            monto_total_colegiatura = sum(plan.monto_colegiatura for plan in planes_pago)
-            monto_total_pagado = sum(
-                cuota.monto_pagado for cuota in Cuota.objects.filter(plan_pago__evento=evento)
+            # Totales de planes: una consulta agregada
+            planes = PlanPago.objects.filter(evento=evento).aggregate(
+                total_estudiantes=Count('id'),
+                total_cuotas=Sum('numero_cuotas'),
+                monto_total=Sum('monto_colegiatura', output_field=MONTO_FIELD),
             )
+            # Cuotas por estado: una consulta con agregación condicional
+            cuotas = Cuota.objects.filter(plan_pago__evento=evento).aggregate(
+                pagadas=Count('id', filter=Q(estado='pagado')),
+                pendientes=Count('id', filter=Q(estado='pendiente')),
+                atrasadas=Count('id', filter=Q(estado='atrasado')),
+            )
+            # Monto pagado: cortes del diario más movimientos recientes, agregados
+            totales_diario = DiarioPagosService.totales_evento(evento)
+
+            total_estudiantes = planes['total_estudiantes']
+            total_cuotas = planes['total_cuotas'] or 0
+            cuotas_pagadas = cuotas['pagadas']
+            cuotas_pendientes = cuotas['pendientes']
+            cuotas_atrasadas = cuotas['atrasadas']
+            monto_total_colegiatura = _monto(planes['monto_total'])
+            monto_total_pagado = _monto(totales_diario['abonos'])
             
             return {
                 'evento': evento,
@@ -400,7 +969,9 @@ class SistemaPagosService:
                     'total_pendiente': monto_total_colegiatura - monto_total_pagado,
                     'progreso_porcentaje': round((monto_total_pagado / monto_total_colegiatura * 100) if monto_total_colegiatura > 0 else 0, 2)
                 },
-                'estudiantes_atrasados': cls.obtener_estudiantes_atrasados(evento)
+                'estudiantes_atrasados': cls.obtener_estudiantes_atrasados(
+                    evento, limite=limite_atrasados, desplazamiento=desplazamiento_atrasados
+                )
             }
             
         except Exception as e:
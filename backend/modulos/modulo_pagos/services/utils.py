@@ -0,0 +1,97 @@
+import re
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+
+# Formatos de fecha aceptados en los archivos de extractos y de pagos
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d')
+
+
+def leer_monto(valor):
+    """
+    Convierte un monto leído de un archivo a Decimal con dos decimales.
+    Acepta símbolo de moneda, espacios y coma o punto como separador decimal.
+
+    Raises:
+        InvalidOperation: Si el texto no es un número
+    """
+    texto = re.sub(r'[\s$]', '', str(valor or ''))
+    if ',' in texto and '.' in texto:
+        texto = texto.replace(',', '')
+    else:
+        texto = texto.replace(',', '.')
+    return Decimal(texto).quantize(Decimal('0.01'))
+
+
+def leer_fecha(valor):
+    """
+    Convierte una fecha leída de un archivo en alguno de `FORMATOS_FECHA`.
+
+    Raises:
+        ValueError: Si la fecha no tiene un formato reconocido
+    """
+    texto = str(valor or '').strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha no reconocida: {texto}")
+
+
+def _dentro_de(contexto, registro):
+    """Indica si `contexto` está dentro del bloque atómico (y savepoints) de `registro`."""
+    bloques, savepoints = contexto
+    bloques_registro, savepoints_registro = registro
+    return (
+        len(bloques_registro) <= len(bloques)
+        and all(a is b for a, b in zip(bloques_registro, bloques))
+        and savepoints[:len(savepoints_registro)] == savepoints_registro
+    )
+
+
+class PendientesAlConfirmar(threading.local):
+    """
+    Trabajo acumulado en la transacción en curso del hilo que se ejecuta una
+    sola vez al confirmarla, con `transaction.on_commit`.
+
+    El callback queda registrado en el bloque atómico donde se pidió y no se
+    repite mientras las marcas lleguen desde ese bloque o sus savepoints
+    internos. Al salir de él se registra otro, porque Django descarta los
+    callbacks de un savepoint revertido; los repetidos no hacen nada, el
+    primero que se ejecuta vacía el estado. Lo acumulado en una transacción
+    revertida se descarta al empezar la siguiente.
+
+    Args:
+        vaciar: Función que recibe el estado acumulado al confirmar
+        nuevo: Fábrica del estado vacío (dict por defecto)
+    """
+
+    def __init__(self, vaciar, nuevo=dict):
+        self._vaciar = vaciar
+        self._nuevo = nuevo
+        self._estado = None
+        self._registro = None
+
+    def estado(self):
+        """
+        Estado pendiente de la transacción en curso, donde el llamador acumula
+        su trabajo. Debe llamarse dentro de un bloque atómico.
+        """
+        connection = transaction.get_connection()
+        contexto = (tuple(connection.atomic_blocks), tuple(connection.savepoint_ids))
+        if self._registro is not None and _dentro_de(contexto, self._registro):
+            return self._estado
+        if self._registro is None or self._registro[0][0] is not contexto[0][0]:
+            # Primera marca de la transacción
+            self._estado = self._nuevo()
+        self._registro = contexto
+        transaction.on_commit(self._al_confirmar)
+        return self._estado
+
+    def _al_confirmar(self):
+        estado, self._estado, self._registro = self._estado, None, None
+        if estado is not None:
+            self._vaciar(estado)
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
 from modulos.modulo_estudiantes.models import Estudiante
 from modulos.modulo_certificados.models import Evento
-from .models import Matricula, PlanPago, EstadoPagosEvento
+from .models import Cuota, Descuento, Matricula, Pago, PagoCuota, PlanPago, EstadoPagosEvento
+from .services.cierre_caja_service import CierreCajaService
+from .services.descuentos_service import DescuentosService
 from .services.sistema_pagos_service import SistemaPagosService
 
 
@@ -76,3 +79,107 @@ def asegurar_plan_y_cuotas_en_matricula(sender, instance: Matricula, created, **
         instance.save(update_fields=["plan_pago"]) 
 
 
+
+
+def _afecta_saldos(update_fields):
+    if update_fields is None:
+        return True
+    campos = set(update_fields)
+    return bool(campos & {'plan_pago', 'plan_pago_id', 'estado', 'monto_pagado', 'fecha_vencimiento'})
+
+
+@receiver(pre_save, sender=Cuota)
+def capturar_saldo_previo_cuota(sender, instance: Cuota, raw=False, update_fields=None, **kwargs):
+    """
+    Guarda el estado persistido de la cuota antes de modificarla para poder
+    aplicar a su plan solo la diferencia. Pago y PagoCuota actualizan saldos
+    a través de `cuota.save()`, por lo que quedan cubiertos aquí.
+    """
+    instance._saldo_previo = None
+    if raw or instance.pk is None or not _afecta_saldos(update_fields):
+        return
+    if not SistemaPagosService.saldos_incrementales_activos():
+        return
+    instance._saldo_previo = Cuota.objects.filter(pk=instance.pk).values_list(
+        *Cuota.CAMPOS_SALDO
+    ).first()
+
+
+@receiver(post_save, sender=Cuota)
+def actualizar_saldos_plan_por_cuota(sender, instance: Cuota, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _afecta_saldos(update_fields):
+        return
+    if not SistemaPagosService.saldos_incrementales_activos():
+        return
+    SistemaPagosService.aplicar_cambio_cuota(
+        getattr(instance, '_saldo_previo', None), instance.valores_saldo()
+    )
+
+
+@receiver(post_delete, sender=Cuota)
+def descontar_saldos_plan_por_cuota(sender, instance: Cuota, origin=None, **kwargs):
+    # Si se elimina el plan (o su estudiante/evento) en cascada no hay saldos
+    # que mantener ni movimientos que asentar
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Cuota:
+        return
+    if not SistemaPagosService.saldos_incrementales_activos():
+        return
+    SistemaPagosService.aplicar_cambio_cuota(instance.valores_saldo(), None)
+
+
+@receiver(post_save, sender=Descuento)
+@receiver(post_delete, sender=Descuento)
+def invalidar_codigos_promocionales(sender, instance: Descuento, **kwargs):
+    """Los códigos promocionales en caché dejan de ser válidos al cambiar un Descuento."""
+    DescuentosService.invalidar_cache_codigos()
+
+
+@receiver(pre_save, sender=Pago)
+def capturar_cierre_previo_pago(sender, instance: Pago, raw=False, **kwargs):
+    """Guarda la contribución persistida del pago al cierre de caja antes de modificarlo."""
+    if raw or instance.pk is None:
+        return
+    instance._cierre_previo = Pago.objects.filter(pk=instance.pk).values(
+        'fecha_pago', 'tipo_pago', 'metodo_pago', 'institucion_financiera_id', 'evento_id', 'monto'
+    ).first()
+
+
+@receiver(post_save, sender=Pago)
+def actualizar_cierre_caja_por_pago(sender, instance: Pago, raw=False, **kwargs):
+    if raw:
+        return
+    CierreCajaService.aplicar_cambio(
+        'pago', getattr(instance, '_cierre_previo', None), CierreCajaService.valores_pago(instance)
+    )
+    instance._cierre_previo = None
+
+
+@receiver(pre_delete, sender=Pago)
+def descontar_cierre_caja_por_pago(sender, instance: Pago, **kwargs):
+    # pre_delete corre dentro de la transacción del borrado
+    CierreCajaService.aplicar_cambio('pago', CierreCajaService.valores_pago(instance), None)
+
+
+@receiver(pre_save, sender=PagoCuota)
+def capturar_cierre_previo_pago_cuota(sender, instance: PagoCuota, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._cierre_previo = PagoCuota.objects.filter(pk=instance.pk).values(
+        'fecha_pago', 'metodo_pago', 'institucion_financiera_id',
+        evento_id=F('cuota__plan_pago__evento_id'), monto=F('monto_pagado'),
+    ).first()
+
+
+@receiver(post_save, sender=PagoCuota)
+def actualizar_cierre_caja_por_pago_cuota(sender, instance: PagoCuota, raw=False, **kwargs):
+    if raw:
+        return
+    CierreCajaService.aplicar_cambio(
+        'pago_cuota', getattr(instance, '_cierre_previo', None), CierreCajaService.valores_pago_cuota(instance)
+    )
+    instance._cierre_previo = None
+
+
+@receiver(pre_delete, sender=PagoCuota)
+def descontar_cierre_caja_por_pago_cuota(sender, instance: PagoCuota, **kwargs):
+    CierreCajaService.aplicar_cambio('pago_cuota', CierreCajaService.valores_pago_cuota(instance), None)
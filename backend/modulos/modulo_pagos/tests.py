@@ -1,17 +1,59 @@
-from datetime import date, timedelta
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from io import BytesIO, StringIO
+import os
+import tempfile
+import threading
+import zipfile
+from unittest import skipUnless
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from pypdf import PdfReader
 
 from modulos.modulo_estudiantes.models import Estudiante
 from modulos.modulo_certificados.models import Evento
+from modulos.modulo_certificados.services.comprobante_generator import generar_comprobantes_lote
 from modulos.modulo_pagos.models import (
     PlanPago,
     Cuota,
     Beca,
     Descuento,
+    Matricula,
+    EstadoPagosEvento,
+    Pago,
+    PagoCuota,
+    PagoCuotaAplicada,
+    PagoConvenio,
+    InstitucionFinanciera,
+    MovimientoPlanPago,
+    CorteSaldoPlanPago,
+    CierreCajaDiario,
+    LineaExtractoBancario,
 )
+from modulos.modulo_pagos.services.sistema_pagos_service import SistemaPagosService
+from modulos.modulo_pagos.services.convenios_service import ConveniosService
+from modulos.modulo_pagos.services.diario_pagos_service import DiarioPagosService
+from modulos.modulo_pagos.services.conciliacion_bancaria_service import ConciliacionBancariaService
+from modulos.modulo_pagos.services.cartera_service import CarteraService
+from modulos.modulo_pagos.services.proyeccion_cobros_service import ProyeccionCobrosService
+from modulos.modulo_pagos.services.cronogramas_service import CronogramasService
+from modulos.modulo_pagos.services.simulador_planes_service import SimuladorPlanesService
+from modulos.modulo_pagos.services.descuentos_service import DescuentosService
+from modulos.modulo_pagos.services.cierre_caja_service import CierreCajaService
+from modulos.modulo_pagos.services.comprobantes_service import ComprobantesService
+from modulos.modulo_pagos.services.estado_cuenta_service import EstadoCuentaService
+from modulos.modulo_pagos.services.pagos_lote_service import PagosLoteService
+from modulos.modulo_pagos.services.utils import PendientesAlConfirmar
 
 
 class PagosModelsTest(TestCase):
@@ -99,3 +141,1699 @@ class PagosModelsTest(TestCase):
         self.assertEqual(dcto_monto, Decimal("15.00"))
 
 
+
+
+def _crear_evento(codigo, dias_transcurridos=0, **campos):
+    """Evento de prueba `EVT-<codigo>` que empezó hace `dias_transcurridos` días."""
+    inicio = date.today() - timedelta(days=dias_transcurridos)
+    datos = {
+        "nombre": f"Evento {codigo.title()}",
+        "tipo": "diploma",
+        "fecha_inicio": inicio,
+        "fecha_fin": date.today() + timedelta(days=90),
+        "lugar": "UTEQ",
+        "codigo_evento": f"EVT-{codigo}",
+        "aval": "UTEQ",
+        "horas_academicas": 120,
+        "costo_colegiatura": Decimal("300.00"),
+    }
+    datos.update(campos)
+    return Evento.objects.create(**datos)
+
+
+def _crear_estudiantes(codigo, cantidad, prefijo_cedula, ciudades=("Quevedo",)):
+    """Estudiantes `EST-<codigo>-<i>` con cédulas `<prefijo_cedula><i:02d>`."""
+    return [
+        Estudiante.objects.create(
+            nombres=f"Est{i}",
+            apellidos=codigo.title(),
+            cedula=f"{prefijo_cedula}{i:02d}",
+            correo=f"{codigo.lower()}{i}@example.com",
+            ciudad=ciudades[i % len(ciudades)],
+            codigo_estudiante=f"EST-{codigo}-{i}",
+        )
+        for i in range(cantidad)
+    ]
+
+
+def _crear_plan_para_pagos(codigo):
+    evento = _crear_evento(codigo)
+    estudiante, = _crear_estudiantes(codigo, 1, "09500000")
+    SistemaPagosService.crear_planes_pago_masivo(evento, [estudiante], numero_cuotas=3)
+    return PlanPago.objects.get(estudiante=estudiante, evento=evento)
+
+
+def _contar_recalculos():
+    """Cuenta las llamadas a actualizar_estados_pagos_lote sin alterar su efecto."""
+    return patch.object(
+        SistemaPagosService, "actualizar_estados_pagos_lote",
+        wraps=SistemaPagosService.actualizar_estados_pagos_lote,
+    )
+
+
+class EventoPagosTestCase(TestCase):
+    """
+    Base de las pruebas con un evento y sus estudiantes, creados una sola vez
+    por clase. Cada subclase define el código, los estudiantes y los campos
+    del evento que cambian.
+    """
+    codigo = None
+    numero_estudiantes = 1
+    prefijo_cedula = "09000000"
+    ciudades = ("Quevedo",)
+    campos_evento = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.evento = _crear_evento(cls.codigo, **cls.campos_evento)
+        cls.estudiantes = _crear_estudiantes(
+            cls.codigo, cls.numero_estudiantes, cls.prefijo_cedula, cls.ciudades
+        )
+        cls.estudiante = cls.estudiantes[0]
+
+
+class CrearPlanesPagoMasivoTest(EventoPagosTestCase):
+    codigo = "MASIVO"
+    numero_estudiantes = 6
+    campos_evento = {
+        "costo_matricula": Decimal("50.00"),
+        "costo_colegiatura": Decimal("100.00"),
+        "costo_certificado": Decimal("25.00"),
+    }
+
+    def test_crea_planes_y_omite_existentes(self):
+        with CaptureQueriesContext(connection) as pocos:
+            SistemaPagosService.crear_planes_pago_masivo(
+                self.evento, self.estudiantes[:2], numero_cuotas=3
+            )
+        with CaptureQueriesContext(connection) as muchos:
+            resultado = SistemaPagosService.crear_planes_pago_masivo(
+                self.evento, self.estudiantes, numero_cuotas=3
+            )
+
+        # El número de consultas no depende de la cantidad de estudiantes
+        self.assertEqual(len(pocos), len(muchos))
+        self.assertEqual(len(resultado["creados"]), 4)
+        self.assertEqual(len(resultado["omitidos"]), 2)
+        self.assertEqual(PlanPago.objects.filter(evento=self.evento).count(), 6)
+        self.assertEqual(Matricula.objects.filter(evento=self.evento, estado="activa").count(), 6)
+        self.assertEqual(EstadoPagosEvento.objects.filter(evento=self.evento).count(), 6)
+
+        # 100 / 3 → 33.33, 33.33, 33.34
+        plan = PlanPago.objects.get(evento=self.evento, estudiante=self.estudiantes[-1])
+        montos = list(plan.cuotas.order_by("numero_cuota").values_list("monto", flat=True))
+        self.assertEqual(montos, [Decimal("33.33"), Decimal("33.33"), Decimal("33.34")])
+
+
+class DescuentosEventoTest(EventoPagosTestCase):
+    codigo = "DCTOS"
+    numero_estudiantes = 4
+    prefijo_cedula = "09100000"
+    campos_evento = {"costo_matricula": Decimal("50.00"), "costo_certificado": Decimal("25.00")}
+
+    def setUp(self) -> None:
+        vigencia = {"fecha_inicio": date.today(), "fecha_fin": date.today() + timedelta(days=10)}
+        for est in self.estudiantes[:2]:
+            Beca.objects.create(
+                estudiante=est, evento=self.evento, nombre_beca="Excelencia", tipo_beca="porcentual",
+                porcentaje_descuento=Decimal("12.50"), aplica_certificado=True, estado="activa",
+                motivo="Alto rendimiento", **vigencia,
+            )
+        Descuento.objects.create(
+            estudiante=self.estudiantes[1], evento=self.evento, nombre_descuento="Promo",
+            tipo_descuento="monto_fijo", monto_descuento=Decimal("40.00"), aplica_matricula=False,
+            estado="activo", motivo="Promoción", **vigencia,
+        )
+        # Vencida e inactiva: no aplican
+        Beca.objects.create(
+            estudiante=self.estudiantes[2], evento=self.evento, nombre_beca="Vencida", tipo_beca="monto_fijo",
+            monto_descuento=Decimal("20.00"), estado="activa", motivo="-",
+            fecha_inicio=date.today() - timedelta(days=30), fecha_fin=date.today() - timedelta(days=1),
+        )
+        Descuento.objects.create(
+            estudiante=self.estudiantes[3], evento=self.evento, nombre_descuento="Suspendido",
+            tipo_descuento="porcentual", porcentaje_descuento=Decimal("50.00"), estado="inactivo",
+            motivo="-", **vigencia,
+        )
+
+    def test_igual_al_calculo_por_estudiante(self):
+        ids = [est.pk for est in self.estudiantes]
+        with CaptureQueriesContext(connection) as consultas:
+            descuentos = DescuentosService.calcular_descuentos_evento(self.evento, estudiante_ids=ids)
+        self.assertEqual(len(consultas), 2)
+        self.assertEqual(set(descuentos), set(ids))
+
+        montos = {"matricula": Decimal("50.00"), "colegiatura": Decimal("300.00"), "certificado": Decimal("25.00")}
+        for eid in ids:
+            for tipo_pago, monto in montos.items():
+                esperado = DescuentosService.calcular_descuento_total(eid, self.evento.pk, tipo_pago, monto)
+                detalle = descuentos[eid][tipo_pago]
+                self.assertEqual(detalle["descuento_total"], esperado["descuento_total"])
+                self.assertEqual(detalle["monto_final"], esperado["monto_final"])
+                self.assertEqual(
+                    [b["id"] for b in detalle["becas_aplicadas"]], [b["id"] for b in esperado["becas_aplicadas"]]
+                )
+                self.assertEqual(
+                    [d["id"] for d in detalle["descuentos_aplicados"]],
+                    [d["id"] for d in esperado["descuentos_aplicados"]],
+                )
+
+        # 12.5% de 300 = 37.50, más 40 fijos
+        self.assertEqual(descuentos[ids[1]]["colegiatura"]["monto_final"], Decimal("222.50"))
+        # Sin filtro solo aparecen estudiantes con beneficios vigentes
+        self.assertEqual(set(DescuentosService.calcular_descuentos_evento(self.evento)), set(ids[:2]))
+        with self.assertRaises(ValidationError):
+            DescuentosService.calcular_descuentos_evento(self.evento, montos={"inscripcion": 10})
+
+    def test_creacion_masiva_con_descuentos(self):
+        resultado = SistemaPagosService.crear_planes_pago_masivo(
+            self.evento, self.estudiantes, numero_cuotas=3, aplicar_descuentos=True
+        )
+        montos = {item["estudiante_id"]: item["monto_colegiatura"] for item in resultado["creados"]}
+        self.assertEqual(
+            [montos[est.pk] for est in self.estudiantes],
+            [Decimal("262.50"), Decimal("222.50"), Decimal("300.00"), Decimal("300.00")],
+        )
+        self.assertEqual(resultado["total_cuotas"], 12)
+
+        plan = PlanPago.objects.get(evento=self.evento, estudiante=self.estudiantes[1])
+        self.assertTrue(plan.usa_monto_personalizado)
+        self.assertFalse(plan.tiene_convenio)
+        self.assertEqual(plan.becas.count(), 1)
+        self.assertEqual(plan.descuentos.count(), 1)
+        self.assertEqual(plan.monto_pendiente_total, Decimal("222.50"))
+        self.assertEqual(
+            list(plan.cuotas.order_by("numero_cuota").values_list("monto", flat=True)),
+            [Decimal("74.17"), Decimal("74.17"), Decimal("74.16")],
+        )
+        sin_beneficios = PlanPago.objects.get(evento=self.evento, estudiante=self.estudiantes[3])
+        self.assertFalse(sin_beneficios.usa_monto_personalizado)
+        self.assertEqual(sin_beneficios.descuentos.count(), 0)
+
+        # El recálculo del evento conserva los montos con beneficios
+        reporte = CronogramasService.recalcular_evento(self.evento, simular=True)
+        self.assertIn({"plan_pago_id": plan.id, "motivo": "monto_personalizado"}, reporte["omitidos"])
+
+    def test_expirar_beneficios(self):
+        Descuento.objects.create(
+            estudiante=self.estudiantes[0], evento=self.evento, nombre_descuento="Antiguo",
+            tipo_descuento="porcentual", porcentaje_descuento=Decimal("5.00"), estado="activo", motivo="-",
+            fecha_inicio=date.today() - timedelta(days=60), fecha_fin=date.today() - timedelta(days=30),
+        )
+        self.assertEqual(DescuentosService.expirar_beneficios(simular=True), {"becas": 1, "descuentos": 1})
+
+        salida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command("expirar_beneficios", stdout=salida)
+        self.assertEqual(len(consultas), 2)
+        self.assertIn("Becas expiradas: 1", salida.getvalue())
+        self.assertEqual(Beca.objects.get(nombre_beca="Vencida").estado, "expirada")
+        self.assertEqual(Descuento.objects.get(nombre_descuento="Antiguo").estado, "expirado")
+        # Los vigentes no cambian y una segunda pasada no encuentra nada
+        self.assertEqual(DescuentosService.becas_vigentes().count(), 2)
+        self.assertEqual(DescuentosService.expirar_beneficios(), {"becas": 0, "descuentos": 0})
+
+
+def _crear_codigo_promocional(sufijo, max_usos=None):
+    evento = _crear_evento(
+        f"PROMO-{sufijo}", horas_academicas=40, costo_colegiatura=Decimal("200.00")
+    )
+    estudiante, = _crear_estudiantes(f"PROMO-{sufijo}", 1, "09200000")
+    return Descuento.objects.create(
+        estudiante=estudiante, evento=evento, nombre_descuento="Campaña", tipo_descuento="porcentual",
+        porcentaje_descuento=Decimal("10.00"), estado="activo", motivo="Campaña",
+        codigo_promocional=f"PROMO{sufijo}", max_usos=max_usos,
+        fecha_inicio=date.today(), fecha_fin=date.today() + timedelta(days=10),
+    )
+
+
+class CodigoPromocionalTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.descuento = _crear_codigo_promocional("1", max_usos=2)
+        self.args = (self.descuento.estudiante_id, self.descuento.evento_id)
+
+    def test_validacion_en_cache(self):
+        with CaptureQueriesContext(connection) as primera:
+            resultado = DescuentosService.validar_codigo_promocional("PROMO1", *self.args)
+        self.assertTrue(resultado["valido"])
+        self.assertEqual(resultado["descuento"]["usos_restantes"], 2)
+        self.assertEqual(len(primera), 1)
+        with CaptureQueriesContext(connection) as segunda:
+            DescuentosService.validar_codigo_promocional("PROMO1", *self.args)
+            otro = DescuentosService.validar_codigo_promocional("PROMO1", self.args[0], self.args[1] + 1)
+        self.assertEqual(len(segunda), 0)
+        self.assertIn("no aplica", otro["error"])
+
+        # Los códigos inexistentes también se guardan en caché
+        DescuentosService.validar_codigo_promocional("NOEXISTE", *self.args)
+        with CaptureQueriesContext(connection) as invalido:
+            resultado = DescuentosService.validar_codigo_promocional("NOEXISTE", *self.args)
+        self.assertEqual(len(invalido), 0)
+        self.assertFalse(resultado["valido"])
+        self.assertFalse(DescuentosService.validar_codigo_promocional("", *self.args)["valido"])
+
+        # Guardar un Descuento invalida la caché
+        self.descuento.estado = "inactivo"
+        self.descuento.save()
+        self.assertFalse(DescuentosService.validar_codigo_promocional("PROMO1", *self.args)["valido"])
+
+    def test_canje_respeta_limite(self):
+        primero = DescuentosService.canjear_codigo_promocional("PROMO1", *self.args)
+        self.assertTrue(primero["canjeado"])
+        self.assertEqual(primero["descuento"]["usos_restantes"], 1)
+        self.assertTrue(DescuentosService.canjear_codigo_promocional("PROMO1", *self.args)["canjeado"])
+        agotado = DescuentosService.canjear_codigo_promocional("PROMO1", *self.args)
+        self.assertFalse(agotado["valido"])
+        self.assertIn("límite", agotado["error"])
+        self.descuento.refresh_from_db()
+        self.assertEqual(self.descuento.usos, 2)
+        self.assertFalse(DescuentosService.validar_codigo_promocional("PROMO1", *self.args)["valido"])
+
+    def test_canje_con_cache_desactualizada_no_supera_el_limite(self):
+        # La caché dice que quedan 2 usos, pero otro proceso ya los consumió
+        # (update() no dispara la invalidación): decide el UPDATE condicional
+        self.assertEqual(
+            DescuentosService.validar_codigo_promocional("PROMO1", *self.args)["descuento"]["usos_restantes"], 2
+        )
+        Descuento.objects.filter(pk=self.descuento.pk).update(usos=2)
+        agotado = DescuentosService.canjear_codigo_promocional("PROMO1", *self.args)
+        self.assertFalse(agotado["valido"])
+        self.assertNotIn("canjeado", agotado)
+        self.descuento.refresh_from_db()
+        self.assertEqual(self.descuento.usos, 2)
+        # La entrada obsoleta se descartó
+        self.assertFalse(DescuentosService.validar_codigo_promocional("PROMO1", *self.args)["valido"])
+
+
+class VerificarCuotasAtrasadasTest(EventoPagosTestCase):
+    codigo = "VENCIDO"
+    numero_estudiantes = 3
+    prefijo_cedula = "09100000"
+    campos_evento = {"dias_transcurridos": 45}
+
+    def setUp(self) -> None:
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=3)
+
+    def test_barrido_por_lotes(self):
+        # Cuotas 1 (hace 45 días) y 2 (hace 15 días) vencidas para 3 estudiantes
+        with _contar_recalculos() as recalculos, self.captureOnCommitCallbacks(execute=True):
+            resultado = SistemaPagosService.verificar_cuotas_atrasadas(tamano_lote=2)
+        # Los lotes comparten la transacción externa: un solo recálculo diferido
+        self.assertEqual(recalculos.call_count, 1)
+        self.assertEqual(len(recalculos.call_args.args[0]), 3)
+        self.assertEqual(resultado["cuotas_marcadas"], 6)
+        self.assertEqual(resultado["pares_actualizados"], 3)
+        self.assertEqual(resultado["lotes"], 3)
+        self.assertEqual(Cuota.objects.filter(estado="atrasado").count(), 6)
+        self.assertEqual(Cuota.objects.filter(estado="pendiente").count(), 3)
+
+        # Segunda ejecución no encuentra nada nuevo
+        resultado = SistemaPagosService.verificar_cuotas_atrasadas()
+        self.assertEqual(resultado["cuotas_marcadas"], 0)
+        self.assertEqual(resultado["lotes"], 0)
+
+        estado = EstadoPagosEvento.objects.filter(evento=self.evento).first()
+        self.assertTrue(estado.matricula_pagada)
+
+    def test_estudiantes_atrasados_agrupados(self):
+        SistemaPagosService.verificar_cuotas_atrasadas()
+        # Abono parcial a una cuota atrasada del primer estudiante
+        cuota = Cuota.objects.filter(estado="atrasado").order_by("id").first()
+        Cuota.objects.filter(pk=cuota.pk).update(monto_pagado=Decimal("40.00"))
+
+        atrasados = SistemaPagosService.obtener_estudiantes_atrasados(self.evento)
+        self.assertEqual(len(atrasados), 3)
+        for item in atrasados:
+            self.assertEqual(item["cuotas_atrasadas"], 2)
+            self.assertEqual(item["dias_atraso"], 45)
+        montos = sorted(item["monto_atrasado"] for item in atrasados)
+        self.assertEqual(montos, [Decimal("160.00"), Decimal("200.00"), Decimal("200.00")])
+
+        pagina = SistemaPagosService.obtener_estudiantes_atrasados(
+            self.evento, limite=2, desplazamiento=2
+        )
+        self.assertEqual(len(pagina), 1)
+
+    def test_estadisticas_evento_agregadas(self):
+        SistemaPagosService.verificar_cuotas_atrasadas()
+        cuota = Cuota.objects.filter(estado="pendiente").order_by("id").first()
+        cuota.estado = "pagado"
+        cuota.monto_pagado = Decimal("100.00")
+        cuota.save()
+        # Parte del pagado queda en cortes y parte en movimientos posteriores
+        DiarioPagosService.compactar(margen=timedelta(0))
+        cuota = Cuota.objects.filter(estado="pendiente").order_by("id").first()
+        cuota.monto_pagado = Decimal("40.00")
+        cuota.save()
+
+        with CaptureQueriesContext(connection) as consultas:
+            stats = SistemaPagosService.obtener_estadisticas_evento(self.evento)
+        # Planes + cuotas + cortes y cola del diario + estudiantes atrasados
+        self.assertEqual(len(consultas), 5)
+        self.assertEqual(stats["estudiantes"]["total"], 3)
+        self.assertEqual(
+            stats["cuotas"], {"total": 9, "pagadas": 1, "pendientes": 2, "atrasadas": 6}
+        )
+        self.assertEqual(stats["montos"]["total_colegiatura"], Decimal("900.00"))
+        self.assertEqual(stats["montos"]["total_pagado"], Decimal("140.00"))
+        self.assertEqual(stats["montos"]["total_pendiente"], Decimal("760.00"))
+
+
+class ResumenesEventoTest(EventoPagosTestCase):
+    codigo = "RESUMEN"
+    numero_estudiantes = 4
+    prefijo_cedula = "09200000"
+    campos_evento = {"costo_colegiatura": Decimal("120.00"), "costo_certificado": Decimal("25.00")}
+
+    def setUp(self) -> None:
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=4)
+        primera = Cuota.objects.get(
+            plan_pago__estudiante=self.estudiantes[0], numero_cuota=1
+        )
+        primera.estado = "pagado"
+        primera.monto_pagado = Decimal("30.00")
+        primera.save()
+
+    def test_resumenes_en_lote(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resumenes = SistemaPagosService.obtener_resumenes_evento(self.evento)
+        # Planes + cortes y cola del diario + matrículas + certificados
+        self.assertEqual(len(consultas), 5)
+        self.assertEqual(set(resumenes), {est.id for est in self.estudiantes})
+
+        resumen = resumenes[self.estudiantes[0].id]
+        self.assertEqual(resumen["colegiatura"]["monto_pagado"], Decimal("30.00"))
+        self.assertEqual(resumen["colegiatura"]["monto_pendiente"], Decimal("90.00"))
+        self.assertEqual(resumen["colegiatura"]["progreso_porcentaje"], Decimal("25.00"))
+        self.assertEqual(resumen["colegiatura"]["cuotas"]["pagadas"], 1)
+        self.assertEqual(resumen["estado_general"], "al_dia")
+        self.assertTrue(resumen["matricula"]["pagada"])
+        self.assertEqual(resumenes[self.estudiantes[1].id]["estado_general"], "pendiente")
+
+        individual = SistemaPagosService.obtener_resumen_estudiante(self.estudiantes[0], self.evento)
+        self.assertEqual(individual["colegiatura"], resumen["colegiatura"])
+
+
+class SaldosPlanPagoTest(EventoPagosTestCase):
+    codigo = "SALDOS"
+    prefijo_cedula = "09300000"
+    campos_evento = {"dias_transcurridos": 45}
+
+    def setUp(self) -> None:
+        self.plan = PlanPago.objects.create(
+            estudiante=self.estudiante,
+            evento=self.evento,
+            numero_cuotas=3,
+            monto_colegiatura=Decimal("300.00"),
+        )
+        self.plan.generar_cuotas()
+
+    def test_saldos_incrementales(self):
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.cuotas_registradas, 3)
+        self.assertEqual(self.plan.cuotas_pendientes, 3)
+        self.assertEqual(self.plan.monto_pendiente_total, Decimal("300.00"))
+        self.assertEqual(self.plan.proxima_fecha_vencimiento, self.evento.fecha_inicio)
+        self.assertEqual(self.plan.estado_general, "pendiente")
+
+        # Pago completo de la primera cuota a través de PagoCuota
+        primera = self.plan.cuotas.get(numero_cuota=1)
+        PagoCuota.objects.create(
+            cuota=primera,
+            monto_pagado=Decimal("100.00"),
+            fecha_pago=date.today(),
+            metodo_pago="efectivo",
+        )
+        SistemaPagosService.verificar_cuotas_atrasadas(self.evento)
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_pagado_total, Decimal("100.00"))
+        self.assertEqual(self.plan.monto_pendiente_total, Decimal("200.00"))
+        self.assertEqual(self.plan.cuotas_pagadas, 1)
+        self.assertEqual(self.plan.cuotas_atrasadas, 1)
+        self.assertEqual(self.plan.cuotas_pendientes, 1)
+        self.assertEqual(self.plan.estado_general, "atrasado")
+        self.assertEqual(
+            self.plan.proxima_fecha_vencimiento, self.evento.fecha_inicio + timedelta(days=30)
+        )
+
+        # Guardar el plan con valores en memoria obsoletos no pisa los saldos
+        obsoleto = PlanPago.objects.get(pk=self.plan.pk)
+        obsoleto.monto_pagado_total = Decimal("0.00")
+        obsoleto.motivo_convenio = "Actualización"
+        obsoleto.save()
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_pagado_total, Decimal("100.00"))
+
+        resultado = SistemaPagosService.recalcular_saldos(corregir=False)
+        self.assertEqual(resultado["con_diferencias"], [])
+
+    def test_reconciliar_saldos_corrige_desvios(self):
+        # Un UPDATE masivo no dispara señales y deja el plan desviado
+        self.plan.cuotas.filter(numero_cuota=1).update(estado="pagado", monto_pagado=Decimal("100.00"))
+
+        call_command("reconciliar_saldos", "--dry_run", stdout=StringIO())
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.cuotas_pagadas, 0)
+
+        salida = StringIO()
+        call_command("reconciliar_saldos", "--evento_id", str(self.evento.id), stdout=salida)
+        self.assertIn("Planes corregidos: 1", salida.getvalue())
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.cuotas_pagadas, 1)
+        self.assertEqual(self.plan.monto_pagado_total, Decimal("100.00"))
+        self.assertEqual(self.plan.monto_pendiente_total, Decimal("200.00"))
+        self.assertEqual(self.plan.estado_general, "al_dia")
+
+
+class EstadoPagosDiferidoTest(EventoPagosTestCase):
+    codigo = "DIFERIDO"
+    prefijo_cedula = "09400000"
+    campos_evento = {"costo_colegiatura": Decimal("90.00")}
+
+    def setUp(self) -> None:
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, [self.estudiante], numero_cuotas=3)
+
+    def test_recalculo_una_vez_por_par_al_confirmar(self):
+        with _contar_recalculos() as recalculos, self.captureOnCommitCallbacks(execute=True):
+            for cuota in Cuota.objects.filter(plan_pago__evento=self.evento):
+                SistemaPagosService.registrar_pago_cuota(cuota, cuota.monto, "efectivo")
+            estado = EstadoPagosEvento.objects.get(estudiante=self.estudiante, evento=self.evento)
+            # Aún no confirmado: el estado no se ha recalculado
+            self.assertFalse(estado.colegiatura_al_dia)
+
+            self.assertEqual(recalculos.call_count, 0)
+
+        # Tres cuotas pagadas, un solo recálculo diferido
+        recalculos.assert_called_once_with({(self.estudiante.pk, self.evento.pk)})
+        estado.refresh_from_db()
+        self.assertTrue(estado.colegiatura_al_dia)
+
+    def test_recalculo_tras_revertir_savepoint(self):
+        cuotas = list(Cuota.objects.filter(plan_pago__evento=self.evento))
+        with _contar_recalculos() as recalculos, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    SistemaPagosService.registrar_pago_cuota(cuotas[0], cuotas[0].monto, "efectivo")
+                    raise RuntimeError("revertir")
+            except RuntimeError:
+                pass
+            # El recálculo programado dentro del savepoint se descartó con él
+            for cuota in cuotas:
+                cuota.refresh_from_db()
+                SistemaPagosService.registrar_pago_cuota(cuota, cuota.monto, "efectivo")
+
+        self.assertEqual(recalculos.call_count, 1)
+        estado = EstadoPagosEvento.objects.get(estudiante=self.estudiante, evento=self.evento)
+        self.assertTrue(estado.colegiatura_al_dia)
+
+    def test_pago_revertido_no_recalcula_y_el_siguiente_si(self):
+        cuota = Cuota.objects.filter(plan_pago__evento=self.evento).first()
+        with _contar_recalculos() as recalculos, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    SistemaPagosService.registrar_pago_cuota(cuota, cuota.monto, "efectivo")
+                    raise RuntimeError("revertir")
+            except RuntimeError:
+                pass
+        self.assertEqual(recalculos.call_count, 0)
+
+        # Una marca posterior vuelve a programar el recálculo
+        with _contar_recalculos() as recalculos, self.captureOnCommitCallbacks(execute=True):
+            SistemaPagosService.marcar_estado_pagos_pendiente(planes=[cuota.plan_pago_id])
+        recalculos.assert_called_once_with({(self.estudiante.pk, self.evento.pk)})
+
+
+class PendientesAlConfirmarTest(TransactionTestCase):
+    """Transacciones reales: TestCase envuelve cada prueba en un atomic propio."""
+
+    def setUp(self) -> None:
+        self.vaciados = []
+        self.pendientes = PendientesAlConfirmar(self.vaciados.append, nuevo=list)
+
+    def test_un_vaciado_por_transaccion_con_savepoints(self):
+        with transaction.atomic():
+            self.pendientes.estado().append(1)
+            for valor in (2, 3):
+                with transaction.atomic():
+                    self.pendientes.estado().append(valor)
+        self.assertEqual(self.vaciados, [[1, 2, 3]])
+
+    def test_savepoint_revertido_vuelve_a_programar(self):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.pendientes.estado().append(1)
+                    raise RuntimeError("revertir")
+            except RuntimeError:
+                pass
+            self.pendientes.estado().append(2)
+        self.assertEqual(len(self.vaciados), 1)
+        self.assertIn(2, self.vaciados[0])
+
+    def test_transaccion_revertida_se_descarta(self):
+        try:
+            with transaction.atomic():
+                self.pendientes.estado().append(1)
+                raise RuntimeError("revertir")
+        except RuntimeError:
+            pass
+        self.assertEqual(self.vaciados, [])
+
+        with transaction.atomic():
+            self.pendientes.estado().append(2)
+        self.assertEqual(self.vaciados, [[2]])
+
+
+class AplicacionPagosTest(TestCase):
+    def setUp(self) -> None:
+        self.plan = _crear_plan_para_pagos("CAJA")
+
+    def test_pago_cuota_no_duplica_abono(self):
+        cuota = self.plan.cuotas.get(numero_cuota=1)
+        SistemaPagosService.registrar_pago_cuota(cuota, Decimal("100.00"), "efectivo")
+        cuota.refresh_from_db()
+        self.assertEqual(cuota.monto_pagado, Decimal("100.00"))
+        self.assertEqual(cuota.estado, "pagado")
+
+    def test_pago_colegiatura_marca_cuotas_pagadas(self):
+        Pago.objects.create(
+            estudiante=self.plan.estudiante,
+            evento=self.plan.evento,
+            tipo_pago="colegiatura_parcial",
+            monto=Decimal("150.00"),
+            metodo_pago="efectivo",
+        )
+        estados = list(self.plan.cuotas.order_by("numero_cuota").values_list("estado", "monto_pagado"))
+        self.assertEqual(estados, [
+            ("pagado", Decimal("100.00")),
+            ("pendiente", Decimal("50.00")),
+            ("pendiente", Decimal("0.00")),
+        ])
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_pagado_total, Decimal("150.00"))
+        self.assertEqual(self.plan.cuotas_pagadas, 1)
+
+
+class AplicacionPagoEnBloqueTest(TestCase):
+    def setUp(self) -> None:
+        self.plan = _crear_plan_para_pagos("BLOQUE")
+        self.plan.numero_cuotas = 12
+        self.plan.monto_colegiatura = Decimal("1200.00")
+        self.plan.save()
+
+    def test_pago_total_doce_cuotas_en_pocas_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            pago = Pago.objects.create(
+                estudiante=self.plan.estudiante,
+                evento=self.plan.evento,
+                tipo_pago="colegiatura_total",
+                monto=Decimal("1200.00"),
+                metodo_pago="transferencia",
+            )
+        # Inserción del pago, bloqueo del plan, lectura de cuotas, bulk_create,
+        # bulk_update, saldos del plan y marca de estado (más savepoints), y el
+        # cierre de caja: UPDATE, más el INSERT con savepoint el primer pago del día
+        self.assertLessEqual(len(consultas), 16)
+
+        self.assertEqual(pago.aplicaciones_cuotas.count(), 12)
+        self.assertFalse(self.plan.cuotas.exclude(estado="pagado").exists())
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_pagado_total, Decimal("1200.00"))
+        self.assertEqual(self.plan.cuotas_pagadas, 12)
+        self.assertEqual(self.plan.estado_general, "completado")
+        self.assertIsNone(self.plan.proxima_fecha_vencimiento)
+        self.assertEqual(SistemaPagosService.recalcular_saldos(corregir=False)["con_diferencias"], [])
+
+
+class DiarioPagosTest(TestCase):
+    def setUp(self) -> None:
+        self.plan = _crear_plan_para_pagos("DIARIO")
+
+    def _saldo(self, **kwargs):
+        return DiarioPagosService.saldo_plan(self.plan, **kwargs)
+
+    def test_diario_refleja_todas_las_vias_de_pago(self):
+        cuota = self.plan.cuotas.get(numero_cuota=1)
+        SistemaPagosService.registrar_pago_cuota(cuota, Decimal("40.00"), "efectivo")
+        pago = Pago.objects.create(
+            estudiante=self.plan.estudiante,
+            evento=self.plan.evento,
+            tipo_pago="colegiatura_parcial",
+            monto=Decimal("160.00"),
+            metodo_pago="efectivo",
+        )
+        self.plan.monto_colegiatura = Decimal("360.00")
+        self.plan.save()
+
+        self.assertEqual(
+            list(self.plan.movimientos.values_list("tipo", "concepto", "monto", "pago_id")),
+            [
+                ("cargo", "colegiatura", Decimal("300.00"), None),
+                ("abono", "pago", Decimal("40.00"), None),
+                ("abono", "pago", Decimal("160.00"), pago.id),
+                ("cargo", "ajuste_colegiatura", Decimal("60.00"), None),
+            ],
+        )
+        self.plan.refresh_from_db()
+        saldo = self._saldo()
+        self.assertEqual(saldo["abonos"], self.plan.monto_pagado_total)
+        self.assertEqual(saldo["saldo"], self.plan.monto_pendiente_total)
+        self.assertEqual(saldo["saldo"], Decimal("160.00"))
+
+    def test_corte_y_saldo_historico(self):
+        Pago.objects.create(
+            estudiante=self.plan.estudiante,
+            evento=self.plan.evento,
+            tipo_pago="colegiatura_parcial",
+            monto=Decimal("100.00"),
+            metodo_pago="efectivo",
+        )
+        resultado = DiarioPagosService.compactar(margen=timedelta(0))
+        self.assertEqual(resultado, {"revisados": 1, "planes": 1, "movimientos": 2})
+        corte = CorteSaldoPlanPago.objects.get(plan_pago=self.plan)
+        self.assertEqual(corte.saldo, Decimal("200.00"))
+
+        Pago.objects.create(
+            estudiante=self.plan.estudiante,
+            evento=self.plan.evento,
+            tipo_pago="colegiatura_parcial",
+            monto=Decimal("50.00"),
+            metodo_pago="efectivo",
+        )
+        # Saldo actual: corte más un movimiento de cola
+        self.assertEqual(self._saldo()["saldo"], Decimal("150.00"))
+        self.assertEqual(self._saldo(hasta=corte.fecha_corte)["saldo"], Decimal("200.00"))
+        self.assertEqual(
+            DiarioPagosService._cola([self.plan.pk], {self.plan.pk: corte}).count(), 1
+        )
+
+        # Sin movimientos nuevos fuera del margen no se crean cortes
+        self.assertEqual(DiarioPagosService.compactar()["planes"], 0)
+        DiarioPagosService.compactar(margen=timedelta(0))
+        self.assertEqual(self.plan.cortes_saldo.count(), 2)
+        self.assertEqual(self._saldo()["saldo"], Decimal("150.00"))
+        self.assertEqual(self._saldo(hasta=corte.fecha_corte)["saldo"], Decimal("200.00"))
+
+    def test_diario_de_solo_insercion(self):
+        movimiento = self.plan.movimientos.get()
+        movimiento.monto = Decimal("1.00")
+        with self.assertRaises(ValidationError):
+            movimiento.save()
+        with self.assertRaises(ValidationError):
+            movimiento.delete()
+
+        # Eliminar el plan elimina su diario sin asentar reversos
+        self.plan.delete()
+        self.assertFalse(MovimientoPlanPago.objects.exists())
+
+
+class ConciliacionBancariaTest(TestCase):
+    def setUp(self) -> None:
+        self.plan = _crear_plan_para_pagos("CONCILIA")
+        self.banco = InstitucionFinanciera.objects.create(codigo="PCH", nombre="Banco Pichincha")
+        self.hoy = date.today()
+
+        def pagar(monto, **kwargs):
+            return Pago.objects.create(
+                estudiante=self.plan.estudiante,
+                evento=self.plan.evento,
+                tipo_pago="miscelaneo",
+                monto=Decimal(monto),
+                metodo_pago="transferencia",
+                **kwargs,
+            )
+
+        self.pago = pagar("80.00", numero_transaccion="TRX-001", institucion_financiera=self.banco)
+        self.pago_monto = pagar("50.00", numero_transaccion="TRX-002", institucion_financiera=self.banco)
+        # Misma referencia registrada con y sin institución: no se puede decidir
+        pagar("10.00", numero_transaccion="AMB-1", institucion_financiera=self.banco)
+        pagar("10.00", numero_transaccion="AMB-1")
+        self.pago_cuota = SistemaPagosService.registrar_pago_cuota(
+            self.plan.cuotas.get(numero_cuota=1), Decimal("100.00"), "deposito",
+            institucion_financiera=self.banco, codigo_comprobante="CMP-9",
+        )
+        # El mismo comprobante en la cuota no debe contar como segundo candidato
+        Cuota.objects.filter(pk=self.pago_cuota.cuota_id).update(codigo_comprobante="CMP-9")
+
+    def _extracto(self, filas):
+        contenido = "Fecha;Referencia;Valor;Descripcion\n" + "".join(
+            f"{fecha};{referencia};{monto};Transferencia\n" for fecha, referencia, monto in filas
+        )
+        return BytesIO(contenido.encode("utf-8"))
+
+    def test_conciliacion_en_una_pasada(self):
+        fecha = self.hoy.strftime("%d/%m/%Y")
+        extracto = self._extracto([
+            (fecha, "TRX-001", "80,00"),
+            (fecha, "0000CMP 9", "100.00"),
+            (fecha, "TRX-002", "55.00"),
+            (fecha, "AMB-1", "10.00"),
+            (fecha, "DESCONOCIDA", "12.00"),
+            (fecha, "RETIRO", "-20.00"),
+            ("31/02/2024", "MALA", "1.00"),
+        ])
+        reporte = ConciliacionBancariaService.conciliar_extracto(self.banco, extracto, "extracto.csv")
+
+        self.assertEqual(reporte["resumen"], {
+            "conciliada": 2, "sin_coincidencia": 1, "ambigua": 1, "diferencia_monto": 1,
+            "total_lineas": 5, "duplicadas": 0, "omitidas": 1, "errores": 1,
+        })
+        self.assertEqual(
+            {(d["tipo"], d["registro_id"]) for d in reporte["conciliada"]},
+            {("pago", self.pago.id), ("pago_cuota", self.pago_cuota.id)},
+        )
+        self.assertEqual(reporte["diferencia_monto"][0]["monto_registrado"], Decimal("50.00"))
+        self.assertEqual(len(reporte["ambigua"][0]["candidatos"]), 2)
+        self.assertEqual(self.pago.lineas_extracto.get().estado, "conciliada")
+
+        # Reimportar el mismo extracto no duplica líneas ni vuelve a conciliar
+        extracto.seek(0)
+        repetido = ConciliacionBancariaService.conciliar_extracto(self.banco, extracto, "extracto.csv")
+        self.assertEqual(repetido["resumen"]["duplicadas"], 5)
+        self.assertEqual(LineaExtractoBancario.objects.count(), 5)
+
+    def test_consultas_independientes_del_numero_de_lineas(self):
+        fecha = self.hoy.isoformat()
+
+        def conciliar(cantidad):
+            filas = [(fecha, f"REF-{cantidad}-{i}", "1.00") for i in range(cantidad)]
+            with CaptureQueriesContext(connection) as consultas:
+                reporte = ConciliacionBancariaService.conciliar_extracto(
+                    self.banco, self._extracto(filas + [(fecha, "TRX-001", "80.00")])
+                )
+            self.assertEqual(reporte["resumen"]["sin_coincidencia"], cantidad)
+            return len(consultas)
+
+        self.assertEqual(conciliar(3), conciliar(60))
+
+
+class CarteraVencidaTest(EventoPagosTestCase):
+    codigo = "CARTERA"
+    numero_estudiantes = 2
+    prefijo_cedula = "09700000"
+    ciudades = ("Quevedo", "Babahoyo")
+    campos_evento = {
+        "dias_transcurridos": 100, "aval": "SENESCYT", "costo_colegiatura": Decimal("500.00"),
+    }
+
+    def setUp(self) -> None:
+        cache.clear()
+        # Vencimientos hace 100, 70, 40 y 10 días y dentro de 20 días
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=5)
+        self.cuota = Cuota.objects.get(plan_pago__estudiante=self.estudiantes[0], numero_cuota=1)
+        self.cuota.monto_pagado = Decimal("40.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cuota.save()
+
+    def test_tramos_en_una_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            reporte = CarteraService.calcular_antiguedad(agrupar_por="ciudad")
+        self.assertEqual(len(consultas), 1)
+
+        filas = {fila["clave"]: fila for fila in reporte["filas"]}
+        self.assertEqual(list(filas), ["Babahoyo", "Quevedo"])
+        quevedo = filas["Quevedo"]
+        self.assertEqual(
+            [quevedo[tramo] for tramo in reporte["tramos"]],
+            [Decimal("100.00"), Decimal("100.00"), Decimal("100.00"), Decimal("100.00"), Decimal("60.00")],
+        )
+        self.assertEqual(quevedo["total_vencido"], Decimal("360.00"))
+        self.assertEqual(quevedo["cuotas_vencidas"], 4)
+        self.assertEqual(reporte["totales"]["total"], Decimal("960.00"))
+
+        por_institucion = CarteraService.calcular_antiguedad(agrupar_por="institucion")
+        self.assertEqual(por_institucion["filas"][0]["nombre"], "SENESCYT")
+        self.assertEqual(por_institucion["filas"][0]["estudiantes_con_atraso"], 2)
+
+    def test_cache_diaria_se_invalida_con_pagos(self):
+        primero = CarteraService.obtener_antiguedad(evento_ids=[self.evento.id])
+        with CaptureQueriesContext(connection) as consultas:
+            CarteraService.obtener_antiguedad(evento_ids=[self.evento.id])
+        self.assertEqual(len(consultas), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SistemaPagosService.registrar_pago_cuota(self.cuota, Decimal("60.00"), "efectivo")
+        actualizado = CarteraService.obtener_antiguedad(evento_ids=[self.evento.id])
+        self.assertEqual(
+            primero["totales"]["90_mas"] - actualizado["totales"]["90_mas"], Decimal("60.00")
+        )
+
+    def test_una_invalidacion_por_transaccion(self):
+        cuotas = list(Cuota.objects.filter(plan_pago__estudiante=self.estudiantes[1]).order_by("numero_cuota"))
+        invalidar = patch.object(CarteraService, "invalidar_cache", wraps=CarteraService.invalidar_cache)
+        with invalidar as invalidaciones, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    SistemaPagosService.registrar_pago_cuota(cuotas[0], cuotas[0].monto, "efectivo")
+                    raise RuntimeError("revertir")
+            except RuntimeError:
+                pass
+            for cuota in cuotas[:3]:
+                cuota.refresh_from_db()
+                SistemaPagosService.registrar_pago_cuota(cuota, cuota.monto, "efectivo")
+            self.assertEqual(invalidaciones.call_count, 0)
+        self.assertEqual(invalidaciones.call_count, 1)
+
+
+class ProyeccionCobrosTest(EventoPagosTestCase):
+    codigo = "PROY"
+    numero_estudiantes = 2
+    prefijo_cedula = "09600000"
+    campos_evento = {"dias_transcurridos": 100, "costo_colegiatura": Decimal("500.00")}
+
+    def setUp(self) -> None:
+        # Vencimientos hace 100, 70, 40 y 10 días y dentro de 20 días
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=5)
+        self.hoy = date.today()
+        lunes = self.hoy - timedelta(days=self.hoy.weekday())
+        self.semana_futura = ((self.hoy + timedelta(days=20)) - lunes).days // 7
+
+    def test_serie_semanal_en_una_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            proyeccion = ProyeccionCobrosService.proyectar(periodo="semanal", hoy=self.hoy)
+        self.assertEqual(len(consultas), 1)
+
+        serie = proyeccion["serie"]
+        self.assertEqual(len(serie), 13)
+        self.assertEqual(serie[0]["inicio"].weekday(), 0)
+        self.assertLessEqual(serie[0]["inicio"], self.hoy)
+        self.assertEqual(serie[0]["fin"], serie[0]["inicio"] + timedelta(days=6))
+        # Los saldos vencidos se esperan en la semana actual
+        self.assertEqual(serie[0]["monto_vencido"], Decimal("800.00"))
+        self.assertEqual(serie[0]["cuotas"], 8)
+        self.assertEqual(serie[self.semana_futura]["monto_programado"], Decimal("200.00"))
+        self.assertEqual(proyeccion["totales"]["monto_programado"], Decimal("1000.00"))
+        self.assertEqual(proyeccion["totales"]["monto_esperado"], Decimal("1000.00"))
+
+        mensual = ProyeccionCobrosService.proyectar(periodo="mensual", horizonte=1, hoy=self.hoy)
+        self.assertEqual(mensual["serie"][0]["inicio"], self.hoy.replace(day=1))
+        fuera = mensual["totales"]["fuera_de_horizonte"]
+        self.assertEqual(mensual["totales"]["monto_programado"] + fuera, Decimal("1000.00"))
+
+        with self.assertRaises(ValidationError):
+            ProyeccionCobrosService.proyectar(periodo="diario")
+
+    def test_ponderacion_por_puntualidad(self):
+        # Un pago a tiempo y uno atrasado del mismo monto: tasa de 0.5
+        cuotas = Cuota.objects.filter(plan_pago__estudiante=self.estudiantes[1]).order_by("numero_cuota")
+        with self.captureOnCommitCallbacks(execute=True):
+            SistemaPagosService.registrar_pago_cuota(cuotas[0], Decimal("100.00"), "efectivo")
+            SistemaPagosService.registrar_pago_cuota(cuotas[4], Decimal("100.00"), "efectivo")
+
+        with CaptureQueriesContext(connection) as consultas:
+            proyeccion = ProyeccionCobrosService.proyectar(
+                evento_ids=[self.evento.id], ponderar=True, hoy=self.hoy
+            )
+        self.assertEqual(len(consultas), 2)
+        self.assertEqual(proyeccion["tasas_puntualidad"], {self.evento.id: 0.5})
+        self.assertEqual(proyeccion["totales"]["monto_programado"], Decimal("800.00"))
+        self.assertEqual(proyeccion["totales"]["monto_esperado"], Decimal("400.00"))
+        self.assertEqual(proyeccion["serie"][self.semana_futura]["monto_esperado"], Decimal("50.00"))
+
+        csv_texto = ProyeccionCobrosService.a_csv(proyeccion)
+        lineas = csv_texto.splitlines()
+        self.assertEqual(lineas[0], "inicio,fin,cuotas,monto_programado,monto_vencido,monto_esperado")
+        self.assertEqual(len(lineas), 14)
+
+class RecalcularCronogramasTest(EventoPagosTestCase):
+    codigo = "CRONO"
+    numero_estudiantes = 2
+    prefijo_cedula = "09500000"
+    campos_evento = {"dias_transcurridos": 45}
+
+    def setUp(self) -> None:
+        self.hoy = date.today()
+        # Vencimientos hace 45 y 15 días y dentro de 15 días
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=3)
+        self.plan = PlanPago.objects.get(estudiante=self.estudiantes[0])
+        cuotas = list(self.plan.cuotas.order_by("numero_cuota"))
+        with self.captureOnCommitCallbacks(execute=True):
+            SistemaPagosService.registrar_pago_cuota(cuotas[0], Decimal("100.00"), "efectivo")
+            SistemaPagosService.registrar_pago_cuota(cuotas[1], Decimal("30.00"), "efectivo")
+        self.pagada = cuotas[0]
+
+        # Corrección posterior del costo y de la fecha de inicio del evento
+        Evento.objects.filter(pk=self.evento.pk).update(
+            costo_colegiatura=Decimal("450.00"), fecha_inicio=self.hoy - timedelta(days=40)
+        )
+        self.evento.refresh_from_db()
+
+    def test_simulacion_no_modifica_cuotas(self):
+        antes = list(Cuota.objects.order_by("id").values_list("id", "monto", "fecha_vencimiento"))
+        reporte = CronogramasService.recalcular_evento(self.evento, simular=True)
+
+        self.assertEqual(reporte["planes_modificados"], 2)
+        self.assertEqual(reporte["cuotas_actualizadas"], 5)
+        cambios = {plan["plan_pago_id"]: plan for plan in reporte["planes"]}[self.plan.id]
+        self.assertEqual(cambios["monto_colegiatura"], Decimal("450.00"))
+        self.assertEqual(
+            [(c["numero_cuota"], c["monto"], c["monto_anterior"]) for c in cambios["cuotas"]],
+            [(2, Decimal("175.00"), Decimal("100.00")), (3, Decimal("175.00"), Decimal("100.00"))],
+        )
+        self.assertEqual(
+            list(Cuota.objects.order_by("id").values_list("id", "monto", "fecha_vencimiento")), antes
+        )
+
+    def test_recalculo_en_bloque_conserva_pagos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte = CronogramasService.recalcular_evento(self.evento)
+        self.assertEqual(reporte["planes_modificados"], 2)
+        self.assertEqual(reporte["omitidos"], [])
+
+        cuotas = list(self.plan.cuotas.order_by("numero_cuota"))
+        self.assertEqual(cuotas[0].pk, self.pagada.pk)
+        self.assertEqual((cuotas[0].monto, cuotas[0].fecha_vencimiento), (Decimal("100.00"), self.pagada.fecha_vencimiento))
+        self.assertEqual([c.monto for c in cuotas[1:]], [Decimal("175.00"), Decimal("175.00")])
+        self.assertEqual(cuotas[1].monto_pagado, Decimal("30.00"))
+        self.assertEqual(
+            [(c.fecha_vencimiento, c.estado) for c in cuotas[1:]],
+            [(self.hoy - timedelta(days=10), "atrasado"), (self.hoy + timedelta(days=20), "pendiente")],
+        )
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_colegiatura, Decimal("450.00"))
+        self.assertEqual(self.plan.monto_pendiente_total, Decimal("320.00"))
+        self.assertEqual(self.plan.cuotas_atrasadas, 1)
+        self.assertEqual(DiarioPagosService.saldo_plan(self.plan)["saldo"], Decimal("320.00"))
+        self.assertEqual(SistemaPagosService.recalcular_saldos(corregir=False)["con_diferencias"], [])
+
+        # Sin cambios nuevos, un segundo recálculo no modifica nada
+        self.assertEqual(CronogramasService.recalcular_evento(self.evento)["planes_modificados"], 0)
+
+    def test_omite_planes_con_abono_mayor_a_la_nueva_cuota(self):
+        Evento.objects.filter(pk=self.evento.pk).update(costo_colegiatura=Decimal("150.00"))
+        self.evento.refresh_from_db()
+        reporte = CronogramasService.recalcular_evento(self.evento)
+
+        self.assertEqual(reporte["omitidos"], [{"plan_pago_id": self.plan.id, "motivo": "abono_parcial_excede_cuota"}])
+        self.assertEqual(reporte["planes_modificados"], 1)
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_colegiatura, Decimal("300.00"))
+
+    def test_omite_planes_con_monto_personalizado(self):
+        personalizado = PlanPago.objects.get(estudiante=self.estudiantes[1])
+        PlanPago.objects.filter(pk=personalizado.pk).update(usa_monto_personalizado=True)
+        antes = list(personalizado.cuotas.order_by("numero_cuota").values_list("monto", "fecha_vencimiento"))
+
+        simulacion = CronogramasService.recalcular_evento(self.evento, simular=True)
+        self.assertEqual(simulacion["omitidos"], [{"plan_pago_id": personalizado.id, "motivo": "monto_personalizado"}])
+        self.assertEqual((simulacion["planes_revisados"], simulacion["planes_modificados"]), (2, 1))
+
+        CronogramasService.recalcular_evento(self.evento)
+        personalizado.refresh_from_db()
+        self.assertEqual(personalizado.monto_colegiatura, Decimal("300.00"))
+        self.assertEqual(
+            list(personalizado.cuotas.order_by("numero_cuota").values_list("monto", "fecha_vencimiento")), antes
+        )
+
+    def test_renumera_cuotas_pendientes(self):
+        plan = PlanPago.objects.get(estudiante=self.estudiantes[1])
+        for cuota in plan.cuotas.order_by("-numero_cuota"):
+            Cuota.objects.filter(pk=cuota.pk).update(numero_cuota=cuota.numero_cuota + 1)
+
+        CronogramasService.recalcular_evento(self.evento)
+        self.assertEqual(
+            list(plan.cuotas.order_by("numero_cuota").values_list("numero_cuota", "monto")),
+            [(1, Decimal("150.00")), (2, Decimal("150.00")), (3, Decimal("150.00"))],
+        )
+
+    def test_comando_dry_run(self):
+        salida = StringIO()
+        call_command("recalcular_cronogramas", "--evento_id", str(self.evento.id), "--dry_run", stdout=salida)
+        self.assertIn("Planes modificados: 2", salida.getvalue())
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.monto_colegiatura, Decimal("300.00"))
+
+class ReestructuracionLoteTest(EventoPagosTestCase):
+    codigo = "REEST"
+    numero_estudiantes = 3
+    prefijo_cedula = "09400000"
+    campos_evento = {"dias_transcurridos": 45}
+
+    def setUp(self) -> None:
+        self.hoy = date.today()
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=3)
+        self.planes = list(PlanPago.objects.filter(evento=self.evento).order_by("id"))
+        primera = self.planes[0].cuotas.get(numero_cuota=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            SistemaPagosService.registrar_pago_cuota(primera, Decimal("100.00"), "efectivo")
+
+    def _cronograma(self, plan):
+        return list(plan.cuotas.order_by("numero_cuota").values_list("numero_cuota", "monto", "fecha_vencimiento", "estado"))
+
+    def test_equivale_a_reestructurar_plan(self):
+        individual = self.planes[1]
+        individual.reestructurar_plan(nuevo_numero_cuotas=4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reporte = CronogramasService.reestructurar_planes(
+                plan_ids=[self.planes[0].id, self.planes[2].id, 999999],
+                nuevo_numero_cuotas=4,
+                motivo_reestructuracion="Comité de becas",
+            )
+        self.assertEqual((reporte["reestructurados"], reporte["rechazados"]), (2, 1))
+        resultados = {r["plan_pago_id"]: r for r in reporte["resultados"]}
+        self.assertEqual(resultados[999999]["motivo"], "no_encontrado")
+        self.assertEqual(resultados[self.planes[0].id]["cambios_realizados"], ["Número de cuotas: 4"])
+
+        self.assertEqual(
+            [fila[:2] for fila in self._cronograma(self.planes[2])],
+            [fila[:2] for fila in self._cronograma(individual)],
+        )
+        cronograma = self._cronograma(self.planes[0])
+        self.assertEqual(cronograma[0][1:], (Decimal("100.00"), self.evento.fecha_inicio, "pagado"))
+        self.assertEqual(
+            [fila[1] for fila in cronograma[1:]], [Decimal("66.67"), Decimal("66.67"), Decimal("66.66")]
+        )
+        self.assertEqual(cronograma[1][2], self.hoy)
+
+        plan = PlanPago.objects.get(pk=self.planes[0].pk)
+        self.assertEqual(plan.numero_cuotas, 4)
+        self.assertTrue(plan.tiene_convenio)
+        self.assertEqual(plan.motivo_convenio, "Reestructuración: Comité de becas")
+        self.assertEqual(plan.cuotas_registradas, 4)
+        self.assertEqual(SistemaPagosService.recalcular_saldos(corregir=False)["con_diferencias"], [])
+
+    def test_valida_todos_los_planes_antes_de_aplicar(self):
+        with CaptureQueriesContext(connection) as consultas:
+            reporte = CronogramasService.reestructurar_planes(
+                evento=self.evento, nuevo_monto_colegiatura=Decimal("90.00"), simular=True
+            )
+        self.assertEqual(reporte["rechazados"], 1)
+        self.assertEqual(reporte["resultados"][-1]["motivo"], "monto_menor_a_pagado")
+        self.assertEqual(reporte["reestructurados"], 2)
+        # Validación agrupada, planes del lote y sus cuotas
+        self.assertEqual(len(consultas), 3)
+
+        CronogramasService.reestructurar_planes(evento=self.evento, nuevo_monto_colegiatura=Decimal("450.00"))
+        plan = PlanPago.objects.get(pk=self.planes[1].pk)
+        self.assertEqual(plan.monto_colegiatura, Decimal("450.00"))
+        self.assertEqual(DiarioPagosService.saldo_plan(plan)["saldo"], Decimal("450.00"))
+        self.assertEqual(
+            list(plan.cuotas.values_list("monto", flat=True)), [Decimal("150.00")] * 3
+        )
+
+        with self.assertRaises(ValidationError):
+            CronogramasService.reestructurar_planes(evento=self.evento)
+
+    def test_eliminar_cuotas_no_actualiza_saldos_por_cuota(self):
+        # Una cuota eliminada en un plan y dos en el otro: mismas consultas,
+        # los saldos se recalculan una vez por plan al final
+        with CaptureQueriesContext(connection) as una:
+            CronogramasService.reestructurar_planes(plan_ids=[self.planes[1].id], nuevo_numero_cuotas=2)
+        with CaptureQueriesContext(connection) as dos:
+            CronogramasService.reestructurar_planes(plan_ids=[self.planes[2].id], nuevo_numero_cuotas=1)
+        self.assertEqual(len(una), len(dos))
+        self.assertEqual(PlanPago.objects.get(pk=self.planes[2].pk).cuotas_registradas, 1)
+        self.assertEqual(SistemaPagosService.recalcular_saldos(corregir=False)["con_diferencias"], [])
+
+class SimuladorPlanesTest(TestCase):
+    def test_prorrateo_igual_a_prorratear_monto(self):
+        casos = [
+            (Decimal("100.00"), 3), (Decimal("1000.00"), 7), (Decimal("0.05"), 2),
+            (Decimal("0.15"), 2), (Decimal("999.99"), 60), (Decimal("1234.57"), 6),
+        ]
+        base, ultima = SimuladorPlanesService.prorratear_centavos(
+            [int(monto * 100) for monto, _ in casos], [n for _, n in casos]
+        )
+        for (monto, n), b, u in zip(casos, base, ultima):
+            montos = PlanPago.prorratear_monto(monto, n)
+            self.assertEqual((Decimal(int(b)) / 100, Decimal(int(u)) / 100), (montos[0], montos[-1]))
+
+    def test_simulacion_sin_escrituras(self):
+        inicio = date(2026, 1, 15)
+        with CaptureQueriesContext(connection) as consultas:
+            simulacion = SimuladorPlanesService.simular(
+                Decimal("1000.00"), 10, [3, 6], [inicio, date(2026, 3, 1)],
+                porcentajes_beca=[0, Decimal("25.50")], estudiantes_becados=4,
+            )
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual(simulacion["combinaciones"], 8)
+
+        opcion = simulacion["opciones"][1]
+        self.assertEqual((opcion["numero_cuotas"], opcion["fecha_inicio"]), (3, inicio))
+        self.assertEqual(opcion["monto_becado"], Decimal("745.00"))
+        self.assertEqual((opcion["cuota_regular"], opcion["ultima_cuota"]), (Decimal("333.33"), Decimal("333.34")))
+        self.assertEqual(
+            [(c["fecha_vencimiento"], c["monto_becado"]) for c in opcion["cronograma"]],
+            [(inicio, Decimal("248.33")), (date(2026, 2, 14), Decimal("248.33")), (date(2026, 3, 16), Decimal("248.34"))],
+        )
+        self.assertEqual(opcion["ingreso_total"], Decimal("8980.00"))
+        self.assertEqual(sum(opcion["flujo"]), opcion["ingreso_total"])
+        self.assertEqual(simulacion["periodos"][0], date(2026, 1, 1))
+        self.assertEqual(opcion["flujo"][0], Decimal("2993.30"))
+        self.assertEqual(simulacion["opciones"][0]["estudiantes_becados"], 0)
+
+        with self.assertRaises(ValidationError):
+            SimuladorPlanesService.simular(Decimal("100.00"), 1, [61], [inicio])
+
+class PagoConvenioTest(EventoPagosTestCase):
+    codigo = "CONVENIO"
+    numero_estudiantes = 6
+    prefijo_cedula = "09600000"
+    campos_evento = {"dias_transcurridos": 45}
+
+    def setUp(self) -> None:
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=3)
+        # El primer estudiante ya pagó 250 de sus 300
+        primero = PlanPago.objects.get(evento=self.evento, estudiante=self.estudiantes[0])
+        Pago.objects.create(
+            estudiante=self.estudiantes[0],
+            evento=self.evento,
+            tipo_pago="colegiatura_parcial",
+            monto=Decimal("250.00"),
+            metodo_pago="efectivo",
+        )
+        self.plan_primero = primero
+
+    def test_partes_iguales_redistribuye_excedente(self):
+        ids = [est.id for est in self.estudiantes[:3]]
+        reporte = ConveniosService.registrar_pago_convenio(
+            self.evento, "400.00", "partes_iguales", "PRODEUTEQ", estudiante_ids=ids
+        )
+        asignado = {item["estudiante_id"]: item["monto_asignado"] for item in reporte["estudiantes"]}
+        # 400 / 3 = 133.33; el primero solo debe 50 y el resto se reparte
+        self.assertEqual(asignado[ids[0]], Decimal("50.00"))
+        self.assertEqual(asignado[ids[1]] + asignado[ids[2]], Decimal("350.00"))
+        self.assertEqual(reporte["monto_no_aplicado"], Decimal("0.00"))
+
+        convenio = PagoConvenio.objects.get(pk=reporte["pago_convenio_id"])
+        self.assertEqual(convenio.pagos.count(), 3)
+        self.plan_primero.refresh_from_db()
+        self.assertEqual(self.plan_primero.estado_general, "completado")
+        self.assertEqual(SistemaPagosService.recalcular_saldos(corregir=False)["con_diferencias"], [])
+
+    def test_vencimiento_mas_antiguo_y_consultas_constantes(self):
+        # El primer convenio del día crea su fila del cierre de caja
+        ConveniosService.registrar_pago_convenio(
+            self.evento, "100.00", "vencimiento_mas_antiguo", "Municipio",
+            estudiante_ids=[self.estudiantes[1].id],
+        )
+        with CaptureQueriesContext(connection) as pocos:
+            ConveniosService.registrar_pago_convenio(
+                self.evento, "200.00", "vencimiento_mas_antiguo", "Municipio",
+                estudiante_ids=[est.id for est in self.estudiantes[1:3]],
+            )
+        with CaptureQueriesContext(connection) as muchos:
+            reporte = ConveniosService.registrar_pago_convenio(
+                self.evento, "400.00", "vencimiento_mas_antiguo", "Municipio",
+                estudiante_ids=[est.id for est in self.estudiantes[3:]],
+            )
+        self.assertEqual(len(pocos), len(muchos))
+
+        # Las tres cuotas 1 (vencidas hace 45 días) se cubren antes que cualquier cuota 2
+        numeros = sorted(
+            cuota["numero_cuota"] for item in reporte["estudiantes"] for cuota in item["cuotas"]
+        )
+        self.assertEqual(numeros, [1, 1, 1, 2])
+        self.assertEqual(reporte["monto_aplicado"], Decimal("400.00"))
+
+    def test_tabla_valida_saldo_y_transferencia_unica(self):
+        with self.assertRaises(ValidationError):
+            ConveniosService.registrar_pago_convenio(
+                self.evento, "100.00", "tabla", "PRODEUTEQ",
+                distribucion={self.estudiantes[0].id: "100.00"},
+            )
+
+        banco = InstitucionFinanciera.objects.create(codigo="BNF", nombre="BanEcuador")
+        datos = dict(
+            evento=self.evento, monto_total="150.00", regla="tabla", entidad="PRODEUTEQ",
+            distribucion={self.estudiantes[1].id: "100.00", self.estudiantes[2].id: "50.00"},
+            institucion_financiera=banco, numero_transaccion="TRX-77",
+        )
+        simulacion = ConveniosService.registrar_pago_convenio(simular=True, **datos)
+        self.assertIsNone(simulacion["pago_convenio_id"])
+        self.assertFalse(PagoConvenio.objects.exists())
+
+        ConveniosService.registrar_pago_convenio(**datos)
+        with self.assertRaises(ValidationError):
+            ConveniosService.registrar_pago_convenio(**datos)
+        self.assertEqual(Pago.objects.filter(pago_convenio__isnull=False).count(), 2)
+
+
+
+class CierreCajaTest(TestCase):
+    def setUp(self) -> None:
+        self.plan = _crear_plan_para_pagos("CIERRE")
+        self.banco = InstitucionFinanciera.objects.create(codigo="GYE", nombre="Banco Guayaquil")
+        self.hoy = timezone.localdate()
+
+    def _pagar(self, monto, metodo_pago="efectivo", **kwargs):
+        return Pago.objects.create(
+            estudiante=self.plan.estudiante,
+            evento=self.plan.evento,
+            tipo_pago="miscelaneo",
+            monto=Decimal(monto),
+            metodo_pago=metodo_pago,
+            **kwargs,
+        )
+
+    def _cierres(self):
+        return {
+            cierre.clave: (cierre.numero_pagos, cierre.monto_total)
+            for cierre in CierreCajaDiario.objects.filter(numero_pagos__gt=0)
+        }
+
+    def test_cierre_incremental_coincide_con_reconstruccion(self):
+        efectivo = self._pagar("100.00")
+        self._pagar("40.00")
+        transferencia = self._pagar("50.00", "transferencia", institucion_financiera=self.banco)
+        SistemaPagosService.registrar_pago_cuota(
+            self.plan.cuotas.get(numero_cuota=1), Decimal("30.00"), "deposito", institucion_financiera=self.banco
+        )
+
+        cierre = CierreCajaDiario.objects.get(fecha=self.hoy, origen="pago", metodo_pago="efectivo")
+        self.assertEqual((cierre.numero_pagos, cierre.monto_total), (2, Decimal("140.00")))
+        cuota = CierreCajaDiario.objects.get(fecha=self.hoy, origen="pago_cuota")
+        self.assertEqual(cuota.tipo_pago, "cuota_individual")
+        self.assertEqual(cuota.evento_id, self.plan.evento_id)
+        self.assertEqual(cuota.institucion_financiera, self.banco)
+
+        # Cambiar el método mueve el pago de fila; borrar lo descuenta
+        efectivo.monto = Decimal("120.00")
+        efectivo.metodo_pago = "tarjeta"
+        efectivo.save()
+        transferencia.delete()
+        cierre.refresh_from_db()
+        self.assertEqual((cierre.numero_pagos, cierre.monto_total), (1, Decimal("40.00")))
+
+        incremental = self._cierres()
+        resultado = CierreCajaService.reconstruir(self.hoy, self.hoy)
+        self.assertEqual(self._cierres(), incremental)
+        self.assertEqual(resultado["numero_pagos"], 3)
+        self.assertEqual(resultado["monto_total"], Decimal("190.00"))
+
+    def test_reporte_mensual_y_comando(self):
+        anterior = self._pagar("80.00")
+        self._pagar("20.00", "transferencia")
+        self._pagar("10.00")
+        # Un pago del mes anterior registrado sin señales (por ejemplo, una migración)
+        mes_anterior = self.hoy.replace(day=1) - timedelta(days=1)
+        Pago.objects.filter(pk=anterior.pk).update(
+            fecha_pago=timezone.make_aware(datetime.combine(mes_anterior, time(10)))
+        )
+
+        salida = StringIO()
+        call_command(
+            "reconstruir_cierres_caja", "--desde", mes_anterior.isoformat(), "--hasta", self.hoy.isoformat(),
+            stdout=salida,
+        )
+        self.assertIn("Pagos: 3", salida.getvalue())
+
+        with CaptureQueriesContext(connection) as consultas:
+            reporte = CierreCajaService.reporte(
+                mes_anterior, self.hoy, periodo="mes", agrupar_por=["evento", "metodo_pago"]
+            )
+        self.assertEqual(len(consultas), 1)
+        filas = [(f["periodo"], f["metodo_pago"], f["numero_pagos"], f["monto_total"]) for f in reporte["filas"]]
+        self.assertEqual(filas, [
+            (mes_anterior.replace(day=1), "efectivo", 1, Decimal("80.00")),
+            (self.hoy.replace(day=1), "efectivo", 1, Decimal("10.00")),
+            (self.hoy.replace(day=1), "transferencia", 1, Decimal("20.00")),
+        ])
+        self.assertEqual(reporte["filas"][0]["evento_nombre"], self.plan.evento.nombre)
+        self.assertEqual(reporte["totales"]["monto_total"], Decimal("110.00"))
+
+        with self.assertRaises(ValidationError):
+            CierreCajaService.reporte(self.hoy, self.hoy, agrupar_por=["estudiante"])
+
+
+class ComprobantesTest(TestCase):
+    def setUp(self) -> None:
+        self.plan = _crear_plan_para_pagos("RECIBO")
+        self.pagos = [
+            Pago.objects.create(
+                estudiante=self.plan.estudiante,
+                evento=self.plan.evento,
+                tipo_pago="miscelaneo",
+                monto=Decimal("15.00"),
+                metodo_pago="efectivo",
+                observaciones="Carné estudiantil",
+            )
+            for _ in range(4)
+        ]
+        self.pago_cuota = SistemaPagosService.registrar_pago_cuota(
+            self.plan.cuotas.get(numero_cuota=1), Decimal("100.00"), "deposito", codigo_comprobante="DEP-1"
+        )
+
+    def test_comprobante_individual(self):
+        for contenido in (
+            ComprobantesService.comprobante_pago(self.pagos[0]),
+            ComprobantesService.comprobante_pago_cuota(self.pago_cuota),
+        ):
+            self.assertTrue(contenido.startswith(b"%PDF"))
+            self.assertEqual(len(PdfReader(BytesIO(contenido)).pages), 1)
+        texto = PdfReader(BytesIO(ComprobantesService.comprobante_pago_cuota(self.pago_cuota))).pages[0].extract_text()
+        self.assertIn("Cuota 1 de 3", texto)
+        self.assertIn("DEP-1", texto)
+
+    def test_lote_pdf_y_zip_en_bloques(self):
+        hoy = timezone.localdate()
+        with CaptureQueriesContext(connection) as consultas:
+            datos = ComprobantesService.datos_pagos(Pago.objects.all(), "hoy")
+            datos += ComprobantesService.datos_pagos_cuota(PagoCuota.objects.all(), "hoy")
+        self.assertEqual(len(consultas), 2)
+
+        lote = ComprobantesService.generar_lote(desde=hoy, hasta=hoy, evento=self.plan.evento)
+        self.assertEqual(lote["total"], 5)
+        self.assertEqual(len(PdfReader(BytesIO(lote["contenido"])).pages), 5)
+
+        # Bloques de dos comprobantes repartidos entre procesos
+        unido = generar_comprobantes_lote(datos, trabajadores=2, tamano_bloque=2)
+        self.assertEqual(len(PdfReader(BytesIO(unido)).pages), 5)
+        archivo = zipfile.ZipFile(BytesIO(generar_comprobantes_lote(datos, formato="zip", trabajadores=2, tamano_bloque=2)))
+        self.assertEqual(len(archivo.namelist()), 5)
+        self.assertIn(f"comprobante_PC-{self.pago_cuota.id:06d}.pdf", archivo.namelist())
+
+        with self.assertRaises(ValidationError):
+            ComprobantesService.generar_lote()
+        with self.assertRaises(ValidationError):
+            ComprobantesService.generar_lote(desde=hoy + timedelta(days=1))
+
+    def test_comando_generar_comprobantes(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "comprobantes.zip")
+            salida = StringIO()
+            call_command(
+                "generar_comprobantes", "--evento_id", str(self.plan.evento.id), "--origen", "pago",
+                "--formato", "zip", "--trabajadores", "1", "--salida", ruta, stdout=salida,
+            )
+            self.assertIn("Comprobantes: 4", salida.getvalue())
+            self.assertEqual(len(zipfile.ZipFile(ruta).namelist()), 4)
+
+
+class EstadoCuentaTest(EventoPagosTestCase):
+    codigo = "ESTADOS"
+    numero_estudiantes = 5
+    prefijo_cedula = "09700000"
+    campos_evento = {"costo_matricula": Decimal("50.00")}
+
+    def setUp(self) -> None:
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=3)
+        self.planes = {
+            plan.estudiante_id: plan for plan in PlanPago.objects.filter(evento=self.evento)
+        }
+        primero = self.estudiantes[0]
+        Beca.objects.create(
+            estudiante=primero, evento=self.evento, nombre_beca="Excelencia", tipo_beca="porcentual",
+            porcentaje_descuento=Decimal("10.00"), estado="activa", motivo="Alto rendimiento",
+            fecha_inicio=date.today(), fecha_fin=date.today() + timedelta(days=30),
+        )
+        Pago.objects.create(
+            estudiante=primero, evento=self.evento, tipo_pago="colegiatura_parcial",
+            monto=Decimal("120.00"), metodo_pago="transferencia", numero_transaccion="TRX-9",
+        )
+        SistemaPagosService.registrar_pago_cuota(
+            self.planes[primero.id].cuotas.get(numero_cuota=2), Decimal("30.00"), "efectivo"
+        )
+
+    def test_datos_en_consultas_constantes(self):
+        plan_ids = [plan.id for plan in self.planes.values()]
+        with CaptureQueriesContext(connection) as pocos:
+            EstadoCuentaService.datos_bloque(self.evento, plan_ids[:2])
+        with CaptureQueriesContext(connection) as todos:
+            estados = EstadoCuentaService.datos_bloque(self.evento, plan_ids)
+        self.assertEqual(len(pocos), len(todos))
+        self.assertLessEqual(len(todos), 8)
+
+        estado = next(e for e in estados if e["estudiante"]["id"] == self.estudiantes[0].id)
+        self.assertEqual(len(estado["cuotas"]), 3)
+        self.assertEqual(sorted(pago["monto"] for pago in estado["pagos"]), [Decimal("30.00"), Decimal("120.00")])
+        self.assertEqual(estado["descuentos"][0]["nombre"], "Excelencia")
+        resumen = SistemaPagosService.obtener_resumen_estudiante(self.estudiantes[0], self.evento)
+        self.assertEqual(estado["totales"]["saldo"], resumen["colegiatura"]["monto_pendiente"])
+        self.assertEqual(estado["totales"]["abonos"], Decimal("150.00"))
+
+    def test_zip_por_bloques_en_paralelo(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "estados.zip")
+            total = EstadoCuentaService.escribir_zip(ruta, self.evento, trabajadores=2, tamano_bloque=2)
+            self.assertEqual(total, 11)
+            with zipfile.ZipFile(ruta) as archivo:
+                nombre = f"estado_cuenta_EVT-ESTADOS_{self.estudiantes[0].cedula}"
+                pdf = PdfReader(BytesIO(archivo.read(f"{nombre}.pdf")))
+                self.assertIn("TRX-9", pdf.pages[0].extract_text())
+                self.assertIn("Excelencia", archivo.read(f"{nombre}.csv").decode())
+                resumen = archivo.read("resumen.csv").decode().splitlines()
+        self.assertEqual(len(resumen), 6)
+
+        # En flujo: solo CSV, el ZIP se arma por partes
+        partes = list(EstadoCuentaService.zip_en_flujo(self.evento, formatos=("csv",), trabajadores=1))
+        self.assertGreater(len(partes), 2)
+        self.assertEqual(len(zipfile.ZipFile(BytesIO(b"".join(partes))).namelist()), 6)
+
+        with self.assertRaises(ValidationError):
+            EstadoCuentaService.zip_en_flujo(self.evento, formatos=("xlsx",))
+
+    def test_comando_generar_estados_cuenta(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "estados.zip")
+            salida = StringIO()
+            call_command(
+                "generar_estados_cuenta", "--evento_id", str(self.evento.id), "--formato", "pdf",
+                "--trabajadores", "1", "--salida", ruta, stdout=salida,
+            )
+            self.assertIn("Archivos en el ZIP: 6", salida.getvalue())
+
+
+class PagosLoteTest(EventoPagosTestCase):
+    codigo = "LOTE"
+    numero_estudiantes = 6
+    prefijo_cedula = "09600000"
+
+    def setUp(self) -> None:
+        SistemaPagosService.crear_planes_pago_masivo(self.evento, self.estudiantes, numero_cuotas=3)
+        self.banco = InstitucionFinanciera.objects.create(codigo="PICH", nombre="Banco Pichincha")
+        self.hoy = timezone.localdate()
+
+    def _cuota(self, indice, numero_cuota=1):
+        return Cuota.objects.get(
+            plan_pago__estudiante=self.estudiantes[indice], plan_pago__evento=self.evento, numero_cuota=numero_cuota
+        )
+
+    def _leer(self, contenido, formato="csv"):
+        return list(PagosLoteService.leer_archivo(BytesIO(contenido.encode("utf-8")), formato))
+
+    def test_registra_por_ambos_identificadores_en_bloque(self):
+        cuota_id = self._cuota(1, 2).id
+        filas = self._leer(
+            "cedula;codigo_evento;numero_cuota;monto;metodo_pago;institucion_financiera;codigo_comprobante\n"
+            "0960000000;EVT-LOTE;1;100,00;deposito;PICH;DEP-1\n"
+            "0960000000;EVT-LOTE;2;40.00;deposito;PICH;DEP-2\n"
+            f"0960000001;;;;;;\n"
+        )
+        filas += [
+            (10, datos, error) for _, datos, error in self._leer(
+                f'{{"cuota_id": {cuota_id}, "monto": "25.50", "metodo_pago": "transferencia", '
+                f'"numero_transaccion": "TRX-7", "institucion_financiera": "{self.banco.id}"}}\n',
+                "jsonl",
+            )
+        ]
+        reporte = PagosLoteService.registrar(filas, tamano_lote=2)
+
+        self.assertEqual((reporte["aceptadas"], reporte["rechazadas"]), (3, 1))
+        self.assertEqual(reporte["monto_aceptado"], Decimal("165.50"))
+        self.assertIn("cuota_id", reporte["resultados"][2]["motivo"])
+        self.assertEqual(reporte["resultados"][0]["estado_cuota"], "pagado")
+        self.assertEqual(self._cuota(0, 1).estado, "pagado")
+        self.assertEqual(self._cuota(0, 2).monto_pagado, Decimal("40.00"))
+        pago = PagoCuota.objects.get(numero_transaccion="TRX-7")
+        self.assertEqual((pago.cuota_id, pago.institucion_financiera, pago.codigo_comprobante), (cuota_id, self.banco, None))
+
+        # Saldos del plan, diario y cierre de caja cuadran sin pasar por las señales
+        plan_ids = list(PlanPago.objects.filter(evento=self.evento).values_list("id", flat=True))
+        self.assertEqual(SistemaPagosService.recalcular_saldos(plan_ids=plan_ids, corregir=False)["con_diferencias"], [])
+        plan = PlanPago.objects.get(estudiante=self.estudiantes[0], evento=self.evento)
+        self.assertEqual(DiarioPagosService.saldos_planes([plan.id])[plan.id]["abonos"], Decimal("140.00"))
+        incremental = {
+            cierre.clave: (cierre.numero_pagos, cierre.monto_total)
+            for cierre in CierreCajaDiario.objects.filter(numero_pagos__gt=0)
+        }
+        CierreCajaService.reconstruir(self.hoy, self.hoy)
+        self.assertEqual(incremental, {
+            cierre.clave: (cierre.numero_pagos, cierre.monto_total)
+            for cierre in CierreCajaDiario.objects.filter(numero_pagos__gt=0)
+        })
+
+    def test_simulacion_y_rechazos(self):
+        SistemaPagosService.registrar_pago_cuota(
+            self._cuota(3), Decimal("10.00"), "deposito", institucion_financiera=self.banco, codigo_comprobante="DEP-9"
+        )
+        manana = (self.hoy + timedelta(days=1)).isoformat()
+        contenido = (
+            "cuota_id,cedula,codigo_evento,numero_cuota,monto,fecha_pago,institucion_financiera,codigo_comprobante\n"
+            f"{self._cuota(0).id},,,,60.00,,PICH,DEP-1\n"
+            f"{self._cuota(0).id},,,,50.00,,PICH,DEP-2\n"
+            f",0960000001,EVT-LOTE,1,30.00,,PICH,DEP-1\n"
+            f",0960000002,EVT-LOTE,1,30.00,{manana},PICH,DEP-3\n"
+            f",0960000002,EVT-LOTE,9,30.00,,PICH,DEP-4\n"
+            f",0960000004,EVT-LOTE,1,30.00,,XYZ,DEP-5\n"
+            f",0960000004,EVT-LOTE,1,30.00,,PICH,DEP-9\n"
+            f",0960000005,EVT-LOTE,1,-5,,PICH,DEP-6\n"
+        )
+        simulacion = PagosLoteService.registrar(self._leer(contenido), simular=True)
+        self.assertEqual(PagoCuota.objects.count(), 1)
+        self.assertEqual(self._cuota(0).monto_pagado, Decimal("0.00"))
+        self.assertEqual([r["estado"] for r in simulacion["resultados"]], ["simulado"] + ["rechazado"] * 7)
+
+        reporte = PagosLoteService.registrar(self._leer(contenido))
+        self.assertEqual(
+            [r["estado"] for r in reporte["resultados"]], ["registrado"] + ["rechazado"] * 7
+        )
+        self.assertEqual(
+            [r["motivo"] for r in reporte["resultados"]][1:],
+            [m for m in (r["motivo"] for r in simulacion["resultados"][1:])],
+        )
+        motivos = [r["motivo"] for r in reporte["resultados"]]
+        self.assertIn("excede el saldo", motivos[1])
+        self.assertEqual(motivos[2], "Comprobante o transacción ya registrado")
+        self.assertEqual(motivos[3], "La fecha de pago no puede ser futura")
+        self.assertEqual(motivos[4], "Cuota no encontrada")
+        self.assertIn("XYZ", motivos[5])
+        self.assertEqual(motivos[6], "Comprobante o transacción ya registrado")
+        self.assertEqual(motivos[7], "El monto debe ser mayor a cero")
+
+        # Volver a cargar el archivo no duplica pagos
+        repetido = PagosLoteService.registrar(self._leer(contenido))
+        self.assertEqual(repetido["aceptadas"], 0)
+        self.assertEqual(PagoCuota.objects.count(), 2)
+
+    def test_consultas_constantes_por_bloque(self):
+        def archivo(indices):
+            return self._leer("cedula,codigo_evento,numero_cuota,monto\n" + "".join(
+                f"{self.estudiantes[i].cedula},EVT-LOTE,{n},20.00\n" for i in indices for n in (1, 2)
+            ))
+
+        # La primera carga del día crea la fila del cierre de caja
+        PagosLoteService.registrar(self._leer(f"cuota_id,monto\n{self._cuota(0, 3).id},5.00\n"))
+        with CaptureQueriesContext(connection) as pocos:
+            PagosLoteService.registrar(archivo([0]))
+        with CaptureQueriesContext(connection) as muchos:
+            reporte = PagosLoteService.registrar(archivo(range(1, 6)))
+        self.assertEqual(reporte["aceptadas"], 10)
+        self.assertEqual(len(pocos), len(muchos))
+
+    def test_comando_registrar_pagos_lote(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "pagos.jsonl")
+            with open(ruta, "w", encoding="utf-8") as archivo:
+                archivo.write('{"cedula": "0960000000", "codigo_evento": "EVT-LOTE", "numero_cuota": 1, "monto": 100}\n')
+                archivo.write('{"cuota_id": 999999, "monto": 10}\n')
+            salida = StringIO()
+            call_command("registrar_pagos_lote", "--archivo", ruta, "--dry_run", stdout=salida)
+            self.assertIn("Válidas: 1", salida.getvalue())
+            self.assertFalse(PagoCuota.objects.exists())
+
+            call_command("registrar_pagos_lote", "--archivo", ruta, stdout=salida)
+            self.assertIn("Registradas: 1", salida.getvalue())
+            with open(f"{ruta}.resultado.csv", encoding="utf-8") as archivo:
+                resultado = archivo.read().splitlines()
+        self.assertEqual(resultado[0], "linea,estado,motivo,cuota_id,pago_cuota_id,monto,estado_cuota")
+        self.assertTrue(resultado[1].startswith("1,registrado,,"))
+        self.assertTrue(resultado[2].startswith("2,rechazado,Cuota no encontrada"))
+        self.assertEqual(self._cuota(0).estado, "pagado")
+
+class AplicacionPagosConcurrenteTest(TransactionTestCase):
+    hilos = 8
+    pagos_por_hilo = 10
+
+    @skipUnless(connection.features.has_select_for_update, "Requiere bloqueos de fila (PostgreSQL/MySQL)")
+    def test_totales_consistentes_con_cajeros_concurrentes(self):
+        self._verificar_cajeros(nullcontext())
+
+    def test_totales_consistentes_con_cajeros_en_turnos(self):
+        # SQLite no bloquea filas: los hilos se turnan cada pago, pero siguen
+        # intercalando pagos de cuota y de colegiatura sobre el mismo plan
+        self._verificar_cajeros(threading.Lock())
+
+    def _verificar_cajeros(self, turno):
+        plan = _crear_plan_para_pagos("CONC")
+        cuota_id = plan.cuotas.get(numero_cuota=3).pk
+        errores = []
+        inicio = threading.Barrier(self.hilos)
+
+        def cajero(indice):
+            try:
+                inicio.wait()
+                for _ in range(self.pagos_por_hilo):
+                    with turno:
+                        if indice % 2:
+                            Pago.objects.create(
+                                estudiante_id=plan.estudiante_id,
+                                evento_id=plan.evento_id,
+                                tipo_pago="colegiatura_parcial",
+                                monto=Decimal("1.00"),
+                                metodo_pago="efectivo",
+                            )
+                        else:
+                            SistemaPagosService.registrar_pago_cuota(
+                                Cuota.objects.get(pk=cuota_id), Decimal("1.00"), "transferencia"
+                            )
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero, args=(i,)) for i in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        esperado = Decimal("1.00") * self.hilos * self.pagos_por_hilo
+        cuotas = list(plan.cuotas.all())
+        registrado = (
+            (PagoCuota.objects.filter(cuota__plan_pago=plan).aggregate(total=Sum("monto_pagado"))["total"] or 0)
+            + (PagoCuotaAplicada.objects.filter(cuota__plan_pago=plan).aggregate(total=Sum("monto_aplicado"))["total"] or 0)
+        )
+        plan.refresh_from_db()
+        self.assertEqual(sum(cuota.monto_pagado for cuota in cuotas), esperado)
+        self.assertEqual(registrado, esperado)
+        # Los saldos del plan coinciden con la suma de sus cuotas
+        self.assertEqual(plan.monto_pagado_total, esperado)
+        self.assertEqual(plan.monto_pendiente_total, sum(cuota.monto - cuota.monto_pagado for cuota in cuotas))
+        self.assertEqual(plan.monto_pendiente_total, plan.monto_colegiatura - esperado)
+        self.assertEqual(plan.cuotas_pagadas, sum(cuota.estado == "pagado" for cuota in cuotas))
+        self.assertEqual(SistemaPagosService.recalcular_saldos(corregir=False)["con_diferencias"], [])
+
+
+@skipUnless(connection.features.has_select_for_update, "Requiere concurrencia real (PostgreSQL/MySQL)")
+class CanjeCodigoConcurrenteTest(TransactionTestCase):
+    hilos = 8
+    max_usos = 5
+
+    def test_canjes_concurrentes_no_superan_el_limite(self):
+        cache.clear()
+        descuento = _crear_codigo_promocional("9", max_usos=self.max_usos)
+        # Todos los hilos validan contra la misma entrada en caché
+        DescuentosService.validar_codigo_promocional("PROMO9", descuento.estudiante_id, descuento.evento_id)
+        canjes = []
+        errores = []
+        inicio = threading.Barrier(self.hilos)
+
+        def cliente():
+            try:
+                inicio.wait()
+                for _ in range(3):
+                    resultado = DescuentosService.canjear_codigo_promocional(
+                        "PROMO9", descuento.estudiante_id, descuento.evento_id
+                    )
+                    canjes.append(resultado.get("canjeado", False))
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cliente) for _ in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(sum(canjes), self.max_usos)
+        descuento.refresh_from_db()
+        self.assertEqual(descuento.usos, self.max_usos)
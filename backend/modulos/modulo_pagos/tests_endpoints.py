@@ -1,7 +1,10 @@
 from datetime import date, timedelta
 from decimal import Decimal
+from io import BytesIO
+import zipfile
 
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from rest_framework.test import APIClient
 
@@ -12,7 +15,11 @@ from modulos.modulo_pagos.models import (
     Matricula,
     Cuota,
     Pago,
+    PagoCuota,
     EstadoPagosEvento,
+    InstitucionFinanciera,
+    RespuestaIdempotente,
+    Descuento,
 )
 
 
@@ -127,3 +134,296 @@ class TestAPIPagosEndpoints(TestCase):
         r = self.client.get("/api/v1/pagos/por_tipo/?tipo=otro")
         self.assertEqual(r.status_code, 200)
 
+    def _datos_pago_cuota(self, **extra):
+        datos = {
+            "estudiante": self.estudiante.id,
+            "evento": self.evento.id,
+            "tipo_pago": "cuota_individual",
+            "cuota": self.cuota.id,
+            "monto": "40.00",
+            "metodo_pago": "transferencia",
+        }
+        datos.update(extra)
+        return datos
+
+    def test_reintento_con_idempotency_key(self):
+        datos = self._datos_pago_cuota()
+        r1 = self.client.post("/api/v1/pagos/", datos, format="json", HTTP_IDEMPOTENCY_KEY="clave-1")
+        self.assertEqual(r1.status_code, 201)
+        r2 = self.client.post("/api/v1/pagos/", datos, format="json", HTTP_IDEMPOTENCY_KEY="clave-1")
+        self.assertEqual(r2.status_code, 201)
+        self.assertEqual(r2["Idempotent-Replayed"], "true")
+        self.assertEqual(r2.json()["id"], r1.json()["id"])
+
+        # El pago se aplicó una sola vez
+        self.assertEqual(Pago.objects.filter(estudiante=self.estudiante).count(), 1)
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.monto_pagado, Decimal("40.00"))
+        self.assertEqual(RespuestaIdempotente.objects.count(), 1)
+
+        # La misma clave con otro cuerpo se rechaza
+        otra = self._datos_pago_cuota(monto="10.00")
+        r3 = self.client.post("/api/v1/pagos/", otra, format="json", HTTP_IDEMPOTENCY_KEY="clave-1")
+        self.assertEqual(r3.status_code, 422)
+
+    def test_comprobante_duplicado_no_se_aplica_dos_veces(self):
+        banco = InstitucionFinanciera.objects.create(codigo="BP", nombre="Banco Pichincha")
+        datos = self._datos_pago_cuota(institucion_financiera=banco.id, codigo_comprobante="CMP-001")
+        r1 = self.client.post("/api/v1/pagos/", datos, format="json")
+        self.assertEqual(r1.status_code, 201)
+        r2 = self.client.post("/api/v1/pagos/", datos, format="json")
+        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(r2.json()["id"], r1.json()["id"])
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.monto_pagado, Decimal("40.00"))
+
+        # El mismo comprobante con otro monto no es un reintento
+        otro = self._datos_pago_cuota(monto="10.00", institucion_financiera=banco.id, codigo_comprobante="CMP-001")
+        r3 = self.client.post("/api/v1/pagos/", otro, format="json")
+        self.assertEqual(r3.status_code, 409)
+        self.assertEqual(r3.json()["pago_id"], r1.json()["id"])
+        self.assertEqual(Pago.objects.filter(estudiante=self.estudiante).count(), 1)
+
+    def test_pago_convenio_reparte_transferencia(self):
+        r = self.client.post(
+            "/api/v1/pagos/convenio/",
+            {
+                "evento": self.evento.id,
+                "entidad": "PRODEUTEQ",
+                "monto_total": "60.00",
+                "regla": "partes_iguales",
+            },
+            format="json",
+        )
+        self.assertEqual(r.status_code, 201)
+        datos = r.json()
+        self.assertEqual(datos["monto_aplicado"], "60.00")
+        self.assertEqual(datos["estudiantes"][0]["cuotas"][0]["cuota_id"], self.cuota.id)
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.monto_pagado, Decimal("60.00"))
+
+        r = self.client.post(
+            "/api/v1/pagos/convenio/",
+            {"evento": self.evento.id, "entidad": "PRODEUTEQ", "monto_total": "10.00", "regla": "tabla"},
+            format="json",
+        )
+        self.assertEqual(r.status_code, 400)
+
+    def test_importar_extracto_bancario(self):
+        banco = InstitucionFinanciera.objects.create(codigo="GYE", nombre="Banco Guayaquil")
+        pago = Pago.objects.create(
+            estudiante=self.estudiante,
+            evento=self.evento,
+            tipo_pago="matricula",
+            monto=Decimal("50.00"),
+            metodo_pago="transferencia",
+            institucion_financiera=banco,
+            numero_transaccion="778899",
+        )
+        hoy = date.today().isoformat()
+        contenido = f"fecha,referencia,monto\n{hoy},00778899,50.00\n{hoy},123,9.99\n".encode("utf-8")
+
+        def importar(simular):
+            return self.client.post(
+                "/api/v1/conciliaciones-bancarias/importar/",
+                {
+                    "archivo": SimpleUploadedFile("extracto.csv", contenido, content_type="text/csv"),
+                    "institucion_financiera": banco.id,
+                    "simular": simular,
+                },
+                format="multipart",
+            )
+
+        r = importar(True)
+        self.assertEqual(r.status_code, 200)
+        self.assertIsNone(r.json()["conciliacion_id"])
+
+        r = importar(False)
+        self.assertEqual(r.status_code, 201)
+        datos = r.json()
+        self.assertEqual(datos["resumen"]["conciliada"], 1)
+        self.assertEqual(datos["conciliada"][0]["registro_id"], pago.id)
+
+        r = self.client.get(
+            f"/api/v1/conciliaciones-bancarias/{datos['conciliacion_id']}/lineas/?estado=sin_coincidencia"
+        )
+        self.assertEqual(r.status_code, 200)
+        lineas = r.json()
+        lineas = lineas.get("results", lineas) if isinstance(lineas, dict) else lineas
+        self.assertEqual([linea["referencia"] for linea in lineas], ["123"])
+
+    def test_cartera_vencida(self):
+        r = self.client.get(f"/api/v1/cuotas/cartera_vencida/?agrupar_por=evento&eventos={self.evento.id}")
+        self.assertEqual(r.status_code, 200)
+        fila = r.json()["filas"][0]
+        self.assertEqual(fila["clave"], self.evento.id)
+        self.assertEqual(fila["por_vencer"], "100.00")
+
+        r = self.client.get("/api/v1/cuotas/cartera_vencida/?agrupar_por=pais")
+        self.assertEqual(r.status_code, 400)
+
+    def test_recalcular_cronogramas(self):
+        url = "/api/v1/planes-pago/recalcular_cronogramas/"
+        r = self.client.post(url, {"evento": self.evento.id, "simular": True}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["cuotas_actualizadas"], 1)
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.fecha_vencimiento, self.evento.fecha_inicio + timedelta(days=15))
+
+        r = self.client.post(url, {"evento": self.evento.id}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.fecha_vencimiento, self.evento.fecha_inicio)
+
+    def test_reestructurar_lote(self):
+        url = "/api/v1/planes-pago/reestructurar_lote/"
+        r = self.client.post(url, {"planes": [self.plan.id], "nuevo_numero_cuotas": 2}, format="json")
+        self.assertEqual(r.status_code, 200)
+        resultado = r.json()["resultados"][0]
+        self.assertEqual(resultado["estado"], "reestructurado")
+        self.assertEqual(
+            list(self.plan.cuotas.order_by("numero_cuota").values_list("monto", flat=True)),
+            [Decimal("50.00"), Decimal("50.00")],
+        )
+
+        r = self.client.post(url, {"planes": [self.plan.id]}, format="json")
+        self.assertEqual(r.status_code, 400)
+
+    def test_simular_planes(self):
+        url = "/api/v1/planes-pago/simular/"
+        cuotas_antes = Cuota.objects.count()
+        r = self.client.post(
+            url,
+            {"evento": self.evento.id, "numero_estudiantes": 30, "numeros_cuotas": [3, 6, 10],
+             "porcentajes_beca": ["0", "50"], "incluir_cronogramas": False},
+            format="json",
+        )
+        self.assertEqual(r.status_code, 200)
+        datos = r.json()
+        self.assertEqual(datos["combinaciones"], 6)
+        self.assertEqual(datos["opciones"][0]["ingreso_total"], "3000.00")
+        self.assertNotIn("cronograma", datos["opciones"][0])
+        self.assertEqual(Cuota.objects.count(), cuotas_antes)
+
+        r = self.client.post(url, {"numero_estudiantes": 30, "numeros_cuotas": [3]}, format="json")
+        self.assertEqual(r.status_code, 400)
+
+    def test_codigo_promocional(self):
+        Descuento.objects.create(
+            estudiante=self.estudiante, evento=self.evento, nombre_descuento="Campaña",
+            tipo_descuento="porcentual", porcentaje_descuento=Decimal("10.00"), estado="activo",
+            motivo="Campaña", codigo_promocional="CAMPANA", max_usos=1,
+            fecha_inicio=date.today(), fecha_fin=date.today() + timedelta(days=10),
+        )
+        datos = {"codigo": "CAMPANA", "estudiante_id": self.estudiante.id, "evento_id": self.evento.id}
+        r = self.client.get("/api/v1/descuentos/validar_codigo/", datos)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json()["valido"])
+
+        r = self.client.post("/api/v1/descuentos/canjear_codigo/", datos, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["descuento"]["usos_restantes"], 0)
+        r = self.client.post("/api/v1/descuentos/canjear_codigo/", datos, format="json")
+        self.assertEqual(r.status_code, 409)
+
+        r = self.client.get("/api/v1/descuentos/validar_codigo/", {"codigo": "CAMPANA"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_proyeccion_cobros(self):
+        url = f"/api/v1/cuotas/proyeccion_cobros/?periodo=mensual&eventos={self.evento.id}"
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()["serie"]), 12)
+
+        r = self.client.get(url + "&horizonte=3&ponderar=true&formato=csv")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "text/csv")
+        self.assertEqual(len(r.content.decode().splitlines()), 4)
+
+        r = self.client.get("/api/v1/cuotas/proyeccion_cobros/?periodo=anual")
+        self.assertEqual(r.status_code, 400)
+
+    def test_cierre_caja(self):
+        Pago.objects.create(
+            estudiante=self.estudiante,
+            evento=self.evento,
+            tipo_pago="otro",
+            monto=Decimal("35.00"),
+            metodo_pago="efectivo",
+        )
+        r = self.client.get(
+            f"/api/v1/pagos/cierre_caja/?agrupar_por=tipo_pago,evento&eventos={self.evento.id}"
+        )
+        self.assertEqual(r.status_code, 200)
+        fila = r.json()["filas"][0]
+        self.assertEqual(fila["tipo_pago"], "otro")
+        self.assertEqual(fila["evento_nombre"], "Evento Pagos")
+        self.assertEqual(fila["monto_total"], "35.00")
+
+        r = self.client.get("/api/v1/pagos/cierre_caja/?desde=2025-13-01")
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get("/api/v1/pagos/cierre_caja/?periodo=semana")
+        self.assertEqual(r.status_code, 400)
+
+    def test_comprobantes(self):
+        pago = Pago.objects.create(
+            estudiante=self.estudiante,
+            evento=self.evento,
+            tipo_pago="matricula",
+            monto=Decimal("50.00"),
+            metodo_pago="efectivo",
+        )
+        r = self.client.get(f"/api/v1/pagos/{pago.id}/comprobante/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/pdf")
+        self.assertTrue(r.content.startswith(b"%PDF"))
+
+        r = self.client.get(f"/api/v1/pagos/comprobantes/?evento_id={self.evento.id}&formato=zip")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/zip")
+        self.assertEqual(r["X-Total-Comprobantes"], "1")
+
+        r = self.client.get("/api/v1/pagos/comprobantes/")
+        self.assertEqual(r.status_code, 400)
+
+    def test_estados_cuenta(self):
+        r = self.client.get(f"/api/v1/planes-pago/estados_cuenta/?evento_id={self.evento.id}")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/zip")
+        archivo = zipfile.ZipFile(BytesIO(b"".join(r.streaming_content)))
+        self.assertEqual(len(archivo.namelist()), 3)
+
+        r = self.client.get(f"/api/v1/planes-pago/estados_cuenta/?evento_id={self.evento.id}&formato=xlsx")
+        self.assertEqual(r.status_code, 400)
+
+    def test_registrar_pagos_lote(self):
+        contenido = (
+            "cedula,codigo_evento,numero_cuota,monto,metodo_pago,codigo_comprobante\n"
+            "7775554442,EVT-PAG-TEST,1,60.00,deposito,DEP-100\n"
+            "7775554442,EVT-PAG-TEST,1,60.00,deposito,DEP-101\n"
+        ).encode("utf-8")
+
+        def registrar(**datos):
+            return self.client.post(
+                "/api/v1/cuotas/registrar_pagos_lote/",
+                {"archivo": SimpleUploadedFile("pagos.csv", contenido, content_type="text/csv"), **datos},
+                format="multipart",
+            )
+
+        r = registrar(simular=True)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual((r.json()["aceptadas"], r.json()["rechazadas"]), (1, 1))
+        self.assertFalse(PagoCuota.objects.exists())
+
+        r = registrar(formato_resultado="csv")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r["Content-Type"], "text/csv")
+        lineas = r.content.decode().splitlines()
+        self.assertTrue(lineas[1].startswith("2,registrado,"))
+        self.assertIn("excede el saldo", lineas[2])
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.monto_pagado, Decimal("60.00"))
+
+        # Un CSV leído como JSONL se rechaza línea a línea
+        r = registrar(formato="jsonl")
+        self.assertEqual((r.json()["aceptadas"], r.json()["rechazadas"]), (0, 3))
@@ -1,13 +1,19 @@
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.utils import timezone
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Sum
 from datetime import date, timedelta
 from decimal import Decimal
@@ -19,7 +25,8 @@ from .models import (
     EstadoPagosEvento, 
     Matricula,
     Beca,
-    Descuento
+    Descuento,
+    ConciliacionBancaria
 )
 from .serializers import (
     PlanPagoSerializer,
@@ -28,13 +35,39 @@ from .serializers import (
     EstadoPagosEventoSerializer, 
     MatriculaSerializer,
     BecaSerializer,
-    DescuentoSerializer
+    DescuentoSerializer,
+    PagoConvenioSolicitudSerializer,
+    ConciliacionBancariaSerializer,
+    LineaExtractoBancarioSerializer,
+    ExtractoBancarioSolicitudSerializer,
+    PagosLoteSolicitudSerializer,
+    RecalcularCronogramasSolicitudSerializer,
+    ReestructuracionLoteSolicitudSerializer,
+    SimulacionPlanesSolicitudSerializer,
+    CodigoPromocionalSolicitudSerializer
 )
+from .services.idempotencia_service import IdempotenciaService
+from .services.convenios_service import ConveniosService
+from .services.conciliacion_bancaria_service import ConciliacionBancariaService
+from .services.cartera_service import CarteraService
+from .services.cronogramas_service import CronogramasService
+from .services.simulador_planes_service import SimuladorPlanesService
+from .services.proyeccion_cobros_service import ProyeccionCobrosService
+from .services.descuentos_service import DescuentosService
+from .services.cierre_caja_service import CierreCajaService
+from .services.comprobantes_service import ComprobantesService
+from .services.estado_cuenta_service import EstadoCuentaService
+from .services.pagos_lote_service import PagosLoteService
 # Alias temporal para referencias deprecadas en swagger
 PlanPagoPersonalizadoSerializer = CuotaSerializer
 from modulos.modulo_estudiantes.models import Estudiante
 from modulos.modulo_certificados.models import Evento
 
+
+def _respuesta_reporte(datos, codigo=status.HTTP_200_OK):
+    """Respuesta de un reporte de servicio con montos y fechas como texto, igual que los serializadores."""
+    return Response(json.loads(json.dumps(datos, default=str)), status=codigo)
+
 # Create your views here.
 
 @swagger_auto_schema(tags=['Planes de Pago'])
@@ -151,6 +184,147 @@ class PlanPagoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @swagger_auto_schema(
+        operation_description=(
+            "Reestructura en bloque muchos planes (lista de IDs o filtro por evento y estado general) "
+            "con el mismo número de cuotas y/o monto de colegiatura. Devuelve el resultado por plan."
+        ),
+        request_body=ReestructuracionLoteSolicitudSerializer,
+        responses={
+            200: "Resultado por plan y totales de la reestructuración",
+            400: "Error en los datos proporcionados"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def reestructurar_lote(self, request):
+        """
+        Reestructura muchos planes en una sola solicitud: valida todos los
+        planes primero y aplica los cambios en bloque, por lotes.
+        """
+        serializer = ReestructuracionLoteSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        try:
+            reporte = CronogramasService.reestructurar_planes(
+                plan_ids=datos.get('planes'),
+                evento=datos.get('evento'),
+                estado_general=datos.get('estado_general'),
+                nuevo_numero_cuotas=datos.get('nuevo_numero_cuotas'),
+                nuevo_monto_colegiatura=datos.get('nuevo_monto_colegiatura'),
+                motivo_reestructuracion=datos.get('motivo_reestructuracion'),
+                simular=datos['simular'],
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        return _respuesta_reporte(reporte)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Simula en memoria, sin crear planes ni cuotas, las combinaciones de número de cuotas, "
+            "fecha de inicio y porcentaje de beca para una cohorte: cronogramas y flujo mensual de cobros."
+        ),
+        request_body=SimulacionPlanesSolicitudSerializer,
+        responses={
+            200: "Periodos y resultado por combinación",
+            400: "Error en los datos proporcionados"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def simular(self, request):
+        """Compara opciones de planes de pago para una cohorte sin escribir en la base de datos."""
+        serializer = SimulacionPlanesSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        try:
+            simulacion = SimuladorPlanesService.simular(
+                monto_colegiatura=datos['monto_colegiatura'],
+                numero_estudiantes=datos['numero_estudiantes'],
+                numeros_cuotas=datos['numeros_cuotas'],
+                fechas_inicio=datos['fechas_inicio'],
+                porcentajes_beca=datos.get('porcentajes_beca', [Decimal('0.00')]),
+                estudiantes_becados=datos.get('estudiantes_becados'),
+                incluir_cronogramas=datos['incluir_cronogramas'],
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        return _respuesta_reporte(simulacion)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Recalcula las cuotas pendientes de todos los planes de un evento tras corregir su "
+            "costo de colegiatura o fecha de inicio. Las cuotas pagadas no se modifican. "
+            "Con `simular` solo devuelve las diferencias."
+        ),
+        request_body=RecalcularCronogramasSolicitudSerializer,
+        responses={
+            200: "Diferencias por plan y totales del recálculo",
+            400: "Error en los datos proporcionados"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def recalcular_cronogramas(self, request):
+        """Recalcula en bloque los cronogramas de pago de un evento."""
+        serializer = RecalcularCronogramasSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        reporte = CronogramasService.recalcular_evento(
+            datos['evento'],
+            actualizar_monto=datos['actualizar_monto'],
+            simular=datos['simular'],
+        )
+        return _respuesta_reporte(reporte)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Genera los estados de cuenta (cuotas, pagos, becas, descuentos y saldo) de los "
+            "estudiantes de un evento y los envía como ZIP en flujo, con un resumen.csv"
+        ),
+        manual_parameters=[
+            openapi.Parameter('evento_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True),
+            openapi.Parameter(
+                'formato', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['pdf', 'csv', 'ambos'], required=False
+            ),
+            openapi.Parameter(
+                'estudiantes', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                description="IDs de estudiantes separados por coma (por defecto, todos los del evento)"
+            ),
+        ],
+        responses={200: "ZIP con los estados de cuenta", 400: "Parámetros no válidos"}
+    )
+    @action(detail=False, methods=['get'])
+    def estados_cuenta(self, request):
+        """Descarga los estados de cuenta de un evento en un ZIP."""
+        params = request.query_params
+        formato = params.get('formato', 'ambos')
+        if formato not in ('pdf', 'csv', 'ambos'):
+            return Response({"error": f"Formato no válido: {formato}"}, status=status.HTTP_400_BAD_REQUEST)
+        estudiantes = params.get('estudiantes')
+        try:
+            evento = get_object_or_404(Evento, id=int(params.get('evento_id', '')))
+            estudiante_ids = [int(e) for e in estudiantes.split(',') if e.strip()] if estudiantes else None
+            partes = EstadoCuentaService.zip_en_flujo(
+                evento,
+                formatos=('pdf', 'csv') if formato == 'ambos' else (formato,),
+                estudiante_ids=estudiante_ids,
+            )
+        except ValueError:
+            return Response(
+                {"error": "El evento y los IDs de estudiantes deben ser números"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        respuesta = StreamingHttpResponse(partes, content_type='application/zip')
+        respuesta['Content-Disposition'] = (
+            f'attachment; filename="estados_cuenta_{evento.codigo_evento}_{timezone.localdate()}.zip"'
+        )
+        return respuesta
+
 @swagger_auto_schema(tags=['Cuotas'])
 class CuotaViewSet(viewsets.ModelViewSet):
     """
@@ -198,6 +372,97 @@ class CuotaViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description=(
+            "Cartera por tramos de antigüedad (por vencer, 0–30, 31–60, 61–90 y más de 90 días) "
+            "agrupada por evento, ciudad del estudiante o institución (aval del evento)"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'agrupar_por', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['evento', 'ciudad', 'institucion'], required=False
+            ),
+            openapi.Parameter(
+                'eventos', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                description="IDs de eventos separados por coma (por defecto, eventos con planes activos)"
+            ),
+        ],
+        tags=['Cuotas']
+    )
+    @action(detail=False, methods=['get'])
+    def cartera_vencida(self, request):
+        """Obtiene la antigüedad de la cartera pendiente (en caché durante el día)."""
+        agrupar_por = request.query_params.get('agrupar_por', 'evento')
+        eventos = request.query_params.get('eventos')
+        try:
+            evento_ids = [int(e) for e in eventos.split(',') if e.strip()] if eventos else None
+            reporte = CarteraService.obtener_antiguedad(agrupar_por=agrupar_por, evento_ids=evento_ids)
+        except ValueError:
+            return Response({"error": "Los IDs de eventos deben ser números"}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        return _respuesta_reporte(reporte)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Proyección semanal o mensual de los cobros esperados de las cuotas pendientes y "
+            "atrasadas, opcionalmente ponderada por la puntualidad histórica de cada evento"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'periodo', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['semanal', 'mensual'], required=False
+            ),
+            openapi.Parameter(
+                'eventos', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                description="IDs de eventos separados por coma (por defecto, eventos con planes activos)"
+            ),
+            openapi.Parameter(
+                'horizonte', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                description="Número de periodos (por defecto 13 semanas o 12 meses)"
+            ),
+            openapi.Parameter('ponderar', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, required=False),
+            openapi.Parameter(
+                'formato', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['json', 'csv'], required=False
+            ),
+        ],
+        tags=['Cuotas']
+    )
+    @action(detail=False, methods=['get'])
+    def proyeccion_cobros(self, request):
+        """Proyecta el flujo de cobros esperado por periodo en JSON o CSV."""
+        params = request.query_params
+        eventos = params.get('eventos')
+        horizonte = params.get('horizonte')
+        ponderar = params.get('ponderar', '').lower() in ('1', 'true', 'si')
+        formato = params.get('formato', 'json')
+        if formato not in ('json', 'csv'):
+            return Response({"error": f"Formato no válido: {formato}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            evento_ids = [int(e) for e in eventos.split(',') if e.strip()] if eventos else None
+            proyeccion = ProyeccionCobrosService.proyectar(
+                periodo=params.get('periodo', 'semanal'),
+                evento_ids=evento_ids,
+                horizonte=int(horizonte) if horizonte else None,
+                ponderar=ponderar,
+            )
+        except ValueError:
+            return Response(
+                {"error": "Los IDs de eventos y el horizonte deben ser números"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if formato == 'csv':
+            respuesta = HttpResponse(ProyeccionCobrosService.a_csv(proyeccion), content_type='text/csv')
+            respuesta['Content-Disposition'] = (
+                f'attachment; filename="proyeccion_cobros_{proyeccion["periodo"]}_{proyeccion["fecha_corte"]}.csv"'
+            )
+            return respuesta
+        return _respuesta_reporte(proyeccion)
+
     @swagger_auto_schema(
         operation_description="Obtiene las cuotas atrasadas",
         responses={200: CuotaSerializer(many=True)},
@@ -213,6 +478,47 @@ class CuotaViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        request_body=PagosLoteSolicitudSerializer,
+        responses={
+            200: "Simulación del lote",
+            201: "Resultado del lote registrado (JSON o CSV)",
+            400: "Error en el archivo o en los datos proporcionados"
+        },
+        tags=['Cuotas']
+    )
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def registrar_pagos_lote(self, request):
+        """
+        Registra pagos de cuotas desde un CSV o JSONL. Cada fila identifica la
+        cuota por `cuota_id` o por `cedula`, `codigo_evento` y `numero_cuota`.
+        Con `simular` solo valida las filas; `formato_resultado=csv` devuelve
+        el archivo de resultados con una fila por línea.
+        """
+        serializer = PagosLoteSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        archivo = datos['archivo']
+
+        try:
+            reporte = PagosLoteService.registrar(
+                PagosLoteService.leer_archivo(
+                    archivo, datos.get('formato') or PagosLoteService.detectar_formato(archivo.name)
+                ),
+                simular=datos['simular'],
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        codigo = status.HTTP_200_OK if datos['simular'] else status.HTTP_201_CREATED
+        if datos['formato_resultado'] == 'csv':
+            respuesta = HttpResponse(PagosLoteService.resultados_csv(reporte), content_type='text/csv', status=codigo)
+            respuesta['Content-Disposition'] = 'attachment; filename="resultado_pagos_lote.csv"'
+            respuesta['X-Filas-Aceptadas'] = reporte['aceptadas']
+            respuesta['X-Filas-Rechazadas'] = reporte['rechazadas']
+            return respuesta
+        return _respuesta_reporte(reporte, codigo)
+
 @swagger_auto_schema(tags=['Pagos'])
 class PagoViewSet(viewsets.ModelViewSet):
     """
@@ -254,36 +560,101 @@ class PagoViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         request_body=PagoSerializer,
+        manual_parameters=[
+            openapi.Parameter(
+                IdempotenciaService.CABECERA,
+                openapi.IN_HEADER,
+                description="Clave única del cliente; los reintentos con la misma clave devuelven la respuesta original",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
         responses={
+            200: "Pago ya registrado (reintento o comprobante duplicado)",
             201: PagoSerializer,
-            400: "Error en los datos proporcionados"
+            400: "Error en los datos proporcionados",
+            409: "Comprobante o transacción ya registrado para otro estudiante, evento o monto",
+            422: "Clave de idempotencia reutilizada con otra solicitud"
         },
         tags=['Pagos']
     )
     def create(self, request, *args, **kwargs):
+        # Los reintentos se responden antes de validar o aplicar nada
+        clave = request.headers.get(IdempotenciaService.CABECERA)
+        huella = IdempotenciaService.huella_solicitud(request.data)
+        repetida = self._respuesta_repetida(clave, huella, request.data)
+        if repetida is not None:
+            return repetida
+
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         tipo_pago = serializer.validated_data['tipo_pago']
         
-        if tipo_pago == 'cuota':
-            cuota = serializer.validated_data['cuota']
-            monto_pagado = serializer.validated_data['monto']
-            
-            cuota.monto_pagado += monto_pagado
-            if cuota.monto_pagado >= cuota.monto:
-                cuota.estado = 'pagado'
-                cuota.fecha_pago = timezone.now().date()
-            cuota.save()
-        elif tipo_pago == 'matricula':
-            matricula = Matricula.objects.get(estudiante=serializer.validated_data['estudiante'])
-            matricula.matricula_pagada = True
-            matricula.save()
-        
-        self.perform_create(serializer)
+        try:
+            with transaction.atomic():
+                registro = (
+                    IdempotenciaService.reservar_clave(clave, request.path, huella) if clave else None
+                )
+                if tipo_pago == 'cuota':
+                    # Abono bajo bloqueo del plan: sin pérdidas con cajeros concurrentes
+                    Cuota.abonar(
+                        serializer.validated_data['cuota'].pk,
+                        serializer.validated_data['monto'],
+                        timezone.now().date(),
+                    )
+                elif tipo_pago == 'matricula':
+                    matricula = Matricula.objects.get(estudiante=serializer.validated_data['estudiante'])
+                    matricula.matricula_pagada = True
+                    matricula.save()
+                
+                self.perform_create(serializer)
+                if registro:
+                    IdempotenciaService.guardar_respuesta(
+                        registro, status.HTTP_201_CREATED, serializer.data, serializer.instance
+                    )
+        except IntegrityError:
+            # Reintento concurrente con la misma clave o comprobante ya registrado
+            repetida = self._respuesta_repetida(clave, huella, request.data)
+            if repetida is not None:
+                return repetida
+            raise
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def _respuesta_repetida(self, clave, huella, datos):
+        """Respuesta para un reintento ya procesado, o None si la solicitud es nueva."""
+        if clave:
+            registro = IdempotenciaService.buscar_respuesta(clave)
+            if registro is not None and registro.codigo_estado is not None:
+                if registro.huella != huella:
+                    return Response(
+                        {'error': 'La clave de idempotencia ya se usó con una solicitud diferente'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return Response(
+                    registro.respuesta,
+                    status=registro.codigo_estado,
+                    headers={'Idempotent-Replayed': 'true'}
+                )
+
+        duplicado = IdempotenciaService.buscar_pago_duplicado(datos)
+        if duplicado is not None:
+            if not IdempotenciaService.coincide_con_solicitud(duplicado, datos):
+                return Response(
+                    {
+                        'error': 'El comprobante o número de transacción ya está registrado en otro pago',
+                        'pago_id': duplicado.pk,
+                    },
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(
+                self.get_serializer(duplicado).data,
+                status=status.HTTP_200_OK,
+                headers={'Idempotent-Replayed': 'true'}
+            )
+        return None
+
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter(
@@ -338,6 +709,176 @@ class PagoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        request_body=PagoConvenioSolicitudSerializer,
+        responses={
+            200: "Simulación del reparto",
+            201: "Reporte del reparto registrado",
+            400: "Error en los datos proporcionados"
+        },
+        tags=['Pagos']
+    )
+    @action(detail=False, methods=['post'])
+    def convenio(self, request):
+        """
+        Registra la transferencia única de una institución aliada y la reparte
+        entre los estudiantes de un evento (partes iguales, vencimiento más
+        antiguo primero o tabla explícita). Con `simular` solo devuelve el reparto.
+        """
+        serializer = PagoConvenioSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        distribucion = None
+        if datos.get('distribucion'):
+            distribucion = {}
+            for fila in datos['distribucion']:
+                distribucion[fila['estudiante']] = distribucion.get(fila['estudiante'], Decimal('0.00')) + fila['monto']
+
+        try:
+            reporte = ConveniosService.registrar_pago_convenio(
+                evento=datos['evento'],
+                monto_total=datos['monto_total'],
+                regla=datos['regla'],
+                entidad=datos['entidad'],
+                metodo_pago=datos['metodo_pago'],
+                estudiante_ids=datos.get('estudiantes'),
+                distribucion=distribucion,
+                institucion_financiera=datos.get('institucion_financiera'),
+                numero_transaccion=datos.get('numero_transaccion'),
+                codigo_comprobante=datos.get('codigo_comprobante'),
+                observaciones=datos.get('observaciones', ''),
+                simular=datos['simular'],
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        codigo = status.HTTP_200_OK if datos['simular'] else status.HTTP_201_CREATED
+        return _respuesta_reporte(reporte, codigo)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Reporte de caja por día, mes o año leído de los cierres diarios, agrupado por "
+            "origen, tipo de pago, método de pago, institución financiera o evento"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'desde', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                required=False, description="Fecha inicial (por defecto hoy)"
+            ),
+            openapi.Parameter(
+                'hasta', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+                required=False, description="Fecha final (por defecto la fecha inicial)"
+            ),
+            openapi.Parameter(
+                'periodo', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['dia', 'mes', 'anio'], required=False
+            ),
+            openapi.Parameter(
+                'agrupar_por', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                description=(
+                    "Dimensiones separadas por coma: origen, tipo_pago, metodo_pago, "
+                    "institucion_financiera, evento (por defecto metodo_pago)"
+                )
+            ),
+            openapi.Parameter(
+                'eventos', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                description="IDs de eventos separados por coma (por defecto, todos)"
+            ),
+        ],
+        tags=['Pagos']
+    )
+    @action(detail=False, methods=['get'])
+    def cierre_caja(self, request):
+        """Obtiene el cierre de caja del rango de fechas desde la tabla de cierres diarios."""
+        params = request.query_params
+        eventos = params.get('eventos')
+        agrupar_por = params.get('agrupar_por', 'metodo_pago')
+        try:
+            desde = date.fromisoformat(params['desde']) if params.get('desde') else timezone.localdate()
+            hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else desde
+            evento_ids = [int(e) for e in eventos.split(',') if e.strip()] if eventos else None
+            reporte = CierreCajaService.reporte(
+                desde,
+                hasta,
+                periodo=params.get('periodo', 'dia'),
+                agrupar_por=[d.strip() for d in agrupar_por.split(',') if d.strip()],
+                evento_ids=evento_ids,
+            )
+        except ValueError:
+            return Response(
+                {"error": "Las fechas deben tener el formato YYYY-MM-DD y los IDs de eventos ser números"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        return _respuesta_reporte(reporte)
+
+    @swagger_auto_schema(
+        operation_description="Genera el comprobante de pago en PDF",
+        responses={200: "PDF del comprobante"},
+        tags=['Pagos']
+    )
+    @action(detail=True, methods=['get'])
+    def comprobante(self, request, pk=None):
+        """Descarga el comprobante en PDF de un pago."""
+        pago = self.get_object()
+        respuesta = HttpResponse(ComprobantesService.comprobante_pago(pago), content_type='application/pdf')
+        respuesta['Content-Disposition'] = f'attachment; filename="comprobante_P-{pago.id:06d}.pdf"'
+        return respuesta
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Genera en lote los comprobantes de un rango de fechas y/o un evento, "
+            "como un PDF de varias páginas o un ZIP con un PDF por pago"
+        ),
+        manual_parameters=[
+            openapi.Parameter('desde', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=False),
+            openapi.Parameter('hasta', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, required=False),
+            openapi.Parameter('evento_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False),
+            openapi.Parameter(
+                'origen', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['todos', 'pago', 'pago_cuota'], required=False
+            ),
+            openapi.Parameter(
+                'formato', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                enum=['pdf', 'zip'], required=False
+            ),
+        ],
+        responses={200: "PDF o ZIP con los comprobantes", 400: "Filtros no válidos o sin pagos"},
+        tags=['Pagos']
+    )
+    @action(detail=False, methods=['get'])
+    def comprobantes(self, request):
+        """Descarga los comprobantes de varios pagos en un solo archivo."""
+        params = request.query_params
+        evento = None
+        try:
+            desde = date.fromisoformat(params['desde']) if params.get('desde') else None
+            hasta = date.fromisoformat(params['hasta']) if params.get('hasta') else None
+            if params.get('evento_id'):
+                evento = get_object_or_404(Evento, id=int(params['evento_id']))
+            lote = ComprobantesService.generar_lote(
+                desde=desde,
+                hasta=hasta,
+                evento=evento,
+                origen=params.get('origen', 'todos'),
+                formato=params.get('formato', 'pdf'),
+            )
+        except ValueError:
+            return Response(
+                {"error": "Las fechas deben tener el formato YYYY-MM-DD y el evento ser un número"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        tipo = 'application/zip' if lote['nombre_archivo'].endswith('.zip') else 'application/pdf'
+        respuesta = HttpResponse(lote['contenido'], content_type=tipo)
+        respuesta['Content-Disposition'] = f'attachment; filename="{lote["nombre_archivo"]}"'
+        respuesta['X-Total-Comprobantes'] = lote['total']
+        return respuesta
+
 @swagger_auto_schema(tags=['Matrículas'])
 class MatriculaViewSet(viewsets.ModelViewSet):
     """
@@ -528,6 +1069,75 @@ class EstadoPagosEventoViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+@swagger_auto_schema(tags=['Conciliación Bancaria'])
+class ConciliacionBancariaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Conciliaciones de extractos bancarios. Las importaciones se registran
+    con la acción `importar`; las líneas de cada una con `lineas`.
+    """
+    queryset = ConciliacionBancaria.objects.select_related('institucion_financiera')
+    serializer_class = ConciliacionBancariaSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['institucion_financiera']
+    ordering_fields = ['fecha_creacion', 'fecha_desde']
+
+    @swagger_auto_schema(
+        request_body=ExtractoBancarioSolicitudSerializer,
+        responses={
+            200: "Simulación de la conciliación",
+            201: "Reporte de la conciliación registrada",
+            400: "Error en el archivo o en los datos proporcionados"
+        },
+        tags=['Conciliación Bancaria']
+    )
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def importar(self, request):
+        """
+        Concilia un extracto CSV (fecha, referencia, monto) contra los
+        comprobantes y transacciones registrados en la ventana de fechas del
+        extracto. Con `simular` solo devuelve el reporte.
+        """
+        serializer = ExtractoBancarioSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+
+        try:
+            reporte = ConciliacionBancariaService.conciliar_extracto(
+                datos['institucion_financiera'],
+                datos['archivo'],
+                nombre_archivo=datos['archivo'].name,
+                fecha_desde=datos.get('fecha_desde'),
+                fecha_hasta=datos.get('fecha_hasta'),
+                tolerancia_dias=datos['tolerancia_dias'],
+                simular=datos['simular'],
+            )
+        except DjangoValidationError as e:
+            return Response({"error": " ".join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        codigo = status.HTTP_200_OK if datos['simular'] else status.HTTP_201_CREATED
+        return _respuesta_reporte(reporte, codigo)
+
+    @swagger_auto_schema(
+        operation_description="Líneas de una conciliación, filtrables por estado",
+        manual_parameters=[
+            openapi.Parameter('estado', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False)
+        ],
+        tags=['Conciliación Bancaria']
+    )
+    @action(detail=True, methods=['get'])
+    def lineas(self, request, pk=None):
+        """Obtiene las líneas del extracto con su estado de conciliación."""
+        lineas = self.get_object().lineas.all()
+        estado = request.query_params.get('estado')
+        if estado:
+            lineas = lineas.filter(estado=estado)
+        pagina = self.paginate_queryset(lineas)
+        if pagina is not None:
+            return self.get_paginated_response(LineaExtractoBancarioSerializer(pagina, many=True).data)
+        return Response(LineaExtractoBancarioSerializer(lineas, many=True).data)
+
+
 @swagger_auto_schema(tags=['Becas'])
 class BecaViewSet(viewsets.ModelViewSet):
     """
@@ -591,12 +1201,7 @@ class BecaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def activas(self, request):
         """Obtiene la lista de becas activas y vigentes."""
-        hoy = timezone.now().date()
-        queryset = self.queryset.filter(
-            estado='activa',
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        )
+        queryset = DescuentosService.becas_vigentes()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -774,12 +1379,7 @@ class DescuentoViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def activos(self, request):
         """Obtiene la lista de descuentos activos y vigentes."""
-        hoy = timezone.now().date()
-        queryset = self.queryset.filter(
-            estado='activo',
-            fecha_inicio__lte=hoy,
-            fecha_fin__gte=hoy
-        )
+        queryset = DescuentosService.descuentos_vigentes()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -814,6 +1414,52 @@ class DescuentoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description="Valida un código promocional para un estudiante y evento (consulta en caché)",
+        query_serializer=CodigoPromocionalSolicitudSerializer,
+        responses={
+            200: "Resultado de la validación",
+            400: "Error en los datos proporcionados"
+        },
+        tags=['Descuentos']
+    )
+    @action(detail=False, methods=['get'])
+    def validar_codigo(self, request):
+        """Valida un código promocional sin registrar su uso."""
+        serializer = CodigoPromocionalSolicitudSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        resultado = DescuentosService.validar_codigo_promocional(
+            datos['codigo'], datos['estudiante_id'], datos['evento_id']
+        )
+        return _respuesta_reporte(resultado)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Canjea un código promocional: valida y registra un uso. Con `max_usos` definido, "
+            "los canjes concurrentes nunca superan el límite."
+        ),
+        request_body=CodigoPromocionalSolicitudSerializer,
+        responses={
+            200: "Código canjeado",
+            400: "Error en los datos proporcionados",
+            409: "Código no válido, no aplicable o sin usos disponibles"
+        },
+        tags=['Descuentos']
+    )
+    @action(detail=False, methods=['post'])
+    def canjear_codigo(self, request):
+        """Registra el uso de un código promocional."""
+        serializer = CodigoPromocionalSolicitudSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        resultado = DescuentosService.canjear_codigo_promocional(
+            datos['codigo'], datos['estudiante_id'], datos['evento_id']
+        )
+        return _respuesta_reporte(
+            resultado, status.HTTP_200_OK if resultado['valido'] else status.HTTP_409_CONFLICT
+        )
+
 @swagger_auto_schema(tags=['Planes de Pago Personalizados'])
 class PlanPagoPersonalizadoViewSet(viewsets.ModelViewSet):
     """